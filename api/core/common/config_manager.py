@@ -58,6 +58,12 @@ class AppConfig:
     max_file_size: int = 50 * 1024 * 1024 * 1024  # 50GB
     """最大file上传大小限制，单位为字节"""
 
+    max_decompression_ratio: int = 200
+    """压缩文件解压后与压缩前的最大大小比例，超出时拒绝导入（防止压缩炸弹），0表示只受max_file_size限制"""
+
+    max_zip_members: int = 1000
+    """导入的zip包内最多允许的条目数，0表示不限制"""
+
     max_query_rows: int = 10000
     """页面queryresult最大行数，更大data量使用异步任务"""
 
@@ -70,6 +76,47 @@ class AppConfig:
     table_metadata_cache_ttl_hours: int = 24
     """table元data缓存valid期（小时），<=0 时禁用缓存"""
 
+    table_metadata_cache_max_entries: int = 512
+    """table元data缓存最多保留的table数量，超出后按LRU淘汰"""
+
+    table_metadata_cache_max_mb: int = 64
+    """table元data缓存占用内存上限（MB），超出后按LRU淘汰"""
+
+    chunked_upload_max_parallelism: int = 8
+    """分块上传建议的最大并发分块数，由当前活跃上传/导入任务共同分摊"""
+
+    chunked_upload_chunk_size_mb: int = 8
+    """分块上传默认分块大小（MB），尚无写盘吞吐测量时使用"""
+
+    upload_dedup_enabled: bool = True
+    """重复上传内容相同的文件时以视图链接到已导入的表，跳过解析与列画像"""
+
+    query_source_cache_ttl_seconds: int = 0
+    """/api/query 数据库数据源快照的有效期（秒），过期后按探测结果决定是否重新拉取；
+    默认0表示每次都重新拉取（与缓存引入前一致），开启后查询结果最多滞后该时长"""
+
+    query_source_cache_max_entries: int = 64
+    """/api/query 物化缓存表（文件与数据库数据源）的数量上限，超出时淘汰最久未使用的，0表示不限制"""
+
+    external_extract_batch_rows: int = 50000
+    """从外部数据库抽取结果时每批读取并写入DuckDB的行数，内存占用与批大小成正比"""
+
+    external_extract_max_connections_per_source: int = 4
+    """分区并发抽取时每个外部数据源同时使用的最大连接数（所有任务共享）"""
+
+    incremental_watermark_lookback: float = 0
+    """按主键 upsert 的增量同步/导入每次往回重读的水位范围：时间水位按秒，数值水位按数值单位；
+    0 表示只重读与上次水位相同的行。append 模式不回看（重读会产生重复行）"""
+
+    excel_import_max_workers: int = 0
+    """多工作表Excel导入的解析进程数，0表示按CPU核数，1表示不使用进程池"""
+
+    reload_file_datasources_on_startup: bool = False
+    """启动时在后台对账文件数据源，只重新加载源文件已变化或表缺失的数据源（默认关闭）"""
+
+    file_datasource_reload_workers: int = 0
+    """文件数据源对账时并行重新加载的线程数，0表示按CPU核数（不超过连接池上限-2）"""
+
     # ==================== DuckDB引擎configuration ====================
     # 这些parameter控制DuckDBquery引擎的行为和性能
 
@@ -104,7 +151,7 @@ class AppConfig:
     """是否优先使用范围JOIN，可能影响JOIN性能"""
 
     duckdb_enable_object_cache: bool = True
-    """是否启用对象缓存，提升重复query性能"""
+    """是否启用对象缓存（含 Parquet 元数据缓存），提升重复query与外部视图性能"""
 
     duckdb_preserve_insertion_order: bool = False
     """是否保持data插入顺序，False可提升query性能"""
@@ -172,6 +219,12 @@ class AppConfig:
     url_reader_head_timeout: int = 10
     """URL HEAD请求timeout时间，单位为秒"""
 
+    url_download_workers: int = 4
+    """URL 回退下载时的并行区段数（服务器支持 Range 且文件较大时生效），1 表示单连接"""
+
+    url_download_max_retries: int = 3
+    """URL 回退下载中断后的最大续传次数"""
+
     sqlite_timeout: int = 10
     """SQLiteconnectiontimeout时间，单位为秒"""
 
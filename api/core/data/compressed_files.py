@@ -0,0 +1,201 @@
+"""
+压缩数据文件支持
+识别 .gz/.zst/.bz2/.zip 压缩的数据文件：gzip/zstd 压缩的 CSV/JSON 由 DuckDB 读取器按扩展名原生边读边解压；
+bz2、zip 以及 DuckDB 读取器不能直接解压的组合（如 .parquet.gz）按块流式解压到临时目录后再读取，
+不会把整个文件载入内存。解压出的总字节数与 zip 成员数有上限，超出时中止并删除临时文件（防止压缩炸弹）。
+"""
+
+import bz2
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+from core.common.config_manager import config_manager
+from core.security.security import get_max_file_size
+
+logger = logging.getLogger(__name__)
+
+# 压缩扩展名 → 压缩格式
+COMPRESSION_EXTENSIONS = {
+    "gz": "gzip",
+    "gzip": "gzip",
+    "zst": "zstd",
+    "zstd": "zstd",
+    "bz2": "bz2",
+    "zip": "zip",
+}
+# DuckDB read_csv/read_json 可按扩展名原生解压的压缩格式与文件类型
+DUCKDB_NATIVE_COMPRESSIONS = {"gzip", "zstd"}
+DUCKDB_NATIVE_COMPRESSED_TYPES = {"csv", "json", "jsonl"}
+# 允许以压缩形式导入的数据文件（Excel 本身就是 zip 容器，不支持外层压缩）
+COMPRESSIBLE_FILE_TYPES = {
+    "csv": "csv",
+    "json": "json",
+    "jsonl": "jsonl",
+    "parquet": "parquet",
+    "pq": "parquet",
+}
+# 流式解压时每次读取的字节数
+DECOMPRESS_BLOCK_BYTES = 4 * 1024 * 1024
+
+
+class DecompressionLimitError(ValueError):
+    """解压出的数据量或 zip 成员数超过上限"""
+
+
+def split_compression(filename: str) -> Tuple[str, Optional[str]]:
+    """拆出压缩扩展名：'sales.csv.gz' -> ('sales.csv', 'gzip')；未压缩时压缩格式为 None"""
+    root, ext = os.path.splitext(filename)
+    compression = COMPRESSION_EXTENSIONS.get(ext.lower().lstrip("."))
+    if compression is None:
+        return filename, None
+    return root, compression
+
+
+def is_compressed(filename: str) -> bool:
+    return split_compression(filename)[1] is not None
+
+
+def _member_file_type(name: str) -> Optional[str]:
+    base = os.path.basename(name)
+    if not base or base.startswith(".") or name.startswith("__MACOSX/"):
+        return None
+    return COMPRESSIBLE_FILE_TYPES.get(base.rsplit(".", 1)[-1].lower())
+
+
+def zip_data_members(
+    archive: zipfile.ZipFile, file_type: Optional[str] = None
+) -> List[zipfile.ZipInfo]:
+    """zip 包内的数据文件（跳过目录、隐藏文件与 macOS 元数据），可按文件类型过滤"""
+    return [
+        info
+        for info in archive.infolist()
+        if not info.is_dir()
+        and _member_file_type(info.filename) is not None
+        and (file_type is None or _member_file_type(info.filename) == file_type)
+    ]
+
+
+def zip_archive_file_type(zip_path: str) -> Optional[str]:
+    """根据包内文件推断 zip 包的数据类型；包内没有数据文件或混有多种类型时返回 None"""
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            types = {_member_file_type(info.filename) for info in zip_data_members(archive)}
+    except (OSError, zipfile.BadZipFile) as exc:
+        logger.warning("Unable to inspect zip archive %s: %s", zip_path, exc)
+        return None
+    return types.pop() if len(types) == 1 else None
+
+
+def requires_decompression(file_path: str, file_type: str) -> bool:
+    """DuckDB 读取器不能直接读取、需要先解压的文件"""
+    compression = split_compression(file_path)[1]
+    if compression is None:
+        return False
+    return not (
+        compression in DUCKDB_NATIVE_COMPRESSIONS
+        and (file_type or "").lower() in DUCKDB_NATIVE_COMPRESSED_TYPES
+    )
+
+
+def open_decompressed(file_path: str) -> BinaryIO:
+    """以二进制流打开文件，压缩文件透明解压（zip 取第一个数据文件）"""
+    compression = split_compression(file_path)[1]
+    if compression is None:
+        return open(file_path, "rb")
+    if compression == "gzip":
+        return gzip.open(file_path, "rb")
+    if compression == "bz2":
+        return bz2.open(file_path, "rb")
+    if compression == "zip":
+        with zipfile.ZipFile(file_path) as archive:
+            members = zip_data_members(archive)
+            if not members:
+                raise ValueError(f"Zip archive contains no supported data files: {file_path}")
+            # 关闭 ZipFile 后已打开的成员流仍然可读
+            return archive.open(members[0])
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise ValueError(
+            "Reading zstd-compressed files outside DuckDB requires the zstandard package"
+        ) from exc
+    return zstandard.ZstdDecompressor().stream_reader(open(file_path, "rb"), closefd=True)
+
+
+def decompressed_size_limit(file_path: str) -> int:
+    """解压总字节数上限：不超过 max_file_size，也不超过压缩文件大小 × max_decompression_ratio
+
+    按比例计算的上限至少为一个解压块，避免很小的压缩文件被误判。
+    """
+    limit = int(get_max_file_size())
+    ratio = config_manager.get_app_config().max_decompression_ratio
+    if ratio and ratio > 0:
+        by_ratio = max(int(os.path.getsize(file_path) * ratio), DECOMPRESS_BLOCK_BYTES)
+        limit = min(limit, by_ratio)
+    return limit
+
+
+def _copy_stream(source: BinaryIO, target_path: str, limit: int) -> int:
+    """按块复制到 target_path，写入的字节数超过 limit 时抛出 DecompressionLimitError"""
+    written = 0
+    with open(target_path, "wb") as target:
+        while True:
+            block = source.read(DECOMPRESS_BLOCK_BYTES)
+            if not block:
+                return written
+            written += len(block)
+            if written > limit:
+                raise DecompressionLimitError(
+                    f"Decompressed data exceeds the limit of {limit} bytes"
+                )
+            target.write(block)
+
+
+@contextmanager
+def decompressed_paths(file_path: str, file_type: str) -> Iterator[Union[str, List[str]]]:
+    """按需把压缩文件流式解压到临时目录，产出可直接交给 DuckDB 读取器的路径。
+
+    不需要解压时原样产出 file_path；zip 包内有多个同类型数据文件时产出路径列表。
+    离开上下文后删除解压出的临时文件。
+    """
+    if not requires_decompression(file_path, file_type):
+        yield file_path
+        return
+
+    base_name, compression = split_compression(os.path.basename(file_path))
+    remaining = decompressed_size_limit(file_path)
+    temp_dir = tempfile.mkdtemp(prefix="decompress_")
+    try:
+        if compression == "zip":
+            with zipfile.ZipFile(file_path) as archive:
+                max_members = config_manager.get_app_config().max_zip_members
+                if max_members and len(archive.infolist()) > max_members:
+                    raise DecompressionLimitError(
+                        f"Zip archive has {len(archive.infolist())} entries, "
+                        f"more than the limit of {max_members}: {file_path}"
+                    )
+                members = zip_data_members(archive, COMPRESSIBLE_FILE_TYPES.get(file_type, file_type))
+                if not members:
+                    raise ValueError(f"Zip archive contains no {file_type} files: {file_path}")
+                targets = []
+                for index, member in enumerate(members):
+                    target = os.path.join(temp_dir, f"{index:04d}_{os.path.basename(member.filename)}")
+                    with archive.open(member) as source:
+                        remaining -= _copy_stream(source, target, remaining)
+                    targets.append(target)
+            logger.info("Extracted %d member(s) from %s", len(targets), file_path)
+            yield targets[0] if len(targets) == 1 else targets
+        else:
+            target = os.path.join(temp_dir, base_name)
+            with open_decompressed(file_path) as source:
+                written = _copy_stream(source, target, remaining)
+            logger.info("Decompressed %s (%s, %d bytes)", file_path, compression, written)
+            yield target
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
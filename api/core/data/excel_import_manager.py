@@ -1,21 +1,39 @@
 import json
 import logging
+import multiprocessing
 import os
 import re
 import shutil
 import tempfile
+import threading
 import zipfile
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 from uuid import uuid4
 
 import pandas as pd
+import pyarrow as pa
 from openpyxl import load_workbook
 
+from core.common.config_manager import config_manager
 from core.common.timezone_utils import get_current_time_iso
 from core.common.utils import normalize_dataframe_output
+from core.data.excel_sheet_reader import (
+    EXCEL_STREAM_BATCH_ROWS,
+    KIND_DUCKDB_TYPES,
+    SheetBatchWriter,
+    _ensure_unique_name,
+    _normalize_excel_cell,
+    feed_xlsx_sheet,
+    parse_sheet_to_arrow_files,
+    sanitize_identifier,
+)
+from core.data.file_datasource_manager import _quote_identifier
+from core.data.ingest_cache import prepare_table_rewrite
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +42,6 @@ PENDING_BASE_DIR = (
 )
 PENDING_BASE_DIR.mkdir(parents=True, exist_ok=True)
 
-
 @dataclass
 class PendingExcelFile:
     file_id: str
@@ -40,34 +57,6 @@ def _metadata_path(file_id: str) -> Path:
     return PENDING_BASE_DIR / file_id / "metadata.json"
 
 
-def _ensure_unique_name(parts: List[str], index: int) -> str:
-    cleaned = [
-        p
-        for p in [str(part).strip() if part is not None else "" for part in parts]
-        if p and p.lower() != "nan"
-    ]
-    if not cleaned:
-        return f"column_{index + 1}"
-    candidate = "_".join(cleaned)
-    candidate = re.sub(r"[\s]+", "_", candidate, flags=re.UNICODE)
-    candidate = re.sub(r"[^\w]", "_", candidate, flags=re.UNICODE).strip("_")
-    return candidate or f"column_{index + 1}"
-
-
-def sanitize_identifier(
-    value: str, allow_leading_digit: bool = False, prefix: str = "table"
-) -> str:
-    if not value:
-        value = ""
-    sanitized = re.sub(r"[^\w]", "_", value, flags=re.UNICODE)
-    sanitized = re.sub(r"_+", "_", sanitized).strip("_")
-    if not sanitized:
-        sanitized = f"{prefix}_{uuid4().hex[:8]}"
-    if not allow_leading_digit and sanitized[0].isdigit():
-        sanitized = f"{prefix}_{sanitized}"
-    return sanitized
-
-
 def register_excel_upload(
     source_path: str, original_filename: str, table_alias: Optional[str] = None
 ) -> PendingExcelFile:
@@ -98,19 +87,63 @@ def register_excel_upload(
     return PendingExcelFile(**metadata)
 
 
-def get_pending_excel(file_id: str) -> Optional[PendingExcelFile]:
+def _read_pending_metadata(file_id: str) -> Optional[Dict[str, Any]]:
     metadata_file = _metadata_path(file_id)
     if not metadata_file.exists():
         return None
 
     with metadata_file.open("r", encoding="utf-8") as fh:
-        data = json.load(fh)
+        return json.load(fh)
+
+
+def _write_pending_metadata(file_id: str, metadata: Dict[str, Any]) -> None:
+    metadata_file = _metadata_path(file_id)
+    temp_file = metadata_file.with_name(f"{metadata_file.name}.{uuid4().hex[:8]}.tmp")
+    with temp_file.open("w", encoding="utf-8") as fh:
+        json.dump(metadata, fh, ensure_ascii=False, indent=2, default=str)
+    os.replace(temp_file, metadata_file)
+
+
+def get_pending_excel(file_id: str) -> Optional[PendingExcelFile]:
+    data = _read_pending_metadata(file_id)
+    if data is None:
+        return None
 
     stored_path = Path(data.get("stored_path", ""))
     if not stored_path.exists():
         return None
 
-    return PendingExcelFile(**data)
+    return PendingExcelFile(
+        **{key: data.get(key) for key in PendingExcelFile.__dataclass_fields__}
+    )
+
+
+def _inspection_fingerprint(stored_path: str, preview_rows: int) -> Dict[str, Any]:
+    stat = os.stat(stored_path)
+    return {
+        "preview_rows": preview_rows,
+        "file_size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def inspect_pending_excel(
+    pending: PendingExcelFile, preview_rows: int = 20
+) -> List[Dict[str, Any]]:
+    """检查待导入 Excel 的工作表，结果缓存在 metadata.json 中，重复检查直接返回"""
+    fingerprint = _inspection_fingerprint(pending.stored_path, preview_rows)
+    metadata = _read_pending_metadata(pending.file_id) or {}
+    cached = metadata.get("sheet_inspection")
+    if isinstance(cached, dict) and cached.get("fingerprint") == fingerprint:
+        return cached.get("sheets", [])
+
+    sheets_info = inspect_excel_sheets(pending.stored_path, preview_rows)
+    metadata["sheet_inspection"] = {"fingerprint": fingerprint, "sheets": sheets_info}
+    try:
+        _write_pending_metadata(pending.file_id, metadata)
+    except OSError as exc:
+        logger.warning(f"Failed to cache Excel inspection for {pending.file_id}: {exc}")
+    return sheets_info
 
 
 def cleanup_pending_excel(file_id: str):
@@ -161,10 +194,36 @@ def inspect_excel_sheets(
         return _inspect_xlsx_sheets(file_path, preview_rows)
 
 
+def _preview_dataframe(rows: List[List[Any]]) -> pd.DataFrame:
+    """按 pandas.read_excel(header=0) 的规则用已读取的行构造预览 DataFrame"""
+    if not rows:
+        return pd.DataFrame()
+    width = max(len(row) for row in rows)
+    header = list(rows[0]) + [None] * (width - len(rows[0]))
+    names: List[str] = []
+    counts: Dict[str, int] = {}
+    for index, value in enumerate(header):
+        name = f"Unnamed: {index}" if value is None else value
+        key = str(name)
+        if key in counts:
+            counts[key] += 1
+            name = f"{key}.{counts[key]}"
+        else:
+            counts[key] = 0
+        names.append(name)
+    body = [list(row) + [None] * (width - len(row)) for row in rows[1:]]
+    df = pd.DataFrame(body, columns=names).infer_objects()
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        if column.dtype == object and column.isna().all():
+            df.isetitem(position, column.astype("float64"))
+    return df
+
+
 def _inspect_xlsx_sheets(
     file_path: str, preview_rows: int = 20
 ) -> List[Dict[str, Any]]:
-    """使用 openpyxl 检查 .xlsx 文件"""
+    """使用 openpyxl 检查 .xlsx 文件，工作簿与共享字符串只解析一次"""
     workbook = load_workbook(filename=file_path, read_only=True, data_only=True)
     try:
         sheets_info: List[Dict[str, Any]] = []
@@ -184,14 +243,15 @@ def _inspect_xlsx_sheets(
             max_row = sheet.max_row or 0
             max_col = sheet.max_column or 0
 
-            first_row = [
-                cell.value for cell in next(sheet.iter_rows(min_row=1, max_row=1), [])
+            # 表头 + 预览行一次读出，供表头建议与预览共用
+            raw_rows = [
+                list(row)
+                for row in sheet.iter_rows(
+                    min_row=1, max_row=preview_rows + 1, values_only=True
+                )
             ]
-            second_row = (
-                [cell.value for cell in next(sheet.iter_rows(min_row=2, max_row=2), [])]
-                if max_row >= 2
-                else []
-            )
+            first_row = raw_rows[0] if raw_rows else []
+            second_row = raw_rows[1] if max_row >= 2 and len(raw_rows) > 1 else []
             first_empty_ratio = (
                 sum(1 for value in first_row if value in (None, "")) / len(first_row)
                 if first_row
@@ -212,12 +272,15 @@ def _inspect_xlsx_sheets(
             preview_records: List[Dict[str, Any]] = []
             columns: List[Dict[str, Any]] = []
             try:
-                preview_df = pd.read_excel(
-                    file_path,
-                    sheet_name=sheet_name,
-                    nrows=preview_rows,
-                    engine="openpyxl",
-                )
+                rows = []
+                for raw_row in raw_rows:
+                    row = [_normalize_excel_cell(value) for value in raw_row]
+                    while row and row[-1] is None:
+                        row.pop()
+                    rows.append(row)
+                while rows and not rows[-1]:
+                    rows.pop()
+                preview_df = _preview_dataframe(rows)
                 columns = [
                     {
                         "name": str(col),
@@ -248,9 +311,7 @@ def _inspect_xlsx_sheets(
 
 
 def _inspect_xls_sheets(file_path: str, preview_rows: int = 20) -> List[Dict[str, Any]]:
-    """使用 pandas + xlrd 检查 .xls 文件"""
-    import xlrd  # pylint: disable=import-error
-
+    """使用 pandas + xlrd 检查 .xls 文件，所有工作表共用同一个已打开的 ExcelFile"""
     sheets_info: List[Dict[str, Any]] = []
     xl = pd.ExcelFile(file_path, engine="xlrd")
 
@@ -258,16 +319,10 @@ def _inspect_xls_sheets(file_path: str, preview_rows: int = 20) -> List[Dict[str
         for sheet_name in xl.sheet_names:
             # 获取基本信息
             try:
-                preview_df = pd.read_excel(
-                    file_path,
-                    sheet_name=sheet_name,
-                    nrows=preview_rows,
-                    engine="xlrd",
-                )
+                preview_df = xl.parse(sheet_name, nrows=preview_rows)
                 max_col = len(preview_df.columns)
-                # 读取全部行数
-                full_df = pd.read_excel(file_path, sheet_name=sheet_name, engine="xlrd")
-                max_row = len(full_df) + 1  # +1 for header
+                # 行数直接取自 xlrd 的工作表对象，无需读取全部数据
+                max_row = xl.book.sheet_by_name(sheet_name).nrows
 
                 columns = [
                     {
@@ -486,3 +541,374 @@ def load_excel_sheet_dataframe(
                 pass
 
     return data_df
+
+
+@dataclass
+class ExcelSheetLoadResult:
+    row_count: int
+    columns: List[str]
+
+
+class _SheetTableWriter(SheetBatchWriter):
+    """将批次以 VARCHAR 原文写入 DuckDB 表，全部写完后按最终推断的类型一次性转换各列"""
+
+    def __init__(self, con, table_name: str, batch_rows: int):
+        super().__init__(batch_rows)
+        self.con = con
+        self.quoted_table = _quote_identifier(table_name)
+        self._created = False
+
+    def _on_column_added(self, name: str) -> None:
+        if self._created:
+            self.con.execute(
+                f"ALTER TABLE {self.quoted_table} ADD COLUMN {_quote_identifier(name)} VARCHAR"
+            )
+
+    def _before_flush(self) -> None:
+        if not self._created and self.columns:
+            column_defs = ", ".join(
+                f"{_quote_identifier(name)} VARCHAR" for name in self.columns
+            )
+            self.con.execute(f"CREATE TABLE {self.quoted_table} ({column_defs})")
+            self._created = True
+
+    def _write_batch(self, batch: pa.Table) -> None:
+        view_name = f"__excel_batch_{uuid4().hex[:8]}"
+        self.con.register(view_name, batch)
+        try:
+            self.con.execute(
+                f"INSERT INTO {self.quoted_table} SELECT * FROM {_quote_identifier(view_name)}"
+            )
+        finally:
+            self.con.unregister(view_name)
+
+    def finish(self) -> ExcelSheetLoadResult:
+        self.flush()
+        # 全空列与原 DataFrame 路径一致落为 DOUBLE
+        for name, kind in zip(self.columns, self.kinds):
+            if kind != "varchar":
+                self.con.execute(
+                    f"ALTER TABLE {self.quoted_table} ALTER COLUMN "
+                    f"{_quote_identifier(name)} TYPE {KIND_DUCKDB_TYPES[kind or 'double']}"
+                )
+        return ExcelSheetLoadResult(row_count=self.row_count, columns=list(self.columns))
+
+
+def _stream_xlsx_sheet_to_table(
+    con,
+    table_name: str,
+    file_path: str,
+    sheet_name: str,
+    header_rows: int,
+    header_row_index: Optional[int],
+    fill_merged: bool,
+    batch_rows: int,
+) -> ExcelSheetLoadResult:
+    writer = _SheetTableWriter(con, table_name, batch_rows)
+    feed_xlsx_sheet(writer, file_path, sheet_name, header_rows, header_row_index, fill_merged)
+    return writer.finish()
+
+
+def _load_sheet_via_dataframe(
+    con,
+    table_name: str,
+    file_path: str,
+    sheet_name: str,
+    header_rows: int,
+    header_row_index: Optional[int],
+    fill_merged: bool,
+) -> ExcelSheetLoadResult:
+    df = load_excel_sheet_dataframe(
+        file_path,
+        sheet_name,
+        header_rows=header_rows,
+        header_row_index=header_row_index,
+        fill_merged=fill_merged,
+    )
+    if df.empty:
+        return ExcelSheetLoadResult(row_count=0, columns=list(df.columns))
+    view_name = f"__excel_df_{uuid4().hex[:8]}"
+    con.register(view_name, df)
+    try:
+        con.execute(
+            f"CREATE TABLE {_quote_identifier(table_name)} AS "
+            f"SELECT * FROM {_quote_identifier(view_name)}"
+        )
+    finally:
+        con.unregister(view_name)
+    return ExcelSheetLoadResult(row_count=len(df), columns=list(df.columns))
+
+
+def stream_excel_sheet_to_table(
+    con,
+    table_name: str,
+    file_path: str,
+    sheet_name: str,
+    header_rows: int = 1,
+    header_row_index: Optional[int] = 1,
+    fill_merged: bool = False,
+    batch_rows: int = EXCEL_STREAM_BATCH_ROWS,
+) -> ExcelSheetLoadResult:
+    """逐行读取工作表并分批写入新表 ``table_name``，内存占用与工作表大小无关
+
+    表头识别、合并单元格填充与类型推断的语义与 :func:`load_excel_sheet_dataframe` 相同。
+    .xls 及 openpyxl 无法解析的损坏文件回退到 DataFrame 路径。
+    没有数据行时返回 ``row_count == 0``，调用方负责清理可能已创建的表。
+    """
+    header_rows = max(header_rows, 0)
+    if os.path.splitext(file_path)[1].lower() == ".xls":
+        return _load_sheet_via_dataframe(
+            con, table_name, file_path, sheet_name, header_rows, header_row_index, fill_merged
+        )
+
+    try:
+        return _stream_xlsx_sheet_to_table(
+            con,
+            table_name,
+            file_path,
+            sheet_name,
+            header_rows,
+            header_row_index,
+            fill_merged,
+            batch_rows,
+        )
+    except ValueError as e:
+        if "is not a valid column name" not in str(e):
+            raise
+        logger.warning(
+            f"Streaming read failed for {file_path}, falling back to DataFrame loader. Error: {e}"
+        )
+        prepare_table_rewrite(con, table_name)
+        con.execute(f"DROP TABLE IF EXISTS {_quote_identifier(table_name)}")
+        return _load_sheet_via_dataframe(
+            con, table_name, file_path, sheet_name, header_rows, header_row_index, fill_merged
+        )
+
+
+@dataclass
+class ExcelSheetJob:
+    sheet_name: str
+    table_name: str
+    header_rows: int = 1
+    header_row_index: Optional[int] = 1
+    fill_merged: bool = False
+
+
+class ExcelImportProgress:
+    """多工作表导入的逐表进度，供前端在导入过程中轮询"""
+
+    def __init__(self, max_entries: int = 100):
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def start(self, key: str, sheet_names: List[str], workers: int) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = {
+                "status": "running",
+                "workers": workers,
+                "total": len(sheet_names),
+                "completed": 0,
+                "started_at": get_current_time_iso(),
+                "sheets": [
+                    {"name": name, "status": "pending", "row_count": None, "error": None}
+                    for name in sheet_names
+                ],
+            }
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def update(self, key: str, index: int, status: str, **details: Any) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            sheet = entry["sheets"][index]
+            sheet["status"] = status
+            sheet.update(details)
+            if status in {"completed", "failed"}:
+                entry["completed"] = sum(
+                    1 for item in entry["sheets"] if item["status"] in {"completed", "failed"}
+                )
+
+    def finish(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["status"] = "completed"
+                entry["finished_at"] = get_current_time_iso()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            return json.loads(json.dumps(entry)) if entry is not None else None
+
+
+excel_import_progress = ExcelImportProgress()
+
+
+def load_arrow_batches_into_table(
+    con, table_name: str, columns: List[str], kinds: List[Optional[str]], batch_files: List[str]
+) -> ExcelSheetLoadResult:
+    """按最终推断的列类型创建表，并依次导入 worker 生成的 Arrow IPC 批次
+
+    批次中保存的是单元格原文（VARCHAR），``kinds`` 是 worker 看完整个工作表后的最终类型，
+    每个值只在这里 CAST 一次，不会因为中途放宽类型而丢失 "007" 这类原文。
+    """
+    final_types = [KIND_DUCKDB_TYPES[kind or "double"] for kind in kinds]
+    quoted_table = _quote_identifier(table_name)
+    column_defs = ", ".join(
+        f"{_quote_identifier(name)} {column_type}"
+        for name, column_type in zip(columns, final_types)
+    )
+    con.execute(f"CREATE TABLE {quoted_table} ({column_defs})")
+
+    row_count = 0
+    for path in batch_files:
+        with pa.memory_map(path, "r") as source:
+            batch = pa.ipc.open_file(source).read_all()
+        present = set(batch.column_names)
+        # 早期批次可能缺少后来才出现的列，以 NULL 补齐
+        select_list = ", ".join(
+            (
+                f"CAST({_quote_identifier(name)} AS {column_type})"
+                if name in present
+                else f"CAST(NULL AS {column_type})"
+            )
+            for name, column_type in zip(columns, final_types)
+        )
+        view_name = f"__excel_ipc_{uuid4().hex[:8]}"
+        con.register(view_name, batch)
+        try:
+            con.execute(
+                f"INSERT INTO {quoted_table} SELECT {select_list} FROM {_quote_identifier(view_name)}"
+            )
+        finally:
+            con.unregister(view_name)
+        row_count += batch.num_rows
+    return ExcelSheetLoadResult(row_count=row_count, columns=list(columns))
+
+
+def _resolve_import_workers(job_count: int) -> int:
+    configured = int(getattr(config_manager.get_app_config(), "excel_import_max_workers", 0) or 0)
+    workers = configured if configured > 0 else (os.cpu_count() or 1)
+    return max(1, min(workers, job_count))
+
+
+def load_excel_sheets(
+    con,
+    file_path: str,
+    jobs: List[ExcelSheetJob],
+    progress_key: Optional[str] = None,
+    max_workers: Optional[int] = None,
+) -> List[Any]:
+    """导入多个工作表，返回与 ``jobs`` 一一对应的 :class:`ExcelSheetLoadResult` 或异常
+
+    .xlsx 的多个工作表在进程池（spawn）中并行解析，解析结果以 Arrow IPC 文件交回，
+    DuckDB 写入仍在调用方的连接上串行执行；单表、.xls 或只有一个 worker 时在当前进程内流式导入。
+    """
+    workers = max_workers or _resolve_import_workers(len(jobs))
+    workers = max(1, min(workers, len(jobs) or 1))
+    use_pool = (
+        workers > 1 and os.path.splitext(file_path)[1].lower() != ".xls"
+    )
+    if progress_key:
+        excel_import_progress.start(
+            progress_key, [job.sheet_name for job in jobs], workers if use_pool else 1
+        )
+
+    def _report(index: int, status: str, **details: Any) -> None:
+        if progress_key:
+            excel_import_progress.update(progress_key, index, status, **details)
+
+    def _load_in_process(index: int, job: ExcelSheetJob) -> Any:
+        _report(index, "loading")
+        try:
+            result = stream_excel_sheet_to_table(
+                con,
+                job.table_name,
+                file_path,
+                job.sheet_name,
+                header_rows=job.header_rows,
+                header_row_index=job.header_row_index,
+                fill_merged=job.fill_merged,
+            )
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            _report(index, "failed", error=str(exc))
+            return exc
+        _report(index, "completed", row_count=result.row_count)
+        return result
+
+    results: List[Any] = [None] * len(jobs)
+    try:
+        if not use_pool:
+            for index, job in enumerate(jobs):
+                results[index] = _load_in_process(index, job)
+            return results
+
+        work_dir = tempfile.mkdtemp(prefix="excel_import_")
+        try:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {}
+                for index, job in enumerate(jobs):
+                    _report(index, "parsing")
+                    future = pool.submit(
+                        parse_sheet_to_arrow_files,
+                        file_path,
+                        job.sheet_name,
+                        os.path.join(work_dir, f"sheet_{index}"),
+                        job.header_rows,
+                        job.header_row_index,
+                        job.fill_merged,
+                    )
+                    futures[future] = index
+
+                # 按完成顺序写库，写入与其余工作表的解析重叠
+                for future in as_completed(futures):
+                    index = futures[future]
+                    job = jobs[index]
+                    try:
+                        parsed = future.result()
+                    except ValueError as exc:
+                        if "is not a valid column name" not in str(exc):
+                            _report(index, "failed", error=str(exc))
+                            results[index] = exc
+                            continue
+                        # 损坏的工作簿交给进程内的 DataFrame 回退路径
+                        results[index] = _load_in_process(index, job)
+                        continue
+                    except Exception as exc:  # pylint: disable=broad-exception-caught
+                        _report(index, "failed", error=str(exc))
+                        results[index] = exc
+                        continue
+
+                    _report(index, "loading", parse_seconds=parsed["parse_seconds"])
+                    try:
+                        if parsed["row_count"]:
+                            result = load_arrow_batches_into_table(
+                                con,
+                                job.table_name,
+                                parsed["columns"],
+                                parsed["kinds"],
+                                parsed["batch_files"],
+                            )
+                        else:
+                            result = ExcelSheetLoadResult(row_count=0, columns=parsed["columns"])
+                    except Exception as exc:  # pylint: disable=broad-exception-caught
+                        _report(index, "failed", error=str(exc))
+                        results[index] = exc
+                    else:
+                        _report(index, "completed", row_count=result.row_count)
+                        results[index] = result
+                    finally:
+                        shutil.rmtree(
+                            os.path.join(work_dir, f"sheet_{index}"), ignore_errors=True
+                        )
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return results
+    finally:
+        if progress_key:
+            excel_import_progress.finish(progress_key)
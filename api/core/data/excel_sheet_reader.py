@@ -0,0 +1,324 @@
+"""
+Excel 工作表逐行解析
+只依赖 openpyxl 与 pyarrow，不导入 DuckDB 相关模块，因此既可在请求进程中使用，
+也可作为进程池 worker 的入口：worker 将每个批次写成 Arrow IPC 文件交回主进程写库。
+"""
+
+import abc
+import os
+import re
+import time as time_module
+from datetime import date, datetime, time
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import uuid4
+
+import pyarrow as pa
+from openpyxl import load_workbook
+
+# 流式导入时每批写入 DuckDB 的行数，内存占用只与该值和列数相关
+EXCEL_STREAM_BATCH_ROWS = 20000
+
+# 与 pandas.read_excel 默认 na_values 保持一致，保证流式导入与原 DataFrame 路径结果相同
+_EXCEL_NA_STRINGS = frozenset(
+    {
+        "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+        "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+        "n/a", "nan", "null",
+    }
+)
+_INT_PATTERN = re.compile(r"^[+-]?\d+$")
+_FLOAT_PATTERN = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+
+KIND_DUCKDB_TYPES = {
+    "boolean": "BOOLEAN",
+    "bigint": "BIGINT",
+    "double": "DOUBLE",
+    "timestamp": "TIMESTAMP",
+    "varchar": "VARCHAR",
+}
+
+
+def _ensure_unique_name(parts: List[str], index: int) -> str:
+    cleaned = [
+        p
+        for p in [str(part).strip() if part is not None else "" for part in parts]
+        if p and p.lower() != "nan"
+    ]
+    if not cleaned:
+        return f"column_{index + 1}"
+    candidate = "_".join(cleaned)
+    candidate = re.sub(r"[\s]+", "_", candidate, flags=re.UNICODE)
+    candidate = re.sub(r"[^\w]", "_", candidate, flags=re.UNICODE).strip("_")
+    return candidate or f"column_{index + 1}"
+
+
+def sanitize_identifier(
+    value: str, allow_leading_digit: bool = False, prefix: str = "table"
+) -> str:
+    if not value:
+        value = ""
+    sanitized = re.sub(r"[^\w]", "_", value, flags=re.UNICODE)
+    sanitized = re.sub(r"_+", "_", sanitized).strip("_")
+    if not sanitized:
+        sanitized = f"{prefix}_{uuid4().hex[:8]}"
+    if not allow_leading_digit and sanitized[0].isdigit():
+        sanitized = f"{prefix}_{sanitized}"
+    return sanitized
+
+
+def _normalize_excel_cell(value: Any) -> Any:
+    """按 pandas 的规则归一化单元格：NA 字符串/NaN 视为空，整数值浮点数转为 int"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return None if value in _EXCEL_NA_STRINGS else value
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return None
+        if value.is_integer() and _INT64_MIN <= value <= _INT64_MAX:
+            return int(value)
+    return value
+
+
+def _value_kind(value: Any) -> str:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "bigint" if _INT64_MIN <= value <= _INT64_MAX else "double"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, datetime) or (
+        isinstance(value, date) and not isinstance(value, time)
+    ):
+        return "timestamp"
+    if isinstance(value, str):
+        text = value.strip()
+        if _INT_PATTERN.match(text):
+            return "bigint" if _INT64_MIN <= int(text) <= _INT64_MAX else "double"
+        if _FLOAT_PATTERN.match(text):
+            return "double"
+    return "varchar"
+
+
+def merge_kinds(current: Optional[str], incoming: Optional[str]) -> Optional[str]:
+    """类型只会放宽：BIGINT -> DOUBLE，其余不兼容组合统一为 VARCHAR"""
+    if current is None:
+        return incoming
+    if incoming is None or current == incoming:
+        return current
+    if {current, incoming} == {"bigint", "double"}:
+        return "double"
+    return "varchar"
+
+
+def _cell_text(value: Any) -> Optional[str]:
+    """单元格的文本形式：字符串保持原文（如 "007"），其余值转为 DuckDB 可 CAST 回原类型的文本"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, date) and not isinstance(value, (datetime, time)):
+        return datetime.combine(value, time()).isoformat(sep=" ")
+    return str(value)
+
+
+def _unique_column_name(name: str, taken: set) -> str:
+    if name not in taken:
+        return name
+    suffix = 1
+    while f"{name}_{suffix}" in taken:
+        suffix += 1
+    return f"{name}_{suffix}"
+
+
+class SheetBatchWriter(abc.ABC):
+    """把逐行读取的工作表数据组装成 Arrow 批次
+
+    列类型随批次增量推断且只会放宽；批次中的值一律以原始文本（VARCHAR）写出，
+    由使用方在全部批次写完后按 ``kinds`` 一次性 CAST 为最终类型，
+    这样后来的批次把列放宽为 VARCHAR 时，前面批次的 "007" 不会变成 "7"。
+    子类通过钩子决定批次的去向（写入 DuckDB 暂存表，或写成 Arrow IPC 文件），
+    任意时刻内存中只保留一个批次。
+    """
+
+    def __init__(self, batch_rows: int = EXCEL_STREAM_BATCH_ROWS):
+        self.batch_rows = max(int(batch_rows), 1)
+        self.columns: List[str] = []
+        self.kinds: List[Optional[str]] = []
+        self.row_count = 0
+        self._rows: List[Sequence[Any]] = []
+
+    # 子类钩子 ------------------------------------------------------------
+
+    def _on_column_added(self, name: str) -> None:
+        """新增列（行宽超过表头）时调用"""
+
+    def _before_flush(self) -> None:
+        """每次 flush 前调用（包括没有数据行的情况）"""
+
+    @abc.abstractmethod
+    def _write_batch(self, batch: pa.Table) -> None:
+        """写出一个批次（所有列均为字符串列）"""
+
+    # 行处理 --------------------------------------------------------------
+
+    def add_columns(self, raw_names: Sequence[str]) -> None:
+        taken = set(self.columns)
+        for raw_name in raw_names:
+            name = _unique_column_name(
+                sanitize_identifier(raw_name, allow_leading_digit=True, prefix="col"),
+                taken,
+            )
+            taken.add(name)
+            self.columns.append(name)
+            self.kinds.append(None)
+            self._on_column_added(name)
+
+    def ensure_width(self, width: int) -> None:
+        if width > len(self.columns):
+            self.add_columns(
+                [f"column_{index + 1}" for index in range(len(self.columns), width)]
+            )
+
+    def append(self, row: Sequence[Any]) -> None:
+        self.ensure_width(len(row))
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        self._before_flush()
+        if not self._rows:
+            return
+
+        arrays = []
+        for index in range(len(self.columns)):
+            values = [row[index] if index < len(row) else None for row in self._rows]
+            batch_kind = None
+            for value in values:
+                if value is not None:
+                    batch_kind = merge_kinds(batch_kind, _value_kind(value))
+                    if batch_kind == "varchar":
+                        break
+            self.kinds[index] = merge_kinds(self.kinds[index], batch_kind)
+            arrays.append(pa.array([_cell_text(value) for value in values], type=pa.string()))
+
+        self._write_batch(pa.Table.from_arrays(arrays, names=self.columns))
+        self.row_count += len(self._rows)
+        self._rows = []
+
+
+class ArrowFileBatchWriter(SheetBatchWriter):
+    """每个批次写成一个 Arrow IPC 文件，供其他进程按最终列类型导入"""
+
+    def __init__(self, output_dir: str, batch_rows: int = EXCEL_STREAM_BATCH_ROWS):
+        super().__init__(batch_rows)
+        self.output_dir = output_dir
+        self.batch_files: List[str] = []
+
+    def _write_batch(self, batch: pa.Table) -> None:
+        path = os.path.join(self.output_dir, f"batch_{len(self.batch_files):05d}.arrow")
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, batch.schema) as writer:
+                writer.write_table(batch)
+        self.batch_files.append(path)
+
+
+def feed_xlsx_sheet(
+    writer: SheetBatchWriter,
+    file_path: str,
+    sheet_name: str,
+    header_rows: int = 1,
+    header_row_index: Optional[int] = 1,
+    fill_merged: bool = False,
+) -> None:
+    """逐行读取工作表，按 load_excel_sheet_dataframe 的语义处理表头与合并单元格后交给 writer"""
+    header_rows = max(header_rows, 0)
+    workbook = load_workbook(filename=file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name]
+        # 与 pandas 相同：忽略可能不准确的 dimension 声明，按实际行宽读取
+        sheet.reset_dimensions()
+
+        header_start = max((header_row_index or 1) - 1, 0) if header_rows > 0 else 0
+        header_end = header_start + header_rows if header_rows > 0 else 0
+        header_buffer: List[List[Any]] = []
+        headers_ready = False
+        last_values: List[Any] = []
+        pending_empty_rows = 0
+
+        def _consume(row_index: int, row: List[Any]) -> None:
+            nonlocal headers_ready, last_values
+            if fill_merged:
+                # 等价于 DataFrame.ffill(axis=0)
+                for col_idx, value in enumerate(row):
+                    if value is None and col_idx < len(last_values):
+                        row[col_idx] = last_values[col_idx]
+                if len(last_values) > len(row):
+                    row.extend(last_values[len(row):])
+                last_values = list(row)
+
+            if row_index < header_end:
+                if row_index >= header_start:
+                    header_buffer.append(row)
+                return
+
+            if not headers_ready:
+                width = max((len(item) for item in header_buffer), default=0)
+                writer.add_columns(
+                    [
+                        _ensure_unique_name(
+                            [item[col_idx] if col_idx < len(item) else None for item in header_buffer],
+                            col_idx,
+                        )
+                        for col_idx in range(width)
+                    ]
+                )
+                headers_ready = True
+
+            if any(value is not None for value in row):
+                writer.append(row)
+
+        for index, raw_row in enumerate(sheet.iter_rows(values_only=True)):
+            row = [_normalize_excel_cell(value) for value in raw_row]
+            while row and row[-1] is None:
+                row.pop()
+
+            # 末尾的空行与 pandas 一样被丢弃，中间的空行在遇到下一行数据时补回
+            if not row and index >= header_end:
+                pending_empty_rows += 1
+                continue
+            for offset in range(pending_empty_rows, 0, -1):
+                _consume(index - offset, [])
+            pending_empty_rows = 0
+            _consume(index, row)
+
+        writer.flush()
+    finally:
+        workbook.close()
+
+
+def parse_sheet_to_arrow_files(
+    file_path: str,
+    sheet_name: str,
+    output_dir: str,
+    header_rows: int = 1,
+    header_row_index: Optional[int] = 1,
+    fill_merged: bool = False,
+    batch_rows: int = EXCEL_STREAM_BATCH_ROWS,
+) -> Dict[str, Any]:
+    """进程池 worker 入口：解析单个工作表，批次写入 output_dir 下的 Arrow IPC 文件"""
+    started = time_module.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    writer = ArrowFileBatchWriter(output_dir, batch_rows)
+    feed_xlsx_sheet(writer, file_path, sheet_name, header_rows, header_row_index, fill_merged)
+    return {
+        "sheet_name": sheet_name,
+        "row_count": writer.row_count,
+        "columns": list(writer.columns),
+        "kinds": list(writer.kinds),
+        "batch_files": list(writer.batch_files),
+        "parse_seconds": round(time_module.perf_counter() - started, 3),
+    }
@@ -0,0 +1,376 @@
+"""
+外部数据库结果的流式抽取
+以服务端游标按批读取 MySQL/PostgreSQL/SQLite 查询结果，每批转换为 Arrow 后追加到 DuckDB 暂存表，
+全部写完再原子改名为目标表。峰值内存与批大小成正比，与结果总行数无关。
+
+大表可按整数/日期列的 MIN/MAX 切分为键区间（或按整数取模）分区，由多个连接并发读取；
+所有批次经有界队列交给调用线程，由同一个 DuckDB 连接串行追加写入。
+每个数据源同时进行的分区读取数有上限，避免压垮生产数据库。
+"""
+
+import datetime
+import logging
+import math
+import numbers
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from core.common.config_manager import config_manager
+from core.data.file_datasource_manager import (
+    SYSTEM_STAGING_PREFIX,
+    _quote_identifier,
+    promote_staging_table,
+)
+from core.data.incremental_import import widen_duckdb_type
+from core.database.arrow_ingest import dataframe_to_arrow
+from core.database.database_manager import db_manager
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE_PREFIX = f"{SYSTEM_STAGING_PREFIX}extract_"
+PARTITION_STRATEGIES = {"range", "modulo"}
+
+_source_slots_guard = threading.Lock()
+_source_slots: Dict[str, Tuple[threading.BoundedSemaphore, int]] = {}
+
+
+class ExtractionCancelled(Exception):
+    """抽取过程中收到取消请求"""
+
+
+_DECIMAL_TYPE = re.compile(r"^DECIMAL\((\d+),\s*(\d+)\)$")
+MAX_DECIMAL_PRECISION = 38
+
+
+def _widen_column_type(con: duckdb.DuckDBPyConnection, staged: str, incoming: str) -> str:
+    """返回能无损容纳两批数据的列类型
+
+    两侧都是 DECIMAL 时同时保留最多的整数位和小数位，超过 38 位精度则改用 DOUBLE，
+    其余情况按 DuckDB 的隐式转换规则放宽，无公共类型时为 VARCHAR。
+    """
+    staged_decimal = _DECIMAL_TYPE.match(staged)
+    incoming_decimal = _DECIMAL_TYPE.match(incoming)
+    if staged_decimal and incoming_decimal:
+        p1, s1 = map(int, staged_decimal.groups())
+        p2, s2 = map(int, incoming_decimal.groups())
+        scale = max(s1, s2)
+        precision = max(p1 - s1, p2 - s2) + scale
+        if precision > MAX_DECIMAL_PRECISION:
+            return "DOUBLE"
+        return f"DECIMAL({precision},{scale})"
+    return widen_duckdb_type(con, staged, incoming)
+
+
+def _align_staging_types(
+    con: duckdb.DuckDBPyConnection, staging_table: str, batch_view: str
+) -> str:
+    """写入前比较暂存表与本批的列类型，放宽不一致的列，返回按暂存表类型转换的 SELECT 列表
+
+    不依赖 ConversionException：DuckDB 写入更窄的 DECIMAL 列时会静默舍入小数位，不会报错。
+    """
+    staged = {row[0]: row[1] for row in con.execute(f"DESCRIBE {_quote_identifier(staging_table)}").fetchall()}
+    incoming = {row[0]: row[1] for row in con.execute(f"DESCRIBE {_quote_identifier(batch_view)}").fetchall()}
+    widened = []
+    for name, column_type in incoming.items():
+        current = staged.get(name)
+        if current is None or current == column_type:
+            continue
+        target = _widen_column_type(con, current, column_type)
+        if target != current:
+            con.execute(
+                f"ALTER TABLE {_quote_identifier(staging_table)} "
+                f"ALTER COLUMN {_quote_identifier(name)} TYPE {target}"
+            )
+            staged[name] = target
+            widened.append(f"{name}: {current} -> {target}")
+    if widened:
+        logger.info("Widened column(s) of %s: %s", staging_table, ", ".join(widened))
+    return ", ".join(
+        f"CAST({_quote_identifier(name)} AS {staged[name]}) AS {_quote_identifier(name)}"
+        for name in incoming
+        if name in staged
+    )
+
+
+def extract_batches_to_table(
+    con: duckdb.DuckDBPyConnection,
+    table_name: str,
+    batches: Iterable[pd.DataFrame],
+    should_stop: Optional[Callable[[], bool]] = None,
+    allow_empty: bool = False,
+) -> int:
+    """把按批产出的DataFrame依次追加到暂存表，完成后替换 table_name，返回写入的行数。
+
+    结果没有任何行时默认不创建目标表并返回 0，allow_empty=True 时仍创建只有列的空表；
+    should_stop() 在每批之间检查，返回 True 时丢弃暂存表并抛出 ExtractionCancelled。
+    """
+    staging_table = f"{STAGING_TABLE_PREFIX}{uuid4().hex}"
+    quoted_stage = _quote_identifier(staging_table)
+    staging_created = False
+    rows = 0
+    try:
+        for batch in batches:
+            if should_stop is not None and should_stop():
+                raise ExtractionCancelled(f"Extraction into {table_name} was cancelled")
+            if batch.empty and staging_created:
+                continue
+
+            view_name = f"__arrow_{uuid4().hex[:8]}"
+            quoted_view = _quote_identifier(view_name)
+            con.register(view_name, dataframe_to_arrow(batch))
+            try:
+                if not staging_created:
+                    con.execute(f"CREATE TABLE {quoted_stage} AS SELECT * FROM {quoted_view}")
+                    staging_created = True
+                else:
+                    select_list = _align_staging_types(con, staging_table, view_name)
+                    con.execute(
+                        f"INSERT INTO {quoted_stage} BY NAME SELECT {select_list} FROM {quoted_view}"
+                    )
+            finally:
+                con.unregister(view_name)
+
+            rows += len(batch)
+            logger.debug("Extracted %d rows into %s so far", rows, staging_table)
+
+        if not staging_created or (rows == 0 and not allow_empty):
+            con.execute(f"DROP TABLE IF EXISTS {quoted_stage}")
+            return 0
+
+        promote_staging_table(con, staging_table, table_name)
+        logger.info("Extracted %d rows into %s", rows, table_name)
+        return rows
+    except BaseException:
+        con.execute(f"DROP TABLE IF EXISTS {quoted_stage}")
+        raise
+    finally:
+        # 提前结束时立即关闭生成器，释放服务端游标
+        close = getattr(batches, "close", None)
+        if close is not None:
+            close()
+
+
+def extract_query_to_table(
+    con: duckdb.DuckDBPyConnection,
+    connection_id: str,
+    query: str,
+    table_name: str,
+    batch_rows: Optional[int] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    allow_empty: bool = False,
+) -> int:
+    """以服务端游标执行外部数据库查询并按批写入 DuckDB 表 table_name，返回行数"""
+    batch_rows = batch_rows or config_manager.get_app_config().external_extract_batch_rows
+    return extract_batches_to_table(
+        con,
+        table_name,
+        db_manager.iter_query_batches(connection_id, query, max(1, int(batch_rows))),
+        should_stop,
+        allow_empty,
+    )
+
+
+@dataclass
+class PartitionSpec:
+    column: str
+    partitions: int
+    strategy: str = "range"
+
+    @classmethod
+    def from_options(cls, options: Optional[Dict[str, Any]]) -> Optional["PartitionSpec"]:
+        """解析异步任务 datasource.partition 选项；未配置或只有一个分区时返回 None"""
+        if not options or not options.get("column"):
+            return None
+        partitions = int(options.get("partitions") or 0)
+        strategy = (options.get("strategy") or "range").lower()
+        if strategy not in PARTITION_STRATEGIES:
+            raise ValueError(f"Unsupported partition strategy: {strategy}")
+        if partitions < 2:
+            return None
+        return cls(column=str(options["column"]), partitions=partitions, strategy=strategy)
+
+
+def _source_slot(connection_id: str) -> Tuple[threading.BoundedSemaphore, int]:
+    """数据源级别的并发读取配额（所有任务共享），返回 (信号量, 上限)"""
+    with _source_slots_guard:
+        if connection_id not in _source_slots:
+            limit = max(1, config_manager.get_app_config().external_extract_max_connections_per_source)
+            _source_slots[connection_id] = (threading.BoundedSemaphore(limit), limit)
+        return _source_slots[connection_id]
+
+
+def _boundary_value(value: Any) -> Any:
+    """把 MIN/MAX 结果规整为整数或时间戳，其余类型不能做键区间切分"""
+    if isinstance(value, (bool, np.bool_)):
+        raise ValueError("Partition column must be an integer or date column")
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, (float, Decimal)) and value == int(value):
+        return int(value)
+    if isinstance(value, datetime.date):
+        return pd.Timestamp(value)
+    if isinstance(value, str):
+        try:
+            return pd.Timestamp(value)
+        except ValueError:
+            pass
+    raise ValueError("Partition column must be an integer or date column")
+
+
+def _sql_literal(value: Any) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return f"'{value.isoformat(sep=' ')}'"
+
+
+def _range_boundaries(low: Any, high: Any, partitions: int) -> List[Any]:
+    """返回 partitions-1 个内部切分点（去重、递增）"""
+    if isinstance(low, int) and isinstance(high, int):
+        step = max(1, math.ceil((high - low + 1) / partitions))
+        points = [low + step * index for index in range(1, partitions)]
+        return sorted({point for point in points if low < point <= high})
+    if isinstance(low, int) or isinstance(high, int):
+        raise ValueError("Partition column must be an integer or date column")
+    step = (high - low) / partitions
+    points = [(low + step * index).floor("s") for index in range(1, partitions)]
+    return sorted({point for point in points if low < point <= high})
+
+
+def plan_partitions(connection_id: str, query: str, spec: PartitionSpec) -> List[str]:
+    """把查询切分为互不重叠且覆盖全部行（含分区列为 NULL 的行）的分区查询"""
+    engine = db_manager.ensure_engine(connection_id)
+    column = engine.dialect.identifier_preparer.quote(spec.column)
+    inner = query.strip().rstrip(";")
+    source = f"SELECT * FROM ({inner}) AS extract_source"
+
+    if spec.strategy == "modulo":
+        return [
+            f"{source} WHERE ABS({column} % {spec.partitions}) = {index}"
+            + (f" OR {column} IS NULL" if index == 0 else "")
+            for index in range(spec.partitions)
+        ]
+
+    bounds = db_manager.execute_query(
+        connection_id,
+        f"SELECT MIN({column}) AS low, MAX({column}) AS high FROM ({inner}) AS extract_source",
+    )
+    low, high = bounds.iloc[0]["low"], bounds.iloc[0]["high"]
+    if pd.isna(low) or pd.isna(high):
+        return [source]
+    points = [
+        _sql_literal(point)
+        for point in _range_boundaries(
+            _boundary_value(low), _boundary_value(high), spec.partitions
+        )
+    ]
+    if not points:
+        return [source]
+
+    # 同一个切分点同时用于相邻两个分区的 < 与 >=，即使数据库对字面量做了类型转换也不会重叠或遗漏
+    queries = [f"{source} WHERE {column} < {points[0]} OR {column} IS NULL"]
+    queries += [
+        f"{source} WHERE {column} >= {lower} AND {column} < {upper}"
+        for lower, upper in zip(points, points[1:])
+    ]
+    queries.append(f"{source} WHERE {column} >= {points[-1]}")
+    return queries
+
+
+def _parallel_batches(
+    connection_id: str, partition_queries: List[str], batch_rows: int
+) -> Iterator[pd.DataFrame]:
+    """并发读取各分区，产出各分区的批次（顺序不定）；消费者提前结束时通知所有读取线程退出"""
+    slot, limit = _source_slot(connection_id)
+    workers = min(len(partition_queries), limit)
+    batches: "queue.Queue[Any]" = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+    done = object()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch(partition_query: str) -> None:
+        while not slot.acquire(timeout=0.5):
+            if stop.is_set():
+                return
+        try:
+            reader = db_manager.iter_query_batches(connection_id, partition_query, batch_rows)
+            try:
+                for batch in reader:
+                    if not put(batch):
+                        return
+            finally:
+                reader.close()
+            put(done)
+        except BaseException as exc:  # pylint: disable=broad-exception-caught
+            put(exc)
+        finally:
+            slot.release()
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"extract-{connection_id}")
+    try:
+        for partition_query in partition_queries:
+            executor.submit(fetch, partition_query)
+        remaining = len(partition_queries)
+        while remaining:
+            item = batches.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        while True:
+            try:
+                batches.get_nowait()
+            except queue.Empty:
+                break
+        executor.shutdown(wait=True)
+
+
+def extract_partitioned_query_to_table(
+    con: duckdb.DuckDBPyConnection,
+    connection_id: str,
+    query: str,
+    table_name: str,
+    spec: PartitionSpec,
+    batch_rows: Optional[int] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    allow_empty: bool = False,
+) -> int:
+    """按分区并发读取外部数据库查询结果，由当前连接串行写入 DuckDB 表 table_name，返回行数"""
+    batch_rows = batch_rows or config_manager.get_app_config().external_extract_batch_rows
+    partition_queries = plan_partitions(connection_id, query, spec)
+    logger.info(
+        "Extracting %s into %s over %d %s partition(s) on %s",
+        connection_id,
+        table_name,
+        len(partition_queries),
+        spec.strategy,
+        spec.column,
+    )
+    return extract_batches_to_table(
+        con,
+        table_name,
+        _parallel_batches(connection_id, partition_queries, max(1, int(batch_rows))),
+        should_stop,
+        allow_empty,
+    )
@@ -0,0 +1,330 @@
+"""
+外部数据库表的增量同步
+按水位列（自增 ID 或 updated_at）只拉取上次同步之后的行，经暂存表以 append / upsert 并入本地镜像表；
+水位与同步状态随表元数据保存在 system_file_datasources.import_state 中。
+没有可用水位（首次同步、水位列变了）而本地表已存在时，有主键则按主键 upsert 全量结果，否则整表替换。
+有主键时以 >= 水位（可配置回看量）拉取，不会漏掉与水位相同或迟到的行；无主键的 append 只能以 > 水位拉取，
+这些行会被漏掉。
+可选的删除对账：定期比较远端与本地的行数与主键和，不一致时拉取远端主键集合，删除本地多出的行。
+"""
+
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import uuid4
+
+import duckdb
+
+from core.common.timezone_utils import get_current_time_iso
+from core.data.external_extract import (
+    PartitionSpec,
+    extract_partitioned_query_to_table,
+    extract_query_to_table,
+)
+from core.data.file_datasource_manager import (
+    SYSTEM_STAGING_PREFIX,
+    _format_value,
+    _quote_identifier,
+    build_table_metadata_snapshot,
+    promote_staging_table,
+)
+from core.data.ingest_cache import prepare_table_rewrite
+from core.data.incremental_import import (
+    _table_columns,
+    _table_exists,
+    merge_staging_table,
+    watermark_resume_bound,
+)
+from core.database.database_manager import db_manager
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE_PREFIX = f"{SYSTEM_STAGING_PREFIX}sync_"
+_INTEGER_TYPES = {"TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT"}
+
+
+def _mark_literal(value: Any) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _align_all_null_columns(
+    con: duckdb.DuckDBPyConnection, staging_table: str, table_name: str
+) -> None:
+    """先把暂存列改回目标表的类型，避免合并时把目标列放宽
+
+    本批次整列为空的列会被推断为 VARCHAR；含空值的整数列经 pandas 读取后成为 DOUBLE，
+    值全是整数时同样改回目标的整数类型。
+    """
+    if not _table_exists(con, table_name):
+        return
+    target_columns = _table_columns(con, table_name)
+    quoted_stage = _quote_identifier(staging_table)
+    for name, staged_type in _table_columns(con, staging_table).items():
+        target_type = target_columns.get(name)
+        if target_type is None or target_type == staged_type:
+            continue
+        quoted_column = _quote_identifier(name)
+        condition = f"{quoted_column} IS NOT NULL"
+        if staged_type in {"DOUBLE", "FLOAT"} and target_type in _INTEGER_TYPES:
+            condition += (
+                f" AND TRY_CAST({quoted_column} AS {target_type}) IS DISTINCT FROM {quoted_column}"
+            )
+        conflicting = con.execute(f"SELECT 1 FROM {quoted_stage} WHERE {condition} LIMIT 1").fetchone()
+        if not conflicting:
+            con.execute(f"ALTER TABLE {quoted_stage} ALTER {quoted_column} TYPE {target_type}")
+
+
+def _replace_with_staging_table(
+    con: duckdb.DuckDBPyConnection,
+    staging_table: str,
+    table_name: str,
+    watermark_column: str,
+    fetched: int,
+) -> Dict[str, Any]:
+    """用全量结果替换本地表，返回与 merge_staging_table 相同结构的元数据"""
+    if watermark_column not in _table_columns(con, staging_table):
+        raise ValueError(f"Column '{watermark_column}' not found in query result")
+    quoted_table = _quote_identifier(table_name)
+    replaced = con.execute(f"SELECT COUNT(*) FROM {quoted_table}").fetchone()[0]
+    promote_staging_table(con, staging_table, table_name)
+    metadata = build_table_metadata_snapshot(con, table_name)
+    new_mark = con.execute(
+        f"SELECT MAX({_quote_identifier(watermark_column)}) FROM {quoted_table}"
+    ).fetchone()[0]
+    metadata["import_state"] = {
+        "key_columns": [],
+        "watermark_column": watermark_column,
+        "high_water_mark": _format_value(new_mark),
+        "last_import_rows": int(fetched),
+        "last_replaced_rows": int(replaced),
+        "added_columns": [],
+        "widened_columns": [],
+    }
+    return metadata
+
+
+def _reconciliation_due(state: Dict[str, Any], every_hours: Optional[float]) -> bool:
+    if every_hours is None:
+        return False
+    last = state.get("last_reconciled_at")
+    if not last:
+        return True
+    elapsed = datetime.fromisoformat(get_current_time_iso()) - datetime.fromisoformat(last)
+    return elapsed.total_seconds() >= float(every_hours) * 3600
+
+
+def reconcile_deletes(
+    con: duckdb.DuckDBPyConnection,
+    connection_id: str,
+    query: str,
+    table_name: str,
+    key_columns: Sequence[str],
+) -> int:
+    """删除远端已不存在的本地行，返回删除的行数
+
+    先比较行数（单个数值主键时再比较主键和）作为廉价校验，一致时不拉取主键集合。
+    """
+    engine = db_manager.ensure_engine(connection_id)
+    quote = engine.dialect.identifier_preparer.quote
+    inner = query.strip().rstrip(";")
+    quoted_table = _quote_identifier(table_name)
+    local_columns = _table_columns(con, table_name)
+
+    checksum_key = None
+    if len(key_columns) == 1 and any(
+        token in local_columns.get(key_columns[0], "")
+        for token in ("INT", "DECIMAL", "DOUBLE", "FLOAT")
+    ):
+        checksum_key = key_columns[0]
+    remote_sql = "SELECT COUNT(*) AS row_count" + (
+        f", SUM({quote(checksum_key)}) AS key_sum" if checksum_key else ""
+    ) + f" FROM ({inner}) AS sync_source"
+    remote = db_manager.execute_query(connection_id, remote_sql).iloc[0]
+    local = con.execute(
+        "SELECT COUNT(*)"
+        + (f", SUM({_quote_identifier(checksum_key)})" if checksum_key else "")
+        + f" FROM {quoted_table}"
+    ).fetchone()
+    same_count = int(remote["row_count"]) == int(local[0])
+    same_sum = not checksum_key or Decimal(str(remote["key_sum"] or 0)) == Decimal(
+        str(local[1] or 0)
+    )
+    if same_count and same_sum:
+        return 0
+
+    prepare_table_rewrite(con, table_name, keep_data=True)
+    keys_table = f"{STAGING_TABLE_PREFIX}keys_{uuid4().hex}"
+    key_sql = (
+        "SELECT " + ", ".join(quote(column) for column in key_columns)
+        + f" FROM ({inner}) AS sync_source"
+    )
+    try:
+        extract_query_to_table(con, connection_id, key_sql, keys_table, allow_empty=True)
+        match_sql = " AND ".join(
+            f"k.{_quote_identifier(column)} = t.{_quote_identifier(column)}"
+            for column in key_columns
+        )
+        deleted = con.execute(
+            f"DELETE FROM {quoted_table} t WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {_quote_identifier(keys_table)} k WHERE {match_sql})"
+        ).fetchone()[0]
+    finally:
+        con.execute(f"DROP TABLE IF EXISTS {_quote_identifier(keys_table)}")
+    invalidate_table_metadata_cache(table_name)
+    logger.info("Reconciled %s against %s: deleted %d row(s)", table_name, connection_id, deleted)
+    return int(deleted)
+
+
+def sync_external_table(
+    con: duckdb.DuckDBPyConnection,
+    connection_id: str,
+    query: str,
+    table_name: str,
+    watermark_column: str,
+    key_columns: Optional[Sequence[str]] = None,
+    previous: Optional[Dict[str, Any]] = None,
+    reconcile_every_hours: Optional[float] = None,
+    partition_spec: Optional[PartitionSpec] = None,
+    should_stop=None,
+) -> Dict[str, Any]:
+    """把外部查询结果增量同步到本地表 table_name
+
+    Args:
+        previous: 目标表已保存的 system_file_datasources 记录，提供水位、同步状态与历史列画像
+        key_columns: 提供时按主键 upsert（updated_at 水位下可以带回被修改的行），否则 append；
+            没有可用水位时无主键的同步整表替换。upsert 每次重读与水位相同及回看范围内的行，
+            append 只拉取严格大于水位的行，水位相同的后续行与迟到的较小水位会被漏掉
+        reconcile_every_hours: 删除对账的间隔（小时），None 表示不对账，0 表示每次同步都对账
+    Returns:
+        表元数据，包含 ``import_state``，调用方应随元数据一起保存
+    """
+    if not watermark_column:
+        raise ValueError("Incremental sync requires a watermark column")
+    key_columns: List[str] = list(key_columns or [])
+    if reconcile_every_hours is not None and not key_columns:
+        raise ValueError("Delete reconciliation requires key columns")
+    mode = "upsert" if key_columns else "append"
+
+    previous = previous or {}
+    previous_state = previous.get("import_state") or {}
+    table_exists = _table_exists(con, table_name)
+    # 水位只在同一水位列、且本地表仍在时延续；否则做一次全量同步
+    high_water_mark = (
+        previous_state.get("high_water_mark")
+        if table_exists and previous_state.get("watermark_column") == watermark_column
+        else None
+    )
+
+    engine = db_manager.ensure_engine(connection_id)
+    inner = query.strip().rstrip(";")
+    sync_query = inner
+    if high_water_mark is not None:
+        operator, bound = watermark_resume_bound(mode, high_water_mark)
+        sync_query = (
+            f"SELECT * FROM ({inner}) AS sync_source WHERE "
+            f"{engine.dialect.identifier_preparer.quote(watermark_column)} "
+            f"{operator} {_mark_literal(bound)}"
+        )
+
+    # 没有可用水位时拉回的是全量结果：有主键可以 upsert，否则整表替换，不能重复追加
+    full_refresh = table_exists and high_water_mark is None and not key_columns
+
+    staging_table = f"{STAGING_TABLE_PREFIX}{uuid4().hex}"
+    try:
+        if partition_spec:
+            fetched = extract_partitioned_query_to_table(
+                con,
+                connection_id,
+                sync_query,
+                staging_table,
+                partition_spec,
+                should_stop=should_stop,
+                allow_empty=full_refresh,
+            )
+        else:
+            fetched = extract_query_to_table(
+                con,
+                connection_id,
+                sync_query,
+                staging_table,
+                should_stop=should_stop,
+                allow_empty=full_refresh,
+            )
+
+        if full_refresh:
+            metadata = _replace_with_staging_table(
+                con, staging_table, table_name, watermark_column, fetched
+            )
+        elif fetched:
+            _align_all_null_columns(con, staging_table, table_name)
+            metadata = merge_staging_table(
+                con,
+                staging_table,
+                table_name,
+                mode,
+                key_columns=key_columns,
+                watermark_column=watermark_column,
+                high_water_mark=high_water_mark,
+                existing_profiles=previous.get("column_profiles") if table_exists else None,
+            )
+        elif table_exists:
+            # 没有新行：沿用已保存的元数据，不重新采集整表
+            metadata = {
+                "row_count": previous.get("row_count")
+                or con.execute(f"SELECT COUNT(*) FROM {_quote_identifier(table_name)}").fetchone()[0],
+                "column_count": previous.get("column_count"),
+                "columns": previous.get("columns"),
+                "column_profiles": previous.get("column_profiles"),
+                "schema_version": 2,
+                "import_state": {
+                    **previous_state,
+                    "last_import_rows": 0,
+                    "last_replaced_rows": 0,
+                    "added_columns": [],
+                    "widened_columns": [],
+                },
+            }
+            if not metadata["columns"]:
+                metadata.update(build_table_metadata_snapshot(con, table_name))
+        else:
+            raise ValueError("Query result is empty, cannot create synced table")
+    finally:
+        con.execute(f"DROP TABLE IF EXISTS {_quote_identifier(staging_table)}")
+
+    state = metadata["import_state"]
+    state.update(
+        {
+            "mode": "sync",
+            "merge_mode": "replace" if full_refresh else mode,
+            "source_connection": connection_id,
+            "reconcile_every_hours": reconcile_every_hours,
+            "last_reconciled_at": previous_state.get("last_reconciled_at"),
+            "last_deleted_rows": 0,
+        }
+    )
+
+    if _reconciliation_due(previous_state, reconcile_every_hours):
+        deleted = reconcile_deletes(con, connection_id, inner, table_name, key_columns)
+        if deleted:
+            metadata.update(build_table_metadata_snapshot(con, table_name))
+        state["last_reconciled_at"] = get_current_time_iso()
+        state["last_deleted_rows"] = deleted
+
+    state["last_import_at"] = get_current_time_iso()
+    state["batches"] = int(previous_state.get("batches") or 0) + 1 if high_water_mark is not None else 1
+    metadata["import_state"] = state
+    logger.info(
+        "Synced %s from %s: %d new row(s), watermark %s -> %s",
+        table_name,
+        connection_id,
+        fetched,
+        high_water_mark,
+        state.get("high_water_mark"),
+    )
+    return metadata
@@ -0,0 +1,348 @@
+"""
+外部视图（零拷贝导入）
+在服务器挂载目录的文件（或整个目录的 glob）上注册 read_parquet/read_csv 视图而不复制数据；统计信息在注册时
+计算一次并缓存在 system_file_datasources 中（Parquet 直接读取文件尾部的元数据），
+通过文件大小与修改时间判断缓存是否失效，需要时可显式物化为普通表。
+"""
+
+import glob
+import hashlib
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from uuid import uuid4
+
+import duckdb
+
+from core.data.file_datasource_manager import (
+    ColumnProfile,
+    _format_value,
+    _create_table_atomically,
+    _parse_decimal_precision_scale,
+    _quote_identifier,
+    build_table_metadata_snapshot,
+)
+from core.data.compressed_files import requires_decompression
+from core.data.file_utils import _format_reader_option_value, detect_file_type
+from core.data.ingest_cache import prepare_table_rewrite
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
+
+logger = logging.getLogger(__name__)
+
+EXTERNAL_VIEW_STORAGE = "external_view"
+EXTERNAL_VIEW_READERS = {
+    "csv": "read_csv_auto",
+    "parquet": "read_parquet",
+    "pq": "read_parquet",
+    "json": "read_json_auto",
+    "jsonl": "read_json_auto",
+}
+EXTERNAL_VIEW_SAMPLE_ROWS = 200
+EXTERNAL_VIEW_SAMPLE_VALUES = 6
+
+
+def _format_source_paths(paths: Union[str, Sequence[str]]) -> str:
+    if isinstance(paths, str):
+        return _format_reader_option_value(paths)
+    return "[" + ", ".join(_format_reader_option_value(path) for path in paths) + "]"
+
+
+def build_external_reader_sql(
+    paths: Union[str, Sequence[str]],
+    file_type: str,
+    options: Optional[Dict[str, Any]] = None,
+) -> str:
+    """生成读取外部文件的表函数调用；paths 可以是单个路径、glob 或路径列表"""
+    reader = EXTERNAL_VIEW_READERS.get((file_type or "").lower())
+    if reader is None:
+        raise ValueError(f"File type does not support external views: {file_type}")
+
+    args = [_format_source_paths(paths)]
+    if options:
+        args.extend(f"{key}={_format_reader_option_value(val)}" for key, val in options.items())
+    return f"{reader}({', '.join(args)})"
+
+
+def expand_source_glob(pattern: str, file_type: Optional[str] = None) -> List[str]:
+    """展开目录导入的 glob（支持 **），只保留普通文件并跳过符号链接
+
+    指定 file_type 时只保留能用同一读取函数直接读取的文件，数据湖目录中的 _SUCCESS、.crc 等文件
+    以及需要先解压的 bz2/zip 文件被忽略。
+    """
+    reader = EXTERNAL_VIEW_READERS.get((file_type or "").lower())
+    return sorted(
+        path
+        for path in glob.glob(pattern, recursive=True)
+        if os.path.isfile(path)
+        and not os.path.islink(path)
+        and (
+            reader is None
+            or (
+                EXTERNAL_VIEW_READERS.get(detect_file_type(path)) == reader
+                and not requires_decompression(path, file_type)
+            )
+        )
+    )
+
+
+def external_source_fingerprint(paths: Union[str, Sequence[str]]) -> Dict[str, Any]:
+    """外部文件只比较大小与修改时间：对 TB 级文件计算哈希的代价与复制数据相当
+
+    多文件来源汇总为文件数、总大小、最新修改时间与文件列表摘要，增删文件也能被发现。
+    """
+    if isinstance(paths, str):
+        stat = os.stat(paths)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": None}
+
+    stats = [os.stat(path) for path in paths]
+    return {
+        "files": len(stats),
+        "size": sum(stat.st_size for stat in stats),
+        "mtime_ns": max((stat.st_mtime_ns for stat in stats), default=0),
+        "paths_digest": hashlib.md5("\n".join(paths).encode("utf-8")).hexdigest(),
+        "hash": None,
+    }
+
+
+def _fingerprint_key(fingerprint: Dict[str, Any]) -> Tuple[Any, ...]:
+    return tuple(fingerprint.get(key) for key in ("size", "mtime_ns", "files", "paths_digest"))
+
+
+def _object_type(con: duckdb.DuckDBPyConnection, name: str) -> Optional[str]:
+    if con.execute("SELECT 1 FROM duckdb_views() WHERE view_name = ?", [name]).fetchone():
+        return "view"
+    if con.execute("SELECT 1 FROM duckdb_tables() WHERE table_name = ?", [name]).fetchone():
+        return "table"
+    return None
+
+
+def _parquet_statistics(
+    con: duckdb.DuckDBPyConnection, source_paths: str, column_types: Dict[str, str]
+) -> Tuple[int, Dict[str, Tuple[Optional[int], Any, Any]]]:
+    """从 Parquet 行组元数据汇总行数、空值数与最值，不扫描数据页"""
+    row_count = con.execute(
+        f"SELECT COALESCE(SUM(num_rows), 0) FROM parquet_file_metadata({source_paths})"
+    ).fetchone()[0]
+
+    statistics: Dict[str, Tuple[Optional[int], Any, Any]] = {}
+    for column, duckdb_type in column_types.items():
+        try:
+            row = con.execute(
+                f"SELECT SUM(stats_null_count), "
+                f"MIN(TRY_CAST(stats_min_value AS {duckdb_type})), "
+                f"MAX(TRY_CAST(stats_max_value AS {duckdb_type})) "
+                f"FROM parquet_metadata({source_paths}) WHERE path_in_schema = ?",
+                [column],
+            ).fetchone()
+        except duckdb.Error as exc:
+            logger.debug("Parquet statistics unavailable for column %s: %s", column, exc)
+            continue
+        null_count = int(row[0]) if row and row[0] is not None else None
+        statistics[column] = (null_count, row[1], row[2])
+    return int(row_count), statistics
+
+
+def _scan_statistics(
+    con: duckdb.DuckDBPyConnection, view_name: str, columns: List[str]
+) -> Tuple[int, Dict[str, Tuple[Optional[int], Any, Any]]]:
+    """CSV/JSON 没有文件级统计信息，用一次聚合扫描求出所有列的空值数与最值"""
+    expressions = ["COUNT(*)"]
+    for column in columns:
+        quoted = _quote_identifier(column)
+        expressions.extend([f"COUNT(*) - COUNT({quoted})", f"MIN({quoted})", f"MAX({quoted})"])
+    row = con.execute(
+        f"SELECT {', '.join(expressions)} FROM {_quote_identifier(view_name)}"
+    ).fetchone()
+
+    statistics = {
+        column: (int(row[1 + index * 3]), row[2 + index * 3], row[3 + index * 3])
+        for index, column in enumerate(columns)
+    }
+    return int(row[0]), statistics
+
+
+def collect_external_view_metadata(
+    con: duckdb.DuckDBPyConnection,
+    view_name: str,
+    paths: Union[str, Sequence[str]],
+    file_type: str,
+) -> Dict[str, Any]:
+    """为外部视图生成与 build_table_metadata_snapshot 相同结构的元数据（去重计数留空）"""
+    quoted_view = _quote_identifier(view_name)
+    column_types = {
+        row[0]: row[1] for row in con.execute(f"DESCRIBE {quoted_view}").fetchall()
+    }
+    columns = list(column_types)
+
+    if EXTERNAL_VIEW_READERS.get(file_type) == "read_parquet":
+        row_count, statistics = _parquet_statistics(
+            con, _format_source_paths(paths), column_types
+        )
+    else:
+        row_count, statistics = _scan_statistics(con, view_name, columns)
+
+    sample_rows = con.execute(
+        f"SELECT * FROM {quoted_view} LIMIT {EXTERNAL_VIEW_SAMPLE_ROWS}"
+    ).fetchall()
+
+    profiles = []
+    for index, column in enumerate(columns):
+        samples: List[str] = []
+        for sample_row in sample_rows:
+            formatted = _format_value(sample_row[index])
+            if formatted is not None and str(formatted) not in samples:
+                samples.append(str(formatted))
+            if len(samples) >= EXTERNAL_VIEW_SAMPLE_VALUES:
+                break
+        null_count, min_value, max_value = statistics.get(column, (None, None, None))
+        precision, scale = _parse_decimal_precision_scale(column_types[column])
+        profiles.append(
+            ColumnProfile(
+                name=column,
+                duckdb_type=column_types[column],
+                nullable=True,
+                precision=precision,
+                scale=scale,
+                sample_values=samples,
+                null_count=null_count,
+                min_value=min_value,
+                max_value=max_value,
+            ).to_dict()
+        )
+
+    return {
+        "row_count": row_count,
+        "column_count": len(columns),
+        "columns": columns,
+        "column_profiles": profiles,
+        "schema_version": 2,
+    }
+
+
+def register_external_view(
+    con: duckdb.DuckDBPyConnection,
+    view_name: str,
+    file_path: Union[str, Sequence[str]],
+    file_type: str,
+    options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """在文件（或文件列表）上注册（或替换）外部视图，返回带统计信息与文件指纹的元数据"""
+    file_type = (file_type or "").lower()
+    source = build_external_reader_sql(file_path, file_type, options)
+    quoted_view = _quote_identifier(view_name)
+
+    # 同名的已导入表被取代前，先把数据移交给链接到它的数据源
+    prepare_table_rewrite(con, view_name)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        # 同名的已导入表被外部视图取代
+        if _object_type(con, view_name) == "table":
+            con.execute(f"DROP TABLE {quoted_view}")
+        con.execute(f"CREATE OR REPLACE VIEW {quoted_view} AS SELECT * FROM {source}")
+        con.execute("COMMIT")
+    except Exception:  # pylint: disable=broad-exception-caught
+        con.execute("ROLLBACK")
+        raise
+    invalidate_table_metadata_cache(view_name)
+
+    metadata = collect_external_view_metadata(con, view_name, file_path, file_type)
+    metadata["storage"] = EXTERNAL_VIEW_STORAGE
+    if isinstance(file_path, str):
+        metadata["external_path"] = file_path
+    metadata["source_fingerprint"] = external_source_fingerprint(file_path)
+    return metadata
+
+
+def create_table_from_files(
+    con: duckdb.DuckDBPyConnection,
+    table_name: str,
+    paths: Union[str, Sequence[str]],
+    file_type: str,
+    options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """用一次 read_* 调用把多个文件复制为一张表（与外部视图共用读取参数）"""
+    source = build_external_reader_sql(paths, (file_type or "").lower(), options)
+    drop_external_view(con, table_name)
+    _create_table_atomically(con, table_name, f"SELECT * FROM {source}")
+    return build_table_metadata_snapshot(con, table_name)
+
+
+def is_external_view(config: Optional[Dict[str, Any]]) -> bool:
+    return ((config or {}).get("metadata") or {}).get("storage") == EXTERNAL_VIEW_STORAGE
+
+
+def drop_external_view(con: duckdb.DuckDBPyConnection, view_name: str) -> bool:
+    """删除同名外部视图（不存在或是普通表时不做任何事），用于以复制方式重新导入"""
+    if _object_type(con, view_name) != "view":
+        return False
+    con.execute(f"DROP VIEW {_quote_identifier(view_name)}")
+    invalidate_table_metadata_cache(view_name)
+    return True
+
+
+def refresh_external_view(
+    con: duckdb.DuckDBPyConnection, config: Dict[str, Any], force: bool = False
+) -> Tuple[str, Dict[str, Any]]:
+    """检查外部视图的缓存元数据是否仍然有效，返回 (状态, 更新后的data源记录)
+
+    状态为 missing（视图不存在，已重新注册）、changed（文件变化，已重新统计）或 unchanged。
+    """
+    source_id = config["source_id"]
+    stored_meta = config.get("metadata") or {}
+    source_glob = stored_meta.get("source_glob")
+    if source_glob:
+        # 目录导入每次重新展开 glob，新增的分区文件会被纳入视图
+        paths: Union[str, List[str]] = expand_source_glob(source_glob, config["file_type"])
+        if not paths:
+            raise FileNotFoundError(f"No files match: {source_glob}")
+    else:
+        paths = stored_meta.get("external_path") or config["file_path"]
+    stored = stored_meta.get("source_fingerprint") or {}
+    current = external_source_fingerprint(paths)
+
+    if _object_type(con, source_id) != "view":
+        status = "missing"
+    elif force or _fingerprint_key(stored) != _fingerprint_key(current):
+        status = "changed"
+    else:
+        return "unchanged", config
+
+    metadata = register_external_view(
+        con, source_id, paths, config["file_type"], stored_meta.get("reader_options")
+    )
+    updated = dict(config)
+    for key in ("row_count", "column_count", "columns", "column_profiles"):
+        updated[key] = metadata[key]
+    updated["metadata"] = {
+        **stored_meta,
+        "storage": EXTERNAL_VIEW_STORAGE,
+        "source_fingerprint": metadata["source_fingerprint"],
+    }
+    if "external_path" in metadata:
+        updated["metadata"]["external_path"] = metadata["external_path"]
+    return status, updated
+
+
+def materialize_external_view(
+    con: duckdb.DuckDBPyConnection, view_name: str
+) -> Dict[str, Any]:
+    """把外部视图物化为同名表：此后查询不再依赖挂载文件，并返回完整的表元数据快照"""
+    if _object_type(con, view_name) != "view":
+        raise ValueError(f"External view does not exist: {view_name}")
+
+    quoted_view = _quote_identifier(view_name)
+    tmp_table = f"__tmp_{view_name}_{uuid4().hex[:8]}"
+    quoted_tmp = _quote_identifier(tmp_table)
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(f"CREATE TABLE {quoted_tmp} AS SELECT * FROM {quoted_view}")
+        con.execute(f"DROP VIEW {quoted_view}")
+        con.execute(f"ALTER TABLE {quoted_tmp} RENAME TO {quoted_view}")
+        con.execute("COMMIT")
+    except Exception:  # pylint: disable=broad-exception-caught
+        con.execute("ROLLBACK")
+        raise
+    invalidate_table_metadata_cache(view_name)
+
+    return build_table_metadata_snapshot(con, view_name)
@@ -5,12 +5,15 @@ filedata源管理器
 """
 
 import hashlib
+import json
 import logging
 import math
 import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
 from decimal import Decimal
 from pathlib import Path
 
@@ -20,8 +23,11 @@ from uuid import uuid4
 import duckdb
 import pandas as pd
 
+from core.database.arrow_ingest import dataframe_to_arrow
 from core.database.duckdb_engine import with_duckdb_connection
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
 from core.common.config_manager import config_manager
+from core.common.timezone_utils import get_current_time_iso
 from core.data.file_utils import detect_file_type, load_file_to_duckdb
 
 logger = logging.getLogger(__name__)
@@ -143,10 +149,13 @@ def _configure_duckdb_for_ingestion(con: duckdb.DuckDBPyConnection):
 def _create_table_atomically(
     con: duckdb.DuckDBPyConnection, table_name: str, select_sql: str, params: Optional[Sequence[Any]] = None
 ):
+    from core.data.ingest_cache import prepare_table_rewrite
+
     tmp_table = f"__tmp_{table_name}_{uuid4().hex[:8]}"
     quoted_tmp = _quote_identifier(tmp_table)
     quoted_target = _quote_identifier(table_name)
 
+    prepare_table_rewrite(con, table_name)
     con.execute("BEGIN TRANSACTION")
     try:
         con.execute(
@@ -156,6 +165,7 @@ def _create_table_atomically(
         con.execute(f"DROP TABLE IF EXISTS {quoted_target}")
         con.execute(f"ALTER TABLE {quoted_tmp} RENAME TO {quoted_target}")
         con.execute("COMMIT")
+        invalidate_table_metadata_cache(table_name)
     except Exception:  # pylint: disable=broad-exception-caught
         con.execute("ROLLBACK")
         raise
@@ -166,6 +176,46 @@ def _create_table_atomically(
             pass
 
 
+# 导入与抽取过程中的暂存表统一使用该前缀：以 system_ 开头，不出现在表列表中；进程中断留下的残表在启动时清理
+SYSTEM_STAGING_PREFIX = "system_stage_"
+
+
+def drop_stale_staging_tables(con: duckdb.DuckDBPyConnection) -> List[str]:
+    """删除上次进程中断时遗留的暂存表，只能在没有导入任务运行时（应用启动时）调用"""
+    stale = [
+        row[0]
+        for row in con.execute(
+            "SELECT table_name FROM duckdb_tables() WHERE starts_with(table_name, ?)",
+            [SYSTEM_STAGING_PREFIX],
+        ).fetchall()
+    ]
+    for table_name in stale:
+        con.execute(f"DROP TABLE IF EXISTS {_quote_identifier(table_name)}")
+    if stale:
+        logger.info("Dropped %d stale staging table(s): %s", len(stale), stale)
+    return stale
+
+
+def promote_staging_table(
+    con: duckdb.DuckDBPyConnection, staging_table: str, table_name: str
+) -> None:
+    """在同一事务中用已写好的暂存表替换目标表（仅改名，不复制数据）"""
+    from core.data.ingest_cache import prepare_table_rewrite
+
+    quoted_stage = _quote_identifier(staging_table)
+    quoted_target = _quote_identifier(table_name)
+    prepare_table_rewrite(con, table_name)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(f"DROP TABLE IF EXISTS {quoted_target}")
+        con.execute(f"ALTER TABLE {quoted_stage} RENAME TO {quoted_target}")
+        con.execute("COMMIT")
+    except Exception:  # pylint: disable=broad-exception-caught
+        con.execute("ROLLBACK")
+        raise
+    invalidate_table_metadata_cache(table_name)
+
+
 def _collect_column_profiles(
     con: duckdb.DuckDBPyConnection, table_name: str, sample_limit: int = 6
 ) -> List[ColumnProfile]:
@@ -263,7 +313,7 @@ class FileDatasourceManager:
         """计算file的MD5哈希值"""
         hash_md5 = hashlib.md5()
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
                 hash_md5.update(chunk)
         return hash_md5.hexdigest()
 
@@ -295,10 +345,10 @@ class FileDatasourceManager:
             logger.error("Failed to get file datasource configuration: %s", str(e))
             return None
 
-    def list_file_datasources(self) -> List[Dict[str, Any]]:
-        """从 DuckDB 元datatablecolumn出所有filedata源"""
+    def list_file_datasources(self, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """从 DuckDB 元datatablecolumn出filedata源，filters 为按column相等过滤的条件"""
         try:
-            return self.metadata_manager.list_file_datasources()
+            return self.metadata_manager.list_file_datasources(filters)
         except Exception as e:  # pylint: disable=broad-exception-caught
             logger.error("Failed to list file datasources: %s", str(e))
             return []
@@ -320,64 +370,305 @@ class FileDatasourceManager:
             return False
 
     def reload_all_file_datasources(self, con: Optional[duckdb.DuckDBPyConnection] = None):
-        """重新loading所有filedata源到DuckDB"""
+        """对账所有filedata源：仅重新loading源file已变化或DuckDB table缺失的data源"""
         if con is None:
             with with_duckdb_connection() as connection:
                 return self._reload_all_file_datasources(connection)
         return self._reload_all_file_datasources(con)
 
+    def _source_fingerprint(
+        self, file_path: str, file_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        stat = os.stat(file_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": file_hash}
+
+    def _detect_source_change(
+        self, config: Dict[str, Any], existing_tables: set
+    ) -> Tuple[str, Dict[str, Any]]:
+        """判断data源是否需要重新loading，返回 (状态, 当前file指纹)
+
+        状态为 missing（table不存在）、changed 或 unchanged。size/mtime 未变时不读取file内容，
+        只有 mtime 变化时才计算哈希确认内容是否真的改变。
+        """
+        file_path = config["file_path"]
+        stored = (config.get("metadata") or {}).get("source_fingerprint") or {}
+        current = self._source_fingerprint(file_path)
+
+        if config["source_id"] not in existing_tables:
+            return "missing", current
+
+        if stored:
+            if stored.get("size") != current["size"]:
+                return "changed", current
+            if stored.get("mtime_ns") == current["mtime_ns"]:
+                current["hash"] = stored.get("hash")
+                return "unchanged", current
+            current["hash"] = self._get_file_hash(file_path)
+            return ("unchanged" if current["hash"] == stored.get("hash") else "changed"), current
+
+        # 旧版本保存的记录没有指纹：优先比较已保存的哈希，其次比较file修改时间与记录updating时间
+        if config.get("file_hash"):
+            current["hash"] = self._get_file_hash(file_path)
+            return ("unchanged" if current["hash"] == config["file_hash"] else "changed"), current
+        recorded_at = config.get("updated_at") or config.get("upload_time")
+        if isinstance(recorded_at, datetime):
+            modified_at = datetime.fromtimestamp(
+                current["mtime_ns"] / 1e9, timezone.utc
+            ).replace(tzinfo=None)
+            if modified_at > recorded_at:
+                return "changed", current
+        return "unchanged", current
+
+    def _owned_by_other_source(
+        self, config: Dict[str, Any], fingerprint: Dict[str, Any], hash_owners: Dict[str, set]
+    ) -> bool:
+        """上传文件按客户端文件名保存，同名上传共用一个路径：
+        文件内容已是另一个数据源的上传时，不能据此重建本数据源的表"""
+        if fingerprint.get("hash") is None:
+            fingerprint["hash"] = self._get_file_hash(config["file_path"])
+        current = fingerprint["hash"]
+        if current == config.get("file_hash"):
+            return False
+        return bool(hash_owners.get(current, set()) - {config["source_id"]})
+
+    def _reload_file_datasource(
+        self, config: Dict[str, Any], fingerprint: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        source_id = config["source_id"]
+        with with_duckdb_connection() as duckdb_con:
+            table_metadata = create_table_from_file_path_typed(
+                duckdb_con, source_id, config["file_path"], config["file_type"]
+            )
+
+        if fingerprint.get("hash") is None:
+            fingerprint["hash"] = self._get_file_hash(config["file_path"])
+        # 表已按当前文件重建，原来的导入缓存键不再可信（与 prepare_table_rewrite 保持一致）
+        config["metadata"] = {
+            key: value
+            for key, value in (config.get("metadata") or {}).items()
+            if key != "ingest_key"
+        }
+        config["row_count"] = table_metadata.get("row_count")
+        config["column_count"] = table_metadata.get("column_count")
+        config["columns"] = table_metadata.get("columns", [])
+        if table_metadata.get("column_profiles") is not None:
+            config["column_profiles"] = table_metadata["column_profiles"]
+        config["schema_version"] = table_metadata.get(
+            "schema_version", config.get("schema_version", 2)
+        )
+        return table_metadata
+
+    def _save_fingerprint(self, config: Dict[str, Any], fingerprint: Dict[str, Any]) -> None:
+        config["metadata"] = {**(config.get("metadata") or {}), "source_fingerprint": fingerprint}
+        try:
+            self.save_file_datasource(config)
+        except Exception as save_exc:  # pylint: disable=broad-exception-caught
+            logger.warning("Failed to update file metadata %s: %s", config["source_id"], save_exc)
+
+    def _refresh_external_view(
+        self, duckdb_con: duckdb.DuckDBPyConnection, config: Dict[str, Any]
+    ) -> None:
+        from core.data.external_views import refresh_external_view
+
+        source_id = config["source_id"]
+        try:
+            status, updated = refresh_external_view(duckdb_con, config)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            logger.error("Failed to refresh external view %s: %s", source_id, exc)
+            file_reload_progress.record(source_id, "failed", str(exc))
+            return
+
+        if status == "unchanged":
+            file_reload_progress.record(source_id, "unchanged")
+            return
+        logger.info("External view %s refreshed (%s)", source_id, status)
+        try:
+            self.save_file_datasource(updated)
+        except Exception as save_exc:  # pylint: disable=broad-exception-caught
+            logger.warning("Failed to update file metadata %s: %s", source_id, save_exc)
+        file_reload_progress.record(source_id, "reloaded")
+
     def _reload_all_file_datasources(self, duckdb_con: duckdb.DuckDBPyConnection):
         try:
-            logger.info("Starting to reload all file datasources to DuckDB...")
+            logger.info("Starting to reconcile file datasources with DuckDB...")
 
             configs = self.list_file_datasources()
-            success_count = 0
+            existing_tables = {
+                row[0] for row in duckdb_con.execute("SELECT table_name FROM duckdb_tables()").fetchall()
+            }
+            workers = _resolve_reload_workers(len(configs))
+            file_reload_progress.start(len(configs), workers)
+            hash_owners: Dict[str, set] = {}
+            for config in configs:
+                if config.get("file_hash"):
+                    hash_owners.setdefault(config["file_hash"], set()).add(config["source_id"])
 
+            pending = []
             for config in configs:
                 source_id = config["source_id"]
                 file_path = config["file_path"]
-                file_type = config["file_type"]
 
-                if not os.path.exists(file_path):
+                if not file_path or not os.path.exists(file_path):
                     logger.warning("File does not exist, skipping: %s", file_path)
+                    file_reload_progress.record(source_id, "skipped")
                     continue
 
-                try:
-                    table_metadata = create_table_from_file_path_typed(
-                        duckdb_con, source_id, file_path, file_type
-                    )
+                # 追加/合并导入的表由多批文件累积而成，file_path 只指向最后一批，不能按文件重建
+                import_state = config.get("import_state") or {}
+                if import_state.get("mode") in {"append", "upsert"}:
+                    logger.info("Skipping reload of incrementally imported table: %s", source_id)
+                    file_reload_progress.record(source_id, "skipped")
+                    continue
 
-                    if table_metadata:
-                        config["row_count"] = table_metadata.get("row_count")
-                        config["column_count"] = table_metadata.get("column_count")
-                        config["columns"] = table_metadata.get("columns", [])
-                        if table_metadata.get("column_profiles") is not None:
-                            config["column_profiles"] = table_metadata["column_profiles"]
-                        config["schema_version"] = table_metadata.get(
-                            "schema_version", config.get("schema_version", 2)
-                        )
-
-                        try:
-                            self.save_file_datasource(config)
-                        except Exception as save_exc:
-                            logger.warning(
-                                "Failed to update file metadata %s: %s", source_id, save_exc
-                            )
+                source_meta = config.get("metadata") or {}
+                if source_meta.get("source_glob") and source_meta.get("storage") != "external_view":
+                    logger.info("Skipping reload of multi-file table: %s", source_id)
+                    file_reload_progress.record(source_id, "skipped")
+                    continue
+
+                # 重复上传链接到其他表的视图没有自己的数据，不按源文件重建
+                if source_meta.get("storage") == "linked_view":
+                    file_reload_progress.record(source_id, "unchanged")
+                    continue
 
+                # 外部视图不复制数据，只需在文件变化时重新注册并刷新缓存的统计信息
+                if source_meta.get("storage") == "external_view":
+                    self._refresh_external_view(duckdb_con, config)
+                    continue
+
+                try:
+                    status, fingerprint = self._detect_source_change(config, existing_tables)
+                except OSError as exc:
+                    logger.error("Failed to check file datasource %s: %s", source_id, exc)
+                    file_reload_progress.record(source_id, "failed", str(exc))
+                    continue
+
+                if status == "unchanged":
+                    stored = (config.get("metadata") or {}).get("source_fingerprint")
+                    if stored != fingerprint:
+                        self._save_fingerprint(config, fingerprint)
+                    file_reload_progress.record(source_id, "unchanged")
+                    continue
+                try:
+                    owned_elsewhere = self._owned_by_other_source(config, fingerprint, hash_owners)
+                except OSError as exc:
+                    logger.error("Failed to check file datasource %s: %s", source_id, exc)
+                    file_reload_progress.record(source_id, "failed", str(exc))
+                    continue
+                if owned_elsewhere:
+                    logger.warning(
+                        "File %s now holds another datasource's upload, skipping reload of %s",
+                        file_path,
+                        source_id,
+                    )
+                    file_reload_progress.record(source_id, "skipped")
+                    continue
+                logger.info("File datasource %s needs reload (%s)", source_id, status)
+                pending.append((config, fingerprint))
+
+            # 不同table的重新loading互不冲突，在连接池的多个connection上并行执行
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="file-reload") as pool:
+                futures = {
+                    pool.submit(self._reload_file_datasource, config, fingerprint): (config, fingerprint)
+                    for config, fingerprint in pending
+                }
+                for future in as_completed(futures):
+                    config, fingerprint = futures[future]
+                    source_id = config["source_id"]
+                    try:
+                        table_metadata = future.result()
+                    except Exception as exc:  # pylint: disable=broad-exception-caught
+                        logger.error("Failed to reload file datasource %s: %s", source_id, str(exc))
+                        file_reload_progress.record(source_id, "failed", str(exc))
+                        continue
+                    self._save_fingerprint(config, fingerprint)
                     logger.info(
                         "Successfully reloaded file datasource: %s (rows: %s)",
                         source_id,
-                        table_metadata.get("row_count") if table_metadata else "unknown",
+                        table_metadata.get("row_count"),
                     )
-                    success_count += 1
-                except Exception as exc:  # pylint: disable=broad-exception-caught
-                    logger.error("Failed to reload file datasource %s: %s", source_id, str(exc))
-
-            logger.info("File datasource reload completed, success: %s/%s", success_count, len(configs))
-            return success_count
+                    file_reload_progress.record(source_id, "reloaded")
+
+            summary = file_reload_progress.finish()
+            logger.info(
+                "File datasource reconcile completed: %s unchanged, %s reloaded, %s failed, %s skipped",
+                summary["unchanged"],
+                summary["reloaded"],
+                summary["failed"],
+                summary["skipped"],
+            )
+            return summary["unchanged"] + summary["reloaded"]
 
         except Exception as exc:  # pylint: disable=broad-exception-caught
             logger.error("Failed to reload file datasources: %s", str(exc))
+            file_reload_progress.finish(error=str(exc))
+
+
+def _resolve_reload_workers(source_count: int) -> int:
+    app_config = config_manager.get_app_config()
+    configured = int(getattr(app_config, "file_datasource_reload_workers", 0) or 0)
+    workers = configured if configured > 0 else (os.cpu_count() or 1)
+    # 对账本身占用一个连接池connection，另为在线请求保留至少一个
+    pool_limit = max(int(getattr(app_config, "pool_max_connections", 10) or 10) - 2, 1)
+    return max(1, min(workers, pool_limit, source_count or 1))
+
+
+class FileReloadProgress:
+    """启动时filedata源对账进度，供就绪检查接口查询"""
+
+    def __init__(self, max_failures: int = 50):
+        self._lock = threading.Lock()
+        self._max_failures = max_failures
+        self._state: Dict[str, Any] = {"status": "idle"}
+
+    def mark_pending(self) -> None:
+        """对账线程启动前调用，使就绪检查在对账真正开始之前就报告未就绪"""
+        with self._lock:
+            self._state = {"status": "pending", "started_at": None, "finished_at": None}
+
+    def start(self, total: int, workers: int) -> None:
+        with self._lock:
+            self._state = {
+                "status": "running",
+                "workers": workers,
+                "total": total,
+                "checked": 0,
+                "unchanged": 0,
+                "reloaded": 0,
+                "failed": 0,
+                "skipped": 0,
+                "failures": [],
+                "started_at": get_current_time_iso(),
+                "finished_at": None,
+            }
+
+    def record(self, source_id: str, outcome: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            if self._state.get("status") != "running":
+                return
+            self._state["checked"] += 1
+            self._state[outcome] += 1
+            if error and len(self._state["failures"]) < self._max_failures:
+                self._state["failures"].append({"source_id": source_id, "error": error})
+
+    def finish(self, error: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            self._state["status"] = "failed" if error else "ready"
+            self._state["finished_at"] = get_current_time_iso()
+            if error:
+                self._state["error"] = error
+            return dict(self._state)
+
+    @property
+    def ready(self) -> bool:
+        return self._state.get("status") not in {"pending", "running"}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(self._state))
+
+
+file_reload_progress = FileReloadProgress()
 
 
 def create_typed_table_from_dataframe(
@@ -395,7 +686,8 @@ def create_typed_table_from_dataframe(
     quoted_temp = _quote_identifier(temp_view)
 
     try:
-        duckdb_con.register(temp_view, df)
+        # 先按列向量化转换为 Arrow 表，DuckDB 通过 Arrow 扫描零拷贝读取
+        duckdb_con.register(temp_view, dataframe_to_arrow(df))
         select_sql = f"SELECT * FROM {quoted_temp}"
         _create_table_atomically(duckdb_con, table_name, select_sql)
     finally:
@@ -414,42 +706,69 @@ def create_typed_table_from_dataframe(
     return metadata
 
 
-def create_table_from_file_path_typed(
+def load_file_into_table(
     duckdb_con: duckdb.DuckDBPyConnection,
     table_name: str,
     file_path: str,
     file_type: str,
     reader_options: Optional[Dict[str, Any]] = None,
-) -> Dict[str, Any]:
+) -> None:
     """
-    从filepathcreating带类型的 DuckDB 持久化table。
+    将file落为 DuckDB table（替换同名table），不采集column画像。
     """
     _configure_duckdb_for_ingestion(duckdb_con)
     normalized_type = (file_type or "").lower()
     if not normalized_type or normalized_type == "unknown":
         normalized_type = detect_file_type(file_path)
 
-    try:
-        if normalized_type in {"xlsx", "xls", "excel"}:
+    if normalized_type in {"xlsx", "xls", "excel"}:
+        try:
+            duckdb_con.execute("INSTALL excel")
+            duckdb_con.execute("LOAD excel")
+            select_sql = "SELECT * FROM read_xlsx(?)"
+            _create_table_atomically(
+                duckdb_con, table_name, select_sql, [file_path]
+            )
+        except Exception as excel_exc:  # pylint: disable=broad-exception-caught
+            logger.warning("DuckDB Excel extension failed, falling back to pandas: %s", excel_exc)
+            df = pd.read_excel(file_path)
+            if df.empty:
+                raise ValueError("DataFrame is empty, cannot create table")
+            temp_view = f"temp_df_{uuid4().hex[:8]}"
             try:
-                duckdb_con.execute("INSTALL excel")
-                duckdb_con.execute("LOAD excel")
-                select_sql = "SELECT * FROM read_xlsx(?)"
+                duckdb_con.register(temp_view, df)
                 _create_table_atomically(
-                    duckdb_con, table_name, select_sql, [file_path]
+                    duckdb_con, table_name, f"SELECT * FROM {_quote_identifier(temp_view)}"
                 )
-            except Exception as excel_exc:  # pylint: disable=broad-exception-caught
-                logger.warning("DuckDB Excel extension failed, falling back to pandas: %s", excel_exc)
-                df = pd.read_excel(file_path)
-                return create_typed_table_from_dataframe(duckdb_con, table_name, df)
-        else:
-            load_file_to_duckdb(
-                duckdb_con,
-                table_name,
-                file_path,
-                normalized_type,
-                reader_options=reader_options,
-            )
+            finally:
+                try:
+                    duckdb_con.unregister(temp_view)
+                except Exception:  # pylint: disable=broad-exception-caught
+                    pass
+    else:
+        load_file_to_duckdb(
+            duckdb_con,
+            table_name,
+            file_path,
+            normalized_type,
+            reader_options=reader_options,
+        )
+
+
+def create_table_from_file_path_typed(
+    duckdb_con: duckdb.DuckDBPyConnection,
+    table_name: str,
+    file_path: str,
+    file_type: str,
+    reader_options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    从filepathcreating带类型的 DuckDB 持久化table。
+    """
+    try:
+        load_file_into_table(
+            duckdb_con, table_name, file_path, file_type, reader_options=reader_options
+        )
     except Exception as exc:
         logger.error("Failed to create table from file %s: %s", table_name, exc)
         raise
@@ -547,6 +866,7 @@ def convert_table_to_varchar(table_name: str, _table_alias: str, duckdb_con):
 
         # 重命名新table
         duckdb_con.execute(f'ALTER TABLE "{new_table_name}" RENAME TO "{table_name}"')
+        invalidate_table_metadata_cache(table_name)
 
         logger.info("Successfully converted table %s to VARCHAR type", table_name)
 
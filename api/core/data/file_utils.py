@@ -3,23 +3,44 @@ file工具模块
 提供file类型检测和file读取功能
 """
 
+import duckdb
 import pandas as pd
 import numpy as np
 import logging
 import os
+import shutil
+import tempfile
 import time
 from uuid import uuid4
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Union
 
 from core.common.utils import normalize_dataframe_output, handle_non_serializable_data
+from core.data.compressed_files import (
+    COMPRESSIBLE_FILE_TYPES,
+    decompressed_paths,
+    is_compressed,
+    open_decompressed,
+    requires_decompression,
+    split_compression,
+    zip_archive_file_type,
+)
 from core.database.duckdb_engine import with_duckdb_connection
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
 
 logger = logging.getLogger(__name__)
 
 
 def detect_file_type(filename: str) -> str:
-    """检测file类型"""
-    extension = filename.lower().split(".")[-1]
+    """检测file类型，'.csv.gz' 等压缩文件按内层格式识别"""
+    base_name, compression = split_compression(filename)
+    extension = base_name.lower().split(".")[-1]
+    if compression is not None:
+        if extension in COMPRESSIBLE_FILE_TYPES:
+            return COMPRESSIBLE_FILE_TYPES[extension]
+        # 'bundle.zip' 这类没有内层扩展名的压缩包按包内文件识别
+        if compression == "zip" and os.path.isfile(filename):
+            return zip_archive_file_type(filename) or "unknown"
+        return "unknown"
 
     type_mapping = {
         "csv": "csv",
@@ -34,6 +55,12 @@ def detect_file_type(filename: str) -> str:
     return type_mapping.get(extension, "unknown")
 
 
+def file_stem(filename: str) -> str:
+    """去掉目录、压缩扩展名和格式扩展名：'data/sales.csv.gz' -> 'sales'"""
+    base_name = split_compression(os.path.basename(filename))[0]
+    return os.path.splitext(base_name)[0]
+
+
 def read_file_by_type(
     file_path: str, file_type: str = None, nrows: int = None
 ) -> pd.DataFrame:
@@ -46,8 +73,8 @@ def read_file_by_type(
             # 智能检测编码，不再盲目尝试 latin-1
             import charset_normalizer
 
-            # 读取file头部的字节用于检测
-            with open(file_path, "rb") as f:
+            # 读取file头部的字节用于检测（压缩文件读取解压后的内容）
+            with open_decompressed(file_path) as f:
                 raw_data = f.read(1024 * 1024)  # 读取前 1MB
                 
             # 1. 尝试常见编码 (GB18030 覆盖了 GBK 和 GB2312)
@@ -253,6 +280,12 @@ def _quote_identifier(name: str) -> str:
 
 
 def _format_reader_option_value(value: Any) -> str:
+    if isinstance(value, dict):
+        items = ", ".join(
+            f"{_format_reader_option_value(str(key))}: {_format_reader_option_value(val)}"
+            for key, val in value.items()
+        )
+        return "{" + items + "}"
     if isinstance(value, bool):
         return "TRUE" if value else "FALSE"
     if isinstance(value, (int, float)):
@@ -273,63 +306,139 @@ def _build_reader_invocation(function_name: str, options: Optional[Dict[str, Any
     return f"{function_name}({', '.join(args)})"
 
 
+# 编码检测时在文件中均匀抽取的区域数量与每个区域的字节数
+CSV_ENCODING_SAMPLE_REGIONS = 8
+CSV_ENCODING_SAMPLE_BYTES = 64 * 1024
+# 转码时每次读取的字节数，内存占用只与该值相关
+CSV_TRANSCODE_BLOCK_BYTES = 4 * 1024 * 1024
+
+# charset_normalizer 检测结果到 Python 编解码器的映射
+# GBK/GB2312 都是 GB18030 的子集，统一按 GB18030 解码，避免文件后部出现扩展字符时失败
+_CSV_CODEC_ALIASES = {
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "euc_jis_2004": "gb18030",  # 有时中文文件会被误检测为日文编码
+    "iso-8859-1": "latin-1",
+    "latin1": "latin-1",
+}
+# 转码失败时回退到 DuckDB encoding 参数所用的名称
+_DUCKDB_ENCODING_NAMES = {
+    "gb18030": "GB18030",
+    "big5": "BIG5",
+    "shift_jis": "SHIFT_JIS",
+    "latin-1": "LATIN1",
+    "cp1252": "WINDOWS-1252",
+    "utf-16": "UTF-16",
+}
+_UTF16_BOMS = {
+    b"\xff\xfe": "utf-16",
+    b"\xfe\xff": "utf-16",
+}
+
+
+def _sample_file_regions(
+    file_path: str,
+    regions: int = CSV_ENCODING_SAMPLE_REGIONS,
+    region_bytes: int = CSV_ENCODING_SAMPLE_BYTES,
+) -> list:
+    """从文件头、中部和尾部均匀抽取若干区域用于编码检测。
+
+    中间区域按换行符对齐：GBK/GB18030 与 UTF-8 的多字节序列中都不会出现 0x0A，
+    因此对齐后的区域不会从多字节字符中间截断。
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        if file_size <= regions * region_bytes:
+            return [f.read()]
+
+        step = (file_size - region_bytes) // (regions - 1)
+        samples = []
+        for index in range(regions):
+            offset = index * step
+            f.seek(offset)
+            chunk = f.read(region_bytes)
+            is_first = offset == 0
+            is_last = offset + len(chunk) >= file_size
+            if not is_first:
+                newline = chunk.find(b"\n")
+                chunk = chunk[newline + 1:] if newline >= 0 else b""
+            if not is_last:
+                newline = chunk.rfind(b"\n")
+                chunk = chunk[: newline + 1] if newline >= 0 else b""
+            if chunk:
+                samples.append(chunk)
+        return samples
+
+
+def _sample_decompressed_head(
+    file_path: str,
+    sample_bytes: int = CSV_ENCODING_SAMPLE_REGIONS * CSV_ENCODING_SAMPLE_BYTES,
+) -> list:
+    """压缩流不能随机定位，只取解压后的文件头部，按换行对齐避免截断多字节字符"""
+    with open_decompressed(file_path) as f:
+        chunk = f.read(sample_bytes)
+        truncated = bool(f.read(1))
+    if truncated:
+        newline = chunk.rfind(b"\n")
+        chunk = chunk[: newline + 1] if newline >= 0 else chunk
+    return [chunk]
+
+
+def _decodes_all(samples: list, codec: str) -> bool:
+    try:
+        for sample in samples:
+            sample.decode(codec)
+        return True
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+
 def _detect_csv_encoding(file_path: str) -> Optional[str]:
-    """检测 CSV 文件编码，返回 DuckDB 可识别的编码名称。
+    """检测 CSV 文件编码，返回 Python 编解码器名称。
+
+    在文件多个区域抽样（而不只看文件头），候选编码必须能解码全部样本。
 
     Args:
         file_path: CSV 文件路径
 
     Returns:
-        检测到的编码名称，如果是 UTF-8 则返回 None（让 DuckDB 使用默认值）
+        检测到的编码名称，如果是 UTF-8 则返回 None（DuckDB 可直接读取）
     """
     import charset_normalizer
 
-    # DuckDB 支持的编码名称映射
-    # 注意：DuckDB 支持 GB18030 但不支持 GBK，需要将 GBK 映射到 GB18030
-    encoding_map = {
-        "gb18030": "GB18030",
-        "gb2312": "GB18030",  # GB2312 是 GB18030 的子集
-        "gbk": "GB18030",     # GBK 是 GB18030 的子集
-        "big5": "BIG5",
-        "shift_jis": "SHIFT_JIS",
-        "euc_jp": "EUC_JP",
-        "euc_kr": "EUC_KR",
-        "euc_jis_2004": "GB18030",  # 有时中文文件会被误检测为日文编码
-        "iso-8859-1": "LATIN1",
-        "latin1": "LATIN1",
-        "cp1252": "WINDOWS-1252",
-        "utf-16": "UTF-16",
-        "utf-16-le": "UTF-16LE",
-        "utf-16-be": "UTF-16BE",
-    }
-
     try:
-        with open(file_path, "rb") as f:
-            # 读取前 100KB 用于编码检测（避免在多字节字符中间截断）
-            raw_data = f.read(100 * 1024)
+        with open_decompressed(file_path) as f:
+            head = f.read(4)
+        if head.startswith(b"\xef\xbb\xbf"):
+            return None  # 带 BOM 的 UTF-8，DuckDB 可直接读取
+        for bom, codec in _UTF16_BOMS.items():
+            if head.startswith(bom):
+                return codec
+
+        if is_compressed(file_path):
+            samples = _sample_decompressed_head(file_path)
+        else:
+            samples = _sample_file_regions(file_path)
 
         # 优先尝试 UTF-8
-        try:
-            raw_data.decode("utf-8")
-            return None  # UTF-8 是 DuckDB 默认编码，无需指定
-        except UnicodeDecodeError:
-            pass
+        if _decodes_all(samples, "utf-8"):
+            return None
 
-        # 使用 charset_normalizer 检测编码
-        result = charset_normalizer.from_bytes(raw_data)
+        # 与 read_file_by_type 一致，优先尝试中文编码；
+        # charset_normalizer 对以 ASCII 为主的样本容易给出冷门编码，只作为后备
+        candidates = ["gb18030"]
+        result = charset_normalizer.from_bytes(b"".join(samples))
         if result and result.best():
-            detected = result.best().encoding
+            detected = result.best().encoding.lower()
             logger.info(f"Detected CSV encoding for {file_path}: {detected}")
-            return encoding_map.get(detected.lower(), detected.upper())
+            candidates.append(_CSV_CODEC_ALIASES.get(detected, detected))
+        candidates.extend(["big5", "shift_jis", "cp1252"])
+        for codec in candidates:
+            if _decodes_all(samples, codec):
+                return codec
 
-        # charset_normalizer 失败时，尝试常见中文编码
-        for enc in ["gb18030", "gbk"]:
-            try:
-                raw_data.decode(enc)
-                logger.info(f"Fallback encoding detection for {file_path}: {enc}")
-                return "GBK"
-            except UnicodeDecodeError:
-                continue
+        logger.warning(f"Unable to detect encoding for {file_path}, falling back to latin-1")
+        return "latin-1"
 
     except Exception as e:
         logger.warning(f"Failed to detect encoding for {file_path}: {e}")
@@ -337,10 +446,113 @@ def _detect_csv_encoding(file_path: str) -> Optional[str]:
     return None
 
 
+def transcode_to_utf8(
+    source_path: str,
+    source_encoding: str,
+    target_path: str,
+    block_bytes: int = CSV_TRANSCODE_BLOCK_BYTES,
+) -> int:
+    """按块将文件流式转码为 UTF-8，返回写入的字节数。
+
+    使用增量解码器，跨块的多字节字符会被正确拼接；解码错误直接抛出，
+    由调用方决定回退方式，避免静默写入乱码。
+    """
+    import codecs
+
+    decoder = codecs.getincrementaldecoder(source_encoding)(errors="strict")
+    written = 0
+    with open_decompressed(source_path) as src, open(target_path, "wb") as dst:
+        while True:
+            block = src.read(block_bytes)
+            final = not block
+            text = decoder.decode(block, final=final)
+            if text:
+                data = text.encode("utf-8")
+                dst.write(data)
+                written += len(data)
+            if final:
+                break
+    return written
+
+
+# 超过该大小的本地 CSV 不再全文件嗅探类型，而是在分层抽样上嗅探
+CSV_SNIFF_FULL_SCAN_MAX_BYTES = 32 * 1024 * 1024
+CSV_SNIFF_SAMPLE_BLOCKS = 8
+CSV_SNIFF_BLOCK_BYTES = 1024 * 1024
+
+# 按抽样类型加载失败时需要以全文件类型推断重新加载的错误
+_CSV_SCHEMA_MISMATCH_ERRORS = (
+    duckdb.ConversionException,
+    duckdb.InvalidInputException,
+    duckdb.BinderException,
+)
+
+
+def _write_stratified_csv_sample(
+    file_path: str,
+    target_path: str,
+    blocks: int = CSV_SNIFF_SAMPLE_BLOCKS,
+    block_bytes: int = CSV_SNIFF_BLOCK_BYTES,
+) -> None:
+    """从文件头、中部和尾部各取一块按行对齐的数据写入 target_path。
+
+    第一块包含表头；其余块丢弃首尾不完整的行，只用于类型推断。
+    """
+    file_size = os.path.getsize(file_path)
+    if file_size <= blocks * block_bytes:
+        shutil.copyfile(file_path, target_path)
+        return
+    step = (file_size - block_bytes) // (blocks - 1)
+    with open(file_path, "rb") as src, open(target_path, "wb") as dst:
+        for index in range(blocks):
+            offset = file_size - block_bytes if index == blocks - 1 else index * step
+            src.seek(offset)
+            chunk = src.read(block_bytes)
+            at_eof = src.tell() >= file_size
+            if index > 0:
+                newline = chunk.find(b"\n")
+                chunk = chunk[newline + 1:] if newline >= 0 else b""
+            if not at_eof:
+                newline = chunk.rfind(b"\n")
+                chunk = chunk[: newline + 1] if newline >= 0 else b""
+            if chunk and not chunk.endswith(b"\n"):
+                chunk += b"\n"
+            dst.write(chunk)
+
+
+def _sniff_csv_types_from_sample(
+    connection, file_path: str, options: Dict[str, Any]
+) -> Optional[Dict[str, str]]:
+    """在分层抽样上推断 CSV 列类型，返回可直接作为 read_csv ``types`` 参数的字典。
+
+    文件较小（全文件嗅探代价很低）、不是本地文件或抽样无法解析时返回 None。
+    """
+    if not os.path.isfile(file_path) or is_compressed(file_path):
+        return None
+    if os.path.getsize(file_path) <= CSV_SNIFF_FULL_SCAN_MAX_BYTES:
+        return None
+
+    fd, sample_path = tempfile.mkstemp(prefix="csv_sniff_", suffix=".csv")
+    os.close(fd)
+    try:
+        _write_stratified_csv_sample(
+            file_path, sample_path, CSV_SNIFF_SAMPLE_BLOCKS, CSV_SNIFF_BLOCK_BYTES
+        )
+        sniff_options = {**options, "SAMPLE_SIZE": -1}
+        invocation = _build_reader_invocation("read_csv_auto", sniff_options)
+        rows = connection.execute(f"DESCRIBE SELECT * FROM {invocation}", [sample_path]).fetchall()
+        return {row[0]: row[1] for row in rows}
+    except Exception as exc:
+        logger.info("Stratified CSV sniff failed for %s, using full scan: %s", file_path, exc)
+        return None
+    finally:
+        os.remove(sample_path)
+
+
 def load_file_to_duckdb(
     connection,
     table_name: str,
-    file_path: str,
+    file_path: Union[str, List[str]],
     file_type: Optional[str] = None,
     reader_options: Optional[Dict[str, Any]] = None,
     drop_existing: bool = True,
@@ -350,7 +562,7 @@ def load_file_to_duckdb(
     Args:
         connection: DuckDBconnection实例
         table_name: 目标table名
-        file_path: 本地filepath
+        file_path: 本地filepath（.gz/.zst/.bz2/.zip 压缩文件按内层格式读取）；也可以是同格式文件列表
         file_type: 可选file类型；缺省时自动根据扩展名推断
         reader_options: 传递给read_*函数的额外parameter
         drop_existing: 是否在creating前deleting旧table
@@ -364,7 +576,7 @@ def load_file_to_duckdb(
     normalized_type = (file_type or detect_file_type(file_path) or "").lower()
 
     native_readers = {
-        "csv": ("read_csv_auto", {"HEADER": True, "SAMPLE_SIZE": -1}),
+        "csv": ("read_csv_auto", {"HEADER": True}),
         "json": (
             "read_json_auto",
             {"format": "auto", "maximum_depth": 10},
@@ -380,39 +592,114 @@ def load_file_to_duckdb(
     if normalized_type not in native_readers:
         raise ValueError(f"Unsupported file type: {normalized_type}")
 
+    if isinstance(file_path, str) and requires_decompression(file_path, normalized_type):
+        # bz2/zip 等 DuckDB 不能原生解压的文件先流式解压到临时目录
+        with decompressed_paths(file_path, normalized_type) as plain_paths:
+            return load_file_to_duckdb(
+                connection,
+                table_name,
+                plain_paths,
+                normalized_type,
+                reader_options=reader_options,
+                drop_existing=drop_existing,
+            )
+
     function_name, defaults = native_readers[normalized_type]
     merged_options = defaults.copy()
 
-    # 对于 CSV 文件，先检测编码
-    if normalized_type == "csv":
+    # 对于非 UTF-8 的 CSV 文件，先流式转码为 UTF-8 临时文件，再按严格模式解析
+    single_file = isinstance(file_path, str) and os.path.isfile(file_path)
+    read_path = file_path
+    transcoded_path = None
+    option_keys = {str(key).lower() for key in (reader_options or {})}
+    if normalized_type == "csv" and "encoding" not in option_keys and single_file:
         detected_encoding = _detect_csv_encoding(file_path)
         if detected_encoding:
-            merged_options["encoding"] = detected_encoding
-            # 非 UTF-8 编码的 CSV 文件需要 strict_mode=false 以正确处理引号
-            merged_options["strict_mode"] = False
-            logger.info(f"Using encoding '{detected_encoding}' for CSV file: {file_path}")
+            fd, transcoded_path = tempfile.mkstemp(prefix="csv_utf8_", suffix=".csv")
+            os.close(fd)
+            try:
+                started = time.perf_counter()
+                transcode_to_utf8(file_path, detected_encoding, transcoded_path)
+                read_path = transcoded_path
+                logger.info(
+                    "Transcoded CSV %s from %s to UTF-8 in %.2fs",
+                    file_path,
+                    detected_encoding,
+                    time.perf_counter() - started,
+                )
+            except (UnicodeDecodeError, LookupError) as exc:
+                # 转码失败时退回 DuckDB 自带的编码解析
+                logger.warning(
+                    "Failed to transcode %s from %s, using DuckDB encoding option: %s",
+                    file_path,
+                    detected_encoding,
+                    exc,
+                )
+                os.remove(transcoded_path)
+                transcoded_path = None
+                merged_options["encoding"] = _DUCKDB_ENCODING_NAMES.get(
+                    detected_encoding, detected_encoding.upper()
+                )
+                merged_options["strict_mode"] = False
 
     if reader_options:
         merged_options.update(reader_options)
 
     quoted_table = _quote_identifier(table_name)
-    invocation = _build_reader_invocation(function_name, merged_options)
-    load_sql = f"CREATE TABLE {quoted_table} AS SELECT * FROM {invocation}"
 
     if drop_existing:
         connection.execute(f"DROP TABLE IF EXISTS {quoted_table}")
+        invalidate_table_metadata_cache(table_name)
 
     try:
-        connection.execute(load_sql, [file_path])
+        # CSV 先按抽样推断的类型单遍加载，只有实际出现类型转换错误时才全文件推断后重载
+        load_attempts = [merged_options]
+        if normalized_type == "csv" and "sample_size" not in option_keys:
+            full_scan_options = {**merged_options, "SAMPLE_SIZE": -1}
+            if "types" in option_keys:
+                load_attempts = [full_scan_options]
+            elif single_file and not is_compressed(read_path):
+                sampled_types = _sniff_csv_types_from_sample(connection, read_path, merged_options)
+                load_attempts = (
+                    [{**merged_options, "types": sampled_types}, full_scan_options]
+                    if sampled_types
+                    else [full_scan_options]
+                )
+            else:
+                load_attempts = [merged_options, full_scan_options]
+
+        for attempt, options in enumerate(load_attempts, start=1):
+            invocation = _build_reader_invocation(function_name, options)
+            load_sql = f"CREATE TABLE {quoted_table} AS SELECT * FROM {invocation}"
+            try:
+                connection.execute(load_sql, [read_path])
+                break
+            except _CSV_SCHEMA_MISMATCH_ERRORS as exc:
+                if attempt == len(load_attempts):
+                    raise
+                logger.info(
+                    "Sampled CSV schema did not fit %s, reloading with full-file type detection: %s",
+                    file_path,
+                    exc,
+                )
+        invalidate_table_metadata_cache(table_name)
         logger.info("Loaded file %s using DuckDB %s", file_path, function_name)
         return {"fallback_used": False, "engine": "duckdb"}
     except Exception as native_error:
         logger.warning(
             "DuckDB native read failed for %s, falling back to pandas: %s", file_path, native_error
         )
+    finally:
+        if transcoded_path and os.path.exists(transcoded_path):
+            os.remove(transcoded_path)
 
     # pandas fallback
-    df = read_file_by_type(file_path, normalized_type)
+    if isinstance(file_path, str):
+        df = read_file_by_type(file_path, normalized_type)
+    else:
+        df = pd.concat(
+            [read_file_by_type(path, normalized_type) for path in file_path], ignore_index=True
+        )
     temp_view = f"tmp_{table_name}_{int(time.time())}"
     try:
         connection.register(temp_view, df)
@@ -422,6 +709,7 @@ def load_file_to_duckdb(
         connection.execute(
             f"CREATE TABLE {quoted_table} AS SELECT * FROM {source_ref}"
         )
+        invalidate_table_metadata_cache(table_name)
         logger.info("Created table %s via pandas fallback", table_name)
         return {"fallback_used": True, "engine": "pandas"}
     finally:
@@ -0,0 +1,481 @@
+"""
+文件增量导入
+支持 replace / append / upsert 三种模式：新批次先落到暂存表，按列名并入已有表，
+新增列与类型放宽自动完成；只对新批次采集列画像并与已有画像合并，高水位记录在
+system_file_datasources.import_state 中，使每日导入的代价只与新数据量相关。
+upsert 续传时重读与水位相同及回看范围内的行；append 只读取严格大于水位的行（见 watermark_resume_bound）。
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+import duckdb
+
+from core.common.config_manager import config_manager
+from core.common.timezone_utils import get_current_time_iso
+from core.data.file_datasource_manager import (
+    SYSTEM_STAGING_PREFIX,
+    _collect_column_profiles,
+    _format_value,
+    _quote_identifier,
+    build_table_metadata_snapshot,
+    load_file_into_table,
+    promote_staging_table,
+)
+from core.data.ingest_cache import prepare_table_rewrite
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
+
+logger = logging.getLogger(__name__)
+
+INCREMENTAL_IMPORT_MODES = {"replace", "append", "upsert"}
+STAGING_TABLE_PREFIX = f"{SYSTEM_STAGING_PREFIX}import_"
+
+
+def _table_columns(con: duckdb.DuckDBPyConnection, table_name: str) -> Dict[str, str]:
+    rows = con.execute(f"DESCRIBE {_quote_identifier(table_name)}").fetchall()
+    return {row[0]: row[1] for row in rows}
+
+
+def _shift_watermark(mark: Any, lookback: float) -> Any:
+    """把水位往回移动 lookback：数值水位减去该值，时间水位减去同样的秒数，其他水位不移动"""
+    if not lookback or isinstance(mark, bool):
+        return mark
+    if isinstance(mark, int):
+        return mark - math.ceil(lookback)
+    if isinstance(mark, float):
+        return mark - lookback
+    text = str(mark)
+    try:
+        return format(Decimal(text) - Decimal(str(lookback)), "f")
+    except InvalidOperation:
+        pass
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        return mark
+    shifted = moment - timedelta(seconds=lookback)
+    if len(text) == 10:
+        return shifted.date().isoformat()
+    return shifted.isoformat(sep="T" if "T" in text else " ")
+
+
+def watermark_resume_bound(mode: str, high_water_mark: Any) -> Tuple[str, Any]:
+    """续传时要重新读取的行：返回 (比较运算符, 水位下界)，条件为 ``水位列 <运算符> 下界``
+
+    upsert 按主键覆盖，重读的行不会重复：保留 >= 水位 - incremental_watermark_lookback 的行，
+    与上次水位相同、或提交较晚而水位较小（在回看范围内）的行会在下次补上。
+    append 重读会产生重复行，只能保留严格大于水位的行：与上次水位相同的后续行、
+    迟到的较小水位都会被永久漏掉，需要不丢行时应提供主键改用 upsert。
+    """
+    if mode != "upsert":
+        return ">", high_water_mark
+    lookback = float(config_manager.get_app_config().incremental_watermark_lookback or 0)
+    return ">=", _shift_watermark(high_water_mark, max(lookback, 0))
+
+
+def _table_exists(con: duckdb.DuckDBPyConnection, table_name: str) -> bool:
+    return bool(
+        con.execute(
+            "SELECT 1 FROM duckdb_tables() WHERE table_name = ?", [table_name]
+        ).fetchone()
+    )
+
+
+def widen_duckdb_type(con: duckdb.DuckDBPyConnection, current: str, incoming: str) -> str:
+    """返回能同时容纳两种类型的最窄类型（由 DuckDB 的隐式转换规则决定），无公共类型时为 VARCHAR"""
+    if current == incoming:
+        return current
+    try:
+        return con.execute(
+            f"SELECT typeof([NULL::{current}, NULL::{incoming}][1])"
+        ).fetchone()[0]
+    except duckdb.Error:
+        return "VARCHAR"
+
+
+def evolve_table_schema(
+    con: duckdb.DuckDBPyConnection, table_name: str, staging_table: str
+) -> Dict[str, List[str]]:
+    """让目标表能容纳暂存表的数据：补齐新增列，放宽类型不兼容的列"""
+    target_columns = _table_columns(con, table_name)
+    quoted_table = _quote_identifier(table_name)
+    added: List[str] = []
+    widened: List[str] = []
+
+    for name, incoming_type in _table_columns(con, staging_table).items():
+        quoted_column = _quote_identifier(name)
+        current_type = target_columns.get(name)
+        if current_type is None:
+            con.execute(f"ALTER TABLE {quoted_table} ADD COLUMN {quoted_column} {incoming_type}")
+            added.append(name)
+            continue
+        widened_type = widen_duckdb_type(con, current_type, incoming_type)
+        if widened_type != current_type:
+            con.execute(f"ALTER TABLE {quoted_table} ALTER {quoted_column} TYPE {widened_type}")
+            widened.append(name)
+
+    return {"added_columns": added, "widened_columns": widened}
+
+
+def _null_counts(
+    con: duckdb.DuckDBPyConnection, from_sql: str, columns: Sequence[str]
+) -> Dict[str, int]:
+    if not columns:
+        return {}
+    selects = ", ".join(
+        f"COUNT(*) - COUNT({_quote_identifier(name)})" for name in columns
+    )
+    row = con.execute(f"SELECT {selects} {from_sql}").fetchone()
+    return {name: int(value or 0) for name, value in zip(columns, row)}
+
+
+def _combine_bound(current: Any, incoming: Any, pick) -> Any:
+    if current is None:
+        return incoming
+    if incoming is None:
+        return current
+    try:
+        return pick(current, incoming)
+    except TypeError:
+        # 类型放宽后新旧值不可比较，以新批次为准
+        return incoming
+
+
+def merge_column_profiles(
+    existing_profiles: Sequence[Dict[str, Any]],
+    batch_profiles: Sequence[Dict[str, Any]],
+    column_types: Dict[str, str],
+    previous_rows: int,
+    batch_rows: int,
+    removed_rows: int = 0,
+    removed_nulls: Optional[Dict[str, int]] = None,
+    sample_limit: int = 6,
+) -> List[Dict[str, Any]]:
+    """把新批次的列画像并入已有画像
+
+    null_count 精确累加；min/max 取并集（upsert 替换掉的行可能让它们成为宽松边界）；
+    distinct_count 无法增量合并，取两者较大值作为下界估计。
+    """
+    removed_nulls = removed_nulls or {}
+    existing_by_name = {profile["name"]: profile for profile in existing_profiles or []}
+    batch_by_name = {profile["name"]: profile for profile in batch_profiles}
+    kept_rows = previous_rows - removed_rows
+    merged = []
+
+    for name, duckdb_type in column_types.items():
+        old = existing_by_name.get(name)
+        new = batch_by_name.get(name)
+        old_stats = (old or {}).get("statistics") or {}
+        new_stats = (new or {}).get("statistics") or {}
+
+        if old is None:
+            # 新增列：已有行全部为 NULL
+            old_nulls = kept_rows
+        elif old_stats.get("null_count") is None:
+            old_nulls = None
+        else:
+            old_nulls = old_stats["null_count"] - removed_nulls.get(name, 0)
+        if new is None:
+            # 新批次缺少该列：新插入的行全部为 NULL
+            new_nulls = batch_rows
+        else:
+            new_nulls = new_stats.get("null_count")
+        null_count = None if old_nulls is None or new_nulls is None else old_nulls + new_nulls
+
+        distinct_values = [
+            value
+            for value in (old_stats.get("distinct_count"), new_stats.get("distinct_count"))
+            if value is not None
+        ]
+        samples = list((old or {}).get("sample_values") or [])
+        for value in (new or {}).get("sample_values") or []:
+            if len(samples) >= sample_limit:
+                break
+            if value not in samples:
+                samples.append(value)
+
+        source = new or old or {}
+        merged.append(
+            {
+                "name": name,
+                "duckdb_type": duckdb_type,
+                "nullable": bool((old or {}).get("nullable", True) or (new or {}).get("nullable", True)),
+                "precision": source.get("precision"),
+                "scale": source.get("scale"),
+                "sample_values": samples,
+                "statistics": {
+                    "null_count": null_count,
+                    "distinct_count": max(distinct_values) if distinct_values else None,
+                    "min": _combine_bound(old_stats.get("min"), new_stats.get("min"), min),
+                    "max": _combine_bound(old_stats.get("max"), new_stats.get("max"), max),
+                },
+            }
+        )
+
+    return merged
+
+
+def _deduplicate_upsert_batch(
+    con: duckdb.DuckDBPyConnection,
+    staging_table: str,
+    key_columns: Sequence[str],
+    watermark_column: Optional[str],
+) -> int:
+    """upsert 前整理暂存表：每个主键只保留一行，主键含 NULL 的行无法匹配，直接跳过
+
+    同一主键出现多次时保留水位最大的一行（水位相同或没有水位列时保留批次中靠后的一行）。
+    返回跳过的 NULL 主键行数。
+    """
+    quoted_stage = _quote_identifier(staging_table)
+    null_filter = " OR ".join(f"{_quote_identifier(column)} IS NULL" for column in key_columns)
+    skipped = con.execute(f"DELETE FROM {quoted_stage} WHERE {null_filter}").fetchone()[0]
+    if skipped:
+        logger.warning(
+            "Skipped %s row(s) with NULL key columns %s in %s", skipped, key_columns, staging_table
+        )
+
+    order_by = "rowid DESC"
+    if watermark_column:
+        order_by = f"{_quote_identifier(watermark_column)} DESC NULLS LAST, {order_by}"
+    partition_by = ", ".join(_quote_identifier(column) for column in key_columns)
+    con.execute(
+        f"DELETE FROM {quoted_stage} WHERE rowid IN ("
+        f"SELECT rowid FROM {quoted_stage} QUALIFY row_number() OVER "
+        f"(PARTITION BY {partition_by} ORDER BY {order_by}) > 1)"
+    )
+    return int(skipped)
+
+
+def merge_staging_table(
+    con: duckdb.DuckDBPyConnection,
+    staging_table: str,
+    table_name: str,
+    mode: str,
+    key_columns: Optional[Sequence[str]] = None,
+    watermark_column: Optional[str] = None,
+    high_water_mark: Any = None,
+    existing_profiles: Optional[Sequence[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """将暂存表按 append / upsert 并入目标表，返回表元数据与本批次的导入状态
+
+    目标表不存在时暂存表直接改名为目标表。暂存表在调用结束后被删除或改名。
+    """
+    if mode not in {"append", "upsert"}:
+        raise ValueError(f"Unsupported incremental import mode: {mode}")
+    key_columns = list(key_columns or [])
+    if mode == "upsert" and not key_columns:
+        raise ValueError("Upsert import requires at least one key column")
+
+    quoted_stage = _quote_identifier(staging_table)
+    quoted_table = _quote_identifier(table_name)
+    staging_columns = _table_columns(con, staging_table)
+
+    for column in key_columns + ([watermark_column] if watermark_column else []):
+        if column not in staging_columns:
+            raise ValueError(f"Column '{column}' not found in imported file")
+
+    # 只保留需要续传的行（见 watermark_resume_bound）
+    if watermark_column and high_water_mark is not None:
+        quoted_mark = _quote_identifier(watermark_column)
+        operator, bound = watermark_resume_bound(mode, high_water_mark)
+        con.execute(
+            f"DELETE FROM {quoted_stage} WHERE {quoted_mark} IS NULL OR NOT ({quoted_mark} "
+            f"{operator} CAST(? AS {staging_columns[watermark_column]}))",
+            [bound],
+        )
+
+    skipped_null_keys = 0
+    if mode == "upsert":
+        skipped_null_keys = _deduplicate_upsert_batch(
+            con, staging_table, key_columns, watermark_column
+        )
+
+    batch_rows = con.execute(f"SELECT COUNT(*) FROM {quoted_stage}").fetchone()[0]
+    batch_mark = None
+    if watermark_column:
+        batch_mark = _format_value(
+            con.execute(f"SELECT MAX({_quote_identifier(watermark_column)}) FROM {quoted_stage}").fetchone()[0]
+        )
+    new_mark = _combine_bound(high_water_mark, batch_mark, max)
+
+    # 以视图链接到本表的重复上传保留写入前的数据
+    prepare_table_rewrite(con, table_name, keep_data=True)
+    if not _table_exists(con, table_name):
+        promote_staging_table(con, staging_table, table_name)
+        metadata = build_table_metadata_snapshot(con, table_name)
+        metadata["import_state"] = {
+            "mode": mode,
+            "key_columns": key_columns,
+            "watermark_column": watermark_column,
+            "high_water_mark": new_mark,
+            "last_import_rows": int(batch_rows),
+            "last_replaced_rows": 0,
+            "skipped_null_keys": skipped_null_keys,
+            "added_columns": [],
+            "widened_columns": [],
+        }
+        return metadata
+
+    # 只对新批次采集列画像
+    batch_profiles = [profile.to_dict() for profile in _collect_column_profiles(con, staging_table)]
+    previous_rows = con.execute(f"SELECT COUNT(*) FROM {quoted_table}").fetchone()[0]
+
+    removed_rows = 0
+    removed_nulls: Dict[str, int] = {}
+    con.execute("BEGIN TRANSACTION")
+    try:
+        schema_changes = evolve_table_schema(con, table_name, staging_table)
+        target_columns = _table_columns(con, table_name)
+
+        if mode == "upsert" and batch_rows:
+            missing_keys = [column for column in key_columns if column not in target_columns]
+            if missing_keys:
+                raise ValueError(f"Key columns not found in table {table_name}: {missing_keys}")
+            match_sql = " AND ".join(
+                f"t.{_quote_identifier(column)} = s.{_quote_identifier(column)}"
+                for column in key_columns
+            )
+            matched_sql = (
+                f"FROM {quoted_table} t WHERE EXISTS "
+                f"(SELECT 1 FROM {quoted_stage} s WHERE {match_sql})"
+            )
+            existing_names = [
+                name for name in target_columns if name not in schema_changes["added_columns"]
+            ]
+            removed_rows = con.execute(f"SELECT COUNT(*) {matched_sql}").fetchone()[0]
+            if removed_rows:
+                removed_nulls = _null_counts(con, matched_sql, existing_names)
+                con.execute(f"DELETE FROM {quoted_table} t USING {quoted_stage} s WHERE {match_sql}")
+
+        con.execute(f"INSERT INTO {quoted_table} BY NAME SELECT * FROM {quoted_stage}")
+        con.execute("COMMIT")
+    except Exception:  # pylint: disable=broad-exception-caught
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.execute(f"DROP TABLE IF EXISTS {quoted_stage}")
+    invalidate_table_metadata_cache(table_name)
+
+    if existing_profiles:
+        profiles = merge_column_profiles(
+            existing_profiles,
+            batch_profiles,
+            target_columns,
+            int(previous_rows),
+            int(batch_rows),
+            removed_rows=int(removed_rows),
+            removed_nulls=removed_nulls,
+        )
+        metadata = {
+            "row_count": int(previous_rows - removed_rows + batch_rows),
+            "column_count": len(profiles),
+            "columns": [profile["name"] for profile in profiles],
+            "column_profiles": profiles,
+            "schema_version": 2,
+        }
+    else:
+        # 没有历史画像可合并时才对整表重新采集
+        metadata = build_table_metadata_snapshot(con, table_name)
+
+    metadata["import_state"] = {
+        "mode": mode,
+        "key_columns": key_columns,
+        "watermark_column": watermark_column,
+        "high_water_mark": new_mark,
+        "last_import_rows": int(batch_rows),
+        "last_replaced_rows": int(removed_rows),
+        "skipped_null_keys": skipped_null_keys,
+        **schema_changes,
+    }
+    logger.info(
+        "Merged %s rows into %s (%s, replaced %s, added columns %s, widened %s)",
+        batch_rows,
+        table_name,
+        mode,
+        removed_rows,
+        schema_changes["added_columns"],
+        schema_changes["widened_columns"],
+    )
+    return metadata
+
+
+def import_file_incrementally(
+    con: duckdb.DuckDBPyConnection,
+    table_name: str,
+    file_path: str,
+    file_type: str,
+    mode: str = "append",
+    key_columns: Optional[Sequence[str]] = None,
+    watermark_column: Optional[str] = None,
+    previous: Optional[Dict[str, Any]] = None,
+    reader_options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """按指定模式导入文件
+
+    Args:
+        previous: 目标表已保存的 system_file_datasources 记录，用于读取高水位与历史列画像
+    Returns:
+        表元数据，包含 ``import_state``，调用方应随元数据一起保存
+    """
+    mode = (mode or "replace").lower()
+    if mode not in INCREMENTAL_IMPORT_MODES:
+        raise ValueError(f"Unsupported import mode: {mode}")
+
+    previous = previous or {}
+    previous_state = previous.get("import_state") or {}
+    if mode == "replace":
+        load_file_into_table(con, table_name, file_path, file_type, reader_options=reader_options)
+        metadata = build_table_metadata_snapshot(con, table_name)
+        new_mark = None
+        if watermark_column:
+            if watermark_column not in metadata["columns"]:
+                raise ValueError(f"Column '{watermark_column}' not found in imported file")
+            new_mark = _format_value(
+                con.execute(
+                    f"SELECT MAX({_quote_identifier(watermark_column)}) FROM {_quote_identifier(table_name)}"
+                ).fetchone()[0]
+            )
+        metadata["import_state"] = {
+            "mode": mode,
+            "key_columns": list(key_columns or []),
+            "watermark_column": watermark_column,
+            "high_water_mark": new_mark,
+            "last_import_rows": metadata["row_count"],
+            "last_replaced_rows": 0,
+            "added_columns": [],
+            "widened_columns": [],
+        }
+    else:
+        # 高水位只在同一水位列上延续
+        high_water_mark = (
+            previous_state.get("high_water_mark")
+            if watermark_column and previous_state.get("watermark_column") == watermark_column
+            else None
+        )
+        staging_table = f"{STAGING_TABLE_PREFIX}{uuid4().hex}"
+        try:
+            load_file_into_table(
+                con, staging_table, file_path, file_type, reader_options=reader_options
+            )
+            metadata = merge_staging_table(
+                con,
+                staging_table,
+                table_name,
+                mode,
+                key_columns=key_columns,
+                watermark_column=watermark_column,
+                high_water_mark=high_water_mark,
+                existing_profiles=previous.get("column_profiles") if previous else None,
+            )
+        finally:
+            con.execute(f"DROP TABLE IF EXISTS {_quote_identifier(staging_table)}")
+
+    metadata["import_state"]["last_import_at"] = get_current_time_iso()
+    metadata["import_state"]["batches"] = (
+        int(previous_state.get("batches") or 0) + 1 if mode != "replace" else 1
+    )
+    return metadata
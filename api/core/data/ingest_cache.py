@@ -0,0 +1,254 @@
+"""
+内容寻址的导入缓存
+以文件内容哈希 + 文件类型 + 读取选项作为键：再次上传内容相同的文件时，新的表名以视图链接到已导入的物理表，
+跳过解析与列画像，直接复用已保存的元数据。删除物理表时，由第一个链接者接管该表，其余链接改指向它；
+原地改写物理表（替换/追加/合并导入、暂存表替换、启动重载、粘贴覆盖、SQL 编辑器中的 DDL/DML）之前
+同样先把原数据移交给链接者，链接的内容不随之改变。
+"""
+
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import duckdb
+
+from core.data.file_datasource_manager import _quote_identifier, file_datasource_manager
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
+
+logger = logging.getLogger(__name__)
+
+LINKED_VIEW_STORAGE = "linked_view"
+
+
+def build_ingest_key(
+    content_hash: str, file_type: str, reader_options: Optional[Dict[str, Any]] = None
+) -> str:
+    """导入缓存键：内容相同但读取方式不同（类型、读取选项）的文件不能共用一张表"""
+    payload = json.dumps(
+        {
+            "hash": content_hash,
+            "type": (file_type or "").lower(),
+            "options": reader_options or {},
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _table_exists(con: duckdb.DuckDBPyConnection, table_name: str) -> bool:
+    return (
+        con.execute(
+            "SELECT 1 FROM duckdb_tables() WHERE table_name = ?", [table_name]
+        ).fetchone()
+        is not None
+    )
+
+
+def _view_exists(con: duckdb.DuckDBPyConnection, view_name: str) -> bool:
+    return (
+        con.execute(
+            "SELECT 1 FROM duckdb_views() WHERE view_name = ? AND NOT internal", [view_name]
+        ).fetchone()
+        is not None
+    )
+
+
+def _physical_table(config: Dict[str, Any]) -> str:
+    metadata = config.get("metadata") or {}
+    if metadata.get("storage") == LINKED_VIEW_STORAGE:
+        return metadata.get("linked_table") or config["source_id"]
+    return config["source_id"]
+
+
+def find_cached_ingest(
+    con: duckdb.DuckDBPyConnection, content_hash: str, ingest_key: str
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """查找键相同且物理表仍存在的导入结果，返回 (物理表名, 数据源配置)
+
+    链接记录自身的 ingest_key 可能已过时，还要求物理表自己的记录仍是同一个键（未被改写过）。
+    """
+    if not content_hash:
+        return None
+    for config in file_datasource_manager.list_file_datasources({"file_hash": content_hash}):
+        if (config.get("metadata") or {}).get("ingest_key") != ingest_key:
+            continue
+        physical = _physical_table(config)
+        if physical != config["source_id"]:
+            owner = file_datasource_manager.get_file_datasource(physical) or {}
+            if (owner.get("metadata") or {}).get("ingest_key") != ingest_key:
+                continue
+        if _table_exists(con, physical):
+            return physical, config
+    return None
+
+
+def link_cached_ingest(
+    con: duckdb.DuckDBPyConnection,
+    table_name: str,
+    physical_table: str,
+    cached_config: Dict[str, Any],
+) -> Dict[str, Any]:
+    """把 table_name 以视图链接到已导入的物理表，返回与 create_table_from_dataframe 相同结构的元数据"""
+    con.execute(
+        f"CREATE OR REPLACE VIEW {_quote_identifier(table_name)} AS "
+        f"SELECT * FROM {_quote_identifier(physical_table)}"
+    )
+    invalidate_table_metadata_cache(table_name)
+    logger.info("Linked %s to previously imported table %s", table_name, physical_table)
+    return {
+        "row_count": cached_config.get("row_count") or 0,
+        "column_count": cached_config.get("column_count") or 0,
+        "columns": cached_config.get("columns") or [],
+        "column_profiles": cached_config.get("column_profiles"),
+        "schema_version": cached_config.get("schema_version", 2),
+        "linked_table": physical_table,
+    }
+
+
+def ingest_cache_metadata(ingest_key: str, linked_table: Optional[str] = None) -> Dict[str, Any]:
+    """写入数据源 metadata 的缓存字段"""
+    if linked_table is None:
+        return {"ingest_key": ingest_key}
+    return {
+        "ingest_key": ingest_key,
+        "storage": LINKED_VIEW_STORAGE,
+        "linked_table": linked_table,
+    }
+
+
+def _linked_sources(table_name: str) -> List[Dict[str, Any]]:
+    config = file_datasource_manager.get_file_datasource(table_name)
+    if not config or not config.get("file_hash"):
+        return []
+    return [
+        candidate
+        for candidate in file_datasource_manager.list_file_datasources(
+            {"file_hash": config["file_hash"]}
+        )
+        if candidate["source_id"] != table_name
+        and (candidate.get("metadata") or {}).get("storage") == LINKED_VIEW_STORAGE
+        and (candidate.get("metadata") or {}).get("linked_table") == table_name
+    ]
+
+
+def release_linked_table(con: duckdb.DuckDBPyConnection, table_name: str) -> Optional[str]:
+    """删除物理表前调用：仍有链接视图时把表改名给第一个链接者，其余视图改指向它
+
+    返回接管该表的数据源名；没有链接者时返回 None，调用方照常删除。
+    """
+    linked = _linked_sources(table_name)
+    if not linked or not _table_exists(con, table_name):
+        return None
+
+    successor, others = linked[0], linked[1:]
+    successor_id = successor["source_id"]
+    quoted_successor = _quote_identifier(successor_id)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(f"DROP VIEW IF EXISTS {quoted_successor}")
+        con.execute(f"ALTER TABLE {_quote_identifier(table_name)} RENAME TO {quoted_successor}")
+        for other in others:
+            con.execute(
+                f"CREATE OR REPLACE VIEW {_quote_identifier(other['source_id'])} AS "
+                f"SELECT * FROM {quoted_successor}"
+            )
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+    successor_meta = dict(successor.get("metadata") or {})
+    successor_meta.pop("linked_table", None)
+    successor_meta["storage"] = "table"
+    file_datasource_manager.save_file_datasource({**successor, "metadata": successor_meta})
+    for other in others:
+        file_datasource_manager.save_file_datasource(
+            {**other, "metadata": {**(other.get("metadata") or {}), "linked_table": successor_id}}
+        )
+
+    for name in [table_name, successor_id] + [other["source_id"] for other in others]:
+        invalidate_table_metadata_cache(name)
+    logger.info(
+        "Table %s handed over to linked datasource %s (%d other link(s) repointed)",
+        table_name,
+        successor_id,
+        len(others),
+    )
+    return successor_id
+
+
+def prepare_table_rewrite(
+    con: duckdb.DuckDBPyConnection, table_name: str, keep_data: bool = False
+) -> Optional[str]:
+    """原地改写表 table_name 之前调用，保证以视图链接到它的数据源内容不变
+
+    - 仍有链接者时，现有数据先移交给第一个链接者（同 :func:`release_linked_table`）；
+      keep_data=True（追加/合并写入）时再复制一份留给 table_name。
+    - table_name 自己是链接视图时，把它物化为独立的表（keep_data=False 时直接删除视图）。
+    - 清除该表记录中的 ingest_key：改写后的内容不再对应原文件，不能再被新的上传链接。
+
+    返回接管原数据的数据源名，没有移交时返回 None。
+    """
+    config = file_datasource_manager.get_file_datasource(table_name)
+    if not config:
+        return None
+    original = config.get("metadata") or {}
+    metadata = dict(original)
+    quoted_table = _quote_identifier(table_name)
+
+    successor = None
+    if metadata.get("storage") == LINKED_VIEW_STORAGE:
+        if _view_exists(con, table_name):
+            detached = f"{table_name}_{uuid4().hex[:8]}"
+            con.execute("BEGIN TRANSACTION")
+            try:
+                if keep_data:
+                    con.execute(
+                        f"CREATE TABLE {_quote_identifier(detached)} AS SELECT * FROM {quoted_table}"
+                    )
+                con.execute(f"DROP VIEW {quoted_table}")
+                if keep_data:
+                    con.execute(
+                        f"ALTER TABLE {_quote_identifier(detached)} RENAME TO {quoted_table}"
+                    )
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+        metadata.pop("linked_table", None)
+        metadata["storage"] = "table"
+    else:
+        successor = release_linked_table(con, table_name)
+        if successor and keep_data:
+            con.execute(
+                f"CREATE TABLE {quoted_table} AS SELECT * FROM {_quote_identifier(successor)}"
+            )
+
+    metadata.pop("ingest_key", None)
+    if metadata != original:
+        file_datasource_manager.save_file_datasource({**config, "metadata": metadata})
+    invalidate_table_metadata_cache(table_name)
+    return successor
+
+
+def prepare_statement_rewrite(con: duckdb.DuckDBPyConnection, sql_text: str) -> List[str]:
+    """执行用户编写的 DDL/DML 之前调用：SQL 中出现的、参与导入缓存的表都先按改写处理
+
+    无法从 SQL 文本精确判断哪些表会被修改，凡是以标识符形式出现的都视为可能被改写
+    （链接内容移交，ingest_key 清除）。返回处理过的表名。
+    """
+    prepared = []
+    for config in file_datasource_manager.list_file_datasources():
+        metadata = config.get("metadata") or {}
+        if not metadata.get("ingest_key") and metadata.get("storage") != LINKED_VIEW_STORAGE:
+            continue
+        table_name = config["source_id"]
+        pattern = rf'(?<![\w"]){re.escape(table_name)}(?![\w"])|"{re.escape(table_name)}"'
+        if re.search(pattern, sql_text, flags=re.IGNORECASE):
+            prepare_table_rewrite(con, table_name, keep_data=True)
+            prepared.append(table_name)
+    return prepared
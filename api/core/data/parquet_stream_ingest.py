@@ -0,0 +1,219 @@
+"""
+Parquet边上传边导入
+分块上传时先取得文件尾部的footer，随后每个row group的字节范围到齐即读入DuckDB暂存表，
+上传完成时只需处理剩余的row group并改名为正式表。
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+from uuid import uuid4
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from core.data.file_datasource_manager import (
+    SYSTEM_STAGING_PREFIX,
+    _quote_identifier,
+    build_table_metadata_snapshot,
+    promote_staging_table,
+)
+from core.database.duckdb_engine import with_duckdb_connection
+
+logger = logging.getLogger(__name__)
+
+PARQUET_MAGIC = b"PAR1"
+PARQUET_TAIL_SIZE = 8  # footer长度(4字节) + magic(4字节)
+STAGING_TABLE_PREFIX = f"{SYSTEM_STAGING_PREFIX}upload_"
+
+
+def row_group_byte_range(row_group) -> Tuple[int, int]:
+    """Return the ``[start, end)`` byte range covering all column chunks of a row group."""
+    starts = []
+    ends = []
+    for index in range(row_group.num_columns):
+        column = row_group.column(index)
+        start = column.data_page_offset
+        if column.has_dictionary_page and column.dictionary_page_offset:
+            start = min(start, column.dictionary_page_offset)
+        starts.append(start)
+        ends.append(start + column.total_compressed_size)
+    if not starts:
+        return 0, 0
+    return min(starts), max(ends)
+
+
+class ParquetStreamIngestor:
+    """在后台线程中随分块到达逐个导入row group
+
+    分块的到达通过 :meth:`notify_chunk` 通知；所有读取都直接作用于预分配的目标文件，
+    因此不需要额外的内存缓冲。暂存表在 :meth:`finalize` 时原子改名为正式表。
+    """
+
+    def __init__(
+        self,
+        upload_id: str,
+        target_path: str,
+        file_size: int,
+        chunk_size: int,
+        received: Iterable[int] = (),
+    ):
+        self.upload_id = upload_id
+        self.target_path = target_path
+        self.file_size = file_size
+        self.chunk_size = chunk_size
+        self.staging_table = f"{STAGING_TABLE_PREFIX}{uuid4().hex}"
+        self.num_row_groups: Optional[int] = None
+        self.row_groups_loaded = 0
+        self.rows_loaded = 0
+        self.error: Optional[Exception] = None
+        self._received = set(received)
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._staging_created = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"ParquetStream-{upload_id}", daemon=True
+        )
+
+    # ------------------------------------------------------------------ #
+    # Control
+    # ------------------------------------------------------------------ #
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def notify_chunk(self, chunk_number: int) -> None:
+        with self._condition:
+            self._received.add(chunk_number)
+            self._condition.notify_all()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for all row groups to be loaded; returns False on failure or timeout."""
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return False
+        return self.error is None and self.num_row_groups is not None
+
+    @property
+    def finished(self) -> bool:
+        return self.num_row_groups is not None and self.row_groups_loaded >= self.num_row_groups
+
+    def progress(self) -> Dict[str, Any]:
+        return {
+            "row_groups_total": self.num_row_groups,
+            "row_groups_loaded": self.row_groups_loaded,
+            "rows_loaded": self.rows_loaded,
+            "error": str(self.error) if self.error else None,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Finalization
+    # ------------------------------------------------------------------ #
+
+    def finalize(self, con, table_name: str) -> Dict[str, Any]:
+        """Rename the fully loaded staging table to ``table_name`` and return its metadata."""
+        if not self.finished or self.error is not None:
+            raise RuntimeError("Parquet streaming ingestion has not finished")
+
+        promote_staging_table(con, self.staging_table, table_name)
+        self._staging_created = False
+        return build_table_metadata_snapshot(con, table_name)
+
+    def discard(self) -> None:
+        """Stop the worker and drop the staging table."""
+        self.stop()
+        self._thread.join(timeout=30)
+        try:
+            with with_duckdb_connection() as con:
+                con.execute(f"DROP TABLE IF EXISTS {_quote_identifier(self.staging_table)}")
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            logger.warning("Failed to drop staging table %s: %s", self.staging_table, exc)
+
+    # ------------------------------------------------------------------ #
+    # Worker
+    # ------------------------------------------------------------------ #
+
+    def _range_available(self, start: int, end: int) -> bool:
+        if end <= start:
+            return True
+        first = start // self.chunk_size
+        last = (end - 1) // self.chunk_size
+        return all(chunk in self._received for chunk in range(first, last + 1))
+
+    def _wait_for_range(self, start: int, end: int) -> bool:
+        with self._condition:
+            while not self._range_available(start, end):
+                if self._stopped:
+                    return False
+                self._condition.wait(timeout=1.0)
+            return not self._stopped
+
+    def _read_tail(self) -> Optional[int]:
+        tail_start = self.file_size - PARQUET_TAIL_SIZE
+        if not self._wait_for_range(tail_start, self.file_size):
+            return None
+        with open(self.target_path, "rb") as handle:
+            handle.seek(tail_start)
+            tail = handle.read(PARQUET_TAIL_SIZE)
+        if tail[4:] != PARQUET_MAGIC:
+            raise ValueError("Not a parquet file: missing footer magic")
+        footer_length = int.from_bytes(tail[:4], "little")
+        footer_start = tail_start - footer_length
+        if footer_start < 0:
+            raise ValueError("Invalid parquet footer length")
+        if not self._wait_for_range(footer_start, self.file_size):
+            return None
+        return footer_start
+
+    def _append(self, table: pa.Table) -> None:
+        view_name = f"__arrow_{uuid4().hex[:8]}"
+        quoted_stage = _quote_identifier(self.staging_table)
+        with with_duckdb_connection() as con:
+            con.register(view_name, table)
+            try:
+                if self._staging_created:
+                    con.execute(f"INSERT INTO {quoted_stage} SELECT * FROM {_quote_identifier(view_name)}")
+                else:
+                    con.execute(
+                        f"CREATE TABLE {quoted_stage} AS SELECT * FROM {_quote_identifier(view_name)}"
+                    )
+                    self._staging_created = True
+            finally:
+                con.unregister(view_name)
+
+    def _run(self) -> None:
+        try:
+            if self._read_tail() is None:
+                return
+
+            parquet_file = pq.ParquetFile(self.target_path)
+            metadata = parquet_file.metadata
+            if metadata.num_row_groups == 0:
+                self._append(parquet_file.schema_arrow.empty_table())
+                self.num_row_groups = 0
+                return
+            self.num_row_groups = metadata.num_row_groups
+
+            for index in range(metadata.num_row_groups):
+                start, end = row_group_byte_range(metadata.row_group(index))
+                if not self._wait_for_range(start, end):
+                    return
+                table = parquet_file.read_row_group(index)
+                self._append(table)
+                self.row_groups_loaded += 1
+                self.rows_loaded += table.num_rows
+
+            logger.info(
+                "Parquet streaming ingestion finished for upload %s: %d row groups, %d rows",
+                self.upload_id,
+                self.row_groups_loaded,
+                self.rows_loaded,
+            )
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            logger.warning("Parquet streaming ingestion failed for upload %s: %s", self.upload_id, exc)
+            self.error = exc
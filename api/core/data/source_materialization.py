@@ -0,0 +1,291 @@
+"""
+查询数据源物化缓存
+/api/query 的文件数据源按 (路径, mtime, 大小) 物化为一张内部表，查询时数据源别名以视图指向它；
+文件未变化时后续查询直接复用，不再每次把整个文件重新导入 DuckDB。文件变化后自动重新物化并删除旧版本。
+物化表名由路径与版本确定性地生成（system_ 前缀，表列表中不显示），服务重启后仍可命中。
+
+数据库数据源没有 mtime 可用，按拉取时间保存带版本的快照：在有效期内直接复用；过期后若提供了探测函数
+（如远端 MAX(updated_at) 或校验和），探测值未变化则续期，否则重新拉取。快照状态只保存在进程内，重启后首次查询重新拉取。
+
+物化表总数超过 query_source_cache_max_entries 时按最近使用时间淘汰（LRU）；重启前留下、本进程尚未用过的表最先淘汰。
+删除物化表时，指向旧版本的别名视图改指新版本，被淘汰表的别名视图一并删除，下次查询时重新物化并绑定。
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import duckdb
+
+from core.common.config_manager import config_manager
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
+
+logger = logging.getLogger(__name__)
+
+SOURCE_CACHE_PREFIX = "system_source_cache_"
+
+_locks_guard = threading.Lock()
+_group_locks: Dict[str, threading.Lock] = {}
+
+
+@dataclass
+class SourceSnapshot:
+    table_name: str
+    fetched_at: float
+    probe_value: Any = None
+
+
+_snapshots: Dict[str, SourceSnapshot] = {}
+
+_usage_guard = threading.Lock()
+# 物化表名 -> (分组键, 最近使用时间)
+_last_used: Dict[str, Tuple[str, float]] = {}
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _digest(value: str, length: int) -> str:
+    return hashlib.md5(value.encode("utf-8")).hexdigest()[:length]
+
+
+def file_source_version(file_path: str, variant: str = "") -> Tuple[str, str]:
+    """文件数据源的 (分组键, 版本键)：分组键只取决于路径与读取方式，版本键随 mtime/大小变化"""
+    stat = os.stat(file_path)
+    group_key = f"file:{os.path.realpath(file_path)}:{variant}"
+    version_key = f"{stat.st_mtime_ns}:{stat.st_size}"
+    return group_key, version_key
+
+
+def cache_table_name(group_key: str, version_key: str) -> str:
+    return f"{SOURCE_CACHE_PREFIX}{_digest(group_key, 12)}_{_digest(version_key, 8)}"
+
+
+def _group_lock(group_key: str) -> threading.Lock:
+    with _locks_guard:
+        return _group_locks.setdefault(group_key, threading.Lock())
+
+
+def _object_type(con: duckdb.DuckDBPyConnection, name: str) -> str:
+    """返回 'table'、'view' 或空字符串"""
+    if con.execute(
+        "SELECT 1 FROM duckdb_tables() WHERE table_name = ? AND schema_name = current_schema()",
+        [name],
+    ).fetchone():
+        return "table"
+    if con.execute(
+        "SELECT 1 FROM duckdb_views() WHERE view_name = ? AND schema_name = current_schema() "
+        "AND NOT internal",
+        [name],
+    ).fetchone():
+        return "view"
+    return ""
+
+
+def _dependent_aliases(con: duckdb.DuckDBPyConnection, table_name: str) -> List[str]:
+    """返回当前以视图指向 table_name 的数据源别名（按视图定义查找，服务重启前留下的视图也能找到）"""
+    # 物化表名只含小写字母、数字和下划线，DuckDB 保存的视图定义里不会加引号
+    return [
+        row[0]
+        for row in con.execute(
+            "SELECT view_name FROM duckdb_views() WHERE schema_name = current_schema() "
+            "AND NOT internal AND ends_with(sql, ?)",
+            [f" AS SELECT * FROM {table_name};"],
+        ).fetchall()
+    ]
+
+
+def _drop_materialization(
+    con: duckdb.DuckDBPyConnection, table_name: str, successor: Optional[str] = None
+) -> None:
+    """删除物化表；指向它的别名视图改指 successor，没有 successor 时一并删除，避免留下失效的视图"""
+    for alias in _dependent_aliases(con, table_name):
+        if successor is not None:
+            bind_alias(con, alias, successor)
+        else:
+            con.execute(f"DROP VIEW IF EXISTS {_quote(alias)}")
+            invalidate_table_metadata_cache(alias)
+    con.execute(f"DROP TABLE IF EXISTS {_quote(table_name)}")
+    _forget(table_name)
+
+
+def _touch(group_key: str, table_name: str) -> None:
+    with _usage_guard:
+        _last_used[table_name] = (group_key, time.monotonic())
+
+
+def _forget(table_name: str) -> None:
+    with _usage_guard:
+        _last_used.pop(table_name, None)
+    invalidate_table_metadata_cache(table_name)
+
+
+def evict_source_cache(
+    con: duckdb.DuckDBPyConnection, max_entries: Optional[int] = None
+) -> List[str]:
+    """物化表数量超过上限时删除最久未使用的表，返回被删除的表名；max_entries <= 0 表示不限制
+
+    应在不持有任何分组锁时调用：删除某张表前先取得它所属分组的锁，避免与正在绑定该表的查询冲突。
+    """
+    if max_entries is None:
+        max_entries = int(config_manager.get_app_config().query_source_cache_max_entries or 0)
+    if max_entries <= 0:
+        return []
+    tables = [
+        row[0]
+        for row in con.execute(
+            "SELECT table_name FROM duckdb_tables() WHERE starts_with(table_name, ?)",
+            [SOURCE_CACHE_PREFIX],
+        ).fetchall()
+    ]
+    excess = len(tables) - max_entries
+    if excess <= 0:
+        return []
+
+    with _usage_guard:
+        usage = {name: _last_used.get(name) for name in tables}
+    candidates = sorted(tables, key=lambda name: usage[name][1] if usage[name] else float("-inf"))
+
+    evicted = []
+    for table_name in candidates[:excess]:
+        group_key = usage[table_name][0] if usage[table_name] else None
+        with _group_lock(group_key) if group_key else nullcontext():
+            with _usage_guard:
+                if _last_used.get(table_name) != usage[table_name]:
+                    continue  # 选出之后又被使用过
+            _drop_materialization(con, table_name)
+            snapshot = _snapshots.get(group_key) if group_key else None
+            if snapshot is not None and snapshot.table_name == table_name:
+                del _snapshots[group_key]
+        evicted.append(table_name)
+    if evicted:
+        logger.info("Evicted %d least recently used source materialization(s)", len(evicted))
+    return evicted
+
+
+def _drop_stale_versions(con: duckdb.DuckDBPyConnection, group_key: str, current: str) -> None:
+    prefix = f"{SOURCE_CACHE_PREFIX}{_digest(group_key, 12)}_"
+    stale = [
+        row[0]
+        for row in con.execute(
+            "SELECT table_name FROM duckdb_tables() WHERE starts_with(table_name, ?)", [prefix]
+        ).fetchall()
+        if row[0] != current
+    ]
+    for table_name in stale:
+        _drop_materialization(con, table_name, successor=current)
+    if stale:
+        logger.info("Dropped %d stale materialization(s) for %s", len(stale), group_key)
+
+
+def bind_alias(con: duckdb.DuckDBPyConnection, alias: str, target: str) -> None:
+    """让查询里的数据源别名以视图指向物化表（替换旧版本遗留的同名表）"""
+    if _object_type(con, alias) == "table":
+        con.execute(f"DROP TABLE {_quote(alias)}")
+    con.execute(f"CREATE OR REPLACE VIEW {_quote(alias)} AS SELECT * FROM {_quote(target)}")
+    invalidate_table_metadata_cache(alias)
+
+
+def _load_version(
+    con: duckdb.DuckDBPyConnection,
+    group_key: str,
+    table_name: str,
+    loader: Callable[[duckdb.DuckDBPyConnection, str], None],
+) -> None:
+    try:
+        loader(con, table_name)
+    except Exception:
+        con.execute(f"DROP TABLE IF EXISTS {_quote(table_name)}")
+        _forget(table_name)
+        raise
+    _drop_stale_versions(con, group_key, table_name)
+    logger.info("Materialized source %s into %s", group_key, table_name)
+
+
+def materialize_source(
+    con: duckdb.DuckDBPyConnection,
+    alias: str,
+    group_key: str,
+    version_key: str,
+    loader: Callable[[duckdb.DuckDBPyConnection, str], None],
+) -> Tuple[str, bool]:
+    """按 (分组键, 版本键) 物化数据源并把 alias 绑定到物化表。
+
+    loader(con, table_name) 负责创建物化表，只在缓存未命中时调用。
+    返回 (物化表名, 是否命中缓存)。
+    """
+    table_name = cache_table_name(group_key, version_key)
+    with _group_lock(group_key):
+        hit = _object_type(con, table_name) == "table"
+        _touch(group_key, table_name)
+        if hit:
+            logger.info("Reusing materialized source %s (%s)", group_key, table_name)
+        else:
+            _load_version(con, group_key, table_name, loader)
+        bind_alias(con, alias, table_name)
+    if not hit:
+        evict_source_cache(con)
+    return table_name, hit
+
+
+def database_source_key(connection_id: str, query: str) -> str:
+    return f"db:{connection_id}:{hashlib.sha256(query.strip().encode('utf-8')).hexdigest()}"
+
+
+def materialize_snapshot(
+    con: duckdb.DuckDBPyConnection,
+    alias: str,
+    group_key: str,
+    loader: Callable[[duckdb.DuckDBPyConnection, str], None],
+    ttl_seconds: float,
+    probe: Optional[Callable[[], Any]] = None,
+) -> Tuple[str, bool]:
+    """物化没有文件版本可用的数据源（如远端数据库查询结果）并把 alias 绑定到快照。
+
+    快照在 ttl_seconds 内直接复用；过期后调用 probe()，返回值与上次拉取时相同则续期，
+    否则（或未提供 probe）重新拉取。ttl_seconds <= 0 时每次都重新拉取。
+    返回 (快照表名, 是否复用了已有快照)。
+    """
+    with _group_lock(group_key):
+        snapshot = _snapshots.get(group_key)
+        now = time.time()
+        if (
+            ttl_seconds > 0
+            and snapshot is not None
+            and _object_type(con, snapshot.table_name) == "table"
+        ):
+            _touch(group_key, snapshot.table_name)
+            if now - snapshot.fetched_at < ttl_seconds:
+                bind_alias(con, alias, snapshot.table_name)
+                logger.info("Reusing snapshot %s of %s", snapshot.table_name, group_key)
+                return snapshot.table_name, True
+            if probe is not None:
+                probe_value = probe()
+                if probe_value == snapshot.probe_value:
+                    snapshot.fetched_at = now
+                    bind_alias(con, alias, snapshot.table_name)
+                    logger.info(
+                        "Snapshot %s of %s is unchanged, extending freshness",
+                        snapshot.table_name,
+                        group_key,
+                    )
+                    return snapshot.table_name, True
+            else:
+                probe_value = None
+        else:
+            # 先探测再拉取：两者之间远端发生的变化会在下次探测时被发现
+            probe_value = probe() if probe is not None and ttl_seconds > 0 else None
+
+        table_name = cache_table_name(group_key, str(time.time_ns()))
+        _touch(group_key, table_name)
+        _load_version(con, group_key, table_name, loader)
+        _snapshots[group_key] = SourceSnapshot(table_name, now, probe_value)
+        bind_alias(con, alias, table_name)
+    evict_source_cache(con)
+    return table_name, False
@@ -0,0 +1,113 @@
+"""
+DataFrame → Arrow 转换层
+pandas 结果（包括外部数据库经 pd.read_sql 得到的查询结果）落入 DuckDB 前统一转换为 Arrow 表：
+按列向量化地规范类型（bytes 解码、混合 object 转字符串、带时区时间转为 UTC），
+之后由 DuckDB 的 Arrow 扫描直接读取，不再逐值走 pandas 对象列的 Python 分析路径。
+"""
+
+import logging
+from typing import List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+logger = logging.getLogger(__name__)
+
+# Arrow 无法直接推断时按字符串处理的 object 列
+_ARROW_INFERENCE_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError)
+
+# 转换为字符串列时时间值的格式（与旧的 pandas 预处理一致）
+VARCHAR_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _decode_bytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).decode("utf-8", errors="replace")
+    return value
+
+
+def _object_column_to_arrow(series: pd.Series) -> pa.Array:
+    inferred = pd.api.types.infer_dtype(series, skipna=True)
+    if inferred == "bytes":
+        # 外部数据库的 BLOB/VARBINARY 多为文本，按 UTF-8 解码（无法解码的字节被替换）
+        return pa.array(series.str.decode("utf-8", errors="replace"), type=pa.string(), from_pandas=True)
+    if inferred in {"string", "empty"}:
+        return pa.array(series, type=pa.string(), from_pandas=True)
+
+    try:
+        return pa.array(series, from_pandas=True)
+    except _ARROW_INFERENCE_ERRORS:
+        pass
+
+    # 混合类型列：统一转为字符串，保留缺失值
+    missing = series.isna()
+    if inferred.startswith("mixed"):
+        series = series.map(_decode_bytes, na_action="ignore")
+    text = series.astype(str).mask(missing, None)
+    return pa.array(text, type=pa.string(), from_pandas=True)
+
+
+def series_to_arrow(series: pd.Series) -> pa.Array:
+    """把单列转换为 DuckDB 可直接扫描的 Arrow 数组"""
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        # 系统统一以 UTC naive 时间存储
+        series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+
+    if series.dtype == object:
+        return _object_column_to_arrow(series)
+
+    array = pa.array(series, from_pandas=True)
+    if pa.types.is_dictionary(array.type):
+        # 分类列按普通值落库，避免生成 ENUM 列
+        array = array.dictionary_decode()
+    return array
+
+
+def dataframe_to_arrow(df: pd.DataFrame) -> pa.Table:
+    """保留列类型地把 DataFrame 转换为 Arrow 表"""
+    arrays: List[pa.Array] = []
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        try:
+            arrays.append(series_to_arrow(column))
+        except _ARROW_INFERENCE_ERRORS as exc:
+            logger.warning("Column %s falls back to string conversion: %s", df.columns[position], exc)
+            arrays.append(pa.array(column.astype(str).mask(column.isna(), None), type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=[str(name) for name in df.columns])
+
+
+def _array_to_varchar(array: pa.Array) -> pa.Array:
+    if pa.types.is_timestamp(array.type):
+        text = pc.strftime(array, format=VARCHAR_TIMESTAMP_FORMAT)
+    elif pa.types.is_boolean(array.type):
+        # 与 pandas astype(str) 一致
+        text = pc.if_else(array, "True", "False")
+    elif pa.types.is_string(array.type):
+        text = array
+    else:
+        text = pc.cast(array, pa.string())
+    return pc.fill_null(text, "")
+
+
+def _needs_python_text(data_type: pa.DataType) -> bool:
+    """Arrow 无法转换为字符串（struct/list/map），或文本与 pandas 不同（duration）的类型"""
+    return pa.types.is_nested(data_type) or pa.types.is_duration(data_type)
+
+
+def dataframe_to_varchar_arrow(df: pd.DataFrame) -> pa.Table:
+    """把 DataFrame 转换为全部为字符串列的 Arrow 表，缺失值为空串
+
+    JSON/数组（如 psycopg2 的 json、jsonb、数组列）和时间间隔列逐值取 str()，
+    与 pandas astype(str) 一致（"{'a': 1}"、"0 days 00:00:01"）。
+    """
+    table = dataframe_to_arrow(df)
+    arrays: List[pa.Array] = []
+    for position, column in enumerate(table.columns):
+        if _needs_python_text(column.type):
+            series = df.iloc[:, position]
+            text = series.astype(str).mask(series.isna(), "")
+            arrays.append(pa.array(text, type=pa.string()))
+        else:
+            arrays.append(_array_to_varchar(column.combine_chunks()))
+    return pa.Table.from_arrays(arrays, names=table.column_names)
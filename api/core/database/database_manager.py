@@ -10,7 +10,7 @@ import os
 import sqlite3
 import time
 from contextlib import contextmanager
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 import pandas as pd
 import psycopg2
@@ -436,8 +436,8 @@ class DatabaseManager:
             pool_recycle=3600,
         )
 
-    def execute_query(self, connection_id: str, query: str) -> pd.DataFrame:
-        """executingdatabasequery"""
+    def ensure_engine(self, connection_id: str):
+        """获取connection的SQLAlchemy引擎，尚未creating时按需creating"""
         # 如果connectionconfiguration存在但尚未creating引擎（例如仅从configurationloading、未进行过测试/刷新），
         # 这里按需creating引擎，避免外部query/导入直接failed。
         if connection_id not in self.engines:
@@ -447,7 +447,11 @@ class DatabaseManager:
             engine = self._create_engine(connection.type, connection.params)
             self.engines[connection_id] = engine
 
-        engine = self.engines[connection_id]
+        return self.engines[connection_id]
+
+    def execute_query(self, connection_id: str, query: str) -> pd.DataFrame:
+        """executingdatabasequery"""
+        engine = self.ensure_engine(connection_id)
 
         try:
             return pd.read_sql(query, engine)
@@ -455,6 +459,25 @@ class DatabaseManager:
             logger.error(f"queryexecutingfailed: {str(e)}")
             raise
 
+    def iter_query_batches(
+        self, connection_id: str, query: str, batch_rows: int
+    ) -> Iterator[pd.DataFrame]:
+        """以服务端游标流式executingquery，每次产出至多 batch_rows 行的DataFrame
+
+        stream_results 让 MySQL 使用 SSCursor、PostgreSQL 使用命名游标，结果不会整体缓存在客户端。
+        结果为空时产出一个只有column的空DataFrame。
+        """
+        engine = self.ensure_engine(connection_id)
+
+        try:
+            with engine.connect().execution_options(
+                stream_results=True, max_row_buffer=batch_rows
+            ) as connection:
+                yield from pd.read_sql(query, connection, chunksize=batch_rows)
+        except Exception as e:
+            logger.error(f"streaming queryexecutingfailed: {str(e)}")
+            raise
+
     @contextmanager
     def get_engine(self, connection_id: str):
         """gettingdatabase引擎的上下文管理器"""
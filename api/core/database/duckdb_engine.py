@@ -2,6 +2,7 @@
 import duckdb
 import logging
 import pandas as pd
+import pyarrow as pa
 import time
 from typing import List, Dict, Any, Optional, Tuple
 import re
@@ -20,7 +21,9 @@ from models.query_models import (
 logger = logging.getLogger(__name__)
 
 # 导入连接池管理器
+from core.database.arrow_ingest import dataframe_to_varchar_arrow
 from core.database.duckdb_pool import get_connection_pool
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
 
 
 class PooledConnectionProxy:
@@ -212,6 +215,10 @@ def _apply_duckdb_configuration(connection, temp_dir: str):
             connection.execute(
                 f"SET enable_object_cache={str(config_items['duckdb_enable_object_cache']).lower()}"
             )
+            # 新版 DuckDB 中 enable_object_cache 已不起作用，Parquet footer 缓存由 parquet_metadata_cache 控制
+            connection.execute(
+                f"SET parquet_metadata_cache={str(config_items['duckdb_enable_object_cache']).lower()}"
+            )
             logger.info(
                 f"DuckDB object cache set to: {config_items['duckdb_enable_object_cache']}"
             )
@@ -337,6 +344,9 @@ def _apply_default_duckdb_config(connection, temp_dir: str):
         connection.execute(
             f"SET enable_object_cache={str(app_config.duckdb_enable_object_cache).lower()}"
         )
+        connection.execute(
+            f"SET parquet_metadata_cache={str(app_config.duckdb_enable_object_cache).lower()}"
+        )
         connection.execute(
             f"SET preserve_insertion_order={str(app_config.duckdb_preserve_insertion_order).lower()}"
         )
@@ -420,12 +430,12 @@ def register_dataframe(table_name: str, df: pd.DataFrame, con=None) -> bool:
     建议使用 create_persistent_table() 进行持久化
     """
     try:
-        # 预处理DataFrame以避免类型转换错误
-        processed_df = prepare_dataframe_for_duckdb(df)
+        # 预处理为字符串列的Arrow表，DuckDB 直接扫描而不复制
+        processed_table = prepare_arrow_table_for_duckdb(df)
         with _use_connection(con) as connection:
-            connection.register(table_name, processed_df)
+            connection.register(table_name, processed_table)
         logger.info(
-            f"Successfully registered temporary table: {table_name}, rows: {len(processed_df)}, columns: {len(processed_df.columns)}"
+            f"Successfully registered temporary table: {table_name}, rows: {processed_table.num_rows}, columns: {processed_table.num_columns}"
         )
         return True
     except Exception as e:
@@ -523,6 +533,7 @@ def drop_table_if_exists(table_name: str, con=None) -> bool:
     try:
         with _use_connection(con) as connection:
             connection.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        invalidate_table_metadata_cache(table_name)
         logger.info(f"Deleted table: {table_name}")
         return True
     except Exception as e:
@@ -598,6 +609,7 @@ def convert_table_to_varchar(
         create_sql = f'CREATE TABLE "{table_name}" AS SELECT {cast_sql} FROM "{backup_table_name}"'
         with _use_connection(con) as connection:
             connection.execute(create_sql)
+        invalidate_table_metadata_cache(table_name)
 
         # 删除备份表
         drop_table_if_exists(backup_table_name, con)
@@ -727,57 +739,10 @@ def create_varchar_table_from_dataframe(
         return False
 
 
-def prepare_dataframe_for_duckdb(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    预处理DataFrame以避免DuckDB类型转换错误
-    将所有数据统一转换为字符串类型，确保JOIN操作的兼容性
-    """
-    if df.empty:
-        return df
-
-    # 创建DataFrame的深拷贝
-    processed_df = df.copy()
-
-    logger.info(
-        f"Starting DataFrame preprocessing: {len(processed_df)} rows, {len(processed_df.columns)} columns"
-    )
-
-    # 处理所有列，统一转换为字符串类型
-    for col in processed_df.columns:
-        try:
-            # 处理不同的数据类型
-            if processed_df[col].dtype == "datetime64[ns]":
-                # 日期时间转换为字符串
-                processed_df[col] = processed_df[col].dt.strftime("%Y-%m-%d %H:%M:%S")
-            elif processed_df[col].dtype == "bool":
-                # 布尔值转换为字符串
-                processed_df[col] = processed_df[col].astype(str)
-            elif processed_df[col].dtype in ["float64", "float32"]:
-                # 浮点数转换为字符串，处理NaN
-                processed_df[col] = processed_df[col].fillna("").astype(str)
-            elif processed_df[col].dtype in ["int64", "int32", "int16", "int8"]:
-                # 整数转换为字符串
-                processed_df[col] = processed_df[col].astype(str)
-            else:
-                # 对象类型（包括字符串）
-                processed_df[col] = processed_df[col].fillna("").astype(str)
-
-            # 简化字符串处理，避免性能问题
-            # 直接转换为字符串，处理空值
-            processed_df[col] = processed_df[col].astype(str).replace("nan", "")
-
-        except Exception as e:
-            logger.warning(f"Error processing column {col}: {e}, using default string conversion")
-            # 使用最简单的转换方法
-            try:
-                processed_df[col] = processed_df[col].astype(str).fillna("")
-            except:
-                # 如果还是失败，创建一个空字符串列
-                processed_df[col] = [""] * len(processed_df)
-
-    # 清理列名，确保是有效的SQL标识符
+def _clean_column_names(columns) -> List[str]:
+    """清理列名，确保是有效的SQL标识符"""
     clean_columns = []
-    for i, col in enumerate(processed_df.columns):
+    for i, col in enumerate(columns):
         try:
             clean_col = str(col).encode("utf-8", errors="replace").decode("utf-8")
             # 移除或替换特殊字符
@@ -787,11 +752,32 @@ def prepare_dataframe_for_duckdb(df: pd.DataFrame) -> pd.DataFrame:
             if not clean_col or clean_col[0].isdigit():
                 clean_col = f"col_{i}"
             clean_columns.append(clean_col)
-        except:
+        except Exception:  # pylint: disable=broad-exception-caught
             clean_columns.append(f"col_{i}")
+    return clean_columns
 
-    processed_df.columns = clean_columns
 
+def prepare_arrow_table_for_duckdb(df: pd.DataFrame) -> pa.Table:
+    """
+    将DataFrame转换为全部为字符串列的Arrow表，确保JOIN操作的兼容性
+    类型规范与字符串转换都是按列向量化完成的，DuckDB 通过 Arrow 扫描直接读取
+    """
+    table = dataframe_to_varchar_arrow(df)
+    return table.rename_columns(_clean_column_names(df.columns))
+
+
+def prepare_dataframe_for_duckdb(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    预处理DataFrame以避免DuckDB类型转换错误
+    将所有数据统一转换为字符串类型（缺失值为空串），并清理列名
+    """
+    if df.empty:
+        return df
+
+    logger.info(
+        f"Starting DataFrame preprocessing: {len(df)} rows, {len(df.columns)} columns"
+    )
+    processed_df = prepare_arrow_table_for_duckdb(df).to_pandas()
     logger.info(f"DataFrame preprocessing completed: all columns converted to string type")
     return processed_df
 
@@ -11,6 +11,7 @@ from typing import Any, Dict, List, Optional
 from functools import lru_cache
 
 from core.database.duckdb_pool import with_system_connection
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
 from core.common.timezone_utils import get_current_time
 from utils.encryption_utils import encrypt_json, decrypt_json
 
@@ -63,6 +64,7 @@ class MetadataManager:
                     file_size BIGINT,
                     file_hash VARCHAR,
                     source_sql TEXT,
+                    import_state JSON,
                     metadata JSON
                 )
             """)
@@ -93,6 +95,9 @@ class MetadataManager:
             conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_file_ds_upload ON system_file_datasources(upload_time)"
             )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_file_ds_hash ON system_file_datasources(file_hash)"
+            )
 
             # creating系统 SQL 收藏table
             conn.execute("""
@@ -184,6 +189,27 @@ class MetadataManager:
             except Exception as e:
                 logger.warning(f"Warning occurred when adding source_sql field (may already exist): {e}")
 
+            # 迁移：添加 import_state 字段（追加/合并导入的模式、主键与高水位）
+            try:
+                result = conn.execute("""
+                    SELECT COUNT(*) 
+                    FROM information_schema.columns 
+                    WHERE table_name = 'system_file_datasources' 
+                    AND column_name = 'import_state'
+                """).fetchone()
+
+                if result[0] == 0:
+                    logger.info("Detected missing import_state field, starting migration...")
+                    conn.execute("""
+                        ALTER TABLE system_file_datasources 
+                        ADD COLUMN import_state JSON
+                    """)
+                    # WAL 中新增 JSON 类型列的记录在重启回放时会失败，立即落盘
+                    conn.execute("CHECKPOINT")
+                    logger.info("import_state field migration completed")
+            except Exception as e:
+                logger.warning(f"Warning occurred when adding import_state field (may already exist): {e}")
+
             logger.info("metadatatableinitializingcompleted")
 
     # 统一的 CRUD 接口
@@ -608,6 +634,8 @@ class MetadataManager:
 
     def save_file_datasource(self, datasource: dict) -> bool:
         """savingfiledata源metadata"""
+        # 写入datasource记录意味着对应table刚被creating或替换
+        invalidate_table_metadata_cache(datasource["source_id"])
         return self.save_metadata("system_file_datasources", datasource["source_id"], datasource)
 
     def get_file_datasource(self, source_id: str) -> Optional[dict]:
@@ -624,6 +652,7 @@ class MetadataManager:
 
     def delete_file_datasource(self, source_id: str) -> bool:
         """deletingfiledata源metadata"""
+        invalidate_table_metadata_cache(source_id)
         return self.delete_metadata("system_file_datasources", source_id)
 
     def save_sql_favorite(self, favorite: dict) -> bool:
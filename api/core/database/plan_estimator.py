@@ -0,0 +1,183 @@
+"""Optimizer-driven cardinality estimates based on ``EXPLAIN (FORMAT JSON)``."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import RLock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from core.database.table_metadata_cache import table_metadata_cache
+
+logger = logging.getLogger(__name__)
+
+_CARDINALITY_KEY = "Estimated Cardinality"
+_DIGITS_RE = re.compile(r"\d+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@dataclass
+class PlanOperatorEstimate:
+    """Estimated cardinality reported by DuckDB for a single physical operator."""
+
+    name: str
+    estimated_cardinality: Optional[int]
+    table: Optional[str] = None
+    depth: int = 0
+
+
+@dataclass
+class PlanEstimate:
+    """Summary of an optimizer plan: root cardinality plus per-operator details."""
+
+    root_cardinality: int
+    scan_cardinality: int
+    operators: List[PlanOperatorEstimate] = field(default_factory=list)
+
+
+def fingerprint_sql(sql: str) -> str:
+    """Return a stable fingerprint for SQL text, ignoring whitespace and trailing ';'."""
+    normalized = _WHITESPACE_RE.sub(" ", sql or "").strip().rstrip(";").strip()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def _parse_cardinality(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _DIGITS_RE.search(str(value))
+    return int(match.group(0)) if match else None
+
+
+def _walk_plan(nodes: Iterable[Dict[str, Any]], depth: int = 0) -> List[PlanOperatorEstimate]:
+    operators: List[PlanOperatorEstimate] = []
+    for node in nodes or []:
+        if not isinstance(node, dict):
+            continue
+        extra = node.get("extra_info") or {}
+        if not isinstance(extra, dict):
+            extra = {}
+        operators.append(
+            PlanOperatorEstimate(
+                name=str(node.get("name", "")).strip(),
+                estimated_cardinality=_parse_cardinality(extra.get(_CARDINALITY_KEY)),
+                table=extra.get("Table"),
+                depth=depth,
+            )
+        )
+        operators.extend(_walk_plan(node.get("children") or [], depth + 1))
+    return operators
+
+
+def _node_cardinality(node: Dict[str, Any]) -> Optional[int]:
+    """Return a node's estimate, summing its children when it has none (e.g. UNION ALL)."""
+    extra = node.get("extra_info") or {}
+    if isinstance(extra, dict):
+        own = _parse_cardinality(extra.get(_CARDINALITY_KEY))
+        if own is not None:
+            return own
+    child_estimates = [
+        _node_cardinality(child)
+        for child in node.get("children") or []
+        if isinstance(child, dict)
+    ]
+    known = [value for value in child_estimates if value is not None]
+    return sum(known) if known else None
+
+
+def parse_explain_json(rows: List[Tuple[Any, ...]]) -> PlanEstimate:
+    """Build a :class:`PlanEstimate` from the rows returned by ``EXPLAIN (FORMAT JSON)``."""
+    plan_text = None
+    for row in rows or []:
+        if len(row) >= 2 and str(row[0]).lower() == "physical_plan":
+            plan_text = row[1]
+            break
+    if plan_text is None:
+        raise ValueError("EXPLAIN output does not contain a physical plan")
+
+    nodes = json.loads(plan_text)
+    if isinstance(nodes, dict):
+        nodes = [nodes]
+    operators = _walk_plan(nodes)
+    if not operators:
+        raise ValueError("EXPLAIN output contains no operators")
+
+    root_cardinality = sum(_node_cardinality(node) or 0 for node in nodes)
+    if not any(op.estimated_cardinality is not None for op in operators):
+        raise ValueError("EXPLAIN output contains no cardinality estimates")
+
+    scan_cardinality = sum(
+        op.estimated_cardinality or 0
+        for op in operators
+        if op.table and "SCAN" in op.name.upper()
+    )
+    return PlanEstimate(
+        root_cardinality=root_cardinality,
+        scan_cardinality=scan_cardinality,
+        operators=operators,
+    )
+
+
+class QueryPlanEstimator:
+    """Run ``EXPLAIN`` on generated SQL and cache estimates per SQL and table version.
+
+    The table version combines the change counter maintained by the table metadata cache
+    with ``duckdb_tables()`` catalog data (estimated row count and column count), so no
+    table data is scanned to validate a cached estimate.
+    """
+
+    def __init__(self, max_entries: int = 512) -> None:
+        self._cache: "OrderedDict[Tuple[str, Tuple[Any, ...]], PlanEstimate]" = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = RLock()
+
+    @staticmethod
+    def _table_versions(con, table_names: Iterable[str]) -> Tuple[Any, ...]:
+        names = sorted({name for name in table_names if name})
+        if not names:
+            return ()
+        placeholders = ", ".join("?" for _ in names)
+        rows = con.execute(
+            "SELECT table_name, estimated_size, column_count FROM duckdb_tables() "
+            f"WHERE table_name IN ({placeholders})",
+            names,
+        ).fetchall()
+        found = {row[0]: (int(row[1] or 0), int(row[2] or 0)) for row in rows}
+        return tuple(
+            (name, table_metadata_cache.table_version(name), found.get(name)) for name in names
+        )
+
+    def estimate(self, con, sql: str, table_names: Iterable[str] = ()) -> PlanEstimate:
+        """Return optimizer estimates for ``sql``, reusing cached plans when possible."""
+        cache_key = (fingerprint_sql(sql), self._table_versions(con, table_names))
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+                return cached
+
+        statement = (sql or "").strip().rstrip(";")
+        rows = con.execute(f"EXPLAIN (FORMAT JSON) {statement}").fetchall()
+        estimate = parse_explain_json(rows)
+
+        with self._lock:
+            self._cache[cache_key] = estimate
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return estimate
+
+    def invalidate(self) -> int:
+        """Clear all cached plan estimates."""
+        with self._lock:
+            count = len(self._cache)
+            self._cache.clear()
+            return count
+
+
+query_plan_estimator = QueryPlanEstimator()
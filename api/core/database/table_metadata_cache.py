@@ -1,12 +1,13 @@
-"""Table metadata caching utilities with TTL-based invalidation."""
+"""Table metadata caching with change-driven invalidation, TTL expiry and LRU bounds."""
 
 from __future__ import annotations
 
 import logging
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from threading import RLock
-from typing import Callable, Dict, Optional
+from typing import Any, Callable, Dict, Iterable, Optional
 
 from models.visual_query_models import TableMetadata
 
@@ -17,33 +18,112 @@ except Exception:  # pragma: no cover
 
 logger = logging.getLogger(__name__)
 
+_DEFAULT_MAX_ENTRIES = 512
+_DEFAULT_MAX_MB = 64
+# Change counters are kept for at most this many tables (most recently changed first)
+_MAX_TRACKED_VERSIONS = 8192
+
 
 @dataclass
 class _CacheEntry:
     metadata: TableMetadata
     expires_at: datetime
+    size_bytes: int
+    version: int
+
+
+def _estimate_metadata_bytes(metadata: TableMetadata) -> int:
+    """Approximate an entry's footprint by its serialized JSON size."""
+    try:
+        if hasattr(metadata, "model_dump_json"):
+            return len(metadata.model_dump_json().encode("utf-8"))
+        return len(metadata.json().encode("utf-8"))
+    except Exception:  # pragma: no cover - defensive branch
+        return 0
 
 
 class TableMetadataCache:
-    """In-memory metadata cache with per-table TTL."""
+    """In-memory LRU metadata cache.
+
+    Entries expire by TTL and are dropped eagerly whenever a table is created, replaced,
+    altered or dropped (see :meth:`invalidate`). Each invalidation bumps a per-table
+    version so a load that raced with a change is never stored. Versions are tracked for a
+    bounded number of recently changed tables; untracked tables report a floor that is higher
+    than any version ever forgotten, so a forgotten table never goes back to an old version.
+    """
 
     def __init__(self) -> None:
-        self._cache: Dict[str, _CacheEntry] = {}
+        self._cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._version_floor = 0
+        self._total_bytes = 0
         self._lock = RLock()
-
-    def _get_ttl(self) -> Optional[timedelta]:
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def _app_config() -> Any:
         if not config_manager:
             return None
         try:
-            app_cfg = config_manager.get_app_config()
-            ttl_hours = getattr(app_cfg, "table_metadata_cache_ttl_hours", 0) or 0
+            return config_manager.get_app_config()
         except Exception as exc:  # pragma: no cover - defensive branch
-            logger.warning("Unable to get table metadata cache TTL configuration: %s", exc)
+            logger.warning("Unable to get table metadata cache configuration: %s", exc)
             return None
+
+    def _get_ttl(self) -> Optional[timedelta]:
+        app_cfg = self._app_config()
+        if app_cfg is None:
+            return None
+        ttl_hours = getattr(app_cfg, "table_metadata_cache_ttl_hours", 0) or 0
         if ttl_hours <= 0:
             return None
         return timedelta(hours=float(ttl_hours))
 
+    def _get_limits(self) -> tuple[int, int]:
+        app_cfg = self._app_config()
+        max_entries = getattr(app_cfg, "table_metadata_cache_max_entries", None)
+        max_mb = getattr(app_cfg, "table_metadata_cache_max_mb", None)
+        max_entries = int(max_entries) if max_entries else _DEFAULT_MAX_ENTRIES
+        max_mb = float(max_mb) if max_mb else _DEFAULT_MAX_MB
+        return max_entries, int(max_mb * 1024 * 1024)
+
+    def _remove_locked(self, table_name: str) -> bool:
+        entry = self._cache.pop(table_name, None)
+        if entry is None:
+            return False
+        self._total_bytes -= entry.size_bytes
+        return True
+
+    def _enforce_limits_locked(self) -> None:
+        max_entries, max_bytes = self._get_limits()
+        while self._cache and (
+            len(self._cache) > max_entries or self._total_bytes > max_bytes
+        ):
+            evicted_name, _ = next(iter(self._cache.items()))
+            self._remove_locked(evicted_name)
+            self._stats["evictions"] += 1
+
+    def _version_locked(self, table_name: str) -> int:
+        return self._versions.get(table_name, self._version_floor)
+
+    def _bump_version_locked(self, table_name: str) -> None:
+        self._versions[table_name] = self._version_locked(table_name) + 1
+        self._versions.move_to_end(table_name)
+        while len(self._versions) > _MAX_TRACKED_VERSIONS:
+            _, forgotten = self._versions.popitem(last=False)
+            self._version_floor = max(self._version_floor, forgotten + 1)
+
+    def table_version(self, table_name: str) -> int:
+        """Return the change counter of a table (bumped on every invalidation)."""
+        with self._lock:
+            return self._version_locked(table_name)
+
     def get_or_load(
         self,
         table_name: str,
@@ -58,30 +138,73 @@ class TableMetadataCache:
             return metadata
 
         cache_key = table_name
-        if not force_refresh:
-            with self._lock:
+        with self._lock:
+            if not force_refresh:
                 entry = self._cache.get(cache_key)
-                if entry and entry.expires_at > datetime.now(timezone.utc):
-                    return entry.metadata
+                if entry is not None:
+                    if entry.expires_at > datetime.now(timezone.utc):
+                        self._cache.move_to_end(cache_key)
+                        self._stats["hits"] += 1
+                        return entry.metadata
+                    self._remove_locked(cache_key)
+                    self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            version = self._version_locked(cache_key)
 
         metadata = loader()
         expires_at = datetime.now(timezone.utc) + ttl
+        size_bytes = _estimate_metadata_bytes(metadata)
         with self._lock:
+            if self._version_locked(cache_key) != version:
+                # The table changed while loading; do not cache a possibly stale snapshot
+                return metadata
+            self._remove_locked(cache_key)
             self._cache[cache_key] = _CacheEntry(
                 metadata=metadata,
                 expires_at=expires_at,
+                size_bytes=size_bytes,
+                version=version,
             )
+            self._total_bytes += size_bytes
+            self._enforce_limits_locked()
         return metadata
 
     def invalidate(self, table_name: Optional[str] = None) -> int:
-        """Clear cache entries."""
+        """Clear cache entries for one table (or all tables) and bump their versions."""
         with self._lock:
             if table_name:
-                return 1 if self._cache.pop(table_name, None) else 0
+                self._bump_version_locked(table_name)
+                removed = 1 if self._remove_locked(table_name) else 0
+                self._stats["invalidations"] += removed
+                return removed
             count = len(self._cache)
+            for name in set(self._versions) | set(self._cache):
+                self._bump_version_locked(name)
+            self._version_floor += 1
             self._cache.clear()
+            self._total_bytes = 0
+            self._stats["invalidations"] += count
             return count
 
+    def invalidate_many(self, table_names: Iterable[str]) -> int:
+        """Invalidate several tables, e.g. the source and target of a rename."""
+        return sum(self.invalidate(name) for name in table_names if name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size for monitoring."""
+        max_entries, max_bytes = self._get_limits()
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._cache),
+                "total_bytes": self._total_bytes,
+                "max_entries": max_entries,
+                "max_bytes": max_bytes,
+                "ttl_hours": getattr(self._app_config(), "table_metadata_cache_ttl_hours", None),
+            }
+
 
 table_metadata_cache = TableMetadataCache()
 
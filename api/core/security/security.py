@@ -7,7 +7,7 @@ import os
 import re
 import hashlib
 import logging
-from typing import List, Dict, Any, Optional, Set
+from typing import Any, Callable, Dict, List, Optional, Set
 from pathlib import Path
 
 # 可选依赖：python-magic
@@ -30,6 +30,11 @@ ALLOWED_FILE_TYPES = {
     "jsonl": ["application/jsonl", "text/plain"],
     "parquet": ["application/octet-stream"],
     "pq": ["application/octet-stream"],
+    # 压缩的数据文件（内层格式在导入时识别）
+    "gz": ["application/gzip", "application/x-gzip"],
+    "zst": ["application/zstd", "application/octet-stream"],
+    "bz2": ["application/x-bzip2"],
+    "zip": ["application/zip"],
 }
 
 
@@ -113,6 +118,42 @@ class SecurityValidator:
         Returns:
             验证result字典
         """
+        detect_mime = None
+        if os.path.exists(file_path) and self.magic_mime is not None:
+
+            def detect_mime() -> str:
+                return self.magic_mime.from_file(file_path)
+
+        return self._validate_upload(filename, file_size, detect_mime)
+
+    def validate_upload_header(
+        self, header: bytes, filename: str, file_size: int = 0
+    ) -> Dict[str, Any]:
+        """
+        基于file头字节验证上传file（流式上传时使用首块数据，无需完整file落盘）
+
+        Args:
+            header: file开头的字节
+            filename: file名
+            file_size: 已知的file大小（流式上传时由调用方单独限制）
+
+        Returns:
+            验证result字典
+        """
+        detect_mime = None
+        if header and self.magic_mime is not None:
+
+            def detect_mime() -> str:
+                return self.magic_mime.from_buffer(header)
+
+        return self._validate_upload(filename, file_size, detect_mime)
+
+    def _validate_upload(
+        self,
+        filename: str,
+        file_size: int,
+        detect_mime: Optional[Callable[[], str]],
+    ) -> Dict[str, Any]:
         result = {
             "valid": False,
             "errors": [],
@@ -137,9 +178,9 @@ class SecurityValidator:
                 return result
 
             # 3. 检查MIME类型（如果magic可用）
-            if os.path.exists(file_path) and self.magic_mime is not None:
+            if detect_mime is not None:
                 try:
-                    detected_mime = self.magic_mime.from_file(file_path)
+                    detected_mime = detect_mime()
                     result["mime_type"] = detected_mime
 
                     allowed_mimes = ALLOWED_FILE_TYPES[file_extension]
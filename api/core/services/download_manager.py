@@ -0,0 +1,250 @@
+"""
+Remote download manager
+把远程文件按块流式写入磁盘：连接中断后通过 HTTP Range 从已写入位置续传，
+服务器支持 Range 且文件足够大时拆成多个区段并行下载，按偏移写入预分配的目标文件。
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import requests
+
+from core.services.upload_session_manager import preallocate_file
+
+# 每次写盘的块大小
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+# 小于该大小的文件不拆分区段
+MIN_PARALLEL_DOWNLOAD_SIZE = 64 * 1024 * 1024
+# 单个区段的最小大小，避免大量极小的 Range 请求
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+_RESUMABLE_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+class DownloadError(Exception):
+    """下载失败（HTTP 错误、重试耗尽或长度不符）"""
+
+
+@dataclass
+class DownloadResult:
+    path: str
+    size: int
+    segments: int
+    resumes: int
+    ranged: bool
+
+
+@dataclass
+class _RemoteInfo:
+    size: Optional[int]
+    accepts_ranges: bool
+
+
+# 要求服务器按原始字节传输，Content-Length 与 Range 偏移才与写入磁盘的字节数一致
+_IDENTITY_ENCODING = {"Accept-Encoding": "identity"}
+
+
+def _is_encoded(response: requests.Response) -> bool:
+    return response.headers.get("content-encoding", "identity").lower() not in {"", "identity"}
+
+
+def _probe(session: requests.Session, url: str, timeout: float) -> _RemoteInfo:
+    """HEAD 探测文件大小与 Range 支持；HEAD 不可用时按未知大小、不支持 Range 处理"""
+    try:
+        response = session.head(
+            url, headers=_IDENTITY_ENCODING, timeout=timeout, allow_redirects=True
+        )
+        response.raise_for_status()
+    except requests.RequestException as exc:
+        logger.debug("HEAD probe failed for %s: %s", url, exc)
+        return _RemoteInfo(size=None, accepts_ranges=False)
+
+    # 服务器仍压缩传输时 Content-Length 是压缩后的长度，而写入磁盘的是解压后的内容：
+    # 按未知大小处理，也不能按字节区段切分
+    if _is_encoded(response):
+        return _RemoteInfo(size=None, accepts_ranges=False)
+    length = response.headers.get("content-length")
+    size = int(length) if length and length.isdigit() else None
+    accepts_ranges = response.headers.get("accept-ranges", "").lower() == "bytes"
+    return _RemoteInfo(size=size, accepts_ranges=accepts_ranges and size is not None)
+
+
+def _plan_segments(size: int, workers: int) -> List[Tuple[int, int]]:
+    if workers <= 1 or size < MIN_PARALLEL_DOWNLOAD_SIZE:
+        return [(0, size - 1)] if size > 0 else []
+    count = max(1, min(workers, size // MIN_SEGMENT_SIZE))
+    step = -(-size // count)
+    return [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+
+
+class _ResumeCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def increment(self) -> None:
+        with self._lock:
+            self.value += 1
+
+
+def _download_segment(
+    session: requests.Session,
+    url: str,
+    target_path: str,
+    start: int,
+    end: int,
+    timeout: float,
+    max_retries: int,
+    resumes: _ResumeCounter,
+) -> None:
+    """下载 [start, end] 区段；中断后从已写入的位置续传，最多重试 max_retries 次"""
+    position = start
+    failures = 0
+    with open(target_path, "r+b") as handle:
+        while position <= end:
+            headers = {"Range": f"bytes={position}-{end}", **_IDENTITY_ENCODING}
+            try:
+                with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                    if response.status_code != 206:
+                        raise DownloadError(
+                            f"Server ignored range request (HTTP {response.status_code})"
+                        )
+                    handle.seek(position)
+                    for block in response.iter_content(DOWNLOAD_BLOCK_SIZE):
+                        block = block[: end + 1 - position]
+                        handle.write(block)
+                        position += len(block)
+                        if position > end:
+                            break
+                if position <= end:
+                    raise requests.exceptions.ChunkedEncodingError("Connection closed early")
+            except _RESUMABLE_ERRORS as exc:
+                failures += 1
+                if failures > max_retries:
+                    raise DownloadError(
+                        f"Download interrupted at byte {position}: {exc}"
+                    ) from exc
+                resumes.increment()
+                logger.info("Resuming %s at byte %s (%s)", url, position, exc)
+
+
+def _download_stream(
+    session: requests.Session,
+    url: str,
+    target_path: str,
+    info: _RemoteInfo,
+    timeout: float,
+    max_retries: int,
+    resumes: _ResumeCounter,
+) -> int:
+    """单连接流式下载；服务器支持 Range 时断点续传，否则从头重试
+
+    服务器忽略 identity 请求、仍压缩传输时写入的是解压后的内容，info 改为未知大小且不续传。
+    """
+    written = 0
+    failures = 0
+    with open(target_path, "wb") as handle:
+        while True:
+            headers = dict(_IDENTITY_ENCODING)
+            if written and info.accepts_ranges:
+                headers["Range"] = f"bytes={written}-"
+            try:
+                with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                    response.raise_for_status()
+                    if _is_encoded(response):
+                        info.size = None
+                        info.accepts_ranges = False
+                    if written and response.status_code != 206:
+                        # 服务器返回了完整内容，只能丢弃已写入的部分重新开始
+                        handle.seek(0)
+                        handle.truncate()
+                        written = 0
+                    for block in response.iter_content(DOWNLOAD_BLOCK_SIZE):
+                        handle.write(block)
+                        written += len(block)
+                if info.size is None or written >= info.size:
+                    return written
+                raise requests.exceptions.ChunkedEncodingError("Connection closed early")
+            except _RESUMABLE_ERRORS as exc:
+                failures += 1
+                if failures > max_retries:
+                    raise DownloadError(f"Download interrupted at byte {written}: {exc}") from exc
+                resumes.increment()
+                logger.info("Retrying %s from byte %s (%s)", url, written if info.accepts_ranges else 0, exc)
+                if not info.accepts_ranges:
+                    handle.seek(0)
+                    handle.truncate()
+                    written = 0
+            except requests.HTTPError as exc:
+                raise DownloadError(f"HTTP error while downloading: {exc}") from exc
+
+
+def download_to_file(
+    url: str,
+    target_path: str,
+    timeout: float = 30,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    session: Optional[requests.Session] = None,
+) -> DownloadResult:
+    """把 url 下载到 target_path，返回下载结果；失败时删除不完整的文件并抛出 DownloadError"""
+    own_session = session is None
+    session = session or requests.Session()
+    resumes = _ResumeCounter()
+    try:
+        info = _probe(session, url, timeout)
+        segments = _plan_segments(info.size, max_workers) if info.accepts_ranges else []
+
+        if info.accepts_ranges:
+            preallocate_file(target_path, info.size)
+            with ThreadPoolExecutor(
+                max_workers=max(1, len(segments)), thread_name_prefix="url-download"
+            ) as pool:
+                futures = [
+                    pool.submit(
+                        _download_segment,
+                        session,
+                        url,
+                        target_path,
+                        start,
+                        end,
+                        timeout,
+                        max_retries,
+                        resumes,
+                    )
+                    for start, end in segments
+                ]
+                for future in futures:
+                    future.result()
+            size = info.size
+        else:
+            size = _download_stream(session, url, target_path, info, timeout, max_retries, resumes)
+
+        if info.size is not None and os.path.getsize(target_path) != info.size:
+            raise DownloadError(
+                f"Downloaded {os.path.getsize(target_path)} bytes, expected {info.size}"
+            )
+        return DownloadResult(
+            path=target_path,
+            size=size,
+            segments=max(len(segments), 1),
+            resumes=resumes.value,
+            ranged=info.accepts_ranges,
+        )
+    except Exception:
+        if os.path.exists(target_path):
+            os.unlink(target_path)
+        raise
+    finally:
+        if own_session:
+            session.close()
@@ -1,21 +1,98 @@
+import hashlib
 import os
 import shutil
 import time
 import uuid
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Optional
 
 from fastapi import BackgroundTasks
+from starlette.concurrency import run_in_threadpool
 
 TEMP_DIR = Path("temp_files")
 TEMP_DIR.mkdir(exist_ok=True)
 
+# 上传流式落盘的块大小，首块同时用于文件头(MIME)校验
+UPLOAD_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when a streamed upload exceeds the configured size limit."""
+
+    def __init__(self, size: int, max_size: int):
+        super().__init__(f"Upload exceeds size limit ({size} > {max_size} bytes)")
+        self.size = size
+        self.max_size = max_size
+
+
+@dataclass
+class StreamedUpload:
+    path: str
+    size: int
+    sha256: str
+    header: bytes
+    md5: str = ""
+
+
+async def stream_upload_to_path(
+    upload_file,
+    dest_path,
+    block_size: int = UPLOAD_BLOCK_SIZE,
+    max_size: Optional[int] = None,
+    header_check: Optional[Callable[[bytes], None]] = None,
+) -> StreamedUpload:
+    """Copy an UploadFile to ``dest_path`` block by block, hashing as it goes.
+
+    The body is never held in memory as a whole and is written exactly once.
+    ``header_check`` receives the first block before anything touches the disk and may
+    raise to reject the upload. Exceeding ``max_size`` raises :class:`UploadTooLargeError`.
+    A partially written file is removed on any failure.
+    """
+    dest_path = Path(dest_path)
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    hasher = hashlib.sha256()
+    # MD5 与分块上传、文件数据源记录的 file_hash 一致，用于导入去重
+    md5_hasher = hashlib.md5()
+    size = 0
+
+    header = await upload_file.read(block_size)
+    if header_check is not None:
+        header_check(header)
+
+    block = header
+    try:
+        with open(dest_path, "wb") as buffer:
+            while block:
+                size += len(block)
+                if max_size is not None and size > max_size:
+                    raise UploadTooLargeError(size, max_size)
+                hasher.update(block)
+                md5_hasher.update(block)
+                await run_in_threadpool(buffer.write, block)
+                block = await upload_file.read(block_size)
+    except BaseException:
+        try:
+            dest_path.unlink()
+        except OSError:
+            pass
+        raise
+
+    return StreamedUpload(
+        path=str(dest_path),
+        size=size,
+        sha256=hasher.hexdigest(),
+        header=header,
+        md5=md5_hasher.hexdigest(),
+    )
+
+
 async def save_upload_file(upload_file) -> str:
     """Saves an uploaded file to a temporary directory and returns the path."""
     # 生成SQL兼容的文件ID，使用下划线替代连字符
     file_id = str(uuid.uuid4()).replace('-', '_')
     file_path = TEMP_DIR / f"{file_id}_{upload_file.filename}"
-    with open(file_path, "wb") as buffer:
-        buffer.write(await upload_file.read())
+    await stream_upload_to_path(upload_file, file_path)
     return str(file_path)
 
 def _cleanup_resource(file_path: str, delay_seconds: int = 3600):
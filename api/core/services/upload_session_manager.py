@@ -0,0 +1,487 @@
+"""
+Chunked upload session manager
+分块上传会话持久化到系统库，分块通过定位写入预分配的目标文件，哈希按块增量计算
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from core.database.duckdb_pool import with_system_connection
+from core.common.timezone_utils import (
+    format_storage_time_for_response,
+    get_storage_time,
+)
+from core.services.task_manager import retry_on_write_conflict
+
+UPLOAD_SESSIONS_TABLE = "system_upload_sessions"
+UPLOAD_CHUNKS_TABLE = "system_upload_chunks"
+
+# 回读已落盘分块参与哈希时的读取块大小
+HASH_READ_SIZE = 1024 * 1024
+
+# 并发建议：单个分块期望的写盘耗时、分块大小上下限、单个文件的最大分块数
+TARGET_CHUNK_WRITE_SECONDS = 0.25
+MIN_RECOMMENDED_CHUNK_SIZE = 1024 * 1024
+MAX_RECOMMENDED_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_CHUNKS_PER_UPLOAD = 10000
+# 视为“活跃”上传会话的最近活动窗口
+ACTIVE_SESSION_WINDOW_MINUTES = 10
+
+logger = logging.getLogger(__name__)
+
+_SESSION_COLUMNS = [
+    "upload_id",
+    "file_name",
+    "file_size",
+    "chunk_size",
+    "total_chunks",
+    "status",
+    "file_hash",
+    "actual_hash",
+    "table_alias",
+    "file_extension",
+    "chunks_dir",
+    "target_path",
+    "error_message",
+    "file_info",
+    "created_at",
+    "updated_at",
+]
+
+
+def preallocate_file(path: str, size: int) -> None:
+    """Create ``path`` with its final size so chunks can be written at their offsets."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if size > 0 and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                # 部分文件系统不支持 fallocate，退回稀疏文件
+                pass
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+def write_at(path: str, offset: int, data: bytes) -> None:
+    """Write ``data`` at ``offset`` without touching the rest of the file."""
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        if hasattr(os, "pwrite"):
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(fd, view, offset)
+                view = view[written:]
+                offset += written
+        else:  # pragma: no cover - Windows
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+    finally:
+        os.close(fd)
+
+
+def md5_hex(data: bytes) -> str:
+    return hashlib.md5(data).hexdigest()
+
+
+def chunk_range(session: Dict[str, Any], chunk_number: int) -> tuple:
+    """Return ``(offset, length)`` of a chunk inside the target file."""
+    offset = chunk_number * session["chunk_size"]
+    length = max(0, min(session["chunk_size"], session["file_size"] - offset))
+    return offset, length
+
+
+@dataclass
+class _HashState:
+    hasher: Any = field(default_factory=hashlib.md5)
+    next_chunk: int = 0
+    received: Set[int] = field(default_factory=set)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class UploadSessionManager:
+    """分块上传会话管理器（基于DuckDB持久化）
+
+    会话与已接收分块记录在系统库中，进程重启后客户端可通过状态接口获取缺失分块继续上传。
+    MD5 只沿着“连续已到达”的分块前缀推进：顺序到达的分块直接用内存数据更新，
+    乱序分块在前缀补齐时从目标文件回读一次。重启后内存哈希状态丢失，会在下次推进时重建。
+    同一会话的分块可并发上传：分块各自定位写入，哈希推进由会话级锁串行化。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hash_states: Dict[str, _HashState] = {}
+        # 写盘吞吐的指数移动平均（字节/秒），用于给出分块大小建议
+        self._write_throughput: Optional[float] = None
+        self._ensure_tables()
+
+    def _ensure_tables(self) -> None:
+        with with_system_connection() as connection:
+            connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {UPLOAD_SESSIONS_TABLE} (
+                    upload_id TEXT PRIMARY KEY,
+                    file_name TEXT NOT NULL,
+                    file_size BIGINT NOT NULL,
+                    chunk_size BIGINT NOT NULL,
+                    total_chunks INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    file_hash TEXT,
+                    actual_hash TEXT,
+                    table_alias TEXT,
+                    file_extension TEXT,
+                    chunks_dir TEXT,
+                    target_path TEXT,
+                    error_message TEXT,
+                    file_info JSON,
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP
+                )
+                """
+            )
+            connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {UPLOAD_CHUNKS_TABLE} (
+                    upload_id TEXT NOT NULL,
+                    chunk_number INTEGER NOT NULL,
+                    chunk_size BIGINT,
+                    checksum TEXT,
+                    received_at TIMESTAMP,
+                    PRIMARY KEY (upload_id, chunk_number)
+                )
+                """
+            )
+            connection.execute(
+                f"ALTER TABLE {UPLOAD_CHUNKS_TABLE} ADD COLUMN IF NOT EXISTS checksum TEXT"
+            )
+
+    # ------------------------------------------------------------------ #
+    # Session persistence
+    # ------------------------------------------------------------------ #
+
+    def create_session(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist a new session and preallocate its target file."""
+        preallocate_file(session["target_path"], session["file_size"])
+        now = get_storage_time()
+        values = {
+            **{column: session.get(column) for column in _SESSION_COLUMNS},
+            "status": session.get("status") or "uploading",
+            "created_at": now,
+            "updated_at": now,
+        }
+
+        def _insert():
+            with with_system_connection() as connection:
+                connection.execute(
+                    f"INSERT INTO {UPLOAD_SESSIONS_TABLE} ({', '.join(_SESSION_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in _SESSION_COLUMNS)})",
+                    [values[column] for column in _SESSION_COLUMNS],
+                )
+
+        retry_on_write_conflict(_insert)
+        return self.get_session(session["upload_id"])
+
+    def get_session(
+        self, upload_id: str, include_chunks: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """Load a session, optionally with the set of chunks received so far."""
+        with with_system_connection() as connection:
+            row = connection.execute(
+                f"SELECT {', '.join(_SESSION_COLUMNS)} FROM {UPLOAD_SESSIONS_TABLE} "
+                "WHERE upload_id = ?",
+                [upload_id],
+            ).fetchone()
+            if row is None:
+                return None
+            chunk_rows = []
+            if include_chunks:
+                chunk_rows = connection.execute(
+                    f"SELECT chunk_number FROM {UPLOAD_CHUNKS_TABLE} WHERE upload_id = ?",
+                    [upload_id],
+                ).fetchall()
+
+        session = dict(zip(_SESSION_COLUMNS, row))
+        if isinstance(session.get("file_info"), str):
+            try:
+                session["file_info"] = json.loads(session["file_info"])
+            except ValueError:
+                session["file_info"] = None
+        session["created_at"] = format_storage_time_for_response(session["created_at"])
+        session["updated_at"] = format_storage_time_for_response(session["updated_at"])
+        if include_chunks:
+            session["uploaded_chunk_numbers"] = {r[0] for r in chunk_rows}
+            session["uploaded_chunks"] = len(session["uploaded_chunk_numbers"])
+        return session
+
+    def update_session(self, upload_id: str, **updates: Any) -> None:
+        """Update status / error / result fields of a session."""
+        if not updates:
+            return
+        if "file_info" in updates and updates["file_info"] is not None:
+            updates["file_info"] = json.dumps(
+                updates["file_info"], ensure_ascii=False, default=str
+            )
+        updates["updated_at"] = get_storage_time()
+        assignments = ", ".join(f"{column} = ?" for column in updates)
+
+        def _update():
+            with with_system_connection() as connection:
+                connection.execute(
+                    f"UPDATE {UPLOAD_SESSIONS_TABLE} SET {assignments} WHERE upload_id = ?",
+                    [*updates.values(), upload_id],
+                )
+
+        retry_on_write_conflict(_update)
+
+    def record_chunk(
+        self,
+        upload_id: str,
+        chunk_number: int,
+        size: int,
+        checksum: Optional[str] = None,
+    ) -> bool:
+        """Mark a chunk as received; returns False when it was already recorded."""
+
+        def _insert() -> bool:
+            with with_system_connection() as connection:
+                rows = connection.execute(
+                    f"""
+                    INSERT OR IGNORE INTO {UPLOAD_CHUNKS_TABLE}
+                        (upload_id, chunk_number, chunk_size, checksum, received_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    RETURNING chunk_number
+                    """,
+                    [upload_id, chunk_number, size, checksum, get_storage_time()],
+                ).fetchall()
+                return bool(rows)
+
+        return retry_on_write_conflict(_insert)
+
+    def is_chunk_recorded(self, upload_id: str, chunk_number: int) -> bool:
+        with with_system_connection() as connection:
+            row = connection.execute(
+                f"SELECT 1 FROM {UPLOAD_CHUNKS_TABLE} WHERE upload_id = ? AND chunk_number = ?",
+                [upload_id, chunk_number],
+            ).fetchone()
+        return row is not None
+
+    def count_chunks(self, upload_id: str) -> int:
+        with with_system_connection() as connection:
+            row = connection.execute(
+                f"SELECT COUNT(*) FROM {UPLOAD_CHUNKS_TABLE} WHERE upload_id = ?",
+                [upload_id],
+            ).fetchone()
+        return int(row[0]) if row else 0
+
+    def uploaded_chunk_numbers(self, upload_id: str) -> Set[int]:
+        with with_system_connection() as connection:
+            rows = connection.execute(
+                f"SELECT chunk_number FROM {UPLOAD_CHUNKS_TABLE} WHERE upload_id = ?",
+                [upload_id],
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def delete_session(self, upload_id: str) -> None:
+        """Remove a session and its chunk records."""
+
+        def _delete():
+            with with_system_connection() as connection:
+                connection.execute(
+                    f"DELETE FROM {UPLOAD_CHUNKS_TABLE} WHERE upload_id = ?", [upload_id]
+                )
+                connection.execute(
+                    f"DELETE FROM {UPLOAD_SESSIONS_TABLE} WHERE upload_id = ?", [upload_id]
+                )
+
+        retry_on_write_conflict(_delete)
+        with self._lock:
+            self._hash_states.pop(upload_id, None)
+
+    def clear_chunk_records(self, upload_id: str) -> None:
+        """Drop per-chunk records once a session no longer needs them."""
+        with with_system_connection() as connection:
+            connection.execute(
+                f"DELETE FROM {UPLOAD_CHUNKS_TABLE} WHERE upload_id = ?", [upload_id]
+            )
+        with self._lock:
+            self._hash_states.pop(upload_id, None)
+
+    def list_expired_sessions(self, max_age_hours: float = 24) -> List[Dict[str, Any]]:
+        """Return unfinished sessions that have not been touched for ``max_age_hours``."""
+        cutoff = get_storage_time() - timedelta(hours=max_age_hours)
+        with with_system_connection() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT s.upload_id, s.chunks_dir
+                FROM {UPLOAD_SESSIONS_TABLE} s
+                LEFT JOIN (
+                    SELECT upload_id, MAX(received_at) AS last_chunk_at
+                    FROM {UPLOAD_CHUNKS_TABLE}
+                    GROUP BY upload_id
+                ) c ON c.upload_id = s.upload_id
+                WHERE s.status IN ('uploading', 'failed')
+                  AND GREATEST(s.updated_at, COALESCE(c.last_chunk_at, s.updated_at)) < ?
+                """,
+                [cutoff],
+            ).fetchall()
+        return [{"upload_id": row[0], "chunks_dir": row[1]} for row in rows]
+
+    # ------------------------------------------------------------------ #
+    # Transfer recommendations
+    # ------------------------------------------------------------------ #
+
+    def record_write(self, size: int, seconds: float) -> None:
+        """Feed one chunk write into the disk throughput estimate."""
+        if size <= 0 or seconds <= 0:
+            return
+        sample = size / seconds
+        with self._lock:
+            if self._write_throughput is None:
+                self._write_throughput = sample
+            else:
+                self._write_throughput = 0.8 * self._write_throughput + 0.2 * sample
+
+    def active_load(self) -> Dict[str, int]:
+        """Count uploads still receiving chunks and uploads being ingested."""
+        cutoff = get_storage_time() - timedelta(minutes=ACTIVE_SESSION_WINDOW_MINUTES)
+        with with_system_connection() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT s.status, COUNT(*)
+                FROM {UPLOAD_SESSIONS_TABLE} s
+                LEFT JOIN (
+                    SELECT upload_id, MAX(received_at) AS last_chunk_at
+                    FROM {UPLOAD_CHUNKS_TABLE}
+                    GROUP BY upload_id
+                ) c ON c.upload_id = s.upload_id
+                WHERE s.status IN ('uploading', 'processing')
+                  AND GREATEST(s.updated_at, COALESCE(c.last_chunk_at, s.updated_at)) >= ?
+                GROUP BY s.status
+                """,
+                [cutoff],
+            ).fetchall()
+        counts = {status: int(count) for status, count in rows}
+        return {
+            "uploading": counts.get("uploading", 0),
+            "processing": counts.get("processing", 0),
+        }
+
+    def recommend_transfer(
+        self,
+        file_size: int,
+        max_parallelism: int,
+        default_chunk_size: int,
+    ) -> Dict[str, Any]:
+        """Suggest chunk size and parallelism for a new upload.
+
+        The chunk size follows the measured write throughput (one chunk ≈
+        ``TARGET_CHUNK_WRITE_SECONDS`` of disk time) and is bounded so a file never
+        exceeds ``MAX_CHUNKS_PER_UPLOAD`` chunks. Parallelism is the configured maximum
+        shared across uploads that are currently active; running ingestions take one
+        slot each because they compete for the same disk.
+        """
+        with self._lock:
+            throughput = self._write_throughput
+
+        chunk_size = default_chunk_size
+        if throughput:
+            chunk_size = int(throughput * TARGET_CHUNK_WRITE_SECONDS)
+        chunk_size = max(chunk_size, math.ceil(file_size / MAX_CHUNKS_PER_UPLOAD))
+        chunk_size = min(max(chunk_size, MIN_RECOMMENDED_CHUNK_SIZE), MAX_RECOMMENDED_CHUNK_SIZE)
+        # 对齐到MB，便于客户端切片
+        chunk_size = max(MIN_RECOMMENDED_CHUNK_SIZE, chunk_size // (1024 * 1024) * 1024 * 1024)
+
+        load = self.active_load()
+        slots = max(1, max_parallelism - load["processing"])
+        parallelism = max(1, slots // (load["uploading"] + 1))
+        total_chunks = max(1, math.ceil(file_size / chunk_size)) if file_size else 1
+        return {
+            "chunk_size": chunk_size,
+            "parallelism": min(parallelism, total_chunks),
+            "write_throughput": int(throughput) if throughput else None,
+            "active_uploads": load["uploading"],
+            "active_ingestions": load["processing"],
+        }
+
+    # ------------------------------------------------------------------ #
+    # Incremental hashing
+    # ------------------------------------------------------------------ #
+
+    def _hash_state(self, upload_id: str) -> _HashState:
+        with self._lock:
+            state = self._hash_states.get(upload_id)
+            if state is not None:
+                return state
+        # 新建或重启后重建：以系统库中已记录的分块为准
+        received = self.uploaded_chunk_numbers(upload_id)
+        with self._lock:
+            state = self._hash_states.get(upload_id)
+            if state is None:
+                state = _HashState(received=received)
+                self._hash_states[upload_id] = state
+            return state
+
+    def advance_hash(
+        self,
+        session: Dict[str, Any],
+        chunk_number: Optional[int] = None,
+        data: Optional[bytes] = None,
+        received: Optional[Set[int]] = None,
+    ) -> int:
+        """Feed contiguous received chunks into the running MD5.
+
+        ``data`` is the in-memory content of ``chunk_number`` (already written to the
+        target file) and is hashed without re-reading the file when that chunk is next
+        in line. Returns the number of chunks covered by the hash so far.
+        """
+        state = self._hash_state(session["upload_id"])
+        with state.lock:
+            if received:
+                state.received |= received
+            if chunk_number is not None:
+                state.received.add(chunk_number)
+            while state.next_chunk < session["total_chunks"]:
+                current = state.next_chunk
+                if current == chunk_number and data is not None:
+                    state.hasher.update(data)
+                elif current in state.received:
+                    self._hash_chunk_from_file(session, current, state.hasher)
+                else:
+                    break
+                state.next_chunk += 1
+            return state.next_chunk
+
+    @staticmethod
+    def _hash_chunk_from_file(session: Dict[str, Any], chunk_number: int, hasher) -> None:
+        offset, remaining = chunk_range(session, chunk_number)
+        with open(session["target_path"], "rb") as handle:
+            handle.seek(offset)
+            while remaining > 0:
+                block = handle.read(min(HASH_READ_SIZE, remaining))
+                if not block:
+                    raise IOError(f"Unexpected end of file while hashing chunk {chunk_number}")
+                hasher.update(block)
+                remaining -= len(block)
+
+    def finalize_hash(self, session: Dict[str, Any]) -> str:
+        """Return the MD5 of the assembled file; all chunks must have been received."""
+        covered = self.advance_hash(session, received=session["uploaded_chunk_numbers"])
+        if covered < session["total_chunks"]:
+            raise ValueError(
+                f"Cannot finalize hash, chunk {covered} has not been received"
+            )
+        state = self._hash_state(session["upload_id"])
+        return state.hasher.hexdigest()
+
+
+upload_session_manager = UploadSessionManager()
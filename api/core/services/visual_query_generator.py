@@ -35,6 +35,7 @@ from models.visual_query_models import (
     JSONTableConfig,
     JSONTableColumnConfig,
 )
+from core.database.plan_estimator import query_plan_estimator
 from core.database.table_metadata_cache import table_metadata_cache
 
 try:  # pragma: no cover - optional during tests
@@ -1578,6 +1579,9 @@ def estimate_query_performance(config: VisualQueryConfig, con) -> PerformanceEst
     """
     Estimate query performance based on configuration
 
+    Row estimates come from DuckDB's optimizer (``EXPLAIN``) when available and fall
+    back to COUNT(*)-based heuristics otherwise.
+
     Args:
         config: Visual query configuration
         con: DuckDB connection
@@ -1589,27 +1593,41 @@ def estimate_query_performance(config: VisualQueryConfig, con) -> PerformanceEst
         warnings = []
         complexity_score = 0
 
-        # Get base table row count
-        count_sql = f'SELECT COUNT(*) as total_rows FROM "{config.table_name}"'
-        total_rows = con.execute(count_sql).fetchdf().iloc[0]["total_rows"]
+        # Prefer DuckDB optimizer estimates: one EXPLAIN instead of a COUNT(*) scan
+        plan = None
+        try:
+            plan = query_plan_estimator.estimate(
+                con, generate_sql_from_config(config), [config.table_name]
+            )
+        except Exception as plan_exc:
+            logger.debug(f"EXPLAIN-based estimation unavailable: {str(plan_exc)}")
 
-        estimated_rows = total_rows
+        if plan is not None:
+            total_rows = plan.scan_cardinality or plan.root_cardinality
+            estimated_rows = plan.root_cardinality
+        else:
+            # Get base table row count
+            count_sql = f'SELECT COUNT(*) as total_rows FROM "{config.table_name}"'
+            total_rows = con.execute(count_sql).fetchdf().iloc[0]["total_rows"]
+            estimated_rows = total_rows
 
         # Estimate filtering impact
         if config.filters:
-            # Rough estimate: each filter reduces rows by 50% on average
-            filter_factor = 0.5 ** len(config.filters)
-            estimated_rows = int(estimated_rows * filter_factor)
+            if plan is None:
+                # Rough estimate: each filter reduces rows by 50% on average
+                filter_factor = 0.5 ** len(config.filters)
+                estimated_rows = int(estimated_rows * filter_factor)
             complexity_score += len(config.filters)
 
         # Estimate aggregation impact
         if config.aggregations:
-            if config.group_by or config.selected_columns:
-                # GROUP BY typically reduces row count significantly
-                estimated_rows = min(estimated_rows, int(total_rows * 0.1))
-            else:
-                # Single aggregation result
-                estimated_rows = 1
+            if plan is None:
+                if config.group_by or config.selected_columns:
+                    # GROUP BY typically reduces row count significantly
+                    estimated_rows = min(estimated_rows, int(total_rows * 0.1))
+                else:
+                    # Single aggregation result
+                    estimated_rows = 1
             complexity_score += len(config.aggregations) * 2
 
         # Estimate calculated fields impact
@@ -1836,6 +1854,17 @@ class SetOperationQueryGenerator:
             operation_type = config.operation_type
             tables = config.tables
 
+            # 优先使用DuckDB优化器估算（单次EXPLAIN，无需逐table COUNT(*)）
+            try:
+                plan = query_plan_estimator.estimate(
+                    connection,
+                    self.build_set_operation_query(config),
+                    [table.table_name for table in tables],
+                )
+                return int(plan.root_cardinality)
+            except Exception as plan_exc:
+                self.logger.debug(f"EXPLAIN-based estimation unavailable: {str(plan_exc)}")
+
             if operation_type == SetOperationType.UNION:
                 # UNION: 去重后的行数，通常小于所有table行数之和
                 total_rows = 0
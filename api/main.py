@@ -1,8 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import logging
 import json
 import os
+import threading
 import traceback
 import base64
 from datetime import datetime
@@ -47,7 +49,11 @@ except ImportError:
     query_proxy_available = False
 from core.database.database_manager import db_manager
 from models.query_models import DatabaseConnection, DataSourceType
-from core.data.file_datasource_manager import reload_all_file_datasources_to_duckdb
+from core.data.file_datasource_manager import (
+    drop_stale_staging_tables,
+    file_reload_progress,
+    reload_all_file_datasources_to_duckdb,
+)
 from core.database.duckdb_engine import (
     with_duckdb_connection,
     create_persistent_table,
@@ -65,9 +71,10 @@ def load_file_datasources_on_startup():
         logger.info("Starting to reload file datasources...")
         with with_duckdb_connection() as duckdb_con:
             success_count = reload_all_file_datasources_to_duckdb(duckdb_con)
-        logger.info(f"File datasources reload completed, successfully loaded files")
+        logger.info(f"File datasources reload completed, {success_count} datasources ready")
     except Exception as e:
         logger.error(f"Error reloading file datasources: {str(e)}")
+        file_reload_progress.finish(error=str(e))
 
 
 @asynccontextmanager
@@ -85,6 +92,20 @@ async def app_lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to load datasources at startup: {str(e)}")
 
+    # 清理上次进程中断时遗留的导入暂存表
+    try:
+        with with_duckdb_connection() as duckdb_con:
+            drop_stale_staging_tables(duckdb_con)
+    except Exception as e:
+        logger.error(f"Failed to drop stale staging tables: {str(e)}")
+
+    # 文件数据源对账在后台执行，进度见 /health/ready
+    if config_manager.get_app_config().reload_file_datasources_on_startup:
+        file_reload_progress.mark_pending()
+        threading.Thread(
+            target=load_file_datasources_on_startup, name="file-datasource-reload", daemon=True
+        ).start()
+
     try:
         from routers.async_tasks import cleanup_old_files
 
@@ -223,3 +244,14 @@ def initialize_encryption_key():
 @app.get("/health", tags=["Health"])
 async def health_check():
     return {"status": "healthy", "timestamp": "2025-01-18"}
+
+
+@app.get("/health/ready", tags=["Health"])
+async def readiness_check():
+    """文件数据源对账完成前返回 503，便于负载均衡等待就绪"""
+    progress = file_reload_progress.snapshot()
+    ready = file_reload_progress.ready
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "file_datasources": progress},
+    )
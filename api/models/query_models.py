@@ -272,6 +272,7 @@ class FileUploadResponse(BaseModel):
     columns: List[str]
     row_count: int
     preview_data: List[Dict[str, Any]]
+    linked_table: Optional[str] = None  # 内容相同的文件已导入过时，新表链接到的已有表
 
 
 class QueryExecutionResponse(BaseModel):
@@ -13,7 +13,6 @@ import traceback
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-import pandas as pd
 from core.common.config_manager import config_manager
 from core.common.timezone_utils import get_current_time, get_current_time_iso
 from core.data.file_datasource_manager import (
@@ -21,10 +20,9 @@ from core.data.file_datasource_manager import (
     create_table_from_dataframe,
     file_datasource_manager,
 )
-from core.database.duckdb_engine import (
-    create_varchar_table_from_dataframe,
-    get_db_connection,
-)
+from core.data.ingest_cache import prepare_table_rewrite
+from core.database.duckdb_engine import get_db_connection
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
 from core.services.task_manager import TaskStatus, task_manager
 from fastapi import APIRouter, BackgroundTasks, Body, HTTPException
 from fastapi.responses import FileResponse, JSONResponse
@@ -133,7 +131,8 @@ def _ensure_database_connection(datasource_id: str, datasource_type: str):
     return db_manager.get_connection(datasource_id)
 
 
-def _fetch_external_query_result(datasource: Dict[str, Any], sql: str) -> pd.DataFrame:
+def _resolve_external_datasource(datasource: Dict[str, Any]) -> str:
+    """校验外部数据源配置并确保连接可用，返回数据源ID"""
     if not isinstance(datasource, dict):
         raise ValueError("Invalid data source configuration")
 
@@ -149,13 +148,68 @@ def _fetch_external_query_result(datasource: Dict[str, Any], sql: str) -> pd.Dat
     if not connection:
         raise ValueError(f"Failed to establish data source connection: {datasource_id}")
 
-    from core.database.database_manager import db_manager
+    return datasource_id
 
-    result_df = db_manager.execute_query(datasource_id, sql)
-    if result_df is None or result_df.empty:
+
+def _extract_external_query_result(
+    con,
+    datasource: Dict[str, Any],
+    sql: str,
+    table_name: str,
+    should_stop=None,
+) -> int:
+    """以服务端游标按批把外部数据源查询结果写入 DuckDB 表，返回行数"""
+    datasource_id = _resolve_external_datasource(datasource)
+
+    from core.data.external_extract import (
+        PartitionSpec,
+        extract_partitioned_query_to_table,
+        extract_query_to_table,
+    )
+
+    # datasource.partition = {"column": ..., "partitions": N, "strategy": "range" | "modulo"}
+    partition_spec = PartitionSpec.from_options(datasource.get("partition"))
+    if partition_spec:
+        rows = extract_partitioned_query_to_table(
+            con, datasource_id, sql, table_name, partition_spec, should_stop=should_stop
+        )
+    else:
+        rows = extract_query_to_table(
+            con, datasource_id, sql, table_name, should_stop=should_stop
+        )
+    if rows == 0:
         raise ValueError("Query result is empty, cannot create async task")
 
-    return result_df
+    return rows
+
+
+def _sync_external_query_result(
+    con,
+    datasource: Dict[str, Any],
+    sql: str,
+    table_name: str,
+    should_stop=None,
+) -> Dict[str, Any]:
+    """按 datasource.sync 的水位配置把外部查询结果增量同步到 table_name，返回含 import_state 的表元数据"""
+    datasource_id = _resolve_external_datasource(datasource)
+
+    from core.data.external_extract import PartitionSpec
+    from core.data.external_sync import sync_external_table
+
+    # datasource.sync = {"watermark_column": ..., "key_columns": [...], "reconcile_every_hours": 24}
+    sync_options = datasource.get("sync") or {}
+    return sync_external_table(
+        con,
+        datasource_id,
+        sql,
+        table_name,
+        sync_options.get("watermark_column"),
+        key_columns=sync_options.get("key_columns"),
+        previous=file_datasource_manager.get_file_datasource(table_name),
+        reconcile_every_hours=sync_options.get("reconcile_every_hours"),
+        partition_spec=PartitionSpec.from_options(datasource.get("partition")),
+        should_stop=should_stop,
+    )
 
 
 def _attach_external_databases(
@@ -272,7 +326,7 @@ class AsyncQueryRequest(BaseModel):
 
     sql: str
     custom_table_name: Optional[str] = None  # 自定义表名（可选）
-    task_type: str = "query"  # 任务类型：query, save_to_table, export
+    task_type: str = "query"  # 任务类型：query, save_to_table, export, sync（外部表增量同步）
     datasource: Optional[Dict[str, Any]] = None
     # 联邦查询支持：需要 ATTACH 的外部数据库列表
     attach_databases: Optional[List[AttachDatabase]] = None
@@ -343,6 +397,40 @@ async def submit_async_query(
         # 验证 attach_databases 参数
         validate_attach_databases(request.attach_databases)
 
+        # 增量同步任务需要固定的镜像表名与水位列
+        if request.task_type == "sync":
+            sync_options = (request.datasource or {}).get("sync") or {}
+            if (
+                ((request.datasource or {}).get("type") or "").lower() not in SUPPORTED_EXTERNAL_TYPES
+                or not sync_options.get("watermark_column")
+                or not request.custom_table_name
+            ):
+                raise HTTPException(
+                    status_code=400,
+                    detail={
+                        "code": "VALIDATION_ERROR",
+                        "message": "Sync tasks require an external datasource, "
+                        "datasource.sync.watermark_column and custom_table_name",
+                        "field": "datasource.sync",
+                    },
+                )
+
+        # 验证外部数据源的分区抽取选项
+        if request.datasource and request.datasource.get("partition"):
+            from core.data.external_extract import PartitionSpec
+
+            try:
+                PartitionSpec.from_options(request.datasource["partition"])
+            except (TypeError, ValueError) as exc:
+                raise HTTPException(
+                    status_code=400,
+                    detail={
+                        "code": "VALIDATION_ERROR",
+                        "message": str(exc),
+                        "field": "datasource.partition",
+                    },
+                )
+
         # 判断是否为联邦查询
         is_federated = bool(
             request.attach_databases and len(request.attach_databases) > 0
@@ -739,6 +827,7 @@ def execute_async_query(
     metadata_snapshot = {}
     source_datasource_id = None
     datasource_type = ""
+    is_sync_task = False
     query_success = False
     start_time = time.time()
 
@@ -771,6 +860,8 @@ def execute_async_query(
         )
         use_external_source = datasource_type in SUPPORTED_EXTERNAL_TYPES
         source_datasource_id = datasource_info.get("id") if datasource_info else None
+        # 增量同步任务把新行并入已有的镜像表，取消或中断时不能删除该表
+        is_sync_task = task_type == "sync" and use_external_source
 
         # 确定表名
         if custom_table_name:
@@ -786,25 +877,42 @@ def execute_async_query(
 
         # 第二步：执行查询（使用可中断连接）
         with interruptible_connection(task_id, clean_sql) as con:
-            if use_external_source:
+            if is_sync_task:
+                logger.info(
+                    f"Async task will incrementally sync {table_name} from external datasource {source_datasource_id}"
+                )
+                metadata_snapshot = _sync_external_query_result(
+                    con,
+                    datasource_info,
+                    clean_sql,
+                    table_name,
+                    should_stop=lambda: task_manager.is_cancellation_requested(task_id),
+                )
+            elif use_external_source:
                 logger.info(
                     f"Async task will use external datasource {source_datasource_id} ({datasource_type}) to execute query"
                 )
-                result_df = _fetch_external_query_result(datasource_info, clean_sql)
-                created = create_varchar_table_from_dataframe(
-                    table_name, result_df, con
+                extracted_rows = _extract_external_query_result(
+                    con,
+                    datasource_info,
+                    clean_sql,
+                    table_name,
+                    should_stop=lambda: task_manager.is_cancellation_requested(task_id),
+                )
+                logger.info(
+                    f"External data source result streamed to DuckDB table: {table_name} ({extracted_rows} rows)"
                 )
-                if not created:
-                    raise ValueError("Failed to write external data source result to DuckDB")
-                logger.info(f"External data source result written to DuckDB table: {table_name}")
             else:
                 create_sql = f'CREATE OR REPLACE TABLE "{table_name}" AS ({clean_sql})'
                 logger.debug(f"[{task_id}] Starting CREATE TABLE AS SELECT...")
+                prepare_table_rewrite(con, table_name, keep_data=True)
                 con.execute(create_sql)
+                invalidate_table_metadata_cache(table_name)
                 logger.info(f"[{task_id}] Persistent table created successfully: {table_name}")
 
-            # 获取元数据（在同一连接中）
-            metadata_snapshot = build_table_metadata_snapshot(con, table_name)
+            # 获取元数据（在同一连接中）；同步任务已得到合并后的元数据，不再整表采集
+            if not is_sync_task:
+                metadata_snapshot = build_table_metadata_snapshot(con, table_name)
             row_count = metadata_snapshot.get("row_count", 0)
             logger.info(f"Query result row count: {row_count}")
 
@@ -828,8 +936,8 @@ def execute_async_query(
             query_success = True
         # 连接池连接在这里释放
 
-        # 取消检查点 2: 查询完成后检查
-        if task_manager.is_cancellation_requested(task_id):
+        # 取消检查点 2: 查询完成后检查（同步任务的新行已并入镜像表，必须继续保存水位）
+        if not is_sync_task and task_manager.is_cancellation_requested(task_id):
             logger.info(f"Task was cancelled after query completion: {task_id}, cleaning created table")
             # 使用新连接清理表
             with pool.get_connection() as con:
@@ -923,7 +1031,7 @@ def execute_async_query(
         logger.info(f"Task {task_id} query interrupted")
 
         # 清理可能已创建的表
-        if table_name:
+        if table_name and not is_sync_task:
             try:
                 with pool.get_connection() as con:
                     con.execute(f'DROP TABLE IF EXISTS "{table_name}"')
@@ -1040,7 +1148,9 @@ def execute_async_federated_query(
                 # 2.2 执行查询并保存结果
                 create_sql = f'CREATE OR REPLACE TABLE "{table_name}" AS ({clean_sql})'
                 logger.info(f"Executing federated query: {create_sql[:200]}...")
+                prepare_table_rewrite(con, table_name, keep_data=True)
                 con.execute(create_sql)
+                invalidate_table_metadata_cache(table_name)
                 logger.info(f"Federated query result table created: {table_name}")
 
                 # 2.3 获取元数据（在同一连接中）
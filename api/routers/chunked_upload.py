@@ -5,27 +5,42 @@
 """
 
 import os
-import hashlib
 import logging
 import traceback
 import time
-import threading
 import shutil
+import threading
 import uuid
 from typing import Dict, Any, Optional
 from pathlib import Path
 
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 from core.common.config_manager import config_manager
-from core.database.duckdb_engine import get_db_connection
+from core.database.duckdb_engine import with_duckdb_connection
 from core.data.file_datasource_manager import (
     file_datasource_manager,
     create_table_from_dataframe,
 )
 from core.data.excel_import_manager import register_excel_upload, sanitize_identifier
+from core.data.compressed_files import split_compression
+from core.data.file_utils import detect_file_type
+from core.data.ingest_cache import (
+    build_ingest_key,
+    find_cached_ingest,
+    ingest_cache_metadata,
+    link_cached_ingest,
+)
+from core.data.parquet_stream_ingest import ParquetStreamIngestor
 from core.services.resource_manager import schedule_cleanup
+from core.services.upload_session_manager import (
+    chunk_range,
+    md5_hex,
+    upload_session_manager,
+    write_at,
+)
 from core.common.timezone_utils import get_current_time_iso  # 统一时间
 from utils.response_helpers import (
     create_success_response,
@@ -36,8 +51,13 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-STREAMABLE_FILE_TYPES = {"csv", "json", "jsonl"}
-STREAM_CHUNK_SIZE = 1024 * 1024  # 1MB 内部流式写入块
+UPLOAD_SESSION_MAX_AGE_HOURS = 24  # 未完成会话保留时长，超时后清理
+STREAM_INGEST_FORMATS = {"parquet", "pq"}  # 支持边上传边导入的格式
+STREAM_INGEST_WAIT_SECONDS = 600  # 完成上传时等待剩余row group导入的上限
+
+# 进程内的边上传边导入任务；服务重启后丢失时回退为上传完成后整体导入
+_stream_ingestors: Dict[str, ParquetStreamIngestor] = {}
+_stream_ingestors_lock = threading.Lock()
 
 
 class ChunkUploadRequest(BaseModel):
@@ -65,78 +85,6 @@ class UploadStatus(BaseModel):
     error_message: str = None
 
 
-# 全局上传状态存储
-upload_sessions: Dict[str, Dict[str, Any]] = {}
-
-
-def _is_streaming_supported(file_extension: str) -> bool:
-    return hasattr(os, "mkfifo") and file_extension.lower() in STREAMABLE_FILE_TYPES
-
-
-def _build_chunk_path(session: Dict[str, Any], chunk_number: int) -> str:
-    return os.path.join(session["chunks_dir"], f"chunk_{chunk_number:06d}")
-
-
-class ChunkStreamWriter:
-    """将分块数据同时写入最终文件并流向FIFO供DuckDB读取"""
-
-    def __init__(self, session: Dict[str, Any], fifo_path: str, final_file_path: str):
-        self.session = session
-        self.fifo_path = fifo_path
-        self.final_file_path = final_file_path
-        self._stop_event = threading.Event()
-        self._thread = threading.Thread(target=self._run, name=f"ChunkStream-{session['upload_id']}")
-        self.error: Optional[Exception] = None
-
-    def start(self):
-        self._thread.start()
-
-    def stop(self):
-        self._stop_event.set()
-
-    def wait(self):
-        if self._thread.is_alive():
-            self._thread.join()
-
-    def _run(self):
-        try:
-            os.makedirs(os.path.dirname(self.final_file_path), exist_ok=True)
-            if os.path.exists(self.final_file_path):
-                os.unlink(self.final_file_path)
-            with open(self.final_file_path, "wb") as final_file:
-                with open(self.fifo_path, "wb") as fifo:
-                    for chunk_num in range(self.session["total_chunks"]):
-                        if self._stop_event.is_set():
-                            break
-                        chunk_path = _build_chunk_path(self.session, chunk_num)
-                        if not os.path.exists(chunk_path):
-                            raise FileNotFoundError(f"Missing chunk file: {chunk_path}")
-
-                        with open(chunk_path, "rb") as chunk_file:
-                            while True:
-                                data = chunk_file.read(STREAM_CHUNK_SIZE)
-                                if not data:
-                                    break
-                                final_file.write(data)
-                                fifo.write(data)
-
-                        try:
-                            os.unlink(chunk_path)
-                        except FileNotFoundError:
-                            pass
-
-                # FIFO读取完成后由DuckDB关闭，我们负责回收文件
-        except BrokenPipeError as exc:
-            self.error = exc
-        except Exception as exc:  # pylint: disable=broad-exception-caught
-            self.error = exc
-        finally:
-            try:
-                os.unlink(self.fifo_path)
-            except FileNotFoundError:
-                pass
-
-
 def _generate_unique_table_name(con, desired_name: Optional[str], user_provided: bool = False) -> str:
     base_name = desired_name if desired_name else ""
     if not base_name:
@@ -188,103 +136,102 @@ def get_chunks_dir(upload_id: str) -> str:
     return chunks_dir
 
 
-def calculate_file_hash(file_path: str) -> str:
-    """计算文件MD5哈希"""
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+def _cleanup_expired_sessions() -> None:
+    """清理长时间未完成的上传会话及其预分配文件"""
+    try:
+        expired = upload_session_manager.list_expired_sessions(UPLOAD_SESSION_MAX_AGE_HOURS)
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        logger.warning("Failed to list expired upload sessions: %s", exc)
+        return
+    for item in expired:
+        _discard_stream_ingestor(item["upload_id"])
+        if item["chunks_dir"] and os.path.exists(item["chunks_dir"]):
+            shutil.rmtree(item["chunks_dir"], ignore_errors=True)
+        upload_session_manager.delete_session(item["upload_id"])
+        logger.info("Expired upload session removed: %s", item["upload_id"])
+
+
+def _store_chunk(
+    session: Dict[str, Any],
+    chunk_number: int,
+    offset: int,
+    data: bytes,
+    chunk_hash: Optional[str],
+) -> str:
+    """校验分块摘要、定位写入目标文件并推进整体哈希（在线程池中执行）"""
+    checksum = md5_hex(data)
+    if chunk_hash and checksum != chunk_hash.lower():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Chunk checksum mismatch for chunk {chunk_number}, please re-send this chunk",
+        )
 
+    started = time.perf_counter()
+    write_at(session["target_path"], offset, data)
+    upload_session_manager.record_write(len(data), time.perf_counter() - started)
 
-async def process_streaming_upload(
-    session: Dict[str, Any],
-):
-    """通过FIFO流式写入DuckDB，适用于CSV/JSON/JSONL"""
-    fifo_path = os.path.join(session["chunks_dir"], f"stream_{session['upload_id']}.fifo")
-    try:
-        if os.path.exists(fifo_path):
-            os.unlink(fifo_path)
-        os.mkfifo(fifo_path)
-    except Exception as exc:
-        logger.error("Failed to create FIFO: %s", exc)
-        raise HTTPException(status_code=500, detail="Unable to create streaming upload channel") from exc
+    upload_session_manager.record_chunk(
+        session["upload_id"], chunk_number, len(data), checksum
+    )
+    upload_session_manager.advance_hash(session, chunk_number, data)
+    return checksum
 
-    final_file_path = _get_final_file_path(session["file_name"])
-    writer = ChunkStreamWriter(session, fifo_path, final_file_path)
-    writer.start()
 
-    try:
-        file_info = _load_stream_into_duckdb(session, fifo_path, final_file_path)
-    except Exception:
-        writer.stop()
-        writer.wait()
-        raise
+def _build_status_payload(session: Dict[str, Any]) -> Dict[str, Any]:
+    uploaded = session["uploaded_chunk_numbers"]
+    total_chunks = session["total_chunks"]
+    return {
+        "upload_id": session["upload_id"],
+        "file_name": session["file_name"],
+        "file_size": session["file_size"],
+        "chunk_size": session["chunk_size"],
+        "total_chunks": total_chunks,
+        "uploaded_chunks": len(uploaded),
+        "missing_chunks": [n for n in range(total_chunks) if n not in uploaded],
+        "progress": len(uploaded) / total_chunks * 100 if total_chunks else 100.0,
+        "status": session["status"],
+        "created_at": session["created_at"],
+        "error_message": session.get("error_message"),
+        "file_info": session.get("file_info"),
+    }
 
-    writer.wait()
-    if writer.error:
-        raise HTTPException(status_code=500, detail=f"Streaming write failed: {writer.error}")
 
-    if session.get("file_hash"):
-        actual_hash = calculate_file_hash(final_file_path)
-        if actual_hash != session["file_hash"]:
-            raise HTTPException(status_code=400, detail="File hash verification failed, file may be corrupted")
+def _notify_stream_ingestor(session: Dict[str, Any], chunk_number: int) -> None:
+    """分块到达后通知（必要时启动）该会话的流式导入任务"""
+    if session.get("file_extension") not in STREAM_INGEST_FORMATS:
+        return
+    upload_id = session["upload_id"]
+    with _stream_ingestors_lock:
+        ingestor = _stream_ingestors.get(upload_id)
+        if ingestor is None:
+            ingestor = ParquetStreamIngestor(
+                upload_id,
+                session["target_path"],
+                session["file_size"],
+                session["chunk_size"],
+                received=upload_session_manager.uploaded_chunk_numbers(upload_id),
+            )
+            _stream_ingestors[upload_id] = ingestor
+            ingestor.start()
+    ingestor.notify_chunk(chunk_number)
 
-    try:
-        file_size = os.path.getsize(final_file_path)
-    except OSError:
-        file_size = session.get("file_size", 0)
-
-    file_info["file_size"] = file_size
-    file_info["cleanup_path"] = final_file_path
-    return file_info
-
-
-def _load_stream_into_duckdb(session: Dict[str, Any], fifo_path: str, final_file_path: str) -> Dict[str, Any]:
-    file_extension = session.get("file_extension") or session["file_name"].lower().split(".")[-1]
-    con = get_db_connection()
-    desired_name = session.get("table_alias") or session["file_name"].split(".")[0]
-    source_id = _generate_unique_table_name(con, desired_name)
-
-    metadata = create_table_from_dataframe(
-        con,
-        source_id,
-        fifo_path,
-        file_extension,
-    )
 
-    table_metadata = {
-        "source_id": source_id,
-        "filename": session["file_name"],
-        "file_path": final_file_path,
-        "file_type": file_extension,
-        "row_count": metadata.get("row_count", 0),
-        "column_count": metadata.get("column_count", 0),
-        "columns": metadata.get("columns", []),
-        "column_profiles": metadata.get("column_profiles", []),
-        "schema_version": 2,
-        "created_at": get_current_time_iso(),
-    }
+def _pop_stream_ingestor(upload_id: str) -> Optional[ParquetStreamIngestor]:
+    with _stream_ingestors_lock:
+        return _stream_ingestors.pop(upload_id, None)
 
-    file_datasource_manager.save_file_datasource(table_metadata)
-    logger.info("Streaming file datasource saved successfully: %s", source_id)
 
-    return {
-        "source_id": source_id,
-        "filename": session["file_name"],
-        "file_size": 0,
-        "row_count": metadata.get("row_count", 0),
-        "column_count": metadata.get("column_count", 0),
-        "columns": metadata.get("columns", []),
-        "preview_data": [{"提示": "预览数据已禁用以提高性能"}],
-    }
+def _discard_stream_ingestor(upload_id: str) -> None:
+    ingestor = _pop_stream_ingestor(upload_id)
+    if ingestor is not None:
+        ingestor.discard()
 
 
 @router.post("/api/upload/init", tags=["Chunked Upload"])
 async def init_upload(
     file_name: str = Form(...),
     file_size: int = Form(...),
-    chunk_size: int = Form(default=1024 * 1024),  # 默认1MB分块
+    chunk_size: int = Form(default=None),  # 未指定时使用服务端建议值
     file_hash: str = Form(default=None),
     table_alias: str = Form(default=None),  # 表别名支持
 ):
@@ -294,7 +241,7 @@ async def init_upload(
     Args:
         file_name: 文件名
         file_size: 文件总大小
-        chunk_size: 分块大小
+        chunk_size: 分块大小（可选，缺省使用服务端根据磁盘吞吐给出的建议值）
         file_hash: 文件MD5哈希（可选）
         table_alias: 表别名（可选）
     """
@@ -311,46 +258,78 @@ async def init_upload(
         # 检查文件类型
         file_extension = file_name.lower().split(".")[-1]
         supported_formats = ["csv", "xlsx", "xls", "json", "jsonl", "parquet", "pq"]
+        compression = split_compression(file_name)[1]
 
-        if file_extension not in supported_formats:
+        # 压缩文件按内层格式判断；'bundle.zip' 要在组装完成后按包内文件识别
+        if detect_file_type(file_name) == "unknown" and compression != "zip":
             raise HTTPException(
                 status_code=400,
-                detail=f"Unsupported file format. Supported formats: {', '.join(supported_formats)}",
+                detail=(
+                    f"Unsupported file format. Supported formats: {', '.join(supported_formats)}"
+                    " (optionally compressed as .gz, .zst, .bz2 or .zip)"
+                ),
             )
 
+        _cleanup_expired_sessions()
+
+        # 根据写盘吞吐与当前上传/导入负载给出分块大小与并发建议
+        recommendation = upload_session_manager.recommend_transfer(
+            file_size,
+            max_parallelism=max(1, int(app_config.chunked_upload_max_parallelism or 1)),
+            default_chunk_size=int(app_config.chunked_upload_chunk_size_mb or 1) * 1024 * 1024,
+        )
+        if chunk_size is None:
+            chunk_size = recommendation["chunk_size"]
+        if chunk_size <= 0:
+            raise HTTPException(status_code=400, detail="Chunk size must be positive")
+
         # 生成上传ID
         upload_id = str(uuid.uuid4())
 
         # 计算总分块数
         total_chunks = (file_size + chunk_size - 1) // chunk_size
 
-        # 创建上传会话
-        upload_sessions[upload_id] = {
-            "upload_id": upload_id,
-            "file_name": file_name,
-            "file_size": file_size,
-            "chunk_size": chunk_size,
-            "total_chunks": total_chunks,
-            "uploaded_chunks": 0,
-            "uploaded_chunk_numbers": set(),
-            "status": "uploading",
-            "created_at": get_current_time_iso(),
-            "file_hash": file_hash,
-            "table_alias": table_alias,  # 保存表别名
-            "chunks_dir": get_chunks_dir(upload_id),
-            "file_extension": file_extension,
-        }
+        # 创建上传会话（持久化到系统库，并预分配目标文件供分块定位写入）
+        chunks_dir = get_chunks_dir(upload_id)
+        upload_session_manager.create_session(
+            {
+                "upload_id": upload_id,
+                "file_name": file_name,
+                "file_size": file_size,
+                "chunk_size": chunk_size,
+                "total_chunks": total_chunks,
+                "status": "uploading",
+                "file_hash": file_hash,
+                "table_alias": table_alias,  # 保存表别名
+                "chunks_dir": chunks_dir,
+                "target_path": os.path.join(chunks_dir, "upload.part"),
+                "file_extension": file_extension,
+            }
+        )
 
         logger.info(
             "Initialized upload session: %s, file: %s, size: %d, chunks: %d",
             upload_id, file_name, file_size, total_chunks
         )
 
+        # Parquet的footer位于文件末尾，先上传尾块即可在上传过程中逐个导入row group
+        priority_chunks = (
+            [total_chunks - 1]
+            if file_extension in STREAM_INGEST_FORMATS and total_chunks > 0
+            else []
+        )
+
         return create_success_response(
             data={
                 "upload_id": upload_id,
                 "total_chunks": total_chunks,
                 "chunk_size": chunk_size,
+                "recommended_chunk_size": recommendation["chunk_size"],
+                "recommended_parallelism": min(
+                    recommendation["parallelism"], max(total_chunks, 1)
+                ),
+                "priority_chunks": priority_chunks,
+                "stream_ingest": file_extension in STREAM_INGEST_FORMATS,
             },
             message_code=MessageCode.CHUNKED_UPLOAD_INIT,
             message="Upload session initialized successfully",
@@ -368,22 +347,23 @@ async def upload_chunk(
     upload_id: str = Form(...),
     chunk_number: int = Form(...),
     chunk: UploadFile = File(...),
+    chunk_hash: str = Form(default=None),
 ):
     """
-    上传文件分块
+    上传文件分块，同一会话的多个分块可并发上传
 
     Args:
         upload_id: 上传会话ID
         chunk_number: 分块编号（从0开始）
         chunk: 分块文件数据
+        chunk_hash: 分块MD5（可选），不一致时只需重传该分块
     """
     try:
         # Check upload session
-        if upload_id not in upload_sessions:
+        session = upload_session_manager.get_session(upload_id, include_chunks=False)
+        if session is None:
             raise HTTPException(status_code=404, detail="Upload session does not exist")
 
-        session = upload_sessions[upload_id]
-
         if session["status"] != "uploading":
             raise HTTPException(
                 status_code=400, detail=f"Upload session status error: {session['status']}"
@@ -397,11 +377,11 @@ async def upload_chunk(
             )
 
         # 检查分块是否已上传
-        if chunk_number in session["uploaded_chunk_numbers"]:
+        if upload_session_manager.is_chunk_recorded(upload_id, chunk_number):
             return create_success_response(
                 data={
                     "chunk_number": chunk_number,
-                    "progress": len(session["uploaded_chunk_numbers"])
+                    "progress": upload_session_manager.count_chunks(upload_id)
                     / session["total_chunks"]
                     * 100,
                 },
@@ -409,16 +389,23 @@ async def upload_chunk(
                 message=f"Chunk {chunk_number} already exists, skipping upload",
             )
 
-        # 保存分块
-        chunk_path = _build_chunk_path(session, chunk_number)
+        # 校验分块长度，避免截断的分块写入错误偏移
+        offset, expected_length = chunk_range(session, chunk_number)
         chunk_content = await chunk.read()
+        if len(chunk_content) != expected_length:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid chunk size for chunk {chunk_number}: expected {expected_length} bytes, got {len(chunk_content)}",
+            )
 
-        with open(chunk_path, "wb") as f:
-            f.write(chunk_content)
+        # 定位写入预分配的目标文件，乱序/并发分块无需合并；写盘与哈希不阻塞事件循环
+        checksum = await run_in_threadpool(
+            _store_chunk, session, chunk_number, offset, chunk_content, chunk_hash
+        )
+        _notify_stream_ingestor(session, chunk_number)
 
         # 更新会话状态
-        session["uploaded_chunk_numbers"].add(chunk_number)
-        session["uploaded_chunks"] = len(session["uploaded_chunk_numbers"])
+        session["uploaded_chunks"] = upload_session_manager.count_chunks(upload_id)
 
         progress = session["uploaded_chunks"] / session["total_chunks"] * 100
 
@@ -430,6 +417,7 @@ async def upload_chunk(
         return create_success_response(
             data={
                 "chunk_number": chunk_number,
+                "checksum": checksum,
                 "uploaded_chunks": session["uploaded_chunks"],
                 "total_chunks": session["total_chunks"],
                 "progress": progress,
@@ -445,22 +433,55 @@ async def upload_chunk(
         raise HTTPException(status_code=500, detail=f"Failed to upload chunk: {str(e)}") from e
 
 
+@router.get("/api/upload/status/{upload_id}", tags=["Chunked Upload"])
+async def get_upload_status(upload_id: str):
+    """
+    查询上传会话状态，客户端断线重连后据此只补传缺失的分块
+
+    Args:
+        upload_id: 上传会话ID
+    """
+    session = upload_session_manager.get_session(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session does not exist")
+
+    return create_success_response(
+        data=_build_status_payload(session),
+        message_code=MessageCode.CHUNKED_UPLOAD_STATUS,
+    )
+
+
 @router.post("/api/upload/complete", tags=["Chunked Upload"])
 async def complete_upload(
     upload_id: str = Form(...), background_tasks: BackgroundTasks = None
 ):
     """
-    完成分块上传，合并文件并处理
+    完成分块上传，校验已组装的文件并处理
 
     Args:
         upload_id: 上传会话ID
     """
+    ingestor = None
     try:
         # Check upload session
-        if upload_id not in upload_sessions:
+        session = upload_session_manager.get_session(upload_id)
+        if session is None:
             raise HTTPException(status_code=404, detail="Upload session does not exist")
 
-        session = upload_sessions[upload_id]
+        if session["status"] == "completed":
+            return create_success_response(
+                data={
+                    "upload_id": upload_id,
+                    "file_info": session.get("file_info"),
+                },
+                message_code=MessageCode.CHUNKED_UPLOAD_COMPLETE,
+                message="File upload and processing completed",
+            )
+
+        if session["status"] != "uploading":
+            raise HTTPException(
+                status_code=400, detail=f"Upload session status error: {session['status']}"
+            )
 
         # 检查所有分块是否已上传
         if session["uploaded_chunks"] != session["total_chunks"]:
@@ -469,47 +490,44 @@ async def complete_upload(
                 detail=f"Upload incomplete, uploaded: {session['uploaded_chunks']}/{session['total_chunks']}",
             )
 
-        session["status"] = "processing"
-
-        file_extension = session.get("file_extension") or session["file_name"].lower().split(".")[-1]
-        streaming_supported = _is_streaming_supported(file_extension)
-
-        if streaming_supported:
-            file_info = await process_streaming_upload(session)
-            final_file_path = file_info.get("cleanup_path")
-        else:
-            temp_upload_path = os.path.join(get_upload_dir(), session["file_name"])
-
-            with open(temp_upload_path, "wb") as final_file:
-                for chunk_num in range(session["total_chunks"]):
-                    chunk_path = _build_chunk_path(session, chunk_num)
-                    if os.path.exists(chunk_path):
-                        with open(chunk_path, "rb") as chunk_file:
-                            final_file.write(chunk_file.read())
-                    else:
-                        raise HTTPException(
-                            status_code=500,
-                            detail=f"Chunk file missing: chunk_{chunk_num:06d}",
-                        )
-
-            final_file_path = _get_final_file_path(session["file_name"])
-            shutil.move(temp_upload_path, final_file_path)
-            logger.info("File moved to: %s", final_file_path)
-
-            if session.get("file_hash"):
-                actual_hash = calculate_file_hash(final_file_path)
-                if actual_hash != session["file_hash"]:
-                    raise HTTPException(
-                        status_code=400, detail="File hash verification failed, file may be corrupted"
-                    )
-
-            file_info = await process_uploaded_file(
-                final_file_path,
-                session["file_name"],
-                session.get("table_alias"),
-                background_tasks=background_tasks,
+        # 增量哈希在分块到达时已计算，此处仅补齐乱序到达的尾部
+        actual_hash = upload_session_manager.finalize_hash(session)
+        if session.get("file_hash") and actual_hash != session["file_hash"]:
+            _discard_stream_ingestor(upload_id)
+            raise HTTPException(
+                status_code=400, detail="File hash verification failed, file may be corrupted"
             )
 
+        upload_session_manager.update_session(
+            upload_id, status="processing", actual_hash=actual_hash
+        )
+
+        # 等待流式导入完成剩余的row group；失败或不存在时回退为整体导入
+        ingestor = _pop_stream_ingestor(upload_id)
+        if ingestor is not None:
+            ready = await run_in_threadpool(ingestor.wait, STREAM_INGEST_WAIT_SECONDS)
+            if not ready:
+                logger.warning(
+                    "Streaming ingestion unavailable for upload %s, falling back: %s",
+                    upload_id, ingestor.progress(),
+                )
+                await run_in_threadpool(ingestor.discard)
+                ingestor = None
+
+        # 目标文件已完整组装，直接改名到最终位置
+        final_file_path = _get_final_file_path(session["file_name"])
+        os.replace(session["target_path"], final_file_path)
+        logger.info("File moved to: %s", final_file_path)
+
+        file_info = await process_uploaded_file(
+            final_file_path,
+            session["file_name"],
+            session.get("table_alias"),
+            background_tasks=background_tasks,
+            ingestor=ingestor,
+            content_hash=actual_hash,
+        )
+
         if os.path.exists(session["chunks_dir"]):
             shutil.rmtree(session["chunks_dir"])
 
@@ -524,8 +542,10 @@ async def complete_upload(
             ):
                 schedule_cleanup(final_file_path, background_tasks)
 
-        session["status"] = "completed"
-        session["file_info"] = file_info
+        upload_session_manager.update_session(
+            upload_id, status="completed", file_info=file_info
+        )
+        upload_session_manager.clear_chunk_records(upload_id)
 
         logger.info(
             "File upload completed: %s, size: %d",
@@ -547,10 +567,16 @@ async def complete_upload(
         logger.error("Failed to complete upload: %s", e)
         logger.error("Stack trace: %s", traceback.format_exc())
 
+        if ingestor is not None:
+            await run_in_threadpool(ingestor.discard)
+
         # 更新会话状态为失败
-        if upload_id in upload_sessions:
-            upload_sessions[upload_id]["status"] = "failed"
-            upload_sessions[upload_id]["error_message"] = str(e)
+        try:
+            upload_session_manager.update_session(
+                upload_id, status="failed", error_message=str(e)
+            )
+        except Exception as update_error:  # pylint: disable=broad-exception-caught
+            logger.warning("Failed to mark upload session as failed: %s", update_error)
 
         raise HTTPException(status_code=500, detail=f"Failed to complete upload: {str(e)}") from e
 
@@ -560,8 +586,14 @@ async def process_uploaded_file(
     file_name: str,
     table_alias: str = None,
     background_tasks: Optional[BackgroundTasks] = None,
+    ingestor: Optional[ParquetStreamIngestor] = None,
+    content_hash: Optional[str] = None,
 ) -> Dict[str, Any]:
-    """Process uploaded file and load to DuckDB"""
+    """Process uploaded file and load to DuckDB
+
+    ``ingestor`` 为已在上传过程中完成导入的流式任务时，仅将其暂存表改名为正式表。
+    ``content_hash`` 为组装后文件的 MD5；相同内容已导入过时以视图链接到已有的表。
+    """
     try:
         logger.info("Starting to process uploaded file: %s, path: %s", file_name, file_path)
 
@@ -588,28 +620,44 @@ async def process_uploaded_file(
                 "cleanup_path": None,
             }
 
-        con = get_db_connection()
-        desired_name = table_alias if table_alias else file_name.split(".")[0]
-        source_id = _generate_unique_table_name(con, desired_name, user_provided=bool(table_alias))
-        logger.info("Generated table name: %s", source_id)
+        file_type = detect_file_type(file_path)
+        if file_type == "unknown":
+            raise ValueError(f"Unsupported file type: {file_name}")
 
         table_info = None
-        try:
-            logger.info("Starting to load into DuckDB...")
-            con = get_db_connection()
-            table_info = create_table_from_dataframe(
-                con, source_id, file_path, file_extension
-            )
-            logger.info("Successfully loaded into DuckDB: %s", table_info)
-        except Exception as e:
-            logger.error("Failed to load into DuckDB: %s", e)
-            raise
+        ingest_key = build_ingest_key(content_hash, file_type) if content_hash else None
+        with with_duckdb_connection() as con:
+            desired_name = table_alias if table_alias else file_name.split(".")[0]
+            source_id = _generate_unique_table_name(con, desired_name, user_provided=bool(table_alias))
+            logger.info("Generated table name: %s", source_id)
+
+            cached = None
+            if ingest_key and config_manager.get_app_config().upload_dedup_enabled:
+                cached = find_cached_ingest(con, content_hash, ingest_key)
+
+            try:
+                if cached:
+                    if ingestor is not None:
+                        await run_in_threadpool(ingestor.discard)
+                    table_info = link_cached_ingest(con, source_id, *cached)
+                elif ingestor is not None:
+                    logger.info("Promoting streamed staging table %s", ingestor.staging_table)
+                    table_info = ingestor.finalize(con, source_id)
+                else:
+                    logger.info("Starting to load into DuckDB...")
+                    table_info = create_table_from_dataframe(
+                        con, source_id, file_path, file_type
+                    )
+                logger.info("Successfully loaded into DuckDB: %s", table_info)
+            except Exception as e:
+                logger.error("Failed to load into DuckDB: %s", e)
+                raise
 
         file_metadata = {
             "source_id": source_id,
             "filename": file_name,
             "file_path": file_path,
-            "file_type": file_extension,
+            "file_type": file_type,
             "row_count": table_info.get("row_count", 0),
             "column_count": table_info.get("column_count", 0),
             "columns": table_info.get("columns", []),
@@ -617,6 +665,11 @@ async def process_uploaded_file(
             "schema_version": 2,
             "created_at": get_current_time_iso(),
         }
+        if ingest_key:
+            file_metadata["file_hash"] = content_hash
+            file_metadata["metadata"] = ingest_cache_metadata(
+                ingest_key, table_info.get("linked_table")
+            )
 
         try:
             logger.info("Saving file datasource configuration...")
@@ -639,6 +692,7 @@ async def process_uploaded_file(
             "column_count": file_metadata["column_count"],
             "columns": file_metadata["columns"],
             "preview_data": [{"提示": "预览数据已禁用以提高性能"}],
+            "linked_table": table_info.get("linked_table"),
             "cleanup_path": file_path,
         }
 
@@ -652,17 +706,18 @@ async def process_uploaded_file(
 async def cancel_upload(upload_id: str):
     """取消上传"""
     try:
-        if upload_id not in upload_sessions:
+        session = upload_session_manager.get_session(upload_id)
+        if session is None:
             raise HTTPException(status_code=404, detail="Upload session does not exist")
 
-        session = upload_sessions[upload_id]
+        _discard_stream_ingestor(upload_id)
 
         # 清理分块文件
-        if os.path.exists(session["chunks_dir"]):
+        if session["chunks_dir"] and os.path.exists(session["chunks_dir"]):
             shutil.rmtree(session["chunks_dir"])
 
         # 删除会话
-        del upload_sessions[upload_id]
+        upload_session_manager.delete_session(upload_id)
 
         logger.info("Upload cancelled: %s", upload_id)
 
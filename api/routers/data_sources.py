@@ -26,24 +26,42 @@ from pydantic import BaseModel, Field, field_validator, model_validator
 
 from core.common.timezone_utils import get_current_time_iso
 from core.data.excel_import_manager import (
+    ExcelSheetJob,
     cleanup_pending_excel,
     derive_default_table_name,
+    excel_import_progress,
     get_pending_excel,
-    inspect_excel_sheets,
-    load_excel_sheet_dataframe,
+    inspect_pending_excel,
     register_excel_upload,
+    load_excel_sheets,
     sanitize_identifier,
 )
 from core.data.file_datasource_manager import (
+    SYSTEM_STAGING_PREFIX,
     _quote_identifier,
     build_table_metadata_snapshot,
     create_table_from_dataframe,
     file_datasource_manager,
+    promote_staging_table,
 )
+from core.common.config_manager import config_manager
+from core.common.utils import normalize_dataframe_output
+from core.data.compressed_files import split_compression
 from core.data.file_utils import detect_file_type
+from core.data.ingest_cache import (
+    build_ingest_key,
+    find_cached_ingest,
+    ingest_cache_metadata,
+    link_cached_ingest,
+    prepare_table_rewrite,
+)
 from core.database.duckdb_engine import with_duckdb_connection
-from core.security.security import security_validator
-from core.services.resource_manager import save_upload_file, schedule_cleanup
+from core.security.security import get_max_file_size, security_validator
+from core.services.resource_manager import (
+    UploadTooLargeError,
+    schedule_cleanup,
+    stream_upload_to_path,
+)
 from models.query_models import FileUploadResponse
 from utils.response_helpers import (
     MessageCode,
@@ -125,60 +143,69 @@ async def upload_file(
 ) -> Any:
     """上传文件并返回详细信息，支持CSV、Excel、JSON、Parquet格式"""
     try:
-        # 读取文件内容
-        file_content = await file.read()
-        file_size = len(file_content)
-
-        # 重置文件指针
-        await file.seek(0)
-
-        # 保存临时文件用于安全验证
-        temp_file_path = await save_upload_file(file)
-
-        # 安全验证
-        validation_result = security_validator.validate_file_upload(
-            temp_file_path, file.filename, file_size
-        )
-
-        if not validation_result["valid"]:
-            # 清理临时文件
-            try:
-                os.remove(temp_file_path)
-            except:
-                pass
-            raise HTTPException(
-                status_code=400,
-                detail=f"File validation failed: {'; '.join(validation_result['errors'])}",
-            )
-
-        # Log warnings
-        if validation_result["warnings"]:
-            logger.warning(
-                f"File upload warning {file.filename}: {'; '.join(validation_result['warnings'])}"
-            )
-
         # 检查文件类型
         file_type = detect_file_type(file.filename)
-        if file_type == "unknown":
-            try:
-                os.remove(temp_file_path)
-            except:
-                pass
+        # 'bundle.zip' 这类压缩包要落盘后按包内文件识别
+        deferred_type = file_type == "unknown" and split_compression(file.filename)[1] == "zip"
+        if file_type == "unknown" and not deferred_type:
             raise HTTPException(
                 status_code=400,
-                detail=f"Unsupported file type. Supported formats: CSV, Excel, JSON, Parquet",
+                detail="Unsupported file type. Supported formats: CSV, Excel, JSON, Parquet (CSV/JSON/Parquet may be .gz/.zst/.bz2/.zip compressed)",
             )
 
+        def _validate_header(header: bytes) -> None:
+            # 基于首块数据做安全验证，不合法时在写盘前拒绝
+            validation_result = security_validator.validate_upload_header(
+                header, file.filename
+            )
+            if not validation_result["valid"]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"File validation failed: {'; '.join(validation_result['errors'])}",
+                )
+            if validation_result["warnings"]:
+                logger.warning(
+                    f"File upload warning {file.filename}: {'; '.join(validation_result['warnings'])}"
+                )
+
         # 创建临时目录
         temp_dir = os.path.join(
             os.path.dirname(os.path.dirname(__file__)), "temp_files"
         )
         os.makedirs(temp_dir, exist_ok=True)
 
-        # 保存文件
+        # 分块流式保存文件（仅写盘一次，同时计算大小与哈希）
         save_path = os.path.join(temp_dir, file.filename)
-        with open(save_path, "wb") as f:
-            f.write(file_content)
+        try:
+            streamed = await stream_upload_to_path(
+                file,
+                save_path,
+                max_size=get_max_file_size(),
+                header_check=_validate_header,
+            )
+        except UploadTooLargeError as e:
+            raise HTTPException(
+                status_code=413,
+                detail=(
+                    "File validation failed: file大小超过限制 "
+                    f"(> {e.max_size / 1024 / 1024:.0f}MB)"
+                ),
+            )
+        logger.info(
+            "Upload %s streamed to disk: %s bytes, sha256=%s",
+            file.filename,
+            streamed.size,
+            streamed.sha256,
+        )
+
+        if deferred_type:
+            file_type = detect_file_type(save_path)
+            if file_type == "unknown":
+                os.remove(save_path)
+                raise HTTPException(
+                    status_code=400,
+                    detail="Zip archive must contain CSV, JSON or Parquet files of a single format",
+                )
 
         # 获取文件预览信息
         from core.data.file_utils import get_file_preview
@@ -186,12 +213,6 @@ async def upload_file(
         if file_type == "excel":
             pending_excel = register_excel_upload(save_path, file.filename, table_alias)
 
-            try:
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
-            except Exception as e:
-                logger.warning(f"Failed to delete temporary file: {str(e)}")
-
             pending_dir = Path(pending_excel.stored_path).parent
             schedule_cleanup(str(pending_dir), background_tasks, delay_seconds=6 * 3600)
 
@@ -218,7 +239,13 @@ async def upload_file(
                 message="Excel file uploaded, please select the worksheets to import.",
             )
 
-        preview_info = get_file_preview(save_path, rows=10)
+        # 内容与读取方式相同的文件已导入过时，链接到已有的表，不再解析与画像
+        ingest_key = build_ingest_key(streamed.md5, file_type)
+        cached = None
+        if config_manager.get_app_config().upload_dedup_enabled:
+            with with_duckdb_connection() as duckdb_con:
+                cached = find_cached_ingest(duckdb_con, streamed.md5, ingest_key)
+        preview_info = None if cached else get_file_preview(save_path, rows=10)
 
         source_id = table_alias if table_alias else file.filename.split(".")[0]
         source_id = sanitize_identifier(
@@ -247,9 +274,22 @@ async def upload_file(
                     break
 
             try:
-                table_metadata = create_table_from_dataframe(
-                    duckdb_con, source_id, save_path, file_type
-                )
+                if cached:
+                    table_metadata = link_cached_ingest(duckdb_con, source_id, *cached)
+                    preview_info = {
+                        "file_size": streamed.size,
+                        "columns": table_metadata["columns"],
+                        "total_rows": table_metadata["row_count"],
+                        "preview_data": normalize_dataframe_output(
+                            duckdb_con.execute(
+                                f"SELECT * FROM {_quote_identifier(source_id)} LIMIT 10"
+                            ).fetchdf()
+                        ),
+                    }
+                else:
+                    table_metadata = create_table_from_dataframe(
+                        duckdb_con, source_id, save_path, file_type
+                    )
             except Exception as e:
                 raise HTTPException(
                     status_code=500, detail=f"Failed to persist to DuckDB: {str(e)}"
@@ -271,6 +311,9 @@ async def upload_file(
             "column_profiles": column_profiles,
             "schema_version": 2,
             "created_at": get_current_time_iso(),
+            "file_size": streamed.size,
+            "file_hash": streamed.md5,
+            "metadata": ingest_cache_metadata(ingest_key, table_metadata.get("linked_table")),
         }
 
         config_saved = file_datasource_manager.save_file_datasource(file_info)
@@ -287,12 +330,6 @@ async def upload_file(
         except Exception as e:
             logger.warning(f"Failed to delete original uploaded file: {str(e)}")
 
-        try:
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-        except Exception as e:
-            logger.warning(f"Failed to delete temporary file: {str(e)}")
-
         schedule_cleanup(save_path, background_tasks)
 
         return FileUploadResponse(
@@ -303,6 +340,7 @@ async def upload_file(
             columns=preview_info["columns"],
             row_count=preview_info["total_rows"],
             preview_data=preview_info["preview_data"],
+            linked_table=table_metadata.get("linked_table"),
         )
 
     except HTTPException:
@@ -340,7 +378,7 @@ async def inspect_excel(request: ExcelInspectRequest):
         )
 
     try:
-        sheets_info = inspect_excel_sheets(pending.stored_path)
+        sheets_info = inspect_pending_excel(pending)
         return create_success_response(
             data={
                 "file_id": pending.file_id,
@@ -358,8 +396,12 @@ async def inspect_excel(request: ExcelInspectRequest):
 
 
 @router.post("/api/data-sources/excel/import", tags=["Data Sources"])
-async def import_excel(request: ExcelImportRequest):
-    """导入Excel工作表到DuckDB"""
+def import_excel(request: ExcelImportRequest):
+    """导入Excel工作表到DuckDB
+
+    多个工作表在进程池中并行解析，DuckDB 写入串行执行；
+    导入过程中可通过 /api/data-sources/excel/import/progress/{file_id} 查看逐表进度。
+    """
     pending = get_pending_excel(request.file_id)
     if not pending:
         raise HTTPException(
@@ -367,77 +409,87 @@ async def import_excel(request: ExcelImportRequest):
             detail=f"Excel file not found or expired: {request.file_id}",
         )
 
-    processed_results = []
+    processed_results: List[Optional[Dict[str, Any]]] = [None] * len(request.sheets)
     try:
         with with_duckdb_connection() as duckdb_con:
-            for sheet_config in request.sheets:
-                try:
-                    target_table = sanitize_identifier(
-                        sheet_config.target_table,
-                        allow_leading_digit=True,
-                        prefix="table",
-                    )
+            # 1. 确定各工作表的目标表与模式，生成并行解析任务
+            jobs: List[ExcelSheetJob] = []
+            job_sheets = []
+            for position, sheet_config in enumerate(request.sheets):
+                target_table = sanitize_identifier(
+                    sheet_config.target_table,
+                    allow_leading_digit=True,
+                    prefix="table",
+                )
 
-                    exists = _table_exists(duckdb_con, target_table)
-                    mode = sheet_config.mode.lower()
-                    if exists and mode == "fail":
-                        processed_results.append({
-                            "sheet_name": sheet_config.name,
-                            "target_table": target_table,
-                            "success": False,
-                            "message": f"Table {target_table} already exists",
-                        })
-                        continue
+                exists = _table_exists(duckdb_con, target_table)
+                mode = sheet_config.mode.lower()
+                if exists and mode == "fail":
+                    processed_results[position] = {
+                        "sheet_name": sheet_config.name,
+                        "target_table": target_table,
+                        "success": False,
+                        "message": f"Table {target_table} already exists",
+                    }
+                    continue
 
-                    effective_header_row = (
-                        None if sheet_config.header_rows == 0 else sheet_config.header_row_index
-                    )
-                    df = load_excel_sheet_dataframe(
-                        pending.stored_path,
-                        sheet_config.name,
+                effective_header_row = (
+                    None if sheet_config.header_rows == 0 else sheet_config.header_row_index
+                )
+                jobs.append(
+                    ExcelSheetJob(
+                        sheet_name=sheet_config.name,
+                        table_name=f"{SYSTEM_STAGING_PREFIX}excel_{uuid4().hex}",
                         header_row_index=effective_header_row,
                         fill_merged=sheet_config.fill_merged,
                     )
+                )
+                job_sheets.append((position, sheet_config, target_table, exists, mode))
+
+            # 2. 解析并写入暂存表，内存占用与工作表大小无关
+            loaded_results = load_excel_sheets(
+                duckdb_con, pending.stored_path, jobs, progress_key=pending.file_id
+            )
+
+            # 3. 按请求顺序将暂存表落为目标表
+            for job, loaded, (position, sheet_config, target_table, exists, mode) in zip(
+                jobs, loaded_results, job_sheets
+            ):
+                quoted_staging = _quote_identifier(job.table_name)
+                try:
+                    if isinstance(loaded, Exception):
+                        raise loaded
 
-                    if df.empty:
-                        processed_results.append({
+                    if loaded.row_count == 0:
+                        processed_results[position] = {
                             "sheet_name": sheet_config.name,
                             "target_table": target_table,
                             "success": False,
                             "message": f"Sheet '{sheet_config.name}' contains no data",
-                        })
+                        }
                         continue
 
                     quoted = _quote_identifier(target_table)
+                    columns = loaded.columns
 
                     if exists and mode == "append":
                         existing_cols = _fetch_existing_columns(duckdb_con, target_table)
-                        insert_cols = [c for c in df.columns if c in existing_cols]
+                        insert_cols = [c for c in columns if c in existing_cols]
                         if not insert_cols:
-                            processed_results.append({
+                            processed_results[position] = {
                                 "sheet_name": sheet_config.name,
                                 "target_table": target_table,
                                 "success": False,
                                 "message": "No overlapping columns between sheet and existing table",
-                            })
+                            }
                             continue
-                        df_insert = df[insert_cols]
-                        temp_view = f"__excel_tmp_{uuid4().hex}"
-                        duckdb_con.register(temp_view, df_insert)
                         cols_list = ", ".join(_quote_identifier(c) for c in insert_cols)
-                        insert_sql = f"INSERT INTO {quoted} ({cols_list}) SELECT {cols_list} FROM {temp_view}"
+                        insert_sql = f"INSERT INTO {quoted} ({cols_list}) SELECT {cols_list} FROM {quoted_staging}"
+                        prepare_table_rewrite(duckdb_con, target_table, keep_data=True)
                         duckdb_con.execute(insert_sql)
-                        duckdb_con.unregister(temp_view)
-                        row_count = len(df_insert)
                     else:
-                        if exists and mode == "replace":
-                            duckdb_con.execute(f"DROP TABLE IF EXISTS {quoted}")
-                        # Create table from DataFrame directly
-                        temp_view = f"__excel_tmp_{uuid4().hex}"
-                        duckdb_con.register(temp_view, df)
-                        duckdb_con.execute(f"CREATE TABLE {quoted} AS SELECT * FROM {temp_view}")
-                        duckdb_con.unregister(temp_view)
-                        row_count = len(df)
+                        promote_staging_table(duckdb_con, job.table_name, target_table)
+                    row_count = loaded.row_count
 
                     file_info = {
                         "source_id": target_table,
@@ -446,30 +498,32 @@ async def import_excel(request: ExcelImportRequest):
                         "file_type": "excel",
                         "sheet_name": sheet_config.name,
                         "row_count": row_count,
-                        "column_count": len(df.columns),
-                        "columns": list(df.columns),
+                        "column_count": len(columns),
+                        "columns": list(columns),
                         "schema_version": 2,
                         "created_at": get_current_time_iso(),
                     }
                     file_datasource_manager.save_file_datasource(file_info)
 
-                    processed_results.append({
+                    processed_results[position] = {
                         "sheet_name": sheet_config.name,
                         "target_table": target_table,
                         "success": True,
                         "row_count": row_count,
-                        "column_count": len(df.columns),
+                        "column_count": len(columns),
                         "mode": mode,
-                    })
+                    }
 
                 except Exception as sheet_error:
                     logger.error(f"Failed to import sheet {sheet_config.name}: {sheet_error}")
-                    processed_results.append({
+                    processed_results[position] = {
                         "sheet_name": sheet_config.name,
                         "target_table": sheet_config.target_table,
                         "success": False,
                         "message": str(sheet_error),
-                    })
+                    }
+                finally:
+                    duckdb_con.execute(f"DROP TABLE IF EXISTS {quoted_staging}")
 
     except Exception as e:
         logger.error(f"Excel import failed: {str(e)}")
@@ -485,3 +539,16 @@ async def import_excel(request: ExcelImportRequest):
         },
         message_code=MessageCode.EXCEL_SHEETS_IMPORTED,
     )
+
+
+@router.get("/api/data-sources/excel/import/progress/{file_id}", tags=["Data Sources"])
+async def get_excel_import_progress(file_id: str):
+    """查询Excel导入的逐表进度"""
+    progress = excel_import_progress.get(file_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"No Excel import found: {file_id}")
+
+    return create_success_response(
+        data={"file_id": file_id, **progress},
+        message_code=MessageCode.EXCEL_IMPORT_PROGRESS,
+    )
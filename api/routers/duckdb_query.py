@@ -26,6 +26,11 @@ from core.data.file_datasource_manager import (
     build_table_metadata_snapshot,
     file_datasource_manager,
 )
+from core.data.ingest_cache import (
+    prepare_statement_rewrite,
+    prepare_table_rewrite,
+    release_linked_table,
+)
 from core.database.database_manager import db_manager
 from core.database.duckdb_engine import (
     build_attach_sql,
@@ -33,6 +38,10 @@ from core.database.duckdb_engine import (
     get_db_connection,
 )
 from core.database.duckdb_pool import interruptible_connection
+from core.database.table_metadata_cache import (
+    invalidate_table_metadata_cache,
+    table_metadata_cache,
+)
 from core.security.encryption import password_encryptor
 from core.services.resource_manager import save_upload_file
 from core.services.visual_query_generator import get_table_metadata
@@ -291,6 +300,15 @@ async def refresh_duckdb_table_metadata(table_name: str):
         raise HTTPException(status_code=500, detail=f"Failed to refresh table metadata: {str(exc)}")
 
 
+@router.get("/api/duckdb/metadata-cache/stats", tags=["DuckDB Management"])
+async def get_table_metadata_cache_stats():
+    """获取表元数据缓存的命中率、容量与失效统计"""
+    return create_success_response(
+        data={"cache_stats": table_metadata_cache.get_stats(), "timestamp": time.time()},
+        message_code=MessageCode.OPERATION_SUCCESS,
+    )
+
+
 async def execute_duckdb_query(
     request: DuckDBQueryRequest, request_id: Optional[str] = None
 ):
@@ -381,6 +399,13 @@ async def execute_duckdb_query(
         logger.info(f"Executing DuckDB query: {sql_query}")
         logger.info(f"Available tables: {available_tables}")
 
+        # 用户SQL中的DDL/DML以及保存结果都可能改写被链接的表，执行前先移交链接内容并清除导入缓存键
+        is_mutating = any(contains_keyword(sql_upper_clean, kw) for kw in dangerous_keywords)
+        if is_mutating:
+            prepare_statement_rewrite(con, sql_query)
+        if request.save_as_table and request.save_as_table.strip():
+            prepare_table_rewrite(con, request.save_as_table.strip(), keep_data=True)
+
         # 使用可中断连接执行查询（如果有 query_id）
         if query_id:
             with interruptible_connection(query_id, sql_query) as conn:
@@ -397,6 +422,7 @@ async def execute_duckdb_query(
                                 save_sql = save_sql.replace(f" LIMIT {limit}", "")
                             create_sql = f'CREATE OR REPLACE TABLE "{table_name}" AS ({save_sql})'
                             conn.execute(create_sql)
+                            invalidate_table_metadata_cache(table_name)
                             saved_table = table_name
                             logger.info(f"Query result saved as table: {table_name}")
 
@@ -443,6 +469,7 @@ async def execute_duckdb_query(
                             f'CREATE OR REPLACE TABLE "{table_name}" AS ({save_sql})'
                         )
                         con.execute(create_sql)
+                        invalidate_table_metadata_cache(table_name)
                         saved_table = table_name
                         logger.info(f"Query result saved as table: {table_name}")
 
@@ -472,6 +499,10 @@ async def execute_duckdb_query(
                     except Exception as save_error:
                         logger.warning(f"Failed to save query result as table: {str(save_error)}")
 
+        # 用户SQL可能包含DDL/DML，无法精确定位受影响的表，整体失效元数据缓存
+        if is_mutating:
+            invalidate_table_metadata_cache()
+
         execution_time = (time.time() - start_time) * 1000
 
         # 构建响应
@@ -559,9 +590,18 @@ async def delete_duckdb_table(table_name: str):
                 detail=f"Table '{table_name}' does not exist. Available tables: {', '.join(available_tables)}",
             )
 
-        # 删除表
-        drop_sql = f'DROP TABLE IF EXISTS "{table_name}"'
-        con.execute(drop_sql)
+        # 仍有重复上传的表名链接到该表时，先把表移交给链接者
+        release_linked_table(con, table_name)
+
+        # 删除表或视图（外部视图导入的数据源是视图）
+        try:
+            con.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        except Exception as e:
+            if "is of type View" in str(e):
+                con.execute(f'DROP VIEW IF EXISTS "{table_name}"')
+            else:
+                raise e
+        invalidate_table_metadata_cache(table_name)
 
         logger.info(f"Successfully deleted DuckDB table: {table_name}")
 
@@ -831,7 +871,9 @@ async def execute_federated_query(
                     create_sql = (
                         f'CREATE OR REPLACE TABLE "{table_name}" AS ({save_sql})'
                     )
+                    prepare_table_rewrite(conn, table_name, keep_data=True)
                     conn.execute(create_sql)
+                    invalidate_table_metadata_cache(table_name)
                     logger.info(f"Query result saved as table: {table_name}")
                 except Exception as save_error:
                     logger.warning(f"Failed to save query result as table: {str(save_error)}")
@@ -3,15 +3,18 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
-import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
 from core.database.duckdb_engine import with_duckdb_connection
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
 from core.data.file_datasource_manager import (
     build_table_metadata_snapshot,
     file_datasource_manager,
 )
+from core.data.ingest_cache import prepare_table_rewrite
 from core.common.timezone_utils import get_current_time_iso  # 导入时区工具
 from utils.response_helpers import (
     create_success_response,
@@ -26,7 +29,10 @@ class PasteDataRequest(BaseModel):
     table_name: str
     column_names: List[str]
     column_types: List[str]
-    data_rows: List[List[str]]
+    # 三种输入任选其一：原始 TSV/CSV 文本、按列的数组、按行的二维数组（兼容旧前端）
+    data_rows: List[List[str]] = []
+    raw_text: Optional[str] = None
+    column_values: Optional[List[List[Optional[str]]]] = None
     delimiter: str = ","
     has_header: bool = False
 
@@ -34,22 +40,28 @@ class PasteDataRequest(BaseModel):
 BOOL_TRUE_VALUES = {"true", "t", "1", "yes", "y"}
 BOOL_FALSE_VALUES = {"false", "f", "0", "no", "n"}
 
+# Python str.strip() 会去掉的常见空白字符
+_WHITESPACE_SQL = "' ' || chr(9) || chr(10) || chr(11) || chr(12) || chr(13)"
 
-def _clean_cell_value(value: Any) -> Optional[str]:
-    if value is None:
-        return None
 
-    text = str(value).strip()
-    if not text:
-        return None
+def _trim_cell_sql(source_column: str) -> str:
+    """去掉首尾空白，空串视为 NULL"""
+    return f"NULLIF(TRIM(CAST({source_column} AS VARCHAR), {_WHITESPACE_SQL}), '')"
 
-    if text.lower() == "null":
-        return None
 
-    if len(text) >= 2 and ((text.startswith('"') and text.endswith('"')) or (text.startswith("'") and text.endswith("'"))):
-        text = text[1:-1].strip()
-
-    return text or None
+def _unquote_cell_sql(trimmed_column: str) -> str:
+    """对已 trim 的列：null 文本视为 NULL，去掉成对包裹的引号"""
+    quoted_by = " OR ".join(
+        f"(starts_with({trimmed_column}, {mark}) AND ends_with({trimmed_column}, {mark}))"
+        for mark in ("'\"'", "''''")
+    )
+    inner = f"substr({trimmed_column}, 2, length({trimmed_column}) - 2)"
+    return (
+        "CASE "
+        f"WHEN lower({trimmed_column}) = 'null' THEN NULL "
+        f"WHEN length({trimmed_column}) >= 2 AND ({quoted_by}) THEN {_trim_cell_sql(inner)} "
+        f"ELSE {trimmed_column} END"
+    )
 
 
 def _sanitize_table_name(table_name: str) -> str:
@@ -66,9 +78,8 @@ def _quote_identifier(identifier: str) -> str:
 
 def _build_column_expression(source_alias: str, column_name: str, column_type: str) -> str:
     safe_alias = _quote_identifier(column_name)
-    source_column = f"{source_alias}.{_quote_identifier(column_name)}"
-    source_text = f"CAST({source_column} AS VARCHAR)"
-    trimmed = f"NULLIF(TRIM({source_text}), '')"
+    # 源列已经过 _trim_cell_sql/_unquote_cell_sql 清洗：要么为 NULL，要么是去掉首尾空白的非空文本
+    trimmed = f"{source_alias}.{_quote_identifier(column_name)}"
     normalized_type = (column_type or "VARCHAR").upper()
 
     if normalized_type == "INTEGER":
@@ -91,36 +102,102 @@ def _build_column_expression(source_alias: str, column_name: str, column_type: s
         )
 
     # 默认作为字符串处理，保持兼容行为
-    return f"COALESCE(TRIM({source_text}), '') AS {safe_alias}"
+    return f"COALESCE({trimmed}, '') AS {safe_alias}"
+
+
+def _parse_raw_text(raw_text: str, column_names: List[str], delimiter: str, has_header: bool) -> pa.Table:
+    """用 Arrow 的 CSV 解析器在内存中解析粘贴文本，所有列保持字符串，类型转换交给 SQL"""
+    try:
+        return pa_csv.read_csv(
+            pa.BufferReader(raw_text.encode("utf-8")),
+            read_options=pa_csv.ReadOptions(
+                column_names=column_names, skip_rows=1 if has_header else 0
+            ),
+            parse_options=pa_csv.ParseOptions(
+                delimiter=delimiter or ",", newlines_in_values=True
+            ),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={name: pa.string() for name in column_names},
+                strings_can_be_null=False,
+            ),
+        )
+    except pa.ArrowInvalid as exc:
+        raise HTTPException(status_code=400, detail=f"Failed to parse pasted data: {exc}") from exc
+
+
+def _build_paste_table(request: PasteDataRequest) -> pa.Table:
+    """把三种粘贴输入统一为 Arrow 表（列式构建，不逐单元格处理）"""
+    expected_columns = len(request.column_names)
+
+    if request.raw_text is not None:
+        return _parse_raw_text(
+            request.raw_text, request.column_names, request.delimiter, request.has_header
+        )
+
+    if request.column_values is not None:
+        columns = request.column_values
+        if len(columns) != expected_columns:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Column values count ({len(columns)}) does not match expected ({expected_columns})",
+            )
+        lengths = {len(values) for values in columns}
+        if len(lengths) > 1:
+            raise HTTPException(status_code=400, detail="All columns must have the same number of values")
+    else:
+        # Validate row column count consistency
+        for i, row in enumerate(request.data_rows):
+            if len(row) != expected_columns:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Row {i+1} column count ({len(row)}) does not match expected ({expected_columns})",
+                )
+        columns = list(zip(*request.data_rows))
 
+    return pa.table(
+        {
+            name: pa.array(values, type=pa.string())
+            for name, values in zip(request.column_names, columns)
+        }
+    )
 
-def _persist_pasted_dataframe(
+
+def _persist_pasted_table(
     connection,
     table_name: str,
-    dataframe: pd.DataFrame,
+    source: pa.Table,
     column_definitions: List[Tuple[str, str]],
 ) -> Dict[str, Any]:
     temp_view = f"paste_input_{uuid4().hex[:8]}"
     source_alias = "src"
-    connection.register(temp_view, dataframe)
+    connection.register(temp_view, source)
 
     quoted_temp_view = _quote_identifier(temp_view)
+    quoted_columns = [_quote_identifier(name) for name, _ in column_definitions]
+    trim_sql = ", ".join(f"{_trim_cell_sql(col)} AS {col}" for col in quoted_columns)
+    unquote_sql = ", ".join(f"{_unquote_cell_sql(col)} AS {col}" for col in quoted_columns)
     select_list = [
         _build_column_expression(source_alias, name, col_type)
         for name, col_type in column_definitions
     ]
     select_sql = ", ".join(select_list)
     quoted_table = _quote_identifier(table_name)
+    # 清洗与类型转换是同一条流水线中的嵌套投影，只扫描一遍粘贴数据
     create_sql = (
         f"CREATE TABLE {quoted_table} AS "
-        f"SELECT {select_sql} FROM {quoted_temp_view} AS {source_alias}"
+        f"SELECT {select_sql} FROM ("
+        f"SELECT {unquote_sql} FROM (SELECT {trim_sql} FROM {quoted_temp_view})"
+        f") AS {source_alias}"
     )
 
+    # 覆盖同名表之前先把原数据移交给链接到它的数据源
+    prepare_table_rewrite(connection, table_name)
     connection.execute("BEGIN TRANSACTION")
     try:
         connection.execute(f"DROP TABLE IF EXISTS {quoted_table}")
         connection.execute(create_sql)
         connection.execute("COMMIT")
+        invalidate_table_metadata_cache(table_name)
     except Exception:
         connection.execute("ROLLBACK")
         raise
@@ -148,26 +225,12 @@ async def save_paste_data(request: PasteDataRequest):
         if not request.column_names:
             raise HTTPException(status_code=400, detail="Column names cannot be empty")
 
-        if not request.data_rows:
-            raise HTTPException(status_code=400, detail="Data cannot be empty")
-
         if len(request.column_names) != len(request.column_types):
             raise HTTPException(status_code=400, detail="Column names and types count mismatch")
 
-        # Validate row column count consistency
-        expected_columns = len(request.column_names)
-        for i, row in enumerate(request.data_rows):
-            if len(row) != expected_columns:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Row {i+1} column count ({len(row)}) does not match expected ({expected_columns})",
-                )
-
-        cleaned_rows = [
-            [_clean_cell_value(value) for value in row]
-            for row in request.data_rows
-        ]
-        df = pd.DataFrame(cleaned_rows, columns=request.column_names)
+        source = _build_paste_table(request)
+        if source.num_rows == 0:
+            raise HTTPException(status_code=400, detail="Data cannot be empty")
 
         clean_table_name = _sanitize_table_name(request.table_name)
         column_definitions: List[Tuple[str, str]] = list(
@@ -178,11 +241,11 @@ async def save_paste_data(request: PasteDataRequest):
             raise HTTPException(status_code=400, detail="Column definitions cannot be empty")
 
         with with_duckdb_connection() as connection:
-            metadata = _persist_pasted_dataframe(
-                connection, clean_table_name, df, column_definitions
+            metadata = _persist_pasted_table(
+                connection, clean_table_name, source, column_definitions
             )
 
-        saved_rows = metadata.get("row_count", len(df))
+        saved_rows = metadata.get("row_count", source.num_rows)
         logger.info(
             "Successfully saved pasted data to table: %s, rows: %s, columns: %s",
             clean_table_name,
@@ -232,6 +295,6 @@ async def save_paste_data(request: PasteDataRequest):
     except Exception as e:
         logger.error(f"Failed to save pasted data: {str(e)}")
         logger.error(
-            f"Request data: table_name={request.table_name}, columns={len(request.column_names)}, rows={len(request.data_rows)}"
+            f"Request data: table_name={request.table_name}, columns={len(request.column_names)}, rows={len(request.data_rows)}, raw_text={request.raw_text is not None}"
         )
         raise HTTPException(status_code=500, detail=f"Failed to save data: {str(e)}")
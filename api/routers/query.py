@@ -5,8 +5,8 @@ import os
 import re
 import traceback
 import uuid
-from datetime import datetime, time
-from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import duckdb
 import pandas as pd
@@ -17,7 +17,16 @@ from core.data.file_datasource_manager import (
     build_table_metadata_snapshot,
     file_datasource_manager,
 )
-from core.data.file_utils import load_file_to_duckdb
+from core.data.external_extract import extract_query_to_table
+from core.data.file_utils import detect_file_type, load_file_to_duckdb
+from core.data.ingest_cache import release_linked_table
+from core.data.source_materialization import (
+    database_source_key,
+    file_source_version,
+    materialize_snapshot,
+    materialize_source,
+)
+from core.database.arrow_ingest import dataframe_to_arrow
 from core.database.database_manager import db_manager
 from core.database.duckdb_engine import (
     build_single_table_query,
@@ -27,6 +36,7 @@ from core.database.duckdb_engine import (
     get_db_connection,
 )
 from core.database.duckdb_pool import interruptible_connection
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
 from core.services.visual_query_generator import (
     _build_where_clause,
     _quote_identifier,
@@ -1142,6 +1152,29 @@ def build_join_chain(sources, joins, table_columns):
     return from_clause
 
 
+def build_freshness_probe(
+    connection_id: str, query: str, params: Dict[str, Any]
+) -> Optional[Callable[[], Any]]:
+    """数据库数据源快照过期后的探测：freshnessQuery 为自定义探测 SQL（如校验和），
+    freshnessColumn 则探测源查询结果的 MAX(列) 与行数"""
+    probe_sql = params.get("freshnessQuery")
+    column = params.get("freshnessColumn")
+    if not probe_sql and column:
+        quote = "`" if db_manager.get_connection(connection_id).type == "mysql" else '"'
+        quoted_column = quote + str(column).replace(quote, quote * 2) + quote
+        probe_sql = (
+            f"SELECT MAX({quoted_column}) AS watermark, COUNT(*) AS row_count "
+            f"FROM ({query.strip().rstrip(';')}) AS freshness_probe"
+        )
+    if not probe_sql:
+        return None
+
+    def probe():
+        return db_manager.execute_query(connection_id, probe_sql).astype(str).values.tolist()
+
+    return probe
+
+
 @router.post("/api/query", tags=["Query"])
 async def perform_query(
     query_request: QueryRequest,
@@ -1213,35 +1246,39 @@ async def perform_query(
                     try:
                         con.execute("INSTALL excel;")
                         con.execute("LOAD excel;")
-                        duckdb_query = f"SELECT * FROM read_xlsx('{file_path}') LIMIT 1"
-                        con.execute(duckdb_query).fetchdf()
-                        # 先创建临时表
-                        temp_table = f"temp_{source.id}_{int(time.time())}"
-                        con.execute(
-                            f"CREATE TABLE \"{temp_table}\" AS SELECT * FROM read_xlsx('{file_path}')"
-                        )
 
-                        # 获取列信息并转换为VARCHAR
-                        columns_info = con.execute(
-                            f'DESCRIBE "{temp_table}"'
-                        ).fetchall()
-                        cast_columns = []
-                        for col_name, col_type, *_ in columns_info:
-                            cast_columns.append(
-                                f'CAST("{col_name}" AS VARCHAR) AS "{col_name}"'
+                        def load_excel(con, table_name, file_path=file_path):
+                            # 先创建临时表
+                            temp_table = f"temp_{source.id}_{uuid.uuid4().hex[:8]}"
+                            con.execute(
+                                f"CREATE TABLE \"{temp_table}\" AS SELECT * FROM read_xlsx('{file_path}')"
                             )
-
-                        cast_sql = ", ".join(cast_columns)
-
-                        # 创建最终的VARCHAR表
-                        con.execute(f'DROP TABLE IF EXISTS "{source.id}"')
-                        con.execute(
-                            f'CREATE TABLE "{source.id}" AS SELECT {cast_sql} FROM "{temp_table}"'
+                            try:
+                                # 获取列信息并转换为VARCHAR
+                                columns_info = con.execute(
+                                    f'DESCRIBE "{temp_table}"'
+                                ).fetchall()
+                                cast_sql = ", ".join(
+                                    f'CAST("{col_name}" AS VARCHAR) AS "{col_name}"'
+                                    for col_name, col_type, *_ in columns_info
+                                )
+                                con.execute(
+                                    f'CREATE TABLE "{table_name}" AS SELECT {cast_sql} FROM "{temp_table}"'
+                                )
+                            finally:
+                                con.execute(f'DROP TABLE IF EXISTS "{temp_table}"')
+
+                        _, cache_hit = materialize_source(
+                            con,
+                            source.id,
+                            *file_source_version(file_path, "xlsx:varchar"),
+                            load_excel,
+                        )
+                        logger.info(
+                            "Registered Excel table using DuckDB read_xlsx: %s (cache hit: %s)",
+                            source.id,
+                            cache_hit,
                         )
-
-                        # 删除临时表
-                        con.execute(f'DROP TABLE "{temp_table}"')
-                        logger.info(f"Registered Excel table using DuckDB read_xlsx: {source.id}")
                     except Exception as duckdb_exc:
                         logger.warning(
                             f"DuckDB read_xlsx failed, falling back to pandas: {duckdb_exc}"
@@ -1252,21 +1289,23 @@ async def perform_query(
                             f"Registered table using pandas.read_excel: {source.id}, shape: {df.shape}"
                         )
 
-                elif file_extension in {"csv", "json", "jsonl", "parquet", "pq"}:
+                elif detect_file_type(file_path) in {"csv", "json", "jsonl", "parquet"}:
                     try:
-                        normalized_ext = (
-                            "parquet" if file_extension == "pq" else file_extension
-                        )
-                        load_file_to_duckdb(
+                        # 压缩文件（如 .csv.gz）按内层格式读取
+                        normalized_ext = detect_file_type(file_path)
+                        _, cache_hit = materialize_source(
                             con,
                             source.id,
-                            file_path,
-                            normalized_ext,
+                            *file_source_version(file_path, normalized_ext),
+                            lambda con, table_name, path=file_path, file_type=normalized_ext: (
+                                load_file_to_duckdb(con, table_name, path, file_type)
+                            ),
                         )
                         logger.info(
-                            "Loaded file via DuckDB native: %s -> Table %s",
+                            "Loaded file via DuckDB native: %s -> Table %s (cache hit: %s)",
                             file_path,
                             source.id,
+                            cache_hit,
                         )
                     except Exception as load_error:
                         logger.error(
@@ -1275,19 +1314,24 @@ async def perform_query(
                         raise
                 else:
                     logger.warning(f"Unknown file type: {file_extension}, trying pandas read")
-                    try:
-                        df = pd.read_csv(file_path, dtype=str)
-                        create_varchar_table_from_dataframe(source.id, df, con)
-                        logger.info(
-                            f"Created persistent table using pandas.read_csv: {source.id}, shape: {df.shape}"
-                        )
-                    except Exception:
-                        df = pd.read_excel(file_path, dtype=str)
-                        create_varchar_table_from_dataframe(source.id, df, con)
+
+                    def load_with_pandas(con, table_name, file_path=file_path):
+                        try:
+                            df = pd.read_csv(file_path, dtype=str)
+                        except Exception:
+                            df = pd.read_excel(file_path, dtype=str)
+                        create_varchar_table_from_dataframe(table_name, df, con)
                         logger.info(
-                            f"Registered table using pandas.read_excel: {source.id}, shape: {df.shape}"
+                            f"Created persistent table using pandas: {source.id}, shape: {df.shape}"
                         )
 
+                    materialize_source(
+                        con,
+                        source.id,
+                        *file_source_version(file_path, "pandas:varchar"),
+                        load_with_pandas,
+                    )
+
             elif source.type in ["mysql", "postgresql", "sqlite"]:
                 # 处理数据库数据源 - 支持三种模式：connectionId、数据源名称、直接连接参数
                 connection_id = source.params.get("connectionId")
@@ -1311,10 +1355,33 @@ async def perform_query(
                         else:
                             query = "SELECT * FROM dy_order LIMIT 1000"
 
-                        df = db_manager.execute_query(connection_id, query)
-                        create_varchar_table_from_dataframe(source.id, df, con)
+                        def load_database_source(
+                            con, table_name, connection_id=connection_id, query=query
+                        ):
+                            rows = extract_query_to_table(
+                                con, connection_id, query, table_name, allow_empty=True
+                            )
+                            logger.info(f"Fetched database source: {source.id}, rows: {rows}")
+
+                        from core.common.config_manager import config_manager
+
+                        ttl_seconds = source.params.get(
+                            "cacheTtlSeconds",
+                            config_manager.get_app_config().query_source_cache_ttl_seconds,
+                        )
+                        snapshot_table, reused = materialize_snapshot(
+                            con,
+                            source.id,
+                            database_source_key(connection_id, query),
+                            load_database_source,
+                            float(ttl_seconds or 0),
+                            build_freshness_probe(connection_id, query, source.params),
+                        )
                         logger.info(
-                            f"Created persistent database table: {source.id}, shape: {df.shape}"
+                            "Bound database source %s to snapshot %s (reused: %s)",
+                            source.id,
+                            snapshot_table,
+                            reused,
                         )
 
                     except Exception as db_error:
@@ -1366,8 +1433,8 @@ async def perform_query(
                         engine = create_engine(connection_str)
                         df = pd.read_sql(query, engine)
 
-                        # 注册到DuckDB
-                        con.register(source.id, df)
+                        # 注册到DuckDB（转换为 Arrow 表后零拷贝扫描）
+                        con.register(source.id, dataframe_to_arrow(df))
                         logger.info(
                             f"Registered secure datasource table: {source.id}, shape: {df.shape}"
                         )
@@ -1581,9 +1648,7 @@ async def execute_sql(request: dict = Body(...)):
             if not os.path.exists(file_path):
                 raise ValueError(f"File does not exist: {file_path}")
 
-            normalized_ext = file_path.split(".")[-1].lower()
-            if normalized_ext == "pq":
-                normalized_ext = "parquet"
+            normalized_ext = detect_file_type(file_path)
             load_file_to_duckdb(
                 con,
                 table_id,
@@ -2146,6 +2211,9 @@ async def delete_duckdb_table(table_name: str):
         except Exception as cleanup_e:
             logger.warning(f"Error cleaning up source files: {str(cleanup_e)}")
 
+        # 仍有重复上传的表名链接到该表时，先把表移交给链接者
+        release_linked_table(con, table_name)
+
         # 删除DuckDB中的表或视图
         try:
             drop_query = f'DROP TABLE IF EXISTS "{table_name}"'
@@ -2157,6 +2225,7 @@ async def delete_duckdb_table(table_name: str):
                 con.execute(drop_query)
             else:
                 raise e
+        invalidate_table_metadata_cache(table_name)
 
         logger.info(f"Successfully deleted DuckDB table: {table_name}")
 
@@ -2453,6 +2522,7 @@ async def execute_set_operation(request: SetOperationRequest):
             create_sql = f'CREATE OR REPLACE TABLE "{table_name}" AS ({sql})'
             logger.info(f"Executing create table SQL: {create_sql}")
             con.execute(create_sql)
+            invalidate_table_metadata_cache(table_name)
 
             # 获取统计信息（不使用fetchdf）
             row_count_result = con.execute(
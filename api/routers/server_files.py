@@ -2,6 +2,7 @@
 import logging
 import os
 from typing import List, Optional
+from uuid import uuid4
 
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, field_validator
@@ -9,17 +10,34 @@ from pydantic import BaseModel, field_validator
 from core.common.config_manager import config_manager
 from core.database.duckdb_engine import get_db_connection
 from core.data.excel_import_manager import (
+    ExcelSheetJob,
     derive_default_table_name,
+    excel_import_progress,
     inspect_excel_sheets,
-    load_excel_sheet_dataframe,
+    load_excel_sheets,
     sanitize_identifier,
 )
 from core.data.file_datasource_manager import (
+    SYSTEM_STAGING_PREFIX,
+    build_table_metadata_snapshot,
     create_table_from_file_path_typed,
-    create_typed_table_from_dataframe,
     file_datasource_manager,
+    promote_staging_table,
 )
-from core.data.file_utils import detect_file_type
+from core.data.external_views import (
+    EXTERNAL_VIEW_READERS,
+    create_table_from_files,
+    drop_external_view,
+    expand_source_glob,
+    is_external_view,
+    materialize_external_view,
+    refresh_external_view,
+    register_external_view,
+)
+from core.data.compressed_files import requires_decompression
+from core.data.file_utils import detect_file_type, file_stem
+from core.data.incremental_import import INCREMENTAL_IMPORT_MODES, import_file_incrementally
+from core.data.ingest_cache import prepare_table_rewrite
 from core.common.timezone_utils import get_storage_time
 from utils.response_helpers import (
     create_success_response,
@@ -35,6 +53,45 @@ SUPPORTED_FORMATS = {"csv", "json", "jsonl", "parquet", "pq", "xlsx", "xls", "ex
 class ServerFileImportRequest(BaseModel):
     path: str
     table_alias: Optional[str] = None
+    mode: str = "replace"  # replace, append, upsert, external
+    key_columns: List[str] = []
+    watermark_column: Optional[str] = None
+
+    @field_validator("mode", mode="before")
+    @classmethod
+    def validate_mode(cls, mode):
+        normalized = (mode or "replace").lower()
+        if normalized not in INCREMENTAL_IMPORT_MODES | {"external"}:
+            raise ValueError(f"Unsupported import mode: {mode}")
+        return normalized
+
+
+class ServerDirectoryImportRequest(BaseModel):
+    path: str
+    pattern: Optional[str] = None  # 相对目录的 glob，默认递归匹配目录中唯一的受支持格式
+    file_type: Optional[str] = None
+    table_alias: Optional[str] = None
+    mode: str = "external"  # external（视图）或 replace（复制为表）
+    hive_partitioning: bool = True
+    union_by_name: bool = True
+
+    @field_validator("mode", mode="before")
+    @classmethod
+    def validate_mode(cls, mode):
+        normalized = (mode or "external").lower()
+        if normalized not in {"external", "replace"}:
+            raise ValueError(f"Unsupported directory import mode: {mode}")
+        return normalized
+
+    @field_validator("pattern")
+    @classmethod
+    def validate_pattern(cls, pattern):
+        if pattern is None:
+            return pattern
+        # 只允许目录内的相对 glob，防止越出挂载目录
+        if os.path.isabs(pattern) or ".." in pattern.replace("\\", "/").split("/"):
+            raise ValueError("Pattern must be relative to the selected directory")
+        return pattern
 
 
 class ServerExcelInspectRequest(BaseModel):
@@ -174,16 +231,23 @@ async def list_server_directory(path: str = Query(..., description="服务器目
                     "modified": stat_info.st_mtime,
                 }
                 if entry.is_dir():
+                    partition_key, sep, partition_value = entry.name.partition("=")
                     entries.append(
                         {
                             **common_payload,
                             "type": "directory",
+                            # Hive 风格的分区目录（key=value），前端可据此提示按目录导入
+                            "hive_partition": (
+                                {"key": partition_key, "value": partition_value}
+                                if sep and partition_key
+                                else None
+                            ),
                         }
                     )
                 else:
                     ext = detect_file_type(entry.name)
                     suggested = sanitize_identifier(
-                        os.path.splitext(entry.name)[0],
+                        file_stem(entry.name),
                         allow_leading_digit=False,
                         prefix="table",
                     )
@@ -226,23 +290,75 @@ async def import_server_file(payload: ServerFileImportRequest):
     if file_type not in SUPPORTED_FORMATS:
         raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_type}")
 
-    base_name = payload.table_alias or os.path.splitext(os.path.basename(real_path))[0]
+    base_name = payload.table_alias or file_stem(real_path)
     # 如果用户明确提供了 table_alias，尊重用户输入（允许数字开头）
     table_name = sanitize_identifier(
         base_name, allow_leading_digit=bool(payload.table_alias), prefix="table"
     )
 
+    if payload.mode == "upsert" and not payload.key_columns:
+        raise HTTPException(status_code=400, detail="Upsert mode requires key_columns")
+    if payload.mode == "external" and file_type not in EXTERNAL_VIEW_READERS:
+        raise HTTPException(
+            status_code=400, detail=f"External mode does not support file type: {file_type}"
+        )
+    if payload.mode == "external" and requires_decompression(real_path, file_type):
+        # 视图每次查询都直接读取源文件，只有 DuckDB 能原生解压的 gzip/zstd CSV/JSON 可以零拷贝
+        raise HTTPException(
+            status_code=400,
+            detail="External mode only supports uncompressed files or gzip/zstd compressed CSV/JSON",
+        )
+
+    previous = None
+    if payload.mode != "replace":
+        previous = file_datasource_manager.get_file_datasource(table_name)
+    if payload.mode in {"append", "upsert"} and is_external_view(previous):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Table '{table_name}' is an external view, materialize it before {payload.mode}",
+        )
+
     try:
         con = get_db_connection()
-        metadata = create_table_from_file_path_typed(
-            con, table_name, real_path, file_type
-        )
+        if payload.mode == "external":
+            # 零拷贝：只注册视图并缓存统计信息，数据留在挂载目录中
+            metadata = register_external_view(con, table_name, real_path, file_type)
+        elif payload.mode == "replace" and not payload.watermark_column:
+            drop_external_view(con, table_name)
+            metadata = create_table_from_file_path_typed(
+                con, table_name, real_path, file_type
+            )
+        else:
+            metadata = import_file_incrementally(
+                con,
+                table_name,
+                real_path,
+                file_type,
+                mode=payload.mode,
+                key_columns=payload.key_columns,
+                watermark_column=payload.watermark_column,
+                previous=previous,
+            )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Import failed: {str(exc)}") from exc
     except Exception as exc:
         logger.error("Failed to import server file: %s", exc, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Import failed: {str(exc)}") from exc
 
     # 使用 UTC naive 时间用于数据库存储
     current_time = get_storage_time()
+    import_state = metadata.get("import_state")
+    source_metadata = {
+        "schema_version": 2,
+        "mount_label": mount["label"],
+        "source_type": "server_directory",
+    }
+    if payload.mode == "external":
+        source_metadata.update(
+            storage=metadata["storage"],
+            external_path=metadata["external_path"],
+            source_fingerprint=metadata["source_fingerprint"],
+        )
 
     table_metadata = {
         "source_id": table_name,
@@ -254,13 +370,10 @@ async def import_server_file(payload: ServerFileImportRequest):
         "columns": metadata.get("columns", []),
         "column_profiles": metadata.get("column_profiles", []),
         "upload_time": current_time,
-        "created_at": current_time,
+        "created_at": (previous or {}).get("created_at") or current_time,
         "updated_at": current_time,
-        "metadata": {
-            "schema_version": 2,
-            "mount_label": mount["label"],
-            "source_type": "server_directory",
-        },
+        "import_state": import_state,
+        "metadata": source_metadata,
     }
     try:
         file_datasource_manager.save_file_datasource(table_metadata)
@@ -276,15 +389,234 @@ async def import_server_file(payload: ServerFileImportRequest):
             "file_type": file_type,
             "file_path": table_metadata["file_path"],
             "mount_label": mount["label"],
+            "mode": payload.mode,
+            "import_state": import_state,
+            "storage": source_metadata.get("storage", "table"),
         },
         message_code=MessageCode.SERVER_FILE_IMPORTED,
         message=f"Server file imported, table created: {table_name}",
     )
 
 
+def _resolve_directory_sources(
+    real_dir: str, mount: dict, pattern: Optional[str], file_type: Optional[str]
+) -> tuple[str, str, List[str]]:
+    """展开目录导入的 glob，返回 (glob, 文件类型, 文件列表)"""
+    if file_type:
+        file_type = detect_file_type(f"x.{file_type.lower()}")
+        if file_type not in EXTERNAL_VIEW_READERS:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_type}")
+
+    source_glob = os.path.join(real_dir, pattern or "**/*")
+    files = expand_source_glob(source_glob, file_type)
+    # glob 会进入指向目录的符号链接，逐个确认文件仍在挂载目录内
+    files = [
+        path for path in files if os.path.realpath(path).startswith(mount["real_path"])
+    ]
+
+    if not file_type:
+        readers = {
+            EXTERNAL_VIEW_READERS[detect_file_type(path)]
+            for path in files
+            if detect_file_type(path) in EXTERNAL_VIEW_READERS
+        }
+        if len(readers) > 1:
+            raise HTTPException(
+                status_code=400,
+                detail="Directory contains multiple file formats, specify file_type or pattern",
+            )
+        file_type = next(
+            (detect_file_type(path) for path in files if detect_file_type(path) in EXTERNAL_VIEW_READERS),
+            None,
+        )
+        files = [path for path in files if detect_file_type(path) == file_type]
+
+    # 目录导入由一次 read_* 调用读取全部文件，跳过需要先解压的 bz2/zip 等文件
+    files = [path for path in files if not requires_decompression(path, file_type)]
+
+    if not files:
+        raise HTTPException(status_code=404, detail="No supported files match the directory import")
+    return source_glob, file_type, files
+
+
+@router.post("/api/server-files/import-directory")
+async def import_server_directory(payload: ServerDirectoryImportRequest):
+    """把目录（或目录内的 glob）下的多个文件导入为一个视图或表
+
+    使用一次 read_parquet([...], hive_partitioning=true, union_by_name=true) 读取全部文件：
+    key=value 形式的子目录成为分区列，分区过滤会下推为文件裁剪，各文件 footer 走元数据缓存。
+    """
+    real_path, mount = _resolve_path(payload.path)
+
+    if not os.path.exists(real_path):
+        raise HTTPException(status_code=404, detail="Path does not exist")
+    if not os.path.isdir(real_path):
+        raise HTTPException(status_code=400, detail="Target path is not a directory")
+
+    source_glob, file_type, files = _resolve_directory_sources(
+        real_path, mount, payload.pattern, payload.file_type
+    )
+    reader_options = {
+        "hive_partitioning": payload.hive_partitioning,
+        "union_by_name": payload.union_by_name,
+    }
+
+    base_name = payload.table_alias or os.path.basename(os.path.normpath(real_path))
+    table_name = sanitize_identifier(
+        base_name, allow_leading_digit=bool(payload.table_alias), prefix="table"
+    )
+
+    try:
+        con = get_db_connection()
+        if payload.mode == "external":
+            metadata = register_external_view(con, table_name, files, file_type, reader_options)
+        else:
+            metadata = create_table_from_files(con, table_name, files, file_type, reader_options)
+    except Exception as exc:
+        logger.error("Failed to import server directory: %s", exc, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Import failed: {str(exc)}") from exc
+
+    current_time = get_storage_time()
+    previous = file_datasource_manager.get_file_datasource(table_name)
+    storage = metadata.get("storage", "table")
+    source_metadata = {
+        "schema_version": 2,
+        "mount_label": mount["label"],
+        "source_type": "server_directory",
+        "storage": storage,
+        "source_glob": source_glob,
+        "reader_options": reader_options,
+        "file_count": len(files),
+    }
+    if storage == "external_view":
+        source_metadata["source_fingerprint"] = metadata["source_fingerprint"]
+
+    table_metadata = {
+        "source_id": table_name,
+        "filename": os.path.basename(os.path.normpath(real_path)),
+        "file_path": _to_display_path(real_path, mount),
+        "file_type": file_type,
+        "row_count": metadata.get("row_count", 0),
+        "column_count": metadata.get("column_count", 0),
+        "columns": metadata.get("columns", []),
+        "column_profiles": metadata.get("column_profiles", []),
+        "upload_time": current_time,
+        "created_at": (previous or {}).get("created_at") or current_time,
+        "updated_at": current_time,
+        "metadata": source_metadata,
+    }
+    try:
+        file_datasource_manager.save_file_datasource(table_metadata)
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        logger.warning("Failed to save file datasource metadata (ignored): %s", exc, exc_info=True)
+
+    return create_success_response(
+        data={
+            "table_name": table_name,
+            "row_count": metadata.get("row_count", 0),
+            "column_count": metadata.get("column_count", 0),
+            "columns": metadata.get("columns", []),
+            "file_type": file_type,
+            "file_count": len(files),
+            "file_path": table_metadata["file_path"],
+            "mount_label": mount["label"],
+            "mode": payload.mode,
+            "storage": storage,
+        },
+        message_code=MessageCode.SERVER_DIRECTORY_IMPORTED,
+        message=f"Imported {len(files)} files into {table_name}",
+    )
+
+
+def _get_external_view_config(table_name: str) -> dict:
+    config = file_datasource_manager.get_file_datasource(table_name)
+    if not is_external_view(config):
+        raise HTTPException(status_code=404, detail=f"External view not found: {table_name}")
+    return config
+
+
+@router.post("/api/server-files/external/{table_name}/refresh")
+async def refresh_server_external_view(
+    table_name: str,
+    force: bool = Query(False, description="文件未变化时也重新统计"),
+):
+    """文件变化（或 force）时重新注册外部视图并刷新缓存的统计信息"""
+    config = _get_external_view_config(table_name)
+    try:
+        status, updated = refresh_external_view(get_db_connection(), config, force=force)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail="File does not exist") from exc
+    except Exception as exc:
+        logger.error("Failed to refresh external view %s: %s", table_name, exc, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Refresh failed: {str(exc)}") from exc
+
+    if status != "unchanged":
+        updated["updated_at"] = get_storage_time()
+        file_datasource_manager.save_file_datasource(updated)
+
+    return create_success_response(
+        data={
+            "table_name": table_name,
+            "status": status,
+            "row_count": updated.get("row_count", 0),
+            "column_count": updated.get("column_count", 0),
+            "columns": updated.get("columns", []),
+        },
+        message_code=MessageCode.EXTERNAL_VIEW_REFRESHED,
+    )
+
+
+@router.post("/api/server-files/external/{table_name}/materialize")
+async def materialize_server_external_view(table_name: str):
+    """把外部视图复制为 DuckDB 表，之后按普通文件数据源管理"""
+    config = _get_external_view_config(table_name)
+    try:
+        metadata = materialize_external_view(get_db_connection(), table_name)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except Exception as exc:
+        logger.error("Failed to materialize external view %s: %s", table_name, exc, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Materialize failed: {str(exc)}") from exc
+
+    source_metadata = {**(config.get("metadata") or {}), "storage": "table"}
+    fingerprint = source_metadata.get("source_fingerprint")
+    if fingerprint:
+        # 物化后按普通表对账，哈希在下次检测到修改时间变化时补算
+        source_metadata["source_fingerprint"] = {**fingerprint, "hash": None}
+    config.update(
+        row_count=metadata["row_count"],
+        column_count=metadata["column_count"],
+        columns=metadata["columns"],
+        column_profiles=metadata["column_profiles"],
+        updated_at=get_storage_time(),
+        metadata=source_metadata,
+    )
+    file_datasource_manager.save_file_datasource(config)
+
+    return create_success_response(
+        data={
+            "table_name": table_name,
+            "row_count": metadata["row_count"],
+            "column_count": metadata["column_count"],
+            "columns": metadata["columns"],
+        },
+        message_code=MessageCode.EXTERNAL_VIEW_MATERIALIZED,
+    )
+
+
 # ============ Excel 专用 API ============
 
 
+def _build_stream_job(sheet_cfg, header_row_index: int) -> ExcelSheetJob:
+    return ExcelSheetJob(
+        sheet_name=sheet_cfg.name,
+        table_name=f"{SYSTEM_STAGING_PREFIX}excel_{uuid4().hex}",
+        header_rows=sheet_cfg.header_rows,
+        header_row_index=header_row_index,
+        fill_merged=sheet_cfg.fill_merged,
+    )
+
+
 def _should_use_duckdb(file_ext: str, header_row_index: int, fill_merged: bool) -> bool:
     """判断是否应该使用 DuckDB 导入 Excel
 
@@ -357,13 +689,13 @@ async def inspect_server_excel(payload: ServerExcelInspectRequest):
 
 
 @router.post("/api/server-files/excel/import")
-async def import_server_excel(payload: ServerExcelImportRequest):
+def import_server_excel(payload: ServerExcelImportRequest):
     """
     导入服务器上的 Excel 文件的指定工作表
 
     策略：
     1. 如果条件允许（xlsx + 首行表头 + 无合并填充），优先使用 DuckDB
-    2. 否则使用 pandas
+    2. 否则在进程池中并行流式解析，逐表进度见 /api/server-files/excel/import/progress
     """
     real_path, mount = _resolve_path(payload.path)
 
@@ -403,118 +735,141 @@ async def import_server_excel(payload: ServerExcelImportRequest):
                 detail=f"Table '{target_table}' already exists, please modify target table name or select overwrite mode",
             )
 
-    # 4. 执行导入
+    # 3. 无法使用 DuckDB 原生读取的工作表在进程池中并行解析，写入各自的暂存表
+    streamed_jobs = {}
     for sheet_cfg in payload.sheets:
-        target_table = sanitized_name_map[sheet_cfg.name]
         header_row_index = (
             sheet_cfg.header_row_index if sheet_cfg.header_row_index is not None else 1
         )
-        use_duckdb = _should_use_duckdb(
-            file_ext, header_row_index, sheet_cfg.fill_merged
+        if not _should_use_duckdb(file_ext, header_row_index, sheet_cfg.fill_merged):
+            streamed_jobs[sheet_cfg.name] = _build_stream_job(sheet_cfg, header_row_index)
+    prefetched = dict(
+        zip(
+            streamed_jobs,
+            load_excel_sheets(
+                con,
+                real_path,
+                list(streamed_jobs.values()),
+                progress_key=payload.path,
+            ),
         )
-        metadata = {}
-
-        try:
-            if use_duckdb:
-                # 尝试 DuckDB 导入
-                try:
-                    logger.info("Attempting to import worksheet using DuckDB: %s", sheet_cfg.name)
-                    con.execute("INSTALL excel")
-                    con.execute("LOAD excel")
-
-                    sql = f"""
-                        CREATE OR REPLACE TABLE "{target_table}" AS
-                        SELECT * FROM read_xlsx('{real_path}', sheet='{sheet_cfg.name}', header=true)
-                    """
-                    con.execute(sql)
-
-                    # 获取元数据
-                    row_count = con.execute(
-                        f'SELECT COUNT(*) FROM "{target_table}"'
-                    ).fetchone()[0]
-                    columns_info = con.execute(f'DESCRIBE "{target_table}"').fetchall()
-                    columns = [col[0] for col in columns_info]
-
-                    metadata = {
-                        "row_count": row_count,
-                        "column_count": len(columns),
-                        "columns": columns,
-                    }
-                    logger.info("DuckDB import successful: %s, row count: %d", target_table, row_count)
-
-                except Exception as duckdb_exc:
-                    logger.warning("DuckDB import failed, falling back to pandas: %s", duckdb_exc)
-                    use_duckdb = False  # 触发下面的 pandas fallback
-
-            if not use_duckdb:
-                # pandas 导入
-                # pandas 导入
-                logger.info("Importing worksheet using pandas: %s", sheet_cfg.name)
-                df = load_excel_sheet_dataframe(
-                    real_path,
-                    sheet_cfg.name,
-                    header_rows=sheet_cfg.header_rows,
-                    header_row_index=header_row_index,
-                    fill_merged=sheet_cfg.fill_merged,
-                )
+    )
 
-                if df is None or df.empty:
-                    raise ValueError(f"Worksheet {sheet_cfg.name} contains no importable data")
-
-                # 处理追加/替换模式
-                if sheet_cfg.mode == "replace":
-                    con.execute(f'DROP TABLE IF EXISTS "{target_table}"')
-
-                metadata = create_typed_table_from_dataframe(con, target_table, df)
-
-            # 保存元数据
-            table_metadata = {
-                "source_id": target_table,
-                "filename": os.path.basename(real_path),
-                "file_path": _to_display_path(real_path, mount),
-                "file_type": "excel_sheet",
-                "sheet_name": sheet_cfg.name,
-                "row_count": metadata.get("row_count", 0),
-                "column_count": metadata.get("column_count", 0),
-                "columns": metadata.get("columns", []),
-                "column_profiles": metadata.get("column_profiles", []),
-                "upload_time": current_time,
-                "created_at": current_time,
-                "updated_at": current_time,
-                "metadata": {
-                    "schema_version": 2,
-                    "mount_label": mount["label"],
-                    "source_type": "server_directory",
-                    "header_rows": sheet_cfg.header_rows,
-                    "header_row_index": header_row_index,
-                    "fill_merged": sheet_cfg.fill_merged,
-                    "import_engine": "duckdb" if use_duckdb else "pandas",
-                },
-            }
+    # 4. 执行导入
+    try:
+        for sheet_cfg in payload.sheets:
+            target_table = sanitized_name_map[sheet_cfg.name]
+            header_row_index = (
+                sheet_cfg.header_row_index if sheet_cfg.header_row_index is not None else 1
+            )
+            use_duckdb = _should_use_duckdb(
+                file_ext, header_row_index, sheet_cfg.fill_merged
+            )
+            metadata = {}
 
             try:
-                file_datasource_manager.save_file_datasource(table_metadata)
-            except Exception as exc:  # pylint: disable=broad-exception-caught
-                logger.warning("Failed to save metadata (ignored): %s", exc)
-
-            imported_tables.append(
-                {
-                    "table_name": target_table,
+                if use_duckdb:
+                    # 尝试 DuckDB 导入
+                    try:
+                        logger.info("Attempting to import worksheet using DuckDB: %s", sheet_cfg.name)
+                        con.execute("INSTALL excel")
+                        con.execute("LOAD excel")
+
+                        prepare_table_rewrite(con, target_table)
+                        sql = f"""
+                            CREATE OR REPLACE TABLE "{target_table}" AS
+                            SELECT * FROM read_xlsx('{real_path}', sheet='{sheet_cfg.name}', header=true)
+                        """
+                        con.execute(sql)
+
+                        # 获取元数据
+                        row_count = con.execute(
+                            f'SELECT COUNT(*) FROM "{target_table}"'
+                        ).fetchone()[0]
+                        columns_info = con.execute(f'DESCRIBE "{target_table}"').fetchall()
+                        columns = [col[0] for col in columns_info]
+
+                        metadata = {
+                            "row_count": row_count,
+                            "column_count": len(columns),
+                            "columns": columns,
+                        }
+                        logger.info("DuckDB import successful: %s, row count: %d", target_table, row_count)
+
+                    except Exception as duckdb_exc:
+                        logger.warning("DuckDB import failed, falling back to streaming reader: %s", duckdb_exc)
+                        use_duckdb = False  # 触发下面的流式导入
+
+                if not use_duckdb:
+                    # 流式导入的暂存表已在进程池中并行准备好；原生读取失败的工作表在此补做
+                    job = streamed_jobs.get(sheet_cfg.name)
+                    if job is None:
+                        logger.info("Importing worksheet via streaming reader: %s", sheet_cfg.name)
+                        job = _build_stream_job(sheet_cfg, header_row_index)
+                        streamed_jobs[sheet_cfg.name] = job
+                        loaded = load_excel_sheets(con, real_path, [job])[0]
+                    else:
+                        loaded = prefetched[sheet_cfg.name]
+
+                    if isinstance(loaded, Exception):
+                        raise loaded
+                    if loaded.row_count == 0:
+                        raise ValueError(f"Worksheet {sheet_cfg.name} contains no importable data")
+
+                    promote_staging_table(con, job.table_name, target_table)
+                    metadata = build_table_metadata_snapshot(con, target_table)
+
+                # 保存元数据
+                table_metadata = {
+                    "source_id": target_table,
+                    "filename": os.path.basename(real_path),
+                    "file_path": _to_display_path(real_path, mount),
+                    "file_type": "excel_sheet",
                     "sheet_name": sheet_cfg.name,
                     "row_count": metadata.get("row_count", 0),
                     "column_count": metadata.get("column_count", 0),
                     "columns": metadata.get("columns", []),
-                    "import_engine": "duckdb" if use_duckdb else "pandas",
+                    "column_profiles": metadata.get("column_profiles", []),
+                    "upload_time": current_time,
+                    "created_at": current_time,
+                    "updated_at": current_time,
+                    "metadata": {
+                        "schema_version": 2,
+                        "mount_label": mount["label"],
+                        "source_type": "server_directory",
+                        "header_rows": sheet_cfg.header_rows,
+                        "header_row_index": header_row_index,
+                        "fill_merged": sheet_cfg.fill_merged,
+                        "import_engine": "duckdb" if use_duckdb else "pandas",
+                    },
                 }
-            )
 
-        except HTTPException:
-            raise
-        except Exception as exc:
-            logger.error("Failed to import worksheet %s: %s", sheet_cfg.name, exc, exc_info=True)
-            raise HTTPException(
-                status_code=500, detail=f"Failed to import worksheet {sheet_cfg.name}: {str(exc)}"
-            ) from exc
+                try:
+                    file_datasource_manager.save_file_datasource(table_metadata)
+                except Exception as exc:  # pylint: disable=broad-exception-caught
+                    logger.warning("Failed to save metadata (ignored): %s", exc)
+
+                imported_tables.append(
+                    {
+                        "table_name": target_table,
+                        "sheet_name": sheet_cfg.name,
+                        "row_count": metadata.get("row_count", 0),
+                        "column_count": metadata.get("column_count", 0),
+                        "columns": metadata.get("columns", []),
+                        "import_engine": "duckdb" if use_duckdb else "pandas",
+                    }
+                )
+
+            except HTTPException:
+                raise
+            except Exception as exc:
+                logger.error("Failed to import worksheet %s: %s", sheet_cfg.name, exc, exc_info=True)
+                raise HTTPException(
+                    status_code=500, detail=f"Failed to import worksheet {sheet_cfg.name}: {str(exc)}"
+                ) from exc
+    finally:
+        for job in streamed_jobs.values():
+            con.execute(f'DROP TABLE IF EXISTS "{job.table_name}"')
 
     return create_success_response(
         data={
@@ -523,3 +878,18 @@ async def import_server_excel(payload: ServerExcelImportRequest):
         message_code=MessageCode.EXCEL_SHEETS_IMPORTED,
         message=f"Successfully imported {len(imported_tables)} worksheets",
     )
+
+
+@router.get("/api/server-files/excel/import/progress")
+async def get_server_excel_import_progress(
+    path: str = Query(..., description="导入时提交的 Excel 文件路径"),
+):
+    """查询服务器 Excel 导入的逐表进度"""
+    progress = excel_import_progress.get(path)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"No Excel import found: {path}")
+
+    return create_success_response(
+        data={"path": path, **progress},
+        message_code=MessageCode.EXCEL_IMPORT_PROGRESS,
+    )
@@ -1,6 +1,7 @@
 # pylint: disable=duplicate-code
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, HttpUrl
+from starlette.concurrency import run_in_threadpool
 import requests
 import tempfile
 import os
@@ -13,6 +14,7 @@ from core.data.file_datasource_manager import (
     file_datasource_manager,
     create_table_from_dataframe,
 )
+from core.services.download_manager import DownloadError, download_to_file
 from utils.response_helpers import (
     create_success_response,
     create_error_response,
@@ -119,7 +121,6 @@ async def read_from_url(request: URLReadRequest):
             reader_options = {
                 "HEADER": bool(request.header),
                 "DELIM": request.delimiter or ",",
-                "SAMPLE_SIZE": -1,
             }
             if request.encoding:
                 reader_options["ENCODING"] = request.encoding
@@ -143,21 +144,32 @@ async def read_from_url(request: URLReadRequest):
                 )
 
         if metadata is None:
+            with tempfile.NamedTemporaryFile(
+                delete=False, suffix=f".{file_type}"
+            ) as temp_file:
+                temp_file_path = temp_file.name
+
+            # 按块流式写盘，断线后按 Range 续传；在线程池中执行，不阻塞事件循环
             try:
-                response = requests.get(
-                    converted_url, timeout=app_config.url_reader_timeout
+                download = await run_in_threadpool(
+                    download_to_file,
+                    converted_url,
+                    temp_file_path,
+                    timeout=app_config.url_reader_timeout,
+                    max_workers=app_config.url_download_workers,
+                    max_retries=app_config.url_download_max_retries,
                 )
-                response.raise_for_status()
-            except requests.RequestException as download_error:
+            except (DownloadError, requests.RequestException) as download_error:
                 raise HTTPException(
                     status_code=400, detail=f"Unable to download file: {str(download_error)}"
                 )
-
-            with tempfile.NamedTemporaryFile(
-                delete=False, suffix=f".{file_type}"
-            ) as temp_file:
-                temp_file.write(response.content)
-                temp_file_path = temp_file.name
+            logger.info(
+                "Downloaded %s (%s bytes, %s segments, %s resumes)",
+                converted_url,
+                download.size,
+                download.segments,
+                download.resumes,
+            )
 
             metadata = create_table_from_dataframe(
                 conn,
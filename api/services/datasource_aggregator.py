@@ -15,8 +15,11 @@ from models.datasource_models import (
     DataSourceFilter,
 )
 from models.query_models import ConnectionStatus
+from core.data.file_datasource_manager import _quote_identifier
+from core.data.ingest_cache import release_linked_table
 from core.database.database_manager import db_manager  # 使用全局实例
 from core.database.duckdb_pool import get_connection_pool
+from core.database.table_metadata_cache import invalidate_table_metadata_cache
 
 logger = logging.getLogger(__name__)
 
@@ -341,8 +344,17 @@ class DataSourceAggregator:
             table_name = source_id.replace("table_", "").replace("file_", "")
 
             with self.duckdb_pool.get_connection() as conn:
-                # 删除表
-                conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+                # 仍有重复上传的表名链接到该表时，先把表移交给链接者
+                release_linked_table(conn, table_name)
+                # 删除表或视图（外部视图、链接视图导入的数据源是视图）
+                if conn.execute(
+                    "SELECT 1 FROM duckdb_views() WHERE view_name = ? AND NOT internal",
+                    [table_name],
+                ).fetchone():
+                    conn.execute(f"DROP VIEW IF EXISTS {_quote_identifier(table_name)}")
+                else:
+                    conn.execute(f"DROP TABLE IF EXISTS {_quote_identifier(table_name)}")
+                invalidate_table_metadata_cache(table_name)
                 logger.info("Successfully deleted DuckDB table: %s", table_name)
                 return True
 
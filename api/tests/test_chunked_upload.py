@@ -0,0 +1,319 @@
+"""
+Tests for persistent, resumable chunked uploads with positional writes.
+"""
+
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+
+from core.data.external_views import register_external_view
+from core.data.file_datasource_manager import file_datasource_manager, promote_staging_table
+from core.data.incremental_import import merge_staging_table
+from core.database.duckdb_engine import with_duckdb_connection
+from core.services.upload_session_manager import upload_session_manager
+from main import app
+from routers.chunked_upload import _get_final_file_path, _stream_ingestors
+
+client = TestClient(app)
+
+CHUNK_SIZE = 64
+
+
+def _init(
+    content: bytes, file_name: str, file_hash: str = None, chunk_size: int = CHUNK_SIZE
+) -> str:
+    data = {"file_name": file_name, "file_size": len(content), "chunk_size": chunk_size}
+    if file_hash:
+        data["file_hash"] = file_hash
+    resp = client.post("/api/upload/init", data=data)
+    assert resp.status_code == 200
+    return resp.json()["data"]["upload_id"]
+
+
+def _send(
+    upload_id: str,
+    content: bytes,
+    chunk_number: int,
+    chunk_hash: str = None,
+    chunk_size: int = CHUNK_SIZE,
+):
+    part = content[chunk_number * chunk_size : (chunk_number + 1) * chunk_size]
+    data = {"upload_id": upload_id, "chunk_number": chunk_number}
+    if chunk_hash:
+        data["chunk_hash"] = chunk_hash
+    return client.post(
+        "/api/upload/chunk",
+        data=data,
+        files={"chunk": ("blob", part, "application/octet-stream")},
+    )
+
+
+def test_out_of_order_chunks_resume_after_restart():
+    content = b"id,name\n" + b"".join(f"{i},name_{i}\n".encode() for i in range(60))
+    upload_id = _init(content, "chunked_resume.csv", hashlib.md5(content).hexdigest())
+    total = (len(content) + CHUNK_SIZE - 1) // CHUNK_SIZE
+    assert total > 4
+
+    for chunk_number in (3, 0, 1):
+        assert _send(upload_id, content, chunk_number).status_code == 200
+
+    # 模拟进程重启：内存中的哈希状态丢失，会话仍在系统库中
+    upload_session_manager._hash_states.clear()
+
+    status = client.get(f"/api/upload/status/{upload_id}").json()["data"]
+    assert status["uploaded_chunks"] == 3
+    missing = status["missing_chunks"]
+    assert 2 in missing and 3 not in missing
+
+    for chunk_number in reversed(missing):
+        assert _send(upload_id, content, chunk_number).status_code == 200
+
+    session = upload_session_manager.get_session(upload_id)
+    with open(session["target_path"], "rb") as handle:
+        assert handle.read() == content
+    assert upload_session_manager.finalize_hash(session) == hashlib.md5(content).hexdigest()
+
+    with (
+        patch("routers.chunked_upload.schedule_cleanup"),
+        patch(
+            "routers.chunked_upload.file_datasource_manager.save_file_datasource",
+            return_value=True,
+        ),
+    ):
+        resp = client.post("/api/upload/complete", data={"upload_id": upload_id})
+    assert resp.status_code == 200
+    source_id = resp.json()["data"]["file_info"]["source_id"]
+
+    with with_duckdb_connection() as con:
+        try:
+            assert con.execute(f'SELECT COUNT(*) FROM "{source_id}"').fetchone()[0] == 60
+        finally:
+            con.execute(f'DROP TABLE IF EXISTS "{source_id}"')
+            os.remove(_get_final_file_path("chunked_resume.csv"))
+    assert upload_session_manager.get_session(upload_id)["status"] == "completed"
+
+
+def test_truncated_chunk_is_rejected():
+    content = b"a,b\n" + b"1,2\n" * 40
+    upload_id = _init(content, "chunked_truncated.csv")
+    resp = client.post(
+        "/api/upload/chunk",
+        data={"upload_id": upload_id, "chunk_number": 0},
+        files={"chunk": ("blob", content[:10], "application/octet-stream")},
+    )
+    assert resp.status_code == 400
+    assert client.get(f"/api/upload/status/{upload_id}").json()["data"]["uploaded_chunks"] == 0
+    assert client.delete(f"/api/upload/cancel/{upload_id}").status_code == 200
+    assert client.get(f"/api/upload/status/{upload_id}").status_code == 404
+
+
+def test_init_recommends_chunk_size_and_parallelism():
+    resp = client.post(
+        "/api/upload/init", data={"file_name": "recommend.csv", "file_size": 3 * 1024 * 1024}
+    )
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert data["chunk_size"] == data["recommended_chunk_size"]
+    assert data["chunk_size"] % (1024 * 1024) == 0
+    assert 1 <= data["recommended_parallelism"] <= data["total_chunks"]
+    assert client.delete(f"/api/upload/cancel/{data['upload_id']}").status_code == 200
+
+
+def test_concurrent_chunks_with_checksums():
+    content = bytes(range(256)) * 8
+    upload_id = _init(content, "chunked_parallel.bin.csv")
+    total = (len(content) + CHUNK_SIZE - 1) // CHUNK_SIZE
+
+    def _checksum(n: int) -> str:
+        return hashlib.md5(content[n * CHUNK_SIZE : (n + 1) * CHUNK_SIZE]).hexdigest()
+
+    # 损坏的分块只需单独重传
+    bad = _send(upload_id, content, 5, chunk_hash="0" * 32)
+    assert bad.status_code == 400
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda n: _send(upload_id, content, n, _checksum(n)), range(total)))
+    assert all(r.status_code == 200 for r in results)
+
+    session = upload_session_manager.get_session(upload_id)
+    assert session["uploaded_chunks"] == total
+    with open(session["target_path"], "rb") as handle:
+        assert handle.read() == content
+    assert upload_session_manager.finalize_hash(session) == hashlib.md5(content).hexdigest()
+    assert client.delete(f"/api/upload/cancel/{upload_id}").status_code == 200
+
+
+def test_parquet_row_groups_are_ingested_while_uploading():
+    table = pa.table({"id": list(range(4000)), "name": [f"n{i}" for i in range(4000)]})
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, row_group_size=500, compression="none")
+    content = buffer.getvalue()
+    chunk_size = 4096
+    upload_id = _init(content, "chunked_stream.parquet", chunk_size=chunk_size)
+    total = (len(content) + chunk_size - 1) // chunk_size
+
+    # 先传尾部分块（footer），随后按顺序上传，中间的一个分块暂缓
+    held = total // 2
+    order = [total - 1, total - 2] + [n for n in range(total - 2) if n != held]
+    for chunk_number in order:
+        assert _send(upload_id, content, chunk_number, chunk_size=chunk_size).status_code == 200
+
+    ingestor = _stream_ingestors[upload_id]
+    deadline = time.time() + 10
+    while ingestor.row_groups_loaded < 1 and time.time() < deadline:
+        time.sleep(0.05)
+    assert 1 <= ingestor.row_groups_loaded < ingestor.num_row_groups
+
+    assert _send(upload_id, content, held, chunk_size=chunk_size).status_code == 200
+    with (
+        patch("routers.chunked_upload.schedule_cleanup"),
+        patch(
+            "routers.chunked_upload.file_datasource_manager.save_file_datasource",
+            return_value=True,
+        ),
+    ):
+        resp = client.post("/api/upload/complete", data={"upload_id": upload_id})
+    assert resp.status_code == 200
+    file_info = resp.json()["data"]["file_info"]
+    assert file_info["row_count"] == 4000
+    assert upload_id not in _stream_ingestors
+
+    with with_duckdb_connection() as con:
+        try:
+            source_id = file_info["source_id"]
+            assert con.execute(
+                f'SELECT COUNT(*), SUM(id) FROM "{source_id}"'
+            ).fetchone() == (4000, sum(range(4000)))
+            assert not con.execute(
+                "SELECT table_name FROM duckdb_tables() WHERE table_name = ?",
+                [ingestor.staging_table],
+            ).fetchall()
+        finally:
+            con.execute(f'DROP TABLE IF EXISTS "{source_id}"')
+            os.remove(_get_final_file_path("chunked_stream.parquet"))
+
+
+def _upload_whole(content: bytes, file_name: str, table_alias: str) -> dict:
+    data = {"file_name": file_name, "file_size": len(content), "chunk_size": len(content)}
+    resp = client.post("/api/upload/init", data={**data, "table_alias": table_alias})
+    upload_id = resp.json()["data"]["upload_id"]
+    assert _send(upload_id, content, 0, chunk_size=len(content)).status_code == 200
+    with patch("routers.chunked_upload.schedule_cleanup"):
+        resp = client.post("/api/upload/complete", data={"upload_id": upload_id})
+    assert resp.status_code == 200
+    os.remove(_get_final_file_path(file_name))
+    return resp.json()["data"]["file_info"]
+
+
+def test_identical_reupload_links_to_existing_table():
+    content = b"id,amount\n" + b"".join(f"{i},{i * 3}\n".encode() for i in range(50))
+    content += f"# {time.time_ns()}\n".encode()  # 每次运行的内容唯一，避免命中历史记录
+    first = _upload_whole(content, "dedup_monthly.csv", "dedup_first")
+    second = _upload_whole(content, "dedup_monthly.csv", "dedup_second")
+    third = _upload_whole(content, "dedup_monthly.csv", "dedup_third")
+
+    assert first["linked_table"] is None
+    assert second["linked_table"] == third["linked_table"] == first["source_id"]
+    assert second["row_count"] == first["row_count"]
+
+    try:
+        # 删除物理表后，第一个链接者接管数据，其余链接改指向它
+        resp = client.delete(f"/api/duckdb/tables/{first['source_id']}")
+        assert resp.status_code == 200
+        with with_duckdb_connection() as con:
+            tables = {row[0] for row in con.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+            assert second["source_id"] in tables and first["source_id"] not in tables
+            assert con.execute(f'SELECT SUM(amount) FROM "{third["source_id"]}"').fetchone()[0] == sum(
+                i * 3 for i in range(50)
+            )
+    finally:
+        for info in (second, third):
+            client.delete(f"/api/duckdb/tables/{info['source_id']}")
+
+
+def test_rewriting_a_linked_table_leaves_its_links_unchanged():
+    content = b"id,amount\n" + b"".join(f"{i},{i * 5}\n".encode() for i in range(40))
+    content += f"# {time.time_ns()}\n".encode()
+    expected = sum(i * 5 for i in range(40))
+    first = _upload_whole(content, "dedup_rewrite.csv", "dedup_rewrite_a")
+    second = _upload_whole(content, "dedup_rewrite.csv", "dedup_rewrite_b")
+    assert second["linked_table"] == first["source_id"]
+    uploads = [first, second]
+
+    def total(con, info):
+        return con.execute(f'SELECT SUM(amount) FROM "{info["source_id"]}"').fetchone()[0]
+
+    try:
+        # 替换物理表：原数据移交给链接者，物理表不再参与去重
+        with with_duckdb_connection() as con:
+            con.execute('CREATE TABLE "dedup_rewrite_stage" AS SELECT 1 AS id, 1 AS amount')
+            promote_staging_table(con, "dedup_rewrite_stage", first["source_id"])
+            assert total(con, first) == 1
+            assert total(con, second) == expected
+        record = file_datasource_manager.get_file_datasource(first["source_id"])
+        assert "ingest_key" not in (record.get("metadata") or {})
+
+        third = _upload_whole(content, "dedup_rewrite.csv", "dedup_rewrite_c")
+        uploads.append(third)
+        assert third["linked_table"] == second["source_id"]
+
+        # 原地追加：链接者仍看到追加前的数据
+        with with_duckdb_connection() as con:
+            con.execute('CREATE TABLE "dedup_rewrite_stage" AS SELECT 1000 AS id, 7 AS amount')
+            merge_staging_table(con, "dedup_rewrite_stage", second["source_id"], "append")
+            assert total(con, second) == expected + 7
+            assert total(con, third) == expected
+    finally:
+        for info in uploads:
+            client.delete(f"/api/duckdb/tables/{info['source_id']}")
+
+
+def test_paste_and_external_view_over_a_linked_table_keep_links_intact(tmp_path):
+    content = b"id,amount\n" + b"".join(f"{i},{i * 2}\n".encode() for i in range(30))
+    content += f"# {time.time_ns()}\n".encode()
+    expected = sum(i * 2 for i in range(30))
+    first = _upload_whole(content, "dedup_overwrite.csv", "dedup_overwrite_a")
+    second = _upload_whole(content, "dedup_overwrite.csv", "dedup_overwrite_b")
+    assert second["linked_table"] == first["source_id"]
+    uploads = [first, second]
+
+    def total(con, info):
+        return con.execute(f'SELECT SUM(amount) FROM "{info["source_id"]}"').fetchone()[0]
+
+    try:
+        # 粘贴覆盖物理表：原数据移交给链接者
+        resp = client.post(
+            "/api/paste-data",
+            json={
+                "table_name": first["source_id"],
+                "column_names": ["id", "amount"],
+                "column_types": ["INTEGER", "INTEGER"],
+                "data_rows": [["1", "1"]],
+            },
+        )
+        assert resp.status_code == 200
+        with with_duckdb_connection() as con:
+            assert total(con, first) == 1
+            assert total(con, second) == expected
+
+        third = _upload_whole(content, "dedup_overwrite.csv", "dedup_overwrite_c")
+        uploads.append(third)
+        assert third["linked_table"] == second["source_id"]
+
+        # 外部视图取代物理表：链接者仍看到原数据
+        replacement = tmp_path / "replacement.csv"
+        replacement.write_text("id,amount\n1,5\n", encoding="utf-8")
+        with with_duckdb_connection() as con:
+            register_external_view(con, second["source_id"], str(replacement), "csv")
+            assert total(con, second) == 5
+            assert total(con, third) == expected
+    finally:
+        for info in uploads:
+            client.delete(f"/api/duckdb/tables/{info['source_id']}")
@@ -3,7 +3,8 @@ import shutil
 import tempfile
 import pytest
 import pandas as pd
-from core.data.file_utils import read_file_by_type
+import duckdb
+from core.data.file_utils import _detect_csv_encoding, load_file_to_duckdb, read_file_by_type
 
 class TestEncodingDetection:
     def setup_method(self):
@@ -54,3 +55,86 @@ class TestEncodingDetection:
         df = read_file_by_type(path, "csv")
         assert df.iloc[0, 0] == "Résume"
         assert df.iloc[0, 1] == "Café"
+
+    def test_gbk_detected_beyond_file_head(self):
+        """Non-ASCII rows that only appear deep in the file still select GB18030"""
+        rows = [f"{i},plain_{i}" for i in range(20000)] + ["20000,中文在文件末尾"]
+        path = self.create_csv("gbk_tail.csv", "id,name\n" + "\n".join(rows) + "\n", "gbk")
+        assert os.path.getsize(path) > 100 * 1024
+
+        assert _detect_csv_encoding(path) == "gb18030"
+
+    def test_gbk_csv_loaded_with_strict_parsing(self):
+        """GBK CSV with quoted delimiters and newlines is transcoded and parsed strictly"""
+        content = 'id,remark\n1,"客户,甲"\n2,"多行\n备注"\n3,普通\n'
+        path = self.create_csv("gbk_quoted.csv", content, "gbk")
+
+        con = duckdb.connect()
+        try:
+            result = load_file_to_duckdb(con, "gbk_quoted", path, "csv")
+            assert result["engine"] == "duckdb"
+            rows = con.execute("SELECT id, remark FROM gbk_quoted ORDER BY id").fetchall()
+        finally:
+            con.close()
+        assert rows == [(1, "客户,甲"), (2, "多行\n备注"), (3, "普通")]
+
+    def test_compressed_csv_loaded_natively_and_via_streaming_decompression(self):
+        """.csv.gz is read by DuckDB directly; .bz2 and zip bundles are decompressed to temp files"""
+        import bz2
+        import gzip
+        import zipfile
+
+        from core.data.file_utils import detect_file_type, file_stem
+
+        content = "id,name\n1,张三\n2,李四\n"
+        gz_path = os.path.join(self.test_dir, "suppliers.csv.gz")
+        with gzip.open(gz_path, "wb") as f:
+            f.write(content.encode("gbk"))
+        bz2_path = os.path.join(self.test_dir, "suppliers.csv.bz2")
+        with bz2.open(bz2_path, "wb") as f:
+            f.write(content.encode("utf-8"))
+        zip_path = os.path.join(self.test_dir, "bundle.zip")
+        with zipfile.ZipFile(zip_path, "w") as archive:
+            archive.writestr("part1.csv", "id,name\n1,张三\n")
+            archive.writestr("nested/part2.csv", "id,name\n2,李四\n")
+            archive.writestr("__MACOSX/._part1.csv", "metadata")
+
+        assert [detect_file_type(p) for p in (gz_path, bz2_path, zip_path)] == ["csv"] * 3
+        assert file_stem(gz_path) == "suppliers"
+        assert detect_file_type("report.xlsx.gz") == "unknown"
+
+        con = duckdb.connect()
+        try:
+            for index, path in enumerate((gz_path, bz2_path, zip_path)):
+                result = load_file_to_duckdb(con, f"compressed_{index}", path, "csv")
+                assert result["engine"] == "duckdb"
+                rows = con.execute(f"SELECT id, name FROM compressed_{index} ORDER BY id").fetchall()
+                assert rows == [(1, "张三"), (2, "李四")]
+        finally:
+            con.close()
+
+    def test_decompression_stops_at_size_and_member_limits(self, monkeypatch):
+        """Highly compressible payloads and zip archives with too many entries are rejected"""
+        import bz2
+        import zipfile
+
+        from core.common.config_manager import config_manager
+        from core.data.compressed_files import DecompressionLimitError, decompressed_paths
+
+        bomb_path = os.path.join(self.test_dir, "bomb.csv.bz2")
+        with bz2.open(bomb_path, "wb") as f:
+            f.write(b"id,value\n" + b"0,0\n" * (5 * 1024 * 1024))
+        assert os.path.getsize(bomb_path) < 10 * 1024
+
+        with pytest.raises(DecompressionLimitError):
+            with decompressed_paths(bomb_path, "csv"):
+                pass
+
+        zip_path = os.path.join(self.test_dir, "many.zip")
+        with zipfile.ZipFile(zip_path, "w") as archive:
+            for index in range(5):
+                archive.writestr(f"part{index}.csv", f"id\n{index}\n")
+        monkeypatch.setattr(config_manager.get_app_config(), "max_zip_members", 3)
+        with pytest.raises(DecompressionLimitError):
+            with decompressed_paths(zip_path, "csv"):
+                pass
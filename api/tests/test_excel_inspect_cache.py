@@ -0,0 +1,50 @@
+"""
+Tests for single-pass Excel inspection and the cached inspection in metadata.json.
+"""
+
+import json
+import shutil
+from unittest.mock import patch
+
+from openpyxl import Workbook
+
+from core.data.excel_import_manager import (
+    _metadata_path,
+    cleanup_pending_excel,
+    get_pending_excel,
+    inspect_pending_excel,
+    register_excel_upload,
+)
+
+
+def test_inspection_is_cached_next_to_pending_file(tmp_path):
+    workbook = Workbook()
+    first = workbook.active
+    first.title = "Orders"
+    first.append(["order_id", "amount"])
+    first.append([1, 9.5])
+    second = workbook.create_sheet("Notes")
+    second.append(["note"])
+    second.append(["hello"])
+    source = tmp_path / "cached.xlsx"
+    workbook.save(source)
+
+    upload_copy = tmp_path / "upload.xlsx"
+    shutil.copy(source, upload_copy)
+    pending = register_excel_upload(str(upload_copy), "cached.xlsx")
+    try:
+        sheets = inspect_pending_excel(pending)
+        assert [sheet["name"] for sheet in sheets] == ["Orders", "Notes"]
+        assert sheets[0]["columns"][1] == {"name": "amount", "duckdb_type": "DOUBLE"}
+
+        with _metadata_path(pending.file_id).open(encoding="utf-8") as fh:
+            assert json.load(fh)["sheet_inspection"]["sheets"] == sheets
+        assert get_pending_excel(pending.file_id) == pending
+
+        with patch(
+            "core.data.excel_import_manager.load_workbook",
+            side_effect=AssertionError("workbook must not be reopened"),
+        ):
+            assert inspect_pending_excel(pending) == sheets
+    finally:
+        cleanup_pending_excel(pending.file_id)
@@ -0,0 +1,174 @@
+"""
+Tests for row-streaming Excel ingestion into DuckDB.
+"""
+
+import datetime
+
+import duckdb
+from openpyxl import Workbook
+
+from core.data.excel_import_manager import (
+    ExcelSheetJob,
+    excel_import_progress,
+    load_arrow_batches_into_table,
+    load_excel_sheet_dataframe,
+    load_excel_sheets,
+    stream_excel_sheet_to_table,
+)
+from core.data.excel_sheet_reader import parse_sheet_to_arrow_files
+
+
+def _write_workbook(path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Data"
+    sheet.append(["Report title"])
+    sheet.append(["id", "amount", "label", None, "day"])
+    for i in range(1, 101):
+        sheet.append(
+            [
+                i,
+                i * 2 if i < 90 else i + 0.5,  # 后续批次出现小数，列需放宽为 DOUBLE
+                "NA" if i % 10 == 0 else f"item {i}",
+                None,
+                datetime.datetime(2024, 1, 1) + datetime.timedelta(days=i),
+            ]
+        )
+    sheet.append([])
+    sheet.append([101, 3, "tail", None, None, "extra"])  # 比表头更宽的行
+    sheet.append([])
+    workbook.save(path)
+
+
+def test_streaming_matches_dataframe_loader(tmp_path):
+    path = str(tmp_path / "stream.xlsx")
+    _write_workbook(path)
+    con = duckdb.connect()
+
+    result = stream_excel_sheet_to_table(
+        con, "streamed", path, "Data", header_rows=1, header_row_index=2, batch_rows=16
+    )
+    expected = load_excel_sheet_dataframe(path, "Data", header_rows=1, header_row_index=2)
+    con.register("expected_df", expected)
+
+    assert result.row_count == len(expected) == 101
+    assert result.columns == list(expected.columns)
+    streamed_types = [row[:2] for row in con.execute("DESCRIBE streamed").fetchall()]
+    expected_types = [
+        row[:2] for row in con.execute("DESCRIBE SELECT * FROM expected_df").fetchall()
+    ]
+    assert streamed_types == expected_types
+    assert dict(streamed_types)["amount"] == "DOUBLE"
+    assert (
+        con.execute(
+            "SELECT COUNT(*) FROM (SELECT * FROM streamed EXCEPT ALL SELECT * FROM expected_df)"
+        ).fetchone()[0]
+        == 0
+    )
+
+
+def test_streaming_without_header_and_with_fill(tmp_path):
+    path = str(tmp_path / "fill.xlsx")
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["east", 1])
+    sheet.append([None, 2])
+    sheet.append(["west", 3])
+    workbook.save(path)
+    con = duckdb.connect()
+
+    result = stream_excel_sheet_to_table(
+        con, "filled", path, sheet.title, header_rows=0, fill_merged=True
+    )
+
+    assert result.columns == ["column_1", "column_2"]
+    assert con.execute("SELECT column_1 FROM filled ORDER BY column_2").fetchall() == [
+        ("east",),
+        ("east",),
+        ("west",),
+    ]
+
+
+def test_widening_across_batches_keeps_original_text(tmp_path):
+    path = str(tmp_path / "codes.xlsx")
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["code"])
+    for code in ["007", "010", "abc"]:
+        sheet.append([code])
+    workbook.save(path)
+    con = duckdb.connect()
+
+    for batch_rows in (2, 100):
+        table = f"codes_{batch_rows}"
+        stream_excel_sheet_to_table(con, table, path, sheet.title, batch_rows=batch_rows)
+        assert con.execute(f"SELECT list(code ORDER BY rowid) FROM {table}").fetchone()[0] == [
+            "007",
+            "010",
+            "abc",
+        ]
+
+
+def test_arrow_batches_are_cast_once_with_final_kinds(tmp_path):
+    path = str(tmp_path / "codes.xlsx")
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["code", "qty"])
+    for code, qty in [("007", 1), ("010", 2), ("abc", 2.5)]:
+        sheet.append([code, qty])
+    workbook.save(path)
+
+    parsed = parse_sheet_to_arrow_files(
+        path, sheet.title, str(tmp_path / "batches"), batch_rows=2
+    )
+    assert len(parsed["batch_files"]) == 2
+    con = duckdb.connect()
+    load_arrow_batches_into_table(
+        con, "codes", parsed["columns"], parsed["kinds"], parsed["batch_files"]
+    )
+    assert [row[:2] for row in con.execute("DESCRIBE codes").fetchall()] == [
+        ("code", "VARCHAR"),
+        ("qty", "DOUBLE"),
+    ]
+    assert con.execute(
+        "SELECT list(code ORDER BY rowid), list(qty ORDER BY rowid) FROM codes"
+    ).fetchone() == (
+        ["007", "010", "abc"],
+        [1.0, 2.0, 2.5],
+    )
+
+
+def test_parallel_sheet_import_matches_in_process_streaming(tmp_path):
+    path = str(tmp_path / "monthly.xlsx")
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for month in range(1, 4):
+        sheet = workbook.create_sheet(f"M{month}")
+        sheet.append(["day", "value", "note"])
+        for day in range(1, 41):
+            sheet.append([day, day * month if day < 30 else day + 0.25, f"m{month}d{day}"])
+        sheet.append([41, 1, "late", "extra"])
+    workbook.save(path)
+    con = duckdb.connect()
+
+    jobs = [ExcelSheetJob(sheet_name=f"M{m}", table_name=f"parallel_m{m}") for m in range(1, 4)]
+    results = load_excel_sheets(con, path, jobs, progress_key="parallel-test", max_workers=2)
+
+    progress = excel_import_progress.get("parallel-test")
+    assert progress["status"] == "completed"
+    assert progress["workers"] == 2
+    assert [sheet["status"] for sheet in progress["sheets"]] == ["completed"] * 3
+
+    for month, result in enumerate(results, start=1):
+        assert result.row_count == 41
+        stream_excel_sheet_to_table(con, f"serial_m{month}", path, f"M{month}", batch_rows=16)
+        parallel_types = con.execute(f"DESCRIBE parallel_m{month}").fetchall()
+        serial_types = con.execute(f"DESCRIBE serial_m{month}").fetchall()
+        assert [row[:2] for row in parallel_types] == [row[:2] for row in serial_types]
+        assert (
+            con.execute(
+                f"SELECT COUNT(*) FROM (SELECT * FROM parallel_m{month} "
+                f"EXCEPT ALL SELECT * FROM serial_m{month})"
+            ).fetchone()[0]
+            == 0
+        )
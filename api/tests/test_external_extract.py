@@ -0,0 +1,157 @@
+"""
+Tests for streaming external query results into DuckDB in fixed-size batches.
+"""
+
+import sqlite3
+from decimal import Decimal
+
+import duckdb
+import pandas as pd
+import pytest
+
+from core.data import external_extract
+from core.data.external_extract import (
+    STAGING_TABLE_PREFIX,
+    ExtractionCancelled,
+    PartitionSpec,
+    extract_batches_to_table,
+    extract_partitioned_query_to_table,
+    plan_partitions,
+)
+from core.data.file_datasource_manager import drop_stale_staging_tables
+from core.database.database_manager import DatabaseManager
+from models.query_models import DatabaseConnection, DataSourceType
+
+
+def _staging_tables(con):
+    return con.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE starts_with(table_name, ?)",
+        [STAGING_TABLE_PREFIX],
+    ).fetchall()
+
+
+def _sqlite_manager(tmp_path, rows):
+    db_path = tmp_path / "remote.db"
+    with sqlite3.connect(db_path) as remote:
+        remote.execute("CREATE TABLE orders (id INTEGER, note TEXT, created_at TEXT)")
+        remote.executemany("INSERT INTO orders VALUES (?, ?, ?)", rows)
+
+    manager = DatabaseManager()
+    manager.connections["remote"] = DatabaseConnection(
+        id="remote", type=DataSourceType.SQLITE, params={"database": str(db_path)}
+    )
+    return manager
+
+
+def test_sqlite_result_is_streamed_in_batches(tmp_path):
+    manager = _sqlite_manager(
+        tmp_path, [(i, None if i < 5 else f"n{i}", None) for i in range(23)]
+    )
+    batches = list(manager.iter_query_batches("remote", "SELECT * FROM orders ORDER BY id", 10))
+    assert [len(batch) for batch in batches] == [10, 10, 3]
+
+    con = duckdb.connect()
+    rows = extract_batches_to_table(
+        con, "orders", manager.iter_query_batches("remote", "SELECT * FROM orders", 5)
+    )
+    assert rows == 23
+    assert con.execute('SELECT COUNT(*), COUNT(note) FROM "orders"').fetchone() == (23, 18)
+    assert _staging_tables(con) == []
+
+
+def test_conflicting_batch_types_are_widened_to_varchar():
+    con = duckdb.connect()
+    batches = [
+        pd.DataFrame({"code": [1, 2]}),
+        pd.DataFrame({"code": ["A-3", "B-4"]}),
+    ]
+    assert extract_batches_to_table(con, "codes", iter(batches)) == 4
+    assert con.execute('SELECT list(code ORDER BY code) FROM "codes"').fetchone()[0] == [
+        "1",
+        "2",
+        "A-3",
+        "B-4",
+    ]
+
+
+def test_decimal_batches_keep_the_widest_scale():
+    con = duckdb.connect()
+    batches = [
+        pd.DataFrame({"price": [Decimal("1.5")]}),
+        pd.DataFrame({"price": [Decimal("1.25"), Decimal("3.99")]}),
+    ]
+    assert extract_batches_to_table(con, "prices", iter(batches)) == 3
+    assert con.execute('SELECT list(price ORDER BY price) FROM "prices"').fetchone()[0] == [
+        Decimal("1.25"),
+        Decimal("1.50"),
+        Decimal("3.99"),
+    ]
+
+    # 整数位加小数位超过 38 位时改用 DOUBLE，而不是退化为 VARCHAR
+    batches = [
+        pd.DataFrame({"amount": [Decimal("123456789012345678901234567890.5")]}),
+        pd.DataFrame({"amount": [Decimal("0.12345678901234567890")]}),
+    ]
+    assert extract_batches_to_table(con, "amounts", iter(batches)) == 2
+    assert con.execute(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = 'amounts'"
+    ).fetchone()[0] == "DOUBLE"
+
+
+def test_cancelled_extraction_leaves_no_tables():
+    con = duckdb.connect()
+    batches = (pd.DataFrame({"id": [i]}) for i in range(10))
+    seen = []
+
+    def should_stop():
+        seen.append(1)
+        return len(seen) > 3
+
+    with pytest.raises(ExtractionCancelled):
+        extract_batches_to_table(con, "partial", batches, should_stop)
+    assert _staging_tables(con) == []
+    assert con.execute("SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'partial'").fetchone()[0] == 0
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"column": "id", "partitions": 4},
+        {"column": "id", "partitions": 3, "strategy": "modulo"},
+        {"column": "created_at", "partitions": 5},
+    ],
+)
+def test_partitioned_extraction_covers_every_row_once(tmp_path, monkeypatch, options):
+    rows = [(i, f"n{i}", f"2024-01-{i % 28 + 1:02d} 08:00:00") for i in range(-7, 90)]
+    rows += [(None, "no id", None), (None, "no id either", None)]
+    manager = _sqlite_manager(tmp_path, rows)
+    monkeypatch.setattr(external_extract, "db_manager", manager)
+
+    spec = PartitionSpec.from_options(options)
+    assert len(plan_partitions("remote", "SELECT * FROM orders;", spec)) > 1
+
+    con = duckdb.connect()
+    extracted = extract_partitioned_query_to_table(
+        con, "remote", "SELECT * FROM orders;", "orders", spec, batch_rows=7
+    )
+    assert extracted == len(rows)
+    assert con.execute('SELECT COUNT(DISTINCT note) FROM "orders"').fetchone()[0] == len(rows)
+    assert _staging_tables(con) == []
+
+
+def test_stale_staging_tables_are_hidden_and_dropped_at_startup():
+    con = duckdb.connect()
+    left_over = f"{STAGING_TABLE_PREFIX}{'0' * 32}"
+    con.execute(f'CREATE TABLE "{left_over}" (id INTEGER)')
+    con.execute('CREATE TABLE "orders" (id INTEGER)')
+
+    # 表列表隐藏 system_ 前缀的表
+    assert left_over.startswith("system_")
+    assert drop_stale_staging_tables(con) == [left_over]
+    assert con.execute("SELECT table_name FROM duckdb_tables()").fetchall() == [("orders",)]
+
+
+def test_partition_options_are_validated():
+    assert PartitionSpec.from_options({"column": "id", "partitions": 1}) is None
+    with pytest.raises(ValueError):
+        PartitionSpec.from_options({"column": "id", "partitions": 4, "strategy": "hash"})
@@ -0,0 +1,169 @@
+"""
+Tests for watermark-based incremental sync of external tables.
+"""
+
+import sqlite3
+
+import duckdb
+import pytest
+
+from core.data import external_extract, external_sync
+from core.data.external_sync import sync_external_table
+from core.database.database_manager import DatabaseManager
+from models.query_models import DatabaseConnection, DataSourceType
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    db_path = tmp_path / "remote.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE orders (id INTEGER, amount REAL, qty INTEGER, updated_at TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO orders VALUES (?, ?, ?, ?)",
+            [
+                (1, 10.0, 1, "2024-01-01 08:00:00"),
+                (2, 20.0, 2, "2024-01-02 08:00:00"),
+                (3, 30.0, 3, "2024-01-03 08:00:00"),
+            ],
+        )
+
+    manager = DatabaseManager()
+    manager.connections["remote"] = DatabaseConnection(
+        id="remote", type=DataSourceType.SQLITE, params={"database": str(db_path)}
+    )
+    monkeypatch.setattr(external_extract, "db_manager", manager)
+    monkeypatch.setattr(external_sync, "db_manager", manager)
+
+    def execute(sql, params=()):
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(sql, params)
+
+    return execute
+
+
+def test_sync_fetches_only_rows_past_the_watermark(remote):
+    con = duckdb.connect()
+
+    def sync(previous, **kwargs):
+        metadata = sync_external_table(
+            con,
+            "remote",
+            "SELECT * FROM orders",
+            "orders_mirror",
+            "updated_at",
+            key_columns=["id"],
+            previous=previous,
+            **kwargs,
+        )
+        return {**metadata, "source_id": "orders_mirror"}
+
+    first = sync(None)
+    assert first["row_count"] == 3
+    assert first["import_state"]["high_water_mark"] == "2024-01-03 08:00:00"
+
+    remote("UPDATE orders SET amount = 25.0, qty = NULL, updated_at = '2024-01-04 08:00:00' WHERE id = 2")
+    remote("INSERT INTO orders VALUES (4, 40.0, NULL, '2024-01-05 08:00:00')")
+    second = sync(first)
+    state = second["import_state"]
+    # 修改与新增的两行，加上与上次水位相同而被重读的 id=3
+    assert state["last_import_rows"] == 3
+    assert state["last_replaced_rows"] == 2
+    assert state["high_water_mark"] == "2024-01-05 08:00:00"
+    assert state["batches"] == 2
+    assert second["row_count"] == 4
+    assert con.execute("SELECT amount FROM orders_mirror WHERE id = 2").fetchone()[0] == 25.0
+    # 本批次的 qty 只有空值和整数，不应把本地列放宽为 VARCHAR 或 DOUBLE
+    assert con.execute(
+        "SELECT data_type FROM duckdb_columns() WHERE table_name = 'orders_mirror' AND column_name = 'qty'"
+    ).fetchone()[0] == "BIGINT"
+
+    # upsert 以 >= 水位续传：与水位相同的行被重读并按主键覆盖，不会重复
+    third = sync(second)
+    assert third["import_state"]["last_import_rows"] == 1
+    assert third["row_count"] == 4
+
+    remote("DELETE FROM orders WHERE id = 1")
+    reconciled = sync(third, reconcile_every_hours=0)
+    assert reconciled["import_state"]["last_deleted_rows"] == 1
+    assert reconciled["import_state"]["last_reconciled_at"]
+    assert reconciled["row_count"] == 3
+    assert con.execute("SELECT list(id ORDER BY id) FROM orders_mirror").fetchone()[0] == [2, 3, 4]
+
+
+def test_keyed_sync_picks_up_rows_at_or_just_below_the_watermark(remote, monkeypatch):
+    from core.common.config_manager import config_manager
+
+    monkeypatch.setattr(config_manager.get_app_config(), "incremental_watermark_lookback", 3600)
+    con = duckdb.connect()
+
+    def sync(previous):
+        metadata = sync_external_table(
+            con,
+            "remote",
+            "SELECT * FROM orders",
+            "orders_mirror",
+            "updated_at",
+            key_columns=["id"],
+            previous=previous,
+        )
+        return {**metadata, "source_id": "orders_mirror"}
+
+    first = sync(None)
+    # 与上次水位相同的行，以及提交较晚、水位落在回看范围内的行
+    remote("INSERT INTO orders VALUES (5, 50.0, 5, '2024-01-03 08:00:00')")
+    remote("INSERT INTO orders VALUES (6, 60.0, 6, '2024-01-03 07:30:00')")
+    remote("INSERT INTO orders VALUES (7, 70.0, 7, '2024-01-02 08:00:00')")
+    second = sync(first)
+    assert second["import_state"]["high_water_mark"] == "2024-01-03 08:00:00"
+    assert con.execute("SELECT list(id ORDER BY id) FROM orders_mirror").fetchone()[0] == [
+        1,
+        2,
+        3,
+        5,
+        6,
+    ]
+
+
+def test_sync_without_a_usable_watermark_replaces_the_table(remote):
+    con = duckdb.connect()
+
+    def sync(previous, watermark_column="updated_at"):
+        metadata = sync_external_table(
+            con,
+            "remote",
+            "SELECT * FROM orders",
+            "orders_mirror",
+            watermark_column,
+            previous=previous,
+        )
+        return {**metadata, "source_id": "orders_mirror"}
+
+    first = sync(None)
+    remote("INSERT INTO orders VALUES (4, 40.0, 4, '2024-01-04 08:00:00')")
+    # 没有上次的同步状态，或水位列改变，都只能拿到全量结果
+    for previous, column in [(None, "updated_at"), (first, "id"), ({}, "id")]:
+        metadata = sync(previous, column)
+        assert metadata["row_count"] == 4
+        assert metadata["import_state"]["merge_mode"] == "replace"
+        assert metadata["import_state"]["last_replaced_rows"] in {3, 4}
+    counts = con.execute("SELECT COUNT(*), COUNT(DISTINCT id) FROM orders_mirror").fetchone()
+    assert counts == (4, 4)
+
+    appended = sync(metadata, "id")
+    assert appended["import_state"]["merge_mode"] == "append"
+    assert appended["import_state"]["last_import_rows"] == 0
+    assert con.execute("SELECT COUNT(*) FROM orders_mirror").fetchone()[0] == 4
+
+
+def test_reconciliation_requires_key_columns(remote):
+    with pytest.raises(ValueError):
+        sync_external_table(
+            duckdb.connect(),
+            "remote",
+            "SELECT * FROM orders",
+            "orders_mirror",
+            "updated_at",
+            reconcile_every_hours=24,
+        )
@@ -0,0 +1,144 @@
+"""
+Tests for change-detecting, parallel reload of file datasources.
+"""
+
+import hashlib
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from core.data.file_datasource_manager import (
+    _resolve_reload_workers,
+    file_datasource_manager,
+    file_reload_progress,
+)
+from core.database.duckdb_engine import with_duckdb_connection
+from main import app
+
+
+def _write_csv(path, rows):
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write("id,name\n")
+        handle.writelines(f"{i},name_{i}\n" for i in range(rows))
+
+
+def test_reload_skips_unchanged_sources_and_reloads_changed(tmp_path):
+    configs = []
+    for index in range(3):
+        path = tmp_path / f"reload_{index}.csv"
+        _write_csv(path, 5 + index)
+        configs.append(
+            {
+                "source_id": f"test_reload_{index}_{uuid4().hex[:6]}",
+                "file_path": str(path),
+                "file_type": "csv",
+                "filename": path.name,
+            }
+        )
+    saved = {}
+
+    def _run():
+        listed = [dict(saved.get(config["source_id"], config)) for config in configs]
+        with (
+            patch.object(file_datasource_manager, "list_file_datasources", return_value=listed),
+            patch.object(
+                file_datasource_manager,
+                "save_file_datasource",
+                side_effect=lambda info: saved.__setitem__(info["source_id"], dict(info)),
+            ),
+            patch(
+                "core.data.file_datasource_manager._resolve_reload_workers", return_value=3
+            ),
+        ):
+            file_datasource_manager.reload_all_file_datasources()
+        return file_reload_progress.snapshot()
+
+    try:
+        first = _run()
+        assert (first["status"], first["reloaded"], first["unchanged"]) == ("ready", 3, 0)
+        assert all(saved[c["source_id"]]["metadata"]["source_fingerprint"]["hash"] for c in configs)
+
+        second = _run()
+        assert (second["reloaded"], second["unchanged"]) == (0, 3)
+
+        # 只有内容变化的文件才重新加载；仅 mtime 变化时通过哈希确认未变
+        _write_csv(configs[0]["file_path"], 50)
+        stat = os.stat(configs[1]["file_path"])
+        os.utime(configs[1]["file_path"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        third = _run()
+        assert (third["reloaded"], third["unchanged"]) == (1, 2)
+
+        with with_duckdb_connection() as con:
+            count = con.execute(f'SELECT COUNT(*) FROM "{configs[0]["source_id"]}"').fetchone()[0]
+        assert count == 50
+        assert saved[configs[0]["source_id"]]["row_count"] == 50
+
+        response = TestClient(app).get("/health/ready")
+        assert response.status_code == 200
+        assert response.json()["file_datasources"]["unchanged"] == 2
+    finally:
+        with with_duckdb_connection() as con:
+            for config in configs:
+                con.execute(f'DROP TABLE IF EXISTS "{config["source_id"]}"')
+
+
+def test_reload_skips_sources_whose_shared_upload_path_was_overwritten(tmp_path):
+    # 两次上传同名文件 sales.csv 保存在同一路径，文件内容属于后一次上传
+    path = tmp_path / "sales.csv"
+    _write_csv(path, 3)
+    older_hash = hashlib.md5(path.read_bytes()).hexdigest()
+    _write_csv(path, 7)
+    newer_hash = hashlib.md5(path.read_bytes()).hexdigest()
+    configs = [
+        {
+            "source_id": f"test_shared_{name}_{uuid4().hex[:6]}",
+            "file_path": str(path),
+            "file_type": "csv",
+            "filename": path.name,
+            "file_hash": file_hash,
+        }
+        for name, file_hash in (("older", older_hash), ("newer", newer_hash))
+    ]
+
+    try:
+        with (
+            patch.object(file_datasource_manager, "list_file_datasources", return_value=configs),
+            patch.object(file_datasource_manager, "save_file_datasource"),
+            patch(
+                "core.data.file_datasource_manager._resolve_reload_workers", return_value=2
+            ),
+        ):
+            file_datasource_manager.reload_all_file_datasources()
+        progress = file_reload_progress.snapshot()
+        assert (progress["reloaded"], progress["skipped"]) == (1, 1)
+
+        with with_duckdb_connection() as con:
+            tables = {
+                row[0] for row in con.execute("SELECT table_name FROM duckdb_tables()").fetchall()
+            }
+        assert configs[0]["source_id"] not in tables
+        assert configs[1]["source_id"] in tables
+    finally:
+        with with_duckdb_connection() as con:
+            for config in configs:
+                con.execute(f'DROP TABLE IF EXISTS "{config["source_id"]}"')
+
+
+def test_reload_is_not_ready_until_it_runs_and_leaves_pool_headroom():
+    file_reload_progress.mark_pending()
+    try:
+        response = TestClient(app).get("/health/ready")
+        assert response.status_code == 503
+        assert response.json()["file_datasources"]["status"] == "pending"
+    finally:
+        file_reload_progress.finish()
+
+    app_config = SimpleNamespace(file_datasource_reload_workers=16, pool_max_connections=5)
+    with patch(
+        "core.data.file_datasource_manager.config_manager.get_app_config", return_value=app_config
+    ):
+        # 对账自身占用一个连接，另保留一个给在线请求
+        assert _resolve_reload_workers(100) == 3
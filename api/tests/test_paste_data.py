@@ -109,3 +109,71 @@ def test_paste_data_defaults_for_empty_cells():
             assert stored_row[4] == ""  # VARCHAR 默认为空串
     finally:
         _cleanup_table(table_name)
+
+
+def test_paste_raw_text_and_columnar_payloads():
+    raw_table = f"paste_unit_{uuid4().hex[:8]}"
+    columnar_table = f"paste_unit_{uuid4().hex[:8]}"
+    column_names = ["id", "amount", "flag", "note"]
+    column_types = ["INTEGER", "DOUBLE", "BOOLEAN", "VARCHAR"]
+    raw_text = (
+        "id\tamount\tflag\tnote\n"
+        " 1 \t2.5\tyes\t\"tab\tinside\"\n"
+        "NULL\t\t0\t'quoted'\n"
+        "3\tabc\tY\t  \n"
+    )
+
+    try:
+        response = client.post(
+            "/api/paste-data",
+            json={
+                "table_name": raw_table,
+                "column_names": column_names,
+                "column_types": column_types,
+                "raw_text": raw_text,
+                "delimiter": "\t",
+                "has_header": True,
+            },
+        )
+        assert response.status_code == 200
+        assert response.json()["data"]["rows_saved"] == 3
+
+        columnar = client.post(
+            "/api/paste-data",
+            json={
+                "table_name": columnar_table,
+                "column_names": column_names,
+                "column_types": column_types,
+                "column_values": [
+                    [" 1 ", "NULL", "3"],
+                    ["2.5", "", "abc"],
+                    ["yes", "0", "Y"],
+                    ["tab\tinside", "'quoted'", "  "],
+                ],
+            },
+        )
+        assert columnar.status_code == 200
+
+        expected = [
+            (0, 0.0, False, "quoted"),
+            (1, 2.5, True, "tab\tinside"),
+            (3, 0.0, True, ""),
+        ]
+        with with_duckdb_connection() as con:
+            for table_name in (raw_table, columnar_table):
+                rows = con.execute(f'SELECT * FROM "{table_name}" ORDER BY id').fetchall()
+                assert rows == expected
+
+        ragged = client.post(
+            "/api/paste-data",
+            json={
+                "table_name": raw_table,
+                "column_names": column_names,
+                "column_types": column_types,
+                "raw_text": "1,2,true,x\n2,3\n",
+            },
+        )
+        assert ragged.status_code == 400
+    finally:
+        _cleanup_table(raw_table)
+        _cleanup_table(columnar_table)
@@ -61,3 +61,232 @@ def test_import_server_file(server_mount):
     con = get_db_connection()
     result = con.execute('SELECT COUNT(*) FROM "server_file_sample"').fetchone()
     assert result[0] == 2
+
+
+def test_incremental_server_file_import(server_mount):
+    from core.data.file_datasource_manager import file_datasource_manager
+
+    mount_dir, _ = server_mount
+    day1 = os.path.join(mount_dir, "orders_day1.csv")
+    day2 = os.path.join(mount_dir, "orders_day2.csv")
+    with open(day1, "w", encoding="utf-8") as handle:
+        handle.write("id,amount,updated\n1,10,2024-01-01\n2,20,2024-01-01\n")
+    with open(day2, "w", encoding="utf-8") as handle:
+        # 重复的旧行、更新的行、新增列与整数列放宽为小数
+        handle.write(
+            "id,amount,updated,channel\n"
+            "1,10,2024-01-01,web\n2,25.5,2024-01-02,shop\n3,30,2024-01-02,web\n"
+        )
+
+    def _import(path, mode):
+        return client.post(
+            "/api/server-files/import",
+            json={
+                "path": path,
+                "table_alias": "server_file_orders",
+                "mode": mode,
+                "key_columns": ["id"],
+                "watermark_column": "updated",
+            },
+        )
+
+    try:
+        first = _import(day1, "upsert")
+        assert first.status_code == 200
+        assert first.json()["data"]["import_state"]["high_water_mark"] == "2024-01-01"
+
+        second = _import(day2, "upsert")
+        assert second.status_code == 200
+        state = second.json()["data"]["import_state"]
+        # 与上次水位相同的 id=1 也被重读并按主键覆盖
+        assert state["last_import_rows"] == 3
+        assert state["last_replaced_rows"] == 2
+        assert state["added_columns"] == ["channel"]
+        assert state["widened_columns"] == ["amount"]
+        assert state["high_water_mark"] == "2024-01-02"
+
+        con = get_db_connection()
+        rows = con.execute(
+            'SELECT id, amount, channel FROM "server_file_orders" ORDER BY id'
+        ).fetchall()
+        assert rows == [(1, 10.0, "web"), (2, 25.5, "shop"), (3, 30.0, "web")]
+
+        saved = file_datasource_manager.get_file_datasource("server_file_orders")
+        assert saved["row_count"] == 3
+        assert saved["import_state"]["batches"] == 2
+        profiles = {p["name"]: p for p in saved["column_profiles"]}
+        assert profiles["channel"]["statistics"]["null_count"] == 0
+        assert profiles["amount"]["statistics"]["max"] == 30.0
+
+        assert _import(day2, "bogus").status_code == 422
+    finally:
+        get_db_connection().execute('DROP TABLE IF EXISTS "server_file_orders"')
+        file_datasource_manager.delete_file_datasource("server_file_orders")
+
+
+def test_upsert_keeps_one_row_per_key_and_skips_null_keys(server_mount):
+    from core.data.file_datasource_manager import file_datasource_manager
+
+    mount_dir, _ = server_mount
+    day1 = os.path.join(mount_dir, "dup_day1.csv")
+    day2 = os.path.join(mount_dir, "dup_day2.csv")
+    with open(day1, "w", encoding="utf-8") as handle:
+        handle.write(
+            "id,amount,updated\n"
+            "1,10,2024-01-01\n1,11,2024-01-03\n1,12,2024-01-02\n,99,2024-01-01\n"
+        )
+    with open(day2, "w", encoding="utf-8") as handle:
+        # 水位相同的重复主键保留批次中靠后的一行
+        handle.write("id,amount,updated\n,5,2024-01-04\n2,20,2024-01-04\n2,21,2024-01-04\n")
+
+    def _import(path):
+        response = client.post(
+            "/api/server-files/import",
+            json={
+                "path": path,
+                "table_alias": "server_file_dups",
+                "mode": "upsert",
+                "key_columns": ["id"],
+                "watermark_column": "updated",
+            },
+        )
+        assert response.status_code == 200
+        return response.json()["data"]["import_state"]
+
+    try:
+        first = _import(day1)
+        assert (first["last_import_rows"], first["skipped_null_keys"]) == (1, 1)
+        second = _import(day2)
+        assert (second["last_import_rows"], second["skipped_null_keys"]) == (1, 1)
+
+        rows = get_db_connection().execute(
+            'SELECT id, amount FROM "server_file_dups" ORDER BY id'
+        ).fetchall()
+        assert rows == [(1, 11), (2, 21)]
+    finally:
+        get_db_connection().execute('DROP TABLE IF EXISTS "server_file_dups"')
+        file_datasource_manager.delete_file_datasource("server_file_dups")
+
+
+def test_external_view_import_refresh_and_materialize(server_mount):
+    from core.data.file_datasource_manager import file_datasource_manager
+
+    mount_dir, _ = server_mount
+    parquet_path = os.path.join(mount_dir, "events.parquet")
+    con = get_db_connection()
+
+    def _write(rows):
+        con.execute(
+            f"COPY (SELECT range AS id, 'e' || range AS name, "
+            f"CASE WHEN range % 10 = 0 THEN NULL ELSE range END AS score "
+            f"FROM range({rows})) TO '{parquet_path}' (FORMAT PARQUET, ROW_GROUP_SIZE 40)"
+        )
+
+    def _refresh():
+        return client.post("/api/server-files/external/server_file_events/refresh")
+
+    _write(100)
+    try:
+        response = client.post(
+            "/api/server-files/import",
+            json={"path": parquet_path, "table_alias": "server_file_events", "mode": "external"},
+        )
+        assert response.status_code == 200
+        assert response.json()["data"]["storage"] == "external_view"
+        assert con.execute(
+            "SELECT COUNT(*) FROM duckdb_views() WHERE view_name = 'server_file_events'"
+        ).fetchone()[0] == 1
+
+        # 统计信息来自 Parquet 元数据，与实际数据一致
+        saved = file_datasource_manager.get_file_datasource("server_file_events")
+        assert saved["row_count"] == 100
+        assert saved["metadata"]["storage"] == "external_view"
+        profiles = {p["name"]: p["statistics"] for p in saved["column_profiles"]}
+        assert profiles["score"]["null_count"] == 10
+        assert (profiles["id"]["min"], profiles["id"]["max"]) == (0, 99)
+
+        assert _refresh().json()["data"]["status"] == "unchanged"
+        _write(250)
+        refreshed = _refresh().json()["data"]
+        assert (refreshed["status"], refreshed["row_count"]) == ("changed", 250)
+        assert con.execute('SELECT COUNT(*) FROM "server_file_events"').fetchone()[0] == 250
+
+        materialized = client.post("/api/server-files/external/server_file_events/materialize")
+        assert materialized.status_code == 200
+        assert con.execute(
+            "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'server_file_events'"
+        ).fetchone()[0] == 1
+        os.remove(parquet_path)
+        assert con.execute('SELECT COUNT(*) FROM "server_file_events"').fetchone()[0] == 250
+        assert _refresh().status_code == 404
+    finally:
+        client.delete("/api/duckdb/tables/server_file_events")
+        file_datasource_manager.delete_file_datasource("server_file_events")
+
+
+def test_import_hive_partitioned_directory(server_mount):
+    from core.data.file_datasource_manager import file_datasource_manager
+
+    mount_dir, _ = server_mount
+    lake_dir = os.path.join(mount_dir, "lake")
+    con = get_db_connection()
+
+    def _write_month(month, rows, extra_column=False):
+        os.makedirs(os.path.join(lake_dir, f"month={month}"), exist_ok=True)
+        extra = ", 'x' AS channel" if extra_column else ""
+        con.execute(
+            f"COPY (SELECT range AS id{extra} FROM range({rows})) "
+            f"TO '{os.path.join(lake_dir, f'month={month}', 'part-0.parquet')}' (FORMAT PARQUET)"
+        )
+
+    _write_month("2024-01", 10)
+    _write_month("2024-02", 20, extra_column=True)
+    with open(os.path.join(lake_dir, "_SUCCESS"), "w", encoding="utf-8"):
+        pass
+
+    try:
+        response = client.post(
+            "/api/server-files/import-directory",
+            json={"path": lake_dir, "table_alias": "server_lake"},
+        )
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert (data["file_type"], data["file_count"], data["row_count"]) == ("parquet", 2, 30)
+        assert set(data["columns"]) == {"id", "channel", "month"}
+
+        assert con.execute(
+            "SELECT COUNT(*) FROM server_lake WHERE month = '2024-02'"
+        ).fetchone()[0] == 20
+        plan = con.execute(
+            "EXPLAIN SELECT * FROM server_lake WHERE month = '2024-02'"
+        ).fetchall()[0][1]
+        assert "1/2" in plan
+
+        # 新增分区文件在刷新时被纳入视图
+        _write_month("2024-03", 5)
+        refreshed = client.post("/api/server-files/external/server_lake/refresh").json()["data"]
+        assert (refreshed["status"], refreshed["row_count"]) == ("changed", 35)
+        saved = file_datasource_manager.get_file_datasource("server_lake")
+        assert saved["metadata"]["source_fingerprint"]["files"] == 3
+
+        copied = client.post(
+            "/api/server-files/import-directory",
+            json={
+                "path": lake_dir,
+                "table_alias": "server_lake",
+                "mode": "replace",
+                "pattern": "month=2024-0[12]/*.parquet",
+            },
+        )
+        assert copied.status_code == 200
+        assert copied.json()["data"]["storage"] == "table"
+        assert con.execute("SELECT COUNT(*) FROM server_lake").fetchone()[0] == 30
+
+        escaped = client.post(
+            "/api/server-files/import-directory",
+            json={"path": lake_dir, "pattern": "../*.csv"},
+        )
+        assert escaped.status_code == 422
+    finally:
+        client.delete("/api/duckdb/tables/server_lake")
+        file_datasource_manager.delete_file_datasource("server_lake")
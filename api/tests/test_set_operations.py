@@ -249,6 +249,24 @@ class TestSetOperationQueryGenerator:
         estimated_rows = self.generator.estimate_result_rows(config, mock_con)
         assert estimated_rows > 0
 
+    def test_estimate_result_rows_with_explain(self):
+        """测试基于EXPLAIN的结果行数估算"""
+        import duckdb
+
+        con = duckdb.connect()
+        con.execute("CREATE TABLE est_a AS SELECT range AS col1 FROM range(3000)")
+        con.execute("CREATE TABLE est_b AS SELECT range AS col1 FROM range(2000)")
+        config = SetOperationConfig(
+            operation_type=SetOperationType.UNION_ALL,
+            tables=[
+                TableConfig(table_name="est_a", selected_columns=["col1"]),
+                TableConfig(table_name="est_b", selected_columns=["col1"]),
+            ],
+            use_by_name=False,
+        )
+
+        assert self.generator.estimate_result_rows(config, con) == 5000
+
 
 class TestSetOperationAPI:
     """测试集合操作API端点"""
@@ -0,0 +1,175 @@
+"""
+Tests for the /api/query source materialization cache (file sources and database snapshots).
+"""
+
+import os
+
+import duckdb
+
+from core.common.config_manager import config_manager
+from core.data.file_utils import load_file_to_duckdb
+from core.data import source_materialization
+from core.data.source_materialization import (
+    SOURCE_CACHE_PREFIX,
+    database_source_key,
+    file_source_version,
+    materialize_snapshot,
+    materialize_source,
+)
+
+
+def test_file_source_is_reloaded_only_when_the_file_changes(tmp_path):
+    source = tmp_path / "orders.csv"
+    source.write_text("id,amount\n1,10\n2,20\n", encoding="utf-8")
+    con = duckdb.connect()
+    loads = []
+
+    def loader(con, table_name):
+        loads.append(table_name)
+        load_file_to_duckdb(con, table_name, str(source), "csv")
+
+    def query():
+        return materialize_source(con, "orders", *file_source_version(str(source), "csv"), loader)
+
+    first_table, first_hit = query()
+    second_table, second_hit = query()
+    assert (first_hit, second_hit) == (False, True)
+    assert first_table == second_table
+    assert len(loads) == 1
+    assert con.execute('SELECT SUM(amount) FROM "orders"').fetchone()[0] == 30
+
+    source.write_text("id,amount\n1,10\n2,20\n3,30\n", encoding="utf-8")
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    third_table, third_hit = query()
+    assert third_hit is False
+    assert third_table != first_table
+    assert con.execute('SELECT SUM(amount) FROM "orders"').fetchone()[0] == 60
+
+    cached = con.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE starts_with(table_name, ?)",
+        [SOURCE_CACHE_PREFIX],
+    ).fetchall()
+    assert cached == [(third_table,)]
+
+
+def test_alias_left_as_table_by_older_queries_is_replaced(tmp_path):
+    source = tmp_path / "items.csv"
+    source.write_text("sku\nA\nB\n", encoding="utf-8")
+    con = duckdb.connect()
+    con.execute('CREATE TABLE "items" AS SELECT 1 AS stale')
+
+    materialize_source(
+        con,
+        "items",
+        *file_source_version(str(source), "csv"),
+        lambda con, table_name: load_file_to_duckdb(con, table_name, str(source), "csv"),
+    )
+    assert con.execute('SELECT COUNT(*) FROM "items"').fetchone()[0] == 2
+
+
+def test_database_snapshot_is_refetched_only_when_stale_and_changed():
+    con = duckdb.connect()
+    remote = {"rows": [(1, "2024-01-01")], "fetches": 0}
+    key = database_source_key("conn-1", "SELECT * FROM orders")
+
+    def loader(con, table_name):
+        remote["fetches"] += 1
+        con.execute(f'CREATE TABLE "{table_name}" (id INTEGER, updated_at VARCHAR)')
+        con.executemany(f'INSERT INTO "{table_name}" VALUES (?, ?)', remote["rows"])
+
+    def probe():
+        return max(row[1] for row in remote["rows"]), len(remote["rows"])
+
+    def query():
+        return materialize_snapshot(con, "orders", key, loader, 3600, probe)
+
+    def expire():
+        source_materialization._snapshots[key].fetched_at -= 7200
+
+    first_table, reused = query()
+    assert reused is False
+    assert query() == (first_table, True)
+
+    expire()
+    assert query() == (first_table, True)
+    assert remote["fetches"] == 1
+
+    remote["rows"].append((2, "2024-02-01"))
+    assert query() == (first_table, True)
+    expire()
+    second_table, reused = query()
+    assert reused is False
+    assert second_table != first_table
+    assert remote["fetches"] == 2
+    assert con.execute('SELECT COUNT(*) FROM "orders"').fetchone()[0] == 2
+    assert con.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE starts_with(table_name, ?)",
+        [SOURCE_CACHE_PREFIX],
+    ).fetchone()[0] == 1
+
+
+def test_least_recently_used_materializations_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_manager.get_app_config(), "query_source_cache_max_entries", 2)
+    con = duckdb.connect()
+
+    def query(name):
+        source = tmp_path / f"{name}.csv"
+        if not source.exists():
+            source.write_text(f"{name}\n1\n", encoding="utf-8")
+        return materialize_source(
+            con,
+            name,
+            *file_source_version(str(source), "csv"),
+            lambda con, table_name: load_file_to_duckdb(con, table_name, str(source), "csv"),
+        )
+
+    a_table, _ = query("a")
+    b_table, _ = query("b")
+    assert query("a") == (a_table, True)
+    c_table, _ = query("c")
+
+    cached = con.execute(
+        "SELECT list(table_name ORDER BY table_name) FROM duckdb_tables() "
+        "WHERE starts_with(table_name, ?)",
+        [SOURCE_CACHE_PREFIX],
+    ).fetchone()[0]
+    assert cached == sorted([a_table, c_table])
+    assert query("b") == (b_table, False)
+
+
+def test_alias_views_follow_or_leave_with_their_materialization(tmp_path, monkeypatch):
+    source = tmp_path / "orders.csv"
+    source.write_text("id\n1\n", encoding="utf-8")
+    con = duckdb.connect()
+
+    def query(alias, path=source):
+        return materialize_source(
+            con,
+            alias,
+            *file_source_version(str(path), "csv"),
+            lambda con, table_name: load_file_to_duckdb(con, table_name, str(path), "csv"),
+        )
+
+    query("orders_a")
+    query("orders_b")
+    source.write_text("id\n1\n2\n", encoding="utf-8")
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    query("orders_b")
+    # orders_a 没有重新查询，但仍指向新版本而不是已删除的旧表
+    assert con.execute('SELECT COUNT(*) FROM "orders_a"').fetchone()[0] == 2
+
+    for name in ("c", "d"):
+        other = tmp_path / f"{name}.csv"
+        other.write_text("id\n1\n", encoding="utf-8")
+        query(name, other)
+    monkeypatch.setattr(config_manager.get_app_config(), "query_source_cache_max_entries", 1)
+    source_materialization.evict_source_cache(con)
+
+    views = con.execute(
+        "SELECT list(view_name ORDER BY view_name) FROM duckdb_views() WHERE NOT internal"
+    ).fetchone()[0]
+    assert views == ["d"]
+    for view in views:
+        con.execute(f'SELECT COUNT(*) FROM "{view}"').fetchone()
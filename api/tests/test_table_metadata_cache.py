@@ -0,0 +1,99 @@
+"""
+Tests for TableMetadataCache: change-driven invalidation, LRU bounds and metrics.
+"""
+
+from unittest.mock import patch
+
+import duckdb
+
+from core.data.file_datasource_manager import create_typed_table_from_dataframe
+from core.database.table_metadata_cache import TableMetadataCache, table_metadata_cache
+from models.visual_query_models import TableMetadata
+
+
+def _metadata(name: str, rows: int = 1) -> TableMetadata:
+    return TableMetadata(table_name=name, row_count=rows, column_count=0, columns=[])
+
+
+def test_hits_and_misses_are_counted():
+    cache = TableMetadataCache()
+    cache.get_or_load("t1", lambda: _metadata("t1"))
+    cache.get_or_load("t1", lambda: _metadata("t1"))
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    assert stats["total_bytes"] > 0
+
+
+def test_lru_evicts_least_recently_used_entry():
+    cache = TableMetadataCache()
+    with patch.object(TableMetadataCache, "_get_limits", return_value=(2, 1024 * 1024)):
+        cache.get_or_load("a", lambda: _metadata("a"))
+        cache.get_or_load("b", lambda: _metadata("b"))
+        cache.get_or_load("a", lambda: _metadata("a"))
+        cache.get_or_load("c", lambda: _metadata("c"))
+
+        stats = cache.get_stats()
+
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert cache.table_version("b") == 0
+    loads = []
+    cache.get_or_load("b", lambda: loads.append("b") or _metadata("b"))
+    assert loads == ["b"]
+
+
+def test_byte_budget_bounds_total_size():
+    cache = TableMetadataCache()
+    entry_size = len(_metadata("x").model_dump_json())
+    with patch.object(TableMetadataCache, "_get_limits", return_value=(100, entry_size * 2)):
+        for name in ("x", "y", "z"):
+            cache.get_or_load(name, lambda name=name: _metadata(name))
+        stats = cache.get_stats()
+
+    assert stats["entries"] == 2
+    assert stats["total_bytes"] <= entry_size * 2
+
+
+def test_load_racing_with_invalidation_is_not_cached():
+    cache = TableMetadataCache()
+
+    def _loader():
+        cache.invalidate("racy")
+        return _metadata("racy", rows=1)
+
+    cache.get_or_load("racy", _loader)
+    fresh = cache.get_or_load("racy", lambda: _metadata("racy", rows=2))
+    assert fresh.row_count == 2
+
+
+def test_version_map_is_bounded_and_never_reuses_versions():
+    cache = TableMetadataCache()
+    with patch("core.database.table_metadata_cache._MAX_TRACKED_VERSIONS", 2):
+        for name in ("dropped_a", "dropped_b", "dropped_c"):
+            cache.invalidate(name)
+        assert len(cache._versions) == 2  # pylint: disable=protected-access
+        # 被遗忘的表报告的版本高于它曾经的任何版本
+        assert cache.table_version("dropped_a") > 1
+        assert cache.table_version("dropped_c") == 1
+
+
+def test_table_creation_invalidates_cached_metadata():
+    con = duckdb.connect()
+    table_metadata_cache.get_or_load("cache_invalidation_table", lambda: _metadata("stale"))
+    version = table_metadata_cache.table_version("cache_invalidation_table")
+
+    import pandas as pd
+
+    create_typed_table_from_dataframe(
+        con, "cache_invalidation_table", pd.DataFrame({"a": [1, 2, 3]})
+    )
+
+    assert table_metadata_cache.table_version("cache_invalidation_table") == version + 1
+    reloaded = table_metadata_cache.get_or_load(
+        "cache_invalidation_table", lambda: _metadata("fresh", rows=3)
+    )
+    assert reloaded.row_count == 3
+    table_metadata_cache.invalidate("cache_invalidation_table")
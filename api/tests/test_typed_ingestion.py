@@ -79,3 +79,95 @@ def test_csv_ingestion_preserves_types(tmp_path):
     con.execute(f'DROP TABLE IF EXISTS "{table_name}"')
     if Path(csv_path).exists():
         os.remove(csv_path)
+
+
+def test_csv_adaptive_sniff_widens_on_unsampled_conversion_error(tmp_path):
+    import duckdb
+
+    from core.data import file_utils
+
+    rows = [f"{i},{i * 0.5},2024-01-{i % 28 + 1:02d}" for i in range(20000)]
+    csv_path = tmp_path / "adaptive.csv"
+    csv_path.write_text("id,amount,day\n" + "\n".join(rows) + "\n", encoding="utf-8")
+    mismatched = rows[:]
+    mismatched[9000] = "9000,not_a_number,2024-01-01"
+    mismatched_path = tmp_path / "adaptive_mismatch.csv"
+    mismatched_path.write_text("id,amount,day\n" + "\n".join(mismatched) + "\n", encoding="utf-8")
+
+    con = duckdb.connect()
+    try:
+        with (
+            patch.object(file_utils, "CSV_SNIFF_FULL_SCAN_MAX_BYTES", 1024),
+            patch.object(file_utils, "CSV_SNIFF_BLOCK_BYTES", 4096),
+        ):
+            sampled = file_utils._sniff_csv_types_from_sample(con, str(csv_path), {"HEADER": True})
+            assert sampled == {"id": "BIGINT", "amount": "DOUBLE", "day": "DATE"}
+
+            file_utils.load_file_to_duckdb(con, "adaptive", str(csv_path), "csv")
+            file_utils.load_file_to_duckdb(con, "adaptive_mismatch", str(mismatched_path), "csv")
+
+        types = dict(con.execute("SELECT column_name, column_type FROM (DESCRIBE adaptive)").fetchall())
+        assert types == sampled
+        widened = dict(
+            con.execute("SELECT column_name, column_type FROM (DESCRIBE adaptive_mismatch)").fetchall()
+        )
+        assert widened["amount"] == "VARCHAR"
+        assert con.execute("SELECT COUNT(*) FROM adaptive_mismatch").fetchone()[0] == 20000
+    finally:
+        con.close()
+
+
+def test_mixed_dataframe_ingested_through_arrow():
+    from core.data.file_datasource_manager import create_typed_table_from_dataframe
+    from core.database.duckdb_engine import prepare_dataframe_for_duckdb
+
+    con = get_db_connection()
+    table_name = _make_table_name("df_arrow")
+    df = pd.DataFrame(
+        {
+            "blob": [b"abc", None, "中文".encode("utf-8")],
+            "mixed": [1, "two", None],
+            "seen_at": pd.to_datetime(["2024-01-01 08:00", "2024-01-01 09:30", None]).tz_localize(
+                "Asia/Shanghai"
+            ),
+            "grade": pd.Categorical(["a", "b", "a"]),
+            "score": [1.5, None, 3.0],
+        }
+    )
+
+    try:
+        create_typed_table_from_dataframe(con, table_name, df)
+        column_types = {
+            row[1]: row[2]
+            for row in con.execute(f"PRAGMA table_info('{table_name}')").fetchall()
+        }
+        assert column_types["blob"] == "VARCHAR"
+        assert column_types["mixed"] == "VARCHAR"
+        assert column_types["grade"] == "VARCHAR"
+        assert column_types["score"] == "DOUBLE"
+        assert "TIME ZONE" not in column_types["seen_at"]
+
+        rows = con.execute(
+            f'SELECT blob, mixed, strftime(seen_at, \'%H:%M\') FROM "{table_name}"'
+        ).fetchall()
+        # 带时区的时间统一转换为 UTC
+        assert rows == [("abc", "1", "00:00"), (None, "two", "01:30"), ("中文", None, None)]
+    finally:
+        con.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+
+    prepared = prepare_dataframe_for_duckdb(df)
+    assert prepared["score"].tolist() == ["1.5", "", "3"]
+    assert prepared["blob"].tolist() == ["abc", "", "中文"]
+
+    # 外部数据库的 json/数组/时间间隔列逐值转为与 pandas 相同的文本
+    nested = pd.DataFrame(
+        {
+            "payload": [{"a": 1}, None, {"b": "x"}],
+            "tags": [[1, 2], None, []],
+            "elapsed": pd.to_timedelta([1, None, 90], unit="s"),
+        }
+    )
+    prepared = prepare_dataframe_for_duckdb(nested)
+    assert prepared["payload"].tolist() == ["{'a': 1}", "", "{'b': 'x'}"]
+    assert prepared["tags"].tolist() == ["[1, 2]", "", "[]"]
+    assert prepared["elapsed"].tolist() == ["0 days 00:00:01", "", "0 days 00:01:30"]
@@ -0,0 +1,66 @@
+"""
+Tests for block-wise streaming of uploaded files to disk.
+"""
+
+import asyncio
+import hashlib
+import io
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from core.security.security import security_validator
+from core.services.resource_manager import UploadTooLargeError, stream_upload_to_path
+
+
+def _upload(content: bytes, filename: str = "data.csv") -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename=filename)
+
+
+def test_stream_upload_computes_size_and_hash(tmp_path):
+    content = b"id,name\n" + b"".join(f"{i},row{i}\n".encode() for i in range(2000))
+    seen_headers = []
+
+    result = asyncio.run(
+        stream_upload_to_path(
+            _upload(content),
+            tmp_path / "data.csv",
+            block_size=1024,
+            header_check=seen_headers.append,
+        )
+    )
+
+    assert result.size == len(content)
+    assert result.sha256 == hashlib.sha256(content).hexdigest()
+    assert result.md5 == hashlib.md5(content).hexdigest()
+    assert result.header == content[:1024]
+    assert seen_headers == [content[:1024]]
+    assert (tmp_path / "data.csv").read_bytes() == content
+
+
+def test_stream_upload_enforces_size_limit(tmp_path):
+    target = tmp_path / "big.csv"
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(
+            stream_upload_to_path(
+                _upload(b"x" * 5000), target, block_size=1024, max_size=3000
+            )
+        )
+    assert not target.exists()
+
+
+def test_header_check_rejects_before_writing(tmp_path):
+    target = tmp_path / "bad.csv"
+
+    def _reject(header: bytes) -> None:
+        raise ValueError("rejected")
+
+    with pytest.raises(ValueError):
+        asyncio.run(stream_upload_to_path(_upload(b"a,b\n1,2\n"), target, header_check=_reject))
+    assert not target.exists()
+
+
+def test_validate_upload_header_checks_name_and_extension():
+    assert security_validator.validate_upload_header(b"a,b\n1,2\n", "ok.csv")["valid"]
+    assert not security_validator.validate_upload_header(b"MZ", "tool.exe")["valid"]
+    assert not security_validator.validate_upload_header(b"a,b\n", "..\\evil.csv")["valid"]
@@ -0,0 +1,152 @@
+"""
+Tests for the streaming, resumable URL download manager against a local HTTP server.
+"""
+
+import gzip
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.services import download_manager
+from core.services.download_manager import download_to_file
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """按 Range 返回数据的本地服务器；drop_next 次请求在发送一半后断开连接
+
+    gzip_encoding 时无视 Accept-Encoding，总是以 Content-Encoding: gzip 返回整个文件。
+    """
+
+    payload = b""
+    accept_ranges = True
+    gzip_encoding = False
+    drop_next = 0
+    range_requests = []
+    lock = threading.Lock()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+    def _send_headers(self, status, start, end):
+        self.send_response(status)
+        self.send_header("Content-Length", str(end - start + 1))
+        if self.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.payload)}")
+        self.end_headers()
+
+    def _send_gzip(self, with_body):
+        body = gzip.compress(self.payload)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        if self.gzip_encoding:
+            self._send_gzip(with_body=False)
+            return
+        self._send_headers(200, 0, len(self.payload) - 1)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.gzip_encoding:
+            self._send_gzip(with_body=True)
+            return
+        start, end, status = 0, len(self.payload) - 1, 200
+        range_header = self.headers.get("Range")
+        if range_header and self.accept_ranges:
+            first, _, last = range_header.split("=", 1)[1].partition("-")
+            start, end, status = int(first), int(last) if last else end, 206
+            with self.lock:
+                self.range_requests.append((start, end))
+        self._send_headers(status, start, end)
+
+        body = self.payload[start : end + 1]
+        with self.lock:
+            drop = self.__class__.drop_next > 0
+            if drop:
+                self.__class__.drop_next -= 1
+        if drop:
+            self.wfile.write(body[: len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stand_in_server():
+    handler = type("Handler", (_StandInHandler,), {"range_requests": []})
+    handler.payload = os.urandom(3 * 1024 * 1024 + 17)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield handler, f"http://127.0.0.1:{server.server_address[1]}/data.bin"
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_resumes_after_dropped_connection(stand_in_server, tmp_path):
+    handler, url = stand_in_server
+    handler.drop_next = 1
+    target = tmp_path / "resumed.bin"
+
+    result = download_to_file(url, str(target), timeout=5, max_workers=1)
+
+    assert target.read_bytes() == handler.payload
+    assert (result.resumes, result.segments, result.ranged) == (1, 1, True)
+    # 续传请求从第一次中断的位置开始，而不是从头下载
+    assert handler.range_requests[-1][0] > 0
+
+
+def test_download_uses_parallel_ranged_segments(stand_in_server, tmp_path, monkeypatch):
+    handler, url = stand_in_server
+    monkeypatch.setattr(download_manager, "MIN_PARALLEL_DOWNLOAD_SIZE", 1024)
+    monkeypatch.setattr(download_manager, "MIN_SEGMENT_SIZE", 512 * 1024)
+    handler.drop_next = 2
+    target = tmp_path / "parallel.bin"
+
+    result = download_to_file(url, str(target), timeout=5, max_workers=4)
+
+    assert target.read_bytes() == handler.payload
+    assert result.segments == 4
+    assert result.resumes == 2
+
+
+def test_download_restarts_without_range_support(stand_in_server, tmp_path):
+    handler, url = stand_in_server
+    handler.accept_ranges = False
+    handler.drop_next = 1
+    target = tmp_path / "restarted.bin"
+
+    result = download_to_file(url, str(target), timeout=5, max_workers=4)
+
+    assert target.read_bytes() == handler.payload
+    assert (result.ranged, result.resumes) == (False, 1)
+
+
+def test_download_removes_partial_file_when_retries_exhausted(stand_in_server, tmp_path):
+    handler, url = stand_in_server
+    handler.drop_next = 10
+    target = tmp_path / "failed.bin"
+
+    with pytest.raises(download_manager.DownloadError):
+        download_to_file(url, str(target), timeout=5, max_workers=1, max_retries=2)
+    assert not target.exists()
+
+
+def test_gzip_encoded_download_is_written_decoded(stand_in_server, tmp_path):
+    handler, url = stand_in_server
+    handler.gzip_encoding = True
+    handler.payload = b"id,amount\n" + b"".join(f"{i},{i * 3}\n".encode() for i in range(20000))
+    target = tmp_path / "encoded.csv"
+
+    result = download_to_file(url, str(target), timeout=5, max_workers=4)
+
+    assert target.read_bytes() == handler.payload
+    assert (result.size, result.ranged) == (len(handler.payload), False)
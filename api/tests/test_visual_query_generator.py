@@ -1028,6 +1028,38 @@ class TestPerformanceEstimation:
         assert len(result.warnings) > 0
         assert any("聚合函数较多" in warning for warning in result.warnings)
 
+    def test_estimate_uses_explain_without_count_scan(self):
+        """Optimizer estimates are used and cached instead of COUNT(*) scans"""
+        import duckdb
+
+        con = duckdb.connect()
+        con.execute(
+            "CREATE TABLE explain_table AS SELECT range AS id, range % 10 AS bucket "
+            "FROM range(20000)"
+        )
+        config = VisualQueryConfig(
+            table_name="explain_table",
+            selected_columns=["id", "bucket"],
+            aggregations=[],
+            filters=[],
+            order_by=[],
+        )
+
+        spy = Mock(wraps=con)
+        result = estimate_query_performance(config, spy)
+        assert result.estimated_rows == 20000
+        executed = [call.args[0] for call in spy.execute.call_args_list]
+        assert any(sql.startswith("EXPLAIN") for sql in executed)
+        assert not any("COUNT(*)" in sql for sql in executed)
+
+        spy.execute.reset_mock()
+        estimate_query_performance(config, spy)
+        executed = [call.args[0] for call in spy.execute.call_args_list]
+        assert not any(sql.startswith("EXPLAIN") for sql in executed)
+
+        con.execute("INSERT INTO explain_table SELECT range, 0 FROM range(5000)")
+        assert estimate_query_performance(config, con).estimated_rows == 25000
+
 
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -109,6 +109,7 @@ class MessageCode(str, Enum):
     CHUNKED_UPLOAD_COMPLETE = "CHUNKED_UPLOAD_COMPLETE"
     CHUNKED_UPLOAD_CANCELLED = "CHUNKED_UPLOAD_CANCELLED"
     CHUNKED_UPLOAD_FAILED = "CHUNKED_UPLOAD_FAILED"
+    CHUNKED_UPLOAD_STATUS = "CHUNKED_UPLOAD_STATUS"
 
     # ==================== URL 读取相关 ====================
     URL_READ_SUCCESS = "URL_READ_SUCCESS"
@@ -119,6 +120,7 @@ class MessageCode(str, Enum):
     # ==================== Excel 相关 ====================
     EXCEL_SHEETS_INSPECTED = "EXCEL_SHEETS_INSPECTED"
     EXCEL_SHEETS_IMPORTED = "EXCEL_SHEETS_IMPORTED"
+    EXCEL_IMPORT_PROGRESS = "EXCEL_IMPORT_PROGRESS"
     EXCEL_IMPORT_FAILED = "EXCEL_IMPORT_FAILED"
 
     # ==================== 粘贴数据相关 ====================
@@ -138,7 +140,10 @@ class MessageCode(str, Enum):
     SERVER_MOUNTS_RETRIEVED = "SERVER_MOUNTS_RETRIEVED"
     SERVER_DIRECTORY_BROWSED = "SERVER_DIRECTORY_BROWSED"
     SERVER_FILE_IMPORTED = "SERVER_FILE_IMPORTED"
+    SERVER_DIRECTORY_IMPORTED = "SERVER_DIRECTORY_IMPORTED"
     SERVER_FILE_NOT_FOUND = "SERVER_FILE_NOT_FOUND"
+    EXTERNAL_VIEW_REFRESHED = "EXTERNAL_VIEW_REFRESHED"
+    EXTERNAL_VIEW_MATERIALIZED = "EXTERNAL_VIEW_MATERIALIZED"
 
     # ==================== 连接池相关 ====================
     POOL_STATUS_RETRIEVED = "POOL_STATUS_RETRIEVED"
@@ -262,6 +267,7 @@ DEFAULT_MESSAGES = {
     MessageCode.CHUNKED_UPLOAD_COMPLETE: "分块上传完成",
     MessageCode.CHUNKED_UPLOAD_CANCELLED: "分块上传已取消",
     MessageCode.CHUNKED_UPLOAD_FAILED: "分块上传失败",
+    MessageCode.CHUNKED_UPLOAD_STATUS: "获取上传状态成功",
 
     # ==================== URL 读取相关 ====================
     MessageCode.URL_READ_SUCCESS: "URL 读取成功",
@@ -272,6 +278,7 @@ DEFAULT_MESSAGES = {
     # ==================== Excel 相关 ====================
     MessageCode.EXCEL_SHEETS_INSPECTED: "Excel 表格检查成功",
     MessageCode.EXCEL_SHEETS_IMPORTED: "Excel 表格导入成功",
+    MessageCode.EXCEL_IMPORT_PROGRESS: "获取 Excel 导入进度成功",
     MessageCode.EXCEL_IMPORT_FAILED: "Excel 导入失败",
 
     # ==================== 粘贴数据相关 ====================
@@ -291,7 +298,10 @@ DEFAULT_MESSAGES = {
     MessageCode.SERVER_MOUNTS_RETRIEVED: "获取挂载点列表成功",
     MessageCode.SERVER_DIRECTORY_BROWSED: "目录浏览成功",
     MessageCode.SERVER_FILE_IMPORTED: "服务器文件导入成功",
+    MessageCode.SERVER_DIRECTORY_IMPORTED: "服务器目录导入成功",
     MessageCode.SERVER_FILE_NOT_FOUND: "服务器文件不存在",
+    MessageCode.EXTERNAL_VIEW_REFRESHED: "外部视图元数据已刷新",
+    MessageCode.EXTERNAL_VIEW_MATERIALIZED: "外部视图已物化为表",
 
     # ==================== 连接池相关 ====================
     MessageCode.POOL_STATUS_RETRIEVED: "获取连接池状态成功",
@@ -459,7 +459,7 @@ const UploadPanel = ({ onDataSourceSaved }) => {
                 type="file"
                 className="hidden"
                 onChange={handleFileChange}
-                accept=".csv,.xlsx,.xls,.json,.parquet,.pq"
+                accept=".csv,.xlsx,.xls,.json,.jsonl,.parquet,.pq,.gz,.zst,.bz2,.zip"
               />
               <Upload className="h-8 w-8 text-muted-fg" />
               <p className="text-foreground font-medium text-sm">
@@ -441,7 +441,10 @@ export interface PasteDataRequest {
     table_name: string;
     column_names: string[];
     column_types: string[];
-    data_rows: string[][];
+    // 三选一：按行数组、原始 TSV/CSV 文本（后端一次性解析）或按列数组
+    data_rows?: string[][];
+    raw_text?: string;
+    column_values?: (string | null)[][];
     delimiter?: string;
     has_header?: boolean;
 }
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""DataFrame → DuckDB ingestion benchmark.
+
+Usage::
+
+    python scripts/benchmark_dataframe_ingestion.py --rows 1000000
+
+Compares the legacy pandas paths (object-column registration and the
+per-column ``astype(str)`` loop) with the Arrow conversion layer on a
+mixed-type frame.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+API_ROOT = ROOT / "api"
+if str(API_ROOT) not in sys.path:
+    sys.path.insert(0, str(API_ROOT))
+
+from core.database.arrow_ingest import (  # noqa: E402
+    dataframe_to_arrow,
+    dataframe_to_varchar_arrow,
+)
+
+
+def build_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    ids = np.arange(rows)
+    mixed = pd.Series(ids.astype(object))
+    mixed[::7] = "n/a"
+    return pd.DataFrame(
+        {
+            "id": ids,
+            "amount": rng.normal(100, 15, rows),
+            "name": pd.Series([f"user_{i % 5000}" for i in ids], dtype=object),
+            "payload": pd.Series([f"row-{i}".encode("utf-8") for i in ids], dtype=object),
+            "mixed": mixed,
+            "created_at": pd.date_range("2024-01-01", periods=rows, freq="s", tz="Asia/Shanghai"),
+            "flag": ids % 2 == 0,
+        }
+    )
+
+
+def legacy_varchar(df: pd.DataFrame) -> pd.DataFrame:
+    result = df.copy()
+    for col in result.columns:
+        if pd.api.types.is_datetime64_any_dtype(result[col]):
+            result[col] = result[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+        result[col] = result[col].astype(str).replace({"nan": "", "None": "", "NaT": ""})
+    return result
+
+
+def timed(label: str, func) -> None:
+    start = time.perf_counter()
+    func()
+    print(f"{label:<40} {time.perf_counter() - start:8.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = build_frame(args.rows)
+    con = duckdb.connect()
+
+    def load(name, source):
+        con.register("bench_src", source)
+        con.execute(f'CREATE OR REPLACE TABLE "{name}" AS SELECT * FROM bench_src')
+        con.unregister("bench_src")
+
+    print(f"rows: {args.rows:,}")
+    timed("typed: pandas register", lambda: load("typed_pandas", df.astype({"payload": str, "mixed": str})))
+    timed("typed: arrow conversion + register", lambda: load("typed_arrow", dataframe_to_arrow(df)))
+    timed("varchar: astype loop + register", lambda: load("varchar_pandas", legacy_varchar(df)))
+    timed("varchar: arrow conversion + register", lambda: load("varchar_arrow", dataframe_to_varchar_arrow(df)))
+
+
+if __name__ == "__main__":
+    main()